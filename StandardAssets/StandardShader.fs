@@ -40,7 +40,9 @@ void main() {
 	#else
 
 		#ifdef NORMAL_MAP
-			vec3 tangentSpaceV = texture(texture_normal_map, pass_texture_coordinates).xyz * 2.0 - 1.0;
+			// Z is calculated from X and Y so that 2-channel (BC5) normal maps work
+			vec2 tangentSpaceXY = texture(texture_normal_map, pass_texture_coordinates).xy * 2.0 - 1.0;
+			vec3 tangentSpaceV = vec3(tangentSpaceXY, sqrt(max(1.0 - dot(tangentSpaceXY, tangentSpaceXY), 0.0)));
 			vec3 n = pass_tangentToWorld * tangentSpaceV;
 			n = normalize(n);
 
@@ -67,34 +67,34 @@ void apply_animation(inout vec4 position, inout vec3 normal) {
 #else
 void apply_animation(inout vec4 position) {		
 #endif
-	mat4 boneMat1 = boneMatrices[min(127u, in_bone_indices[0])];	
-	mat4 boneMat2 = boneMatrices[min(127u, in_bone_indices[1])];	
-	mat4 boneMat3 = boneMatrices[min(127u, in_bone_indices[2])];	
-	mat4 boneMat4 = boneMatrices[min(127u, in_bone_indices[3])];
-
-	vec3 position1 = (boneMat1 * position).xyz;
-	vec3 position2 = (boneMat2 * position).xyz;
-	vec3 position3 = (boneMat3 * position).xyz;
-	vec3 position4 = (boneMat4 * position).xyz;
-
-	position = vec4(
-		position1 * in_vertex_weights[0] +
-		position2 * in_vertex_weights[1] +
-		position3 * in_vertex_weights[2] +
-		position4 * in_vertex_weights[3]
-		, 1.0);
+	// The exporter sorts the influences from biggest to smallest so
+	// the loop can stop at the first zero weight.
+	// Vertices with no influences are static.
+	if (in_vertex_weights[0] == 0.0) {
+		return;
+	}
+
+	vec3 animated_position = vec3(0.0);
+#ifdef HAS_NORMALS
+	vec3 animated_normal = vec3(0.0);
+#endif
+
+	for (int i = 0; i < 4; i++) {
+		float weight = in_vertex_weights[i];
+		if (weight == 0.0) {
+			break;
+		}
+
+		mat4 boneMat = boneMatrices[min(127u, in_bone_indices[i])];
+		animated_position += (boneMat * position).xyz * weight;
+#ifdef HAS_NORMALS
+		animated_normal += normalize(mat3(boneMat) * normal) * weight;
+#endif
+	}
 
+	position = vec4(animated_position, 1.0);
 #ifdef HAS_NORMALS
-	vec3 normal1 = normalize(mat3(boneMat1) * normal);
-	vec3 normal2 = normalize(mat3(boneMat2) * normal);
-	vec3 normal3 = normalize(mat3(boneMat3) * normal);
-	vec3 normal4 = normalize(mat3(boneMat4) * normal);
-
-	normal = 
-		normal1 * in_vertex_weights[0] +
-		normal2 * in_vertex_weights[1] +
-		normal3 * in_vertex_weights[2] +
-		normal4 * in_vertex_weights[3];
+	normal = animated_normal;
 #endif
 }
 #endif
@@ -0,0 +1,686 @@
+# READS .model, .anim, .animbank AND .scene FILES (AND THEIR *.compressed VERSIONS) INTO NUMPY ARRAYS, FOR CHECKING, COMPARING AND
+# GATHERING STATISTICS ABOUT EXPORTED FILES WITHOUT THE ENGINE. SEE THE FILE FORMATS IN docs/
+# DOES NOT DEPEND ON BLENDER. KEEP THIS FILE IN THE SAME DIRECTORY AS THE EXPORT SCRIPTS.
+# READING *.compressed FILES REQUIRES THE zstandard MODULE (SEE compressedfile.py)
+
+# Uncompressed files are memory-mapped and *.compressed files are decompressed once. The arrays are read-only views of the
+# file data, nothing is copied: vertex attributes of interleaved models are strided views. Packed values (normals, quantised
+# positions, texture coordinates, quantised animation tracks) are unpacked by the functions below, which do copy.
+# The readers check the same things as ModelFiles.zig, AnimationFiles.zig and Scene.zig and raise ValueError for invalid files.
+#
+#	model = assetfiles.read('../DemoAssets/Minotaur.model.compressed')
+#	normals = assetfiles.unpackNormals(model.normals)
+
+import os
+import sys
+
+import numpy as np
+
+# compressedfile.py is in the same directory as this script
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import compressedfile
+
+MODEL_MAGIC = 0xaaeecdbb
+ANIMATION_MATRICES_MAGIC = 0xee334507
+ANIMATION_TRACKS_MAGIC = 0xee334508
+ANIMATION_BANK_MAGIC = 0xee334509
+SCENE_V1_MAGIC = 0x1a98fd34
+SCENE_V2_MAGIC = 0x1a98fd35
+
+# Vertex attribute bits (docs/model file format.md), in the order that the attributes are stored
+POSITION = 1 << 0
+COLOUR = 1 << 1
+TEXTURE_COORDINATES = 1 << 2
+NORMALS = 1 << 3
+BONE_INDICES = 1 << 4
+VERTEX_WEIGHTS = 1 << 5
+TANGENTS = 1 << 6
+
+# Other bits of the vertex attributes field
+LODS = 1 << 10
+CLUSTERS = 1 << 11
+INDEX_RANGES = 1 << 12
+DEPTH_VERTICES = 1 << 13
+
+# Position formats (bits 8 and 9 of the vertex attributes field)
+POSITION_FLOAT32 = 0
+POSITION_UNORM16 = 1
+POSITION_UNORM10 = 2
+
+# Size of a position in u32s for each position format
+POSITION_SIZES = (3, 2, 1)
+
+# Same layouts as in the files
+CLUSTER_DTYPE = np.dtype([('firstIndex', '<u4'), ('indexCount', '<u4'), ('sphereCentre', '<f4', 3), ('sphereRadius', '<f4'),
+	('boxMin', '<f4', 3), ('boxMax', '<f4', 3), ('coneAxis', '<f4', 3), ('coneCutoff', '<f4')])
+INDEX_RANGE_DTYPE = np.dtype([('firstIndex', '<u4'), ('indexCount', '<u4'), ('baseVertex', '<u4')])
+SCENE_MESH_DTYPE = np.dtype([('assetIndex', '<u4'), ('modifiable', '<u4')])
+SCENE_TEXTURE_DTYPE = np.dtype([('assetIndex', '<u4'), ('modifiable', '<u4'), ('smoothWhenMagnified', '<u4'), ('minFilter', '<u4')])
+SCENE_MATERIAL_DTYPE = np.dtype([('textureIndex', '<u4'), ('normalMapTextureIndex', '<u4'), ('specularSize', '<f4'),
+	('specularIntensity', '<f4'), ('specularColourisation', '<f4'), ('flatShading', '<u4')])
+BVH_ENTRY_DTYPE = np.dtype([('object', '<u4'), ('boxMin', '<f4', 3), ('boxMax', '<f4', 3)])
+BVH_NODE_DTYPE = np.dtype([('boxMin', '<f4', 3), ('boxMax', '<f4', 3), ('first', '<u4'), ('count', '<u4')])
+
+# Returns the contents of the file as a read-only uint8 array. Uncompressed data is memory-mapped
+def readFileData(path):
+	with open(path, 'rb') as f:
+		header = f.read(len(compressedfile.MAGIC))
+
+	if header[:len(compressedfile.MAGIC)] == compressedfile.MAGIC:
+		# bytes objects are read-only
+		return np.frombuffer(compressedfile.readFile(path), dtype=np.uint8)
+
+	if len(header) == 0:
+		return np.zeros(0, dtype=np.uint8)
+	return np.memmap(path, dtype=np.uint8, mode='r')
+
+# Array of the given shape and type that uses the data (uint8 array) from the byte offset, without copying
+# stride: bytes between the first elements of rows (the first dimension), for attributes of interleaved vertices
+def view(data, offset, shape, dtype, stride=None):
+	dtype = np.dtype(dtype)
+	rowSize = int(np.prod(shape[1:], dtype=np.int64)) * dtype.itemsize
+	if stride is None:
+		stride = rowSize
+
+	size = (shape[0] - 1) * stride + rowSize if shape[0] > 0 else 0
+	if offset + size > len(data):
+		raise ValueError('File too small')
+
+	strides = (stride,) + tuple(int(np.prod(shape[i+1:], dtype=np.int64)) * dtype.itemsize for i in range(1, len(shape)))
+	return np.ndarray(shape, dtype=dtype, buffer=data, offset=offset, strides=strides)
+
+# Returns the string (docs/model file format.md, UTF8 string) at the u32 offset and the offset after it
+def readString(data, offset):
+	if offset * 4 >= len(data):
+		raise ValueError('File too small')
+	length = int(data[offset * 4])
+	if offset * 4 + 1 + length > len(data):
+		raise ValueError('File too small')
+	return bytes(data[offset*4+1:offset*4+1+length]).decode('utf8'), offset + (1 + length + 3) // 4
+
+def u32View(data):
+	if len(data) % 4 != 0:
+		raise ValueError('File size is not a multiple of 4')
+	return data.view('<u4'), data.view('<f4')
+
+# -- Unpacking --
+
+# (n,) u32 normals or tangents (signed normalised 10 bits per component, x in the least significant bits) to (n, 3) float32
+def unpackNormals(packed):
+	packed = np.asarray(packed, dtype=np.uint32)
+	v = (packed[..., None] >> np.array([0, 10, 20], dtype=np.uint32)) & 1023
+	v = v.astype(np.int16)
+	v -= (v & 512) << 1 # sign extend
+	return np.maximum(v.astype(np.float32) / 511.0, -1.0)
+
+# Positions as stored (see Model.positions) to model space (n, 3) float32
+def unpackPositions(positions, positionFormat, offset=(0.0, 0.0, 0.0), scale=1.0):
+	if positionFormat == POSITION_FLOAT32:
+		return np.array(positions, dtype=np.float32)
+
+	if positionFormat == POSITION_UNORM16:
+		q = np.ascontiguousarray(positions).view('<u2')[:, :3].astype(np.float32) / 65535.0
+	else:
+		packed = np.asarray(positions, dtype=np.uint32).reshape(-1)
+		q = ((packed[:, None] >> np.array([0, 10, 20], dtype=np.uint32)) & 1023).astype(np.float32) / 1023.0
+
+	return q * np.float32(scale) + np.asarray(offset, dtype=np.float32)
+
+# (n, 2) u16 texture coordinates to (n, 2) float32 from 0 to 1
+def unpackTexCoords(texCoords):
+	return np.asarray(texCoords).astype(np.float32) / 65535.0
+
+# -- Models --
+
+class Region:
+	def __init__(self, firstIndex, count, colour, name):
+		self.firstIndex = firstIndex
+		self.count = count # Indices, or vertices if the model has no indices
+		self.colour = colour # (3,) float32
+		self.name = name
+
+class Bone:
+	def __init__(self, head, tail, parent, name):
+		self.head = head # (3,) float32
+		self.tail = tail
+		self.parent = parent # -1 for root bones
+		self.name = name
+
+class LevelOfDetail:
+	def __init__(self, screenSize, error, regions):
+		self.screenSize = screenSize
+		self.error = error
+		self.regions = regions # (material count, 2) u32: first index and index count of each material
+
+class Model:
+	def __init__(self):
+		self.attributes = 0 # Vertex attributes field, including the flags
+		self.interleaved = False
+		self.vertexCount = 0
+		self.indexCount = 0
+		self.positionFormat = POSITION_FLOAT32
+		self.positionOffset = np.zeros(3, dtype=np.float32)
+		self.positionScale = 1.0
+
+		# Vertex attributes, None if the model does not have them. One row per vertex
+		self.positions = None # (n, 3) float32, or u32 if quantised: (n, 2) if POSITION_UNORM16, (n, 1) if POSITION_UNORM10
+		self.colours = None # (n, 4) u8
+		self.texCoords = None # (n, 2) u16
+		self.normals = None # (n,) u32, see unpackNormals
+		self.boneIndices = None # (n, 4) u8
+		self.boneWeights = None # (n, 4) u8
+		self.tangents = None # (n,) u32
+
+		self.indices = None # u16 or u32, None if the model has no indices. Add the base vertices of indexRanges to get vertex indices
+		self.regions = []
+		self.bones = []
+
+		self.boundingSphere = None # (4,) float32: centre and radius, if the model has levels of detail
+		self.lods = [] # Does not include the full model (level 0)
+		self.clusters = np.zeros(0, dtype=CLUSTER_DTYPE)
+		self.indexRanges = None # INDEX_RANGE_DTYPE array if the indices have base vertices
+
+		# Position-only vertices, if the model has them
+		self.depthVertexCount = 0
+		self.depthPositions = None # Same format as positions
+		self.depthBoneIndices = None
+		self.depthBoneWeights = None
+		self.depthIndices = None
+
+	# Model space (n, 3) float32 positions
+	def modelSpacePositions(self):
+		return unpackPositions(self.positions, self.positionFormat, self.positionOffset, self.positionScale)
+
+	# Indices with the base vertices of the index ranges added (int64)
+	def vertexIndices(self):
+		indices = self.indices.astype(np.int64)
+		if self.indexRanges is not None:
+			indices += np.repeat(self.indexRanges['baseVertex'].astype(np.int64), self.indexRanges['indexCount'])
+		return indices
+
+def readModel(data):
+	u, f = u32View(data)
+	if len(u) < 7 or u[0] != MODEL_MAGIC:
+		raise ValueError('Not a .model file')
+
+	m = Model()
+	m.indexCount = int(u[1])
+	m.attributes = int(u[2])
+	m.interleaved = bool(u[3] != 0)
+	m.vertexCount = int(u[4])
+	m.positionFormat = (m.attributes >> 8) & 3
+	offset = 5
+
+	vertexAttributes = m.attributes & 0x7f
+	if vertexAttributes == 0 or m.vertexCount == 0:
+		raise ValueError('Model has no vertices')
+	if m.positionFormat > POSITION_UNORM10:
+		raise ValueError('Invalid position format')
+	if bool(vertexAttributes & BONE_INDICES) != bool(vertexAttributes & VERTEX_WEIGHTS):
+		raise ValueError('Vertex weights require bone indices')
+
+	if m.positionFormat != POSITION_FLOAT32:
+		if len(u) < 9:
+			raise ValueError('File too small')
+		m.positionOffset = f[5:8]
+		m.positionScale = float(f[8])
+		if not m.positionScale > 0:
+			raise ValueError('Invalid position scale')
+		offset += 4
+
+	# Size in u32s of each attribute (in the order they are stored)
+	positionSize = POSITION_SIZES[m.positionFormat]
+	sizes = [(bit, positionSize if bit == POSITION else 1) for bit in (1 << i for i in range(7)) if vertexAttributes & bit]
+	vertexSize = sum(size for _, size in sizes)
+
+	n = m.vertexCount
+	attributeViews = {}
+	start = offset * 4
+	for bit, size in sizes:
+		if m.interleaved:
+			# Strided view of the attribute in each vertex
+			attributeOffset, stride = start, vertexSize * 4
+			start += size * 4
+		else:
+			attributeOffset, stride = start, size * 4
+			start += n * size * 4
+
+		if bit == POSITION:
+			dtype, shape = ('<f4', (n, 3)) if m.positionFormat == POSITION_FLOAT32 else ('<u4', (n, positionSize))
+		elif bit in (NORMALS, TANGENTS):
+			dtype, shape = '<u4', (n,)
+		elif bit == TEXTURE_COORDINATES:
+			dtype, shape = '<u2', (n, 2)
+		else:
+			dtype, shape = 'u1', (n, 4)
+		attributeViews[bit] = view(data, attributeOffset, shape, dtype, stride)
+
+	m.positions = attributeViews.get(POSITION)
+	m.colours = attributeViews.get(COLOUR)
+	m.texCoords = attributeViews.get(TEXTURE_COORDINATES)
+	m.normals = attributeViews.get(NORMALS)
+	m.boneIndices = attributeViews.get(BONE_INDICES)
+	m.boneWeights = attributeViews.get(VERTEX_WEIGHTS)
+	m.tangents = attributeViews.get(TANGENTS)
+	offset += n * vertexSize
+
+	# Indices
+
+	if m.indexCount > 0:
+		if n > 65536 and not m.attributes & INDEX_RANGES:
+			m.indices = view(data, offset * 4, (m.indexCount,), '<u4')
+			offset += m.indexCount
+		else:
+			m.indices = view(data, offset * 4, (m.indexCount,), '<u2')
+			offset += (m.indexCount + 1) // 2
+
+	# Materials
+
+	if offset >= len(u):
+		raise ValueError('File too small')
+	regionCount = int(u[offset])
+	offset += 1
+	if regionCount > 32:
+		raise ValueError('Too many materials')
+
+	for i in range(regionCount):
+		if offset + 6 > len(u):
+			raise ValueError('File too small')
+		region = Region(int(u[offset]), int(u[offset+1]), f[offset+2:offset+5], None)
+		region.name, offset = readString(data, offset + 5)
+		if region.firstIndex + region.count > (m.indexCount if m.indexCount > 0 else n):
+			raise ValueError('Material region is outside of the indices')
+		m.regions.append(region)
+
+	# Bones
+
+	if offset >= len(u):
+		raise ValueError('File too small')
+	boneCount = int(u[offset])
+	offset += 1
+
+	for i in range(boneCount):
+		if offset + 8 > len(u):
+			raise ValueError('File too small')
+		bone = Bone(f[offset:offset+3], f[offset+3:offset+6], int(np.int32(u[offset+6].view('<i4'))), None)
+		bone.name, offset = readString(data, offset + 7)
+		if bone.parent >= boneCount:
+			raise ValueError('Invalid bone parent index')
+		m.bones.append(bone)
+
+	# Levels of detail
+
+	if m.attributes & LODS:
+		if offset + 5 > len(u):
+			raise ValueError('File too small')
+		lodCount = int(u[offset])
+		m.boundingSphere = f[offset+1:offset+5]
+		offset += 5
+		if lodCount == 0 or m.indexCount == 0:
+			raise ValueError('Invalid levels of detail')
+
+		lodSize = 2 + regionCount * 2
+		lods = view(data, offset * 4, (lodCount, lodSize), '<u4')
+		for lod in lods:
+			regions = lod[2:].reshape(-1, 2)
+			if np.any(regions[:, 0].astype(np.int64) + regions[:, 1] > m.indexCount):
+				raise ValueError('Level of detail is outside of the indices')
+			m.lods.append(LevelOfDetail(float(lod[:1].view('<f4')[0]), float(lod[1:2].view('<f4')[0]), regions))
+		offset += lodCount * lodSize
+
+	# Clusters
+
+	if m.attributes & CLUSTERS:
+		if offset >= len(u):
+			raise ValueError('File too small')
+		clusterCount = int(u[offset])
+		offset += 1
+		if clusterCount == 0 or m.indexCount == 0:
+			raise ValueError('Invalid clusters')
+
+		m.clusters = view(data, offset * 4, (clusterCount,), CLUSTER_DTYPE)
+		ends = m.clusters['firstIndex'].astype(np.int64) + m.clusters['indexCount']
+		if np.any(m.clusters['firstIndex'][1:] < ends[:-1]) or ends[-1] > m.indexCount:
+			raise ValueError('Clusters overlap or are outside of the indices')
+		offset += clusterCount * CLUSTER_DTYPE.itemsize // 4
+
+	# Index ranges
+
+	if m.attributes & INDEX_RANGES:
+		if offset >= len(u):
+			raise ValueError('File too small')
+		rangeCount = int(u[offset])
+		offset += 1
+		if rangeCount == 0 or m.indexCount == 0:
+			raise ValueError('Invalid index ranges')
+
+		m.indexRanges = view(data, offset * 4, (rangeCount,), INDEX_RANGE_DTYPE)
+		counts = m.indexRanges['indexCount'].astype(np.int64)
+		starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+		if (np.any(m.indexRanges['firstIndex'] != starts) or np.any(counts == 0) or counts.sum() != m.indexCount or
+				np.any(m.indexRanges['baseVertex'] >= n)):
+			raise ValueError('Invalid index ranges')
+		if np.any(np.maximum.reduceat(m.indices, starts).astype(np.int64) + m.indexRanges['baseVertex'] >= n):
+			raise ValueError('Index ranges use vertices past the end of the vertex data')
+		offset += rangeCount * 3
+
+	# Depth vertices
+
+	if m.attributes & DEPTH_VERTICES:
+		if offset >= len(u):
+			raise ValueError('File too small')
+		m.depthVertexCount = int(u[offset])
+		offset += 1
+		if m.depthVertexCount == 0 or m.indexCount == 0 or not vertexAttributes & POSITION:
+			raise ValueError('Invalid depth vertices')
+
+		dn = m.depthVertexCount
+		depthVertexSize = positionSize + (2 if vertexAttributes & BONE_INDICES else 0)
+		if m.positionFormat == POSITION_FLOAT32:
+			m.depthPositions = view(data, offset * 4, (dn, 3), '<f4', depthVertexSize * 4)
+		else:
+			m.depthPositions = view(data, offset * 4, (dn, positionSize), '<u4', depthVertexSize * 4)
+		if vertexAttributes & BONE_INDICES:
+			m.depthBoneIndices = view(data, (offset + positionSize) * 4, (dn, 4), 'u1', depthVertexSize * 4)
+			m.depthBoneWeights = view(data, (offset + positionSize + 1) * 4, (dn, 4), 'u1', depthVertexSize * 4)
+		offset += dn * depthVertexSize
+
+		m.depthIndices = view(data, offset * 4, (m.indexCount,), '<u4' if dn > 65536 else '<u2')
+
+	return m
+
+# -- Animations --
+
+class Track:
+	def __init__(self, keyFrames, values, valueOffset=None, valueScale=None):
+		self.keyFrames = keyFrames # (keys,) u16
+		self.values = values # (keys, components): float32, or u16 if quantised
+		self.valueOffset = valueOffset # (components,) float32 if quantised
+		self.valueScale = valueScale
+
+	# (keys, components) float32
+	def keyValues(self):
+		if self.valueOffset is None:
+			return np.array(self.values)
+		return self.valueOffset + self.values.astype(np.float32) * self.valueScale
+
+	# Values at the frames (array of frame numbers), interpolated in the same way as the engine (AnimationFiles.zig sampleTrack)
+	def sample(self, frames):
+		keyFrames = self.keyFrames.astype(np.int64)
+		values = self.keyValues()
+		frames = np.asarray(frames, dtype=np.int64)
+
+		a = np.clip(np.searchsorted(keyFrames, frames, side='right') - 1, 0, len(keyFrames) - 1)
+		b = np.minimum(a + 1, len(keyFrames) - 1)
+		span = keyFrames[b] - keyFrames[a]
+		t = np.where((span > 0) & (frames > keyFrames[a]), (frames - keyFrames[a]) / np.maximum(span, 1), 0.0).astype(np.float32)
+
+		valuesA = values[a]
+		valuesB = values[b]
+		if values.shape[1] == 4:
+			# Quaternions: shortest path, normalised
+			valuesB = valuesB * np.where(np.einsum('ij,ij->i', valuesA, valuesB) < 0.0, -1.0, 1.0).astype(np.float32)[:, None]
+
+		result = valuesA + (valuesB - valuesA) * t[:, None]
+		if values.shape[1] == 4:
+			lengths = np.linalg.norm(result, axis=1, keepdims=True)
+			result = np.divide(result, lengths, out=result, where=lengths > 0)
+		return result
+
+class Animation:
+	def __init__(self):
+		self.tracksFormat = False # Format 2 (docs/animation file format.md)
+		self.frameCount = 0
+		self.frameDuration = 0 # Microseconds
+		self.boneNames = []
+
+		# Format 1. (frames, bones, 4, 4) float32 in the engine's layout: [frame, bone, 3, :3] is the translation
+		self.matricesRelative = None
+		self.matricesAbsolute = None
+
+		# Format 2
+		self.quantised = False
+		self.trackOffsets = None # (bones, 3) u32
+		self.tracks = [] # (translation, rotation, scale) of each bone
+
+	# (frames, 4, 4) float32 final transformations of the bone at the frames (array of frame numbers), same as matricesAbsolute
+	def boneMatrices(self, bone, frames):
+		frames = np.asarray(frames, dtype=np.int64)
+		if not self.tracksFormat:
+			return np.array(self.matricesAbsolute[frames, bone])
+
+		translation, rotation, scale = (track.sample(frames) for track in self.tracks[bone])
+		x, y, z, w = rotation.T
+
+		# Each row is an axis of the rotation multiplied by the scale on that axis (AnimationFiles.zig getBoneMatrix)
+		m = np.zeros((len(frames), 4, 4), dtype=np.float32)
+		m[:, 0, :3] = np.stack((1.0 - 2.0 * (y * y + z * z), 2.0 * (x * y + z * w), 2.0 * (x * z - y * w)), axis=1) * scale[:, 0:1]
+		m[:, 1, :3] = np.stack((2.0 * (x * y - z * w), 1.0 - 2.0 * (x * x + z * z), 2.0 * (y * z + x * w)), axis=1) * scale[:, 1:2]
+		m[:, 2, :3] = np.stack((2.0 * (x * z + y * w), 2.0 * (y * z - x * w), 1.0 - 2.0 * (x * x + y * y)), axis=1) * scale[:, 2:3]
+		m[:, 3, :3] = translation
+		m[:, 3, 3] = 1.0
+		return m
+
+def readTrack(data, u, offset, components, quantised, tracksStart):
+	if offset < tracksStart or offset >= len(u):
+		raise ValueError('Invalid track offset')
+	keyCount = int(u[offset])
+	if keyCount == 0 or keyCount > 65536:
+		raise ValueError('Invalid key count')
+
+	valueOffset = None
+	valueScale = None
+	offset += 1
+	if quantised:
+		valueOffset = view(data, offset * 4, (components,), '<f4')
+		valueScale = view(data, (offset + components) * 4, (components,), '<f4')
+		offset += components * 2
+
+	keyFrames = view(data, offset * 4, (keyCount,), '<u2')
+	offset += (keyCount + 1) // 2
+	if np.any(keyFrames[1:] <= keyFrames[:-1]):
+		raise ValueError('Key frames are not in order')
+
+	values = view(data, offset * 4, (keyCount, components), '<u2' if quantised else '<f4')
+	return Track(keyFrames, values, valueOffset, valueScale)
+
+def readAnimation(data):
+	u, f = u32View(data)
+	if len(u) < 4 or u[0] not in (ANIMATION_MATRICES_MAGIC, ANIMATION_TRACKS_MAGIC):
+		raise ValueError('Not an animation file')
+
+	a = Animation()
+	a.tracksFormat = bool(u[0] == ANIMATION_TRACKS_MAGIC)
+	a.frameCount = int(u[1])
+	a.frameDuration = int(u[2])
+	boneCount = int(u[3])
+	offset = 4
+
+	if a.frameCount * a.frameDuration >= 1 << 32:
+		raise ValueError('Animation too long')
+
+	if a.tracksFormat:
+		if len(u) < 5:
+			raise ValueError('File too small')
+		if u[4] > 1:
+			raise ValueError('Unsupported flags')
+		a.quantised = bool(u[4] == 1)
+		offset += 1
+
+	for i in range(boneCount):
+		name, offset = readString(data, offset)
+		a.boneNames.append(name)
+
+	if a.tracksFormat:
+		a.trackOffsets = view(data, offset * 4, (boneCount, 3), '<u4')
+		tracksStart = offset + boneCount * 3
+		a.tracks = [tuple(readTrack(data, u, int(trackOffset), components, a.quantised, tracksStart)
+			for trackOffset, components in zip(offsets, (3, 4, 3))) for offsets in a.trackOffsets]
+		return a
+
+	shape = (a.frameCount, boneCount, 4, 4)
+	a.matricesRelative = view(data, offset * 4, shape, '<f4')
+	a.matricesAbsolute = view(data, offset * 4 + a.matricesRelative.nbytes, shape, '<f4')
+	return a
+
+# Returns {clip name: Animation}
+def readAnimationBank(data):
+	u, f = u32View(data)
+	if len(u) < 2 or u[0] != ANIMATION_BANK_MAGIC:
+		raise ValueError('Not an animation bank')
+
+	clipCount = int(u[1])
+	clips = view(data, 8, (clipCount, 2), '<u4')
+	offset = 2 + clipCount * 2
+
+	names = []
+	for i in range(clipCount):
+		name, offset = readString(data, offset)
+		names.append(name)
+
+	bank = {}
+	for name, (clipOffset, clipSize) in zip(names, clips.tolist()):
+		if clipOffset % 4 != 0 or clipOffset < offset * 4 or clipOffset + clipSize > len(data):
+			raise ValueError('Invalid clip offset')
+		bank[name] = readAnimation(data[clipOffset:clipOffset+clipSize])
+	return bank
+
+# -- Scenes --
+
+class SceneObject:
+	def __init__(self):
+		self.name = ''
+		self.parent = -1 # Index into Scene.objects, -1 if the object has no parent
+		self.inheritsParentTransform = True
+		self.transform = None # (4, 4) float32, same layout as the animation matrices
+
+		self.meshIndex = None # Index into Scene.meshes, None if the object has no mesh renderer
+		self.material = None # Version 2: index into Scene.materials (0xffffffff for the default material)
+		self.materialOverrides = None # Version 2: (n, 2) u32 slot and index into Scene.materials
+		self.materials = None # Version 1: SCENE_MATERIAL_DTYPE array of all 32 slots
+
+		self.lightType = None # 0 = point, 1 = spot, 2 = directional. None if the object has no light
+		self.lightColour = None # (3,) float32
+		self.castShadows = False
+		self.clipStart = 0.0
+		self.clipEnd = 0.0
+		self.angle = 0.0 # Spotlights
+
+class Scene:
+	def __init__(self):
+		self.version = 1
+		self.ambient = None # (3,) float32
+		self.clearColour = None
+		self.assetNames = []
+		self.meshes = None # SCENE_MESH_DTYPE array
+		self.textures = None # SCENE_TEXTURE_DTYPE array
+		self.materials = np.zeros(0, dtype=SCENE_MATERIAL_DTYPE) # Version 2
+		self.objects = []
+
+		# Bounding volume hierarchy, None if the file does not have one
+		self.bvhEntries = None # BVH_ENTRY_DTYPE array
+		self.bvhNodes = None # BVH_NODE_DTYPE array
+
+def readScene(data):
+	u, f = u32View(data)
+	if len(u) < 9 or u[0] not in (SCENE_V1_MAGIC, SCENE_V2_MAGIC):
+		raise ValueError('Not a scene file')
+
+	s = Scene()
+	s.version = 2 if u[0] == SCENE_V2_MAGIC else 1
+	s.ambient = f[1:4]
+	s.clearColour = f[4:7]
+
+	offset = 9
+	for i in range(int(u[8])):
+		name, offset = readString(data, offset)
+		s.assetNames.append(name)
+	offset = 9 + int(u[7])
+
+	def count():
+		nonlocal offset
+		if offset >= len(u):
+			raise ValueError('File too small')
+		offset += 1
+		return int(u[offset - 1])
+
+	def table(dtype, n):
+		nonlocal offset
+		t = view(data, offset * 4, (n,), dtype)
+		offset += n * dtype.itemsize // 4
+		return t
+
+	s.meshes = table(SCENE_MESH_DTYPE, count())
+	s.textures = table(SCENE_TEXTURE_DTYPE, count())
+	if s.version >= 2:
+		s.materials = table(SCENE_MATERIAL_DTYPE, count())
+
+	for i in range(count()):
+		if offset + 25 > len(u):
+			raise ValueError('File too small')
+		o = SceneObject()
+		o.name = bytes(data[offset*4:offset*4+16]).split(b'\0')[0].decode('utf8', 'replace')
+		parent = int(u[offset+4])
+		o.parent = parent if parent != 0xffffffff and parent < i else -1
+		hasMeshRenderer = bool(u[offset+5])
+		hasLight = bool(u[offset+6])
+		o.inheritsParentTransform = bool(u[offset+8])
+		o.transform = view(data, (offset + 9) * 4, (4, 4), '<f4')
+		offset += 25
+
+		if hasMeshRenderer:
+			o.meshIndex = count()
+			if s.version == 1:
+				o.materials = table(SCENE_MATERIAL_DTYPE, 32)
+			else:
+				o.material = count()
+				overrideCount = count()
+				o.materialOverrides = view(data, offset * 4, (overrideCount, 2), '<u4')
+				offset += overrideCount * 2
+				if np.any(o.materialOverrides[:, 0] >= 32):
+					raise ValueError('Invalid material slot')
+				if np.any(o.materialOverrides[:, 1] >= len(s.materials)) or (o.material != 0xffffffff and o.material >= len(s.materials)):
+					raise ValueError('Invalid material index')
+
+		if hasLight:
+			if offset + 7 > len(u):
+				raise ValueError('File too small')
+			o.lightType = min(int(u[offset]), 2)
+			o.lightColour = f[offset+1:offset+4]
+			o.castShadows = bool(u[offset+4])
+			o.clipStart = float(f[offset+5])
+			o.clipEnd = float(f[offset+6])
+			offset += 7
+			if o.lightType == 1:
+				if offset >= len(u):
+					raise ValueError('File too small')
+				o.angle = float(f[offset])
+				offset += 1
+
+		s.objects.append(o)
+
+	# Files from older exporters end after the objects
+	if offset < len(u):
+		s.bvhEntries = table(BVH_ENTRY_DTYPE, count())
+		s.bvhNodes = table(BVH_NODE_DTYPE, count())
+		if np.any(s.bvhEntries['object'] >= len(s.objects)):
+			raise ValueError('Invalid bounding volume hierarchy')
+
+	return s
+
+# Reads a file of any of the types above. Returns a Model, Animation, {clip name: Animation} (animation banks) or Scene
+def read(path):
+	data = readFileData(path)
+	if len(data) < 4:
+		raise ValueError(path + ' is too small')
+
+	magic = int(data[:4].view('<u4')[0])
+	if magic == MODEL_MAGIC:
+		return readModel(data)
+	if magic in (ANIMATION_MATRICES_MAGIC, ANIMATION_TRACKS_MAGIC):
+		return readAnimation(data)
+	if magic == ANIMATION_BANK_MAGIC:
+		return readAnimationBank(data)
+	if magic in (SCENE_V1_MAGIC, SCENE_V2_MAGIC):
+		return readScene(data)
+	raise ValueError(path + ' is not a model, animation or scene file')
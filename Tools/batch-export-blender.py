@@ -0,0 +1,51 @@
+# RUNS INSIDE BLENDER. STARTED BY batch-export.py, NOT MEANT TO BE RUN DIRECTLY:
+#	blender --background file.blend --python batch-export-blender.py -- '[{"type": "model", "output": "file.model", "settings": {}}]'
+# EXPORTS FROM THE OPEN .BLEND FILE USING THE EXPORT SCRIPTS IN THIS DIRECTORY
+
+import importlib.util
+import json
+import os
+import sys
+import traceback
+
+# Export type -> (script, function)
+EXPORTERS = {
+	'model': ('blender-export.py', 'exportModel'),
+	'animation': ('blender-export-animations.py', 'exportAnimation'),
+	'animationBank': ('blender-export-animations.py', 'exportAnimationBank'),
+	'scene': ('blender-export-scene.py', 'exportScene'),
+}
+
+# The script names are not valid module names so the scripts are loaded from their paths
+# Importing a script does not export anything
+def loadExporter(exportType):
+	script, function = EXPORTERS[exportType]
+	path = os.path.join(os.path.dirname(os.path.abspath(__file__)), script)
+
+	spec = importlib.util.spec_from_file_location(os.path.splitext(script)[0].replace('-', '_'), path)
+	module = importlib.util.module_from_spec(spec)
+	spec.loader.exec_module(module)
+	return getattr(module, function)
+
+def main():
+	exports = json.loads(sys.argv[sys.argv.index('--') + 1])
+
+	exporters = {}
+	failures = 0
+
+	for e in exports:
+		try:
+			if e['type'] not in exporters:
+				exporters[e['type']] = loadExporter(e['type'])
+
+			if not exporters[e['type']](e['output'], **e['settings']):
+				failures += 1
+		except Exception:
+			traceback.print_exc()
+			failures += 1
+
+	if failures > 0:
+		# Blender exits with code 1 (--python-exit-code)
+		raise RuntimeError('%d of %d exports failed' % (failures, len(exports)))
+
+main()
@@ -0,0 +1,196 @@
+# EXPORTS MODELS, ANIMATIONS AND SCENES FROM MANY .BLEND FILES WITHOUT OPENING THE BLENDER UI
+# RUN WITH PYTHON 3 (NOT FROM BLENDER): python batch-export.py manifest.json [--jobs N] [--blender PATH]
+# EACH .BLEND FILE IS EXPORTED BY A SEPERATE 'blender --background' PROCESS. BY DEFAULT ONE PROCESS IS RUN PER CPU CORE.
+# THE BLENDER EXECUTABLE IS 'blender' (FROM PATH), THE BLENDER ENVIRONMENT VARIABLE OR --blender.
+
+# THE MANIFEST IS A JSON FILE. PATHS ARE RELATIVE TO THE MANIFEST FILE.
+# {
+#	"blendDirectory": "Blender", (optional, directory of the .blend files)
+#	"outputDirectory": "../DemoAssets", (optional, directory of the exported files)
+#	"cacheDirectory": "ExportCache", (optional, reuse the files of unchanged objects and animations, see exportcache.py)
+#	"cacheSizeLimit": 1024, (optional, MB)
+#	"defaults": { (optional, settings for all exports of each type)
+#		"model": { "exportTexCoords": true }
+#	},
+#	"files": { (.blend files or patterns such as "Characters/*.blend", and the files to export from them)
+#		"Farm.blend": [
+#			{ "type": "model", "output": "FarmStatic.model" },
+#			{ "type": "scene", "output": "Farm.scene", "settings": { "useFlatShading": false } }
+#		],
+#		"Characters/*.blend": [
+#			{ "type": "model", "settings": { "exportBones": true } },
+#			{ "type": "animation" },
+#			{ "type": "animationBank", "settings": { "armature": "Rig" } }
+#		]
+#	}
+# }
+
+# type is "model" (blender-export.py), "animation" or "animationBank" (blender-export-animations.py) or "scene" (blender-export-scene.py)
+# output defaults to the name of the .blend file with the extension of the type, or to the output directory for models with
+# "separateObjects". '.compressed' is added if the file is compressed.
+# settings are the parameters of exportModel, exportAnimation, exportAnimationBank or exportScene. Settings that are not given use the
+# configuration at the top of the export script. Models are not compressed by default. If the models of a scene are compressed
+# ("compress": true) then the scene must have "usingCompressedModels": true, e.g. in "defaults".
+# The exports of a .blend file are done in order in the same Blender process.
+
+import argparse
+import concurrent.futures
+import glob
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+EXPORT_TYPES = {
+	'model': '.model',
+	'animation': '.anim',
+	'animationBank': '.animbank',
+	'scene': '.scene',
+}
+
+# Runs inside Blender
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'batch-export-blender.py')
+
+# Returns a list of (.blend file, exports) with all paths absolute and the default settings applied
+def loadManifest(manifestPath):
+	with open(manifestPath, 'r', encoding='utf8') as f:
+		manifest = json.load(f)
+
+	manifestDirectory = os.path.dirname(os.path.abspath(manifestPath))
+	blendDirectory = os.path.join(manifestDirectory, manifest.get('blendDirectory', ''))
+	outputDirectory = os.path.join(manifestDirectory, manifest.get('outputDirectory', ''))
+	defaults = manifest.get('defaults', {})
+
+	cacheSettings = {}
+	if 'cacheDirectory' in manifest:
+		cacheSettings['cacheDirectory'] = os.path.join(manifestDirectory, manifest['cacheDirectory'])
+	if 'cacheSizeLimit' in manifest:
+		cacheSettings['cacheSizeLimit'] = manifest['cacheSizeLimit']
+
+	for exportType in defaults:
+		if exportType not in EXPORT_TYPES:
+			raise ValueError('Unknown export type in defaults: ' + exportType)
+
+	# A .blend file can match more than one pattern, the exports are added in the order of the manifest
+	exportsOfFile = {}
+
+	for pattern, exports in manifest.get('files', {}).items():
+		blendFiles = sorted(glob.glob(os.path.join(blendDirectory, pattern), recursive=True))
+		if len(blendFiles) == 0:
+			raise ValueError('No .blend files match ' + pattern)
+
+		for blendFile in blendFiles:
+			blendName = os.path.splitext(os.path.basename(blendFile))[0]
+
+			for e in exports:
+				exportType = e.get('type')
+				if exportType not in EXPORT_TYPES:
+					raise ValueError(pattern + ': Unknown export type: ' + str(exportType))
+
+				settings = {}
+				if exportType != 'scene':
+					# The process pool already uses all CPU cores
+					settings['compressionThreads'] = 0
+					settings.update(cacheSettings)
+				settings.update(defaults.get(exportType, {}))
+				settings.update(e.get('settings', {}))
+
+				if exportType == 'model' and settings.get('separateObjects', False):
+					output = e.get('output', '')
+				else:
+					output = e.get('output', blendName + EXPORT_TYPES[exportType])
+
+				exportsOfFile.setdefault(os.path.abspath(blendFile), []).append({
+					'type': exportType,
+					'output': os.path.join(outputDirectory, output),
+					'settings': settings,
+				})
+
+	return list(exportsOfFile.items())
+
+# Exports from one .blend file in a new Blender process
+# Returns (success, output of Blender, time taken)
+def runBlender(blender, blendFile, exports):
+	start = time.perf_counter()
+
+	args = [blender, '--background', '--factory-startup', blendFile, '--python-exit-code', '1',
+		'--python', WORKER_SCRIPT, '--', json.dumps(exports)]
+
+	try:
+		result = subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True, errors='replace')
+	except OSError as e:
+		return False, str(e), time.perf_counter() - start
+
+	return result.returncode == 0, result.stdout, time.perf_counter() - start
+
+def main():
+	parser = argparse.ArgumentParser(description='Export models, animations and scenes from .blend files')
+	parser.add_argument('manifest', help='JSON file listing the .blend files and what to export from them')
+	parser.add_argument('--jobs', '-j', type=int, default=os.cpu_count() or 1, help='number of Blender processes (default: number of CPU cores)')
+	parser.add_argument('--blender', default=os.environ.get('BLENDER', 'blender'), help='Blender executable')
+	parser.add_argument('--verbose', '-v', action='store_true', help='print the output of Blender for all files, not just the ones that fail')
+	args = parser.parse_args()
+
+	if args.jobs < 1:
+		parser.error('--jobs must be at least 1')
+
+	try:
+		jobs = loadManifest(args.manifest)
+	except (OSError, ValueError) as e:
+		print('Invalid manifest: ' + str(e))
+		return 1
+
+	for _, exports in jobs:
+		for e in exports:
+			os.makedirs(os.path.dirname(e['output']), exist_ok=True)
+			if 'cacheDirectory' in e['settings']:
+				os.makedirs(e['settings']['cacheDirectory'], exist_ok=True)
+
+	# Biggest files first so that a big file does not start last and keep one process running on its own
+	jobs.sort(key=lambda j: os.path.getsize(j[0]), reverse=True)
+
+	exportCount = sum(len(exports) for _, exports in jobs)
+	print('Exporting %d files from %d .blend files with %d Blender processes' % (exportCount, len(jobs), args.jobs))
+
+	start = time.perf_counter()
+	failed = []
+	cacheHits = 0
+	cacheMisses = 0
+
+	# Each thread waits for one Blender process
+	with concurrent.futures.ThreadPoolExecutor(max_workers=args.jobs) as pool:
+		futures = {pool.submit(runBlender, args.blender, blendFile, exports): blendFile for blendFile, exports in jobs}
+
+		for n, future in enumerate(concurrent.futures.as_completed(futures), start=1):
+			blendFile = futures[future]
+			success, output, seconds = future.result()
+
+			print('[%d/%d] %s: %s (%.1f s)' % (n, len(jobs), blendFile, 'done' if success else 'FAILED', seconds))
+			if not success or args.verbose:
+				print(output)
+
+			if not success:
+				failed.append(blendFile)
+
+			# Printed by exportcache.py
+			for hits, misses in re.findall(r'^Export cache: (\d+) hits, (\d+) misses', output, re.MULTILINE):
+				cacheHits += int(hits)
+				cacheMisses += int(misses)
+
+	print('Finished in %.1f s' % (time.perf_counter() - start))
+
+	if cacheHits + cacheMisses > 0:
+		print('Export cache: %d hits, %d misses' % (cacheHits, cacheMisses))
+
+	if len(failed) > 0:
+		print('%d of %d .blend files failed:' % (len(failed), len(jobs)))
+		for blendFile in failed:
+			print('    ' + blendFile)
+		return 1
+
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -1,11 +1,35 @@
 # SEE blender-export.py FOR INSTRUCTIONS
 
-ANIMATION_EXPORT_FILE = 'minotaur_walk.anim'
+ANIMATION_EXPORT_FILE = 'minotaur_walk.anim' # if set to '' will use the blend file name but change '.blend' to '.anim' ('.animbank' if EXPORT_BANK is True)
+EXPORT_BANK = False # Export every action of the armature to one .animbank file (a clip per action) instead of the scene's frame range to a .anim file
+ARMATURE = '' # EXPORT_BANK only. Name of the armature object. '' uses the first armature
+SAMPLER = 'POSE' # 'POSE': evaluates only the bone properties of the actions (fast). 'SCENE': steps through the frames of the scene (slow, includes constraints, drivers and IK)
+ANIMATION_FORMAT = 2 # 1: a matrix for every bone on every frame. 2: keyframed translation, rotation and scale of every bone (smaller)
+QUANTISE_TRACKS = True # Format 2 only. Store the keys as 16-bit values instead of 32-bit floats
+TRANSLATION_TOLERANCE = 0.0005 # Format 2 only. Keys are removed if the translation can be interpolated from the other keys within this distance
+ROTATION_TOLERANCE = 0.0005 # Same as above for rotations (difference between quaternion components)
+SCALE_TOLERANCE = 0.0005 # Same as above for scale
+COMPRESS = False # Write a *.anim.compressed file (zstd) instead of a *.anim file. Requires the zstandard module (see compressedfile.py)
+COMPRESSION_LEVEL = 22 # 1-22
+COMPRESSION_THREADS = -1 # -1 uses all CPU cores
+CACHE_DIRECTORY = '' # Reuse the file from a previous export if the animation has not changed. '' disables the cache
+CACHE_SIZE_LIMIT = 1024 # MB. The least recently used files are removed from the cache
 
 import bpy
 import struct
 import bpy_extras
+import io
+import os
+import re
+import sys
+import time
 from mathutils import *
+import numpy as np
+
+# compressedfile.py and exportcache.py are in the same directory as this script
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import compressedfile
+import exportcache
 
 def writeDWord(file, i, signed=False):
 	file.write(i.to_bytes(4, byteorder='little', signed=signed))
@@ -38,97 +62,684 @@ def writeUTF8(file, s):
 def writeASCII(file, s):
 	writeString(file, s, 'ascii')
 
-file = open(ANIMATION_EXPORT_FILE, 'wb')
+# Splits (n,4,4) transformation matrices (column vectors, as in Blender) into translations (n,3),
+# rotation quaternions (n,4: x,y,z,w) and scales (n,3)
+# Consecutive quaternions are kept on the same side of the 4D sphere so that they can be interpolated
+def decomposeMatrices(matrices):
+	translations = matrices[:, :3, 3]
+
+	axes = matrices[:, :3, :3]
+	scales = np.linalg.norm(axes, axis=1)
+	scales[np.linalg.det(axes) < 0, 0] *= -1 # Mirrored
+	scales[scales == 0] = 1.0
+	r = axes / scales[:, None, :]
+
+	# Shepperd's method, using the biggest of w, x, y, z to divide by
+	trace = r[:, 0, 0] + r[:, 1, 1] + r[:, 2, 2]
+	case = np.argmax(np.stack((trace, r[:, 0, 0], r[:, 1, 1], r[:, 2, 2]), axis=1), axis=1)
+	q = np.empty((len(matrices), 4))
+
+	c = case == 0
+	d = np.sqrt(np.maximum(1.0 + trace[c], 1e-12)) * 2.0
+	q[c] = np.stack(((r[c, 2, 1] - r[c, 1, 2]) / d, (r[c, 0, 2] - r[c, 2, 0]) / d, (r[c, 1, 0] - r[c, 0, 1]) / d, d / 4.0), axis=1)
+
+	c = case == 1
+	d = np.sqrt(np.maximum(1.0 + r[c, 0, 0] - r[c, 1, 1] - r[c, 2, 2], 1e-12)) * 2.0
+	q[c] = np.stack((d / 4.0, (r[c, 0, 1] + r[c, 1, 0]) / d, (r[c, 0, 2] + r[c, 2, 0]) / d, (r[c, 2, 1] - r[c, 1, 2]) / d), axis=1)
+
+	c = case == 2
+	d = np.sqrt(np.maximum(1.0 + r[c, 1, 1] - r[c, 0, 0] - r[c, 2, 2], 1e-12)) * 2.0
+	q[c] = np.stack(((r[c, 0, 1] + r[c, 1, 0]) / d, d / 4.0, (r[c, 1, 2] + r[c, 2, 1]) / d, (r[c, 0, 2] - r[c, 2, 0]) / d), axis=1)
+
+	c = case == 3
+	d = np.sqrt(np.maximum(1.0 + r[c, 2, 2] - r[c, 0, 0] - r[c, 1, 1], 1e-12)) * 2.0
+	q[c] = np.stack(((r[c, 0, 2] + r[c, 2, 0]) / d, (r[c, 1, 2] + r[c, 2, 1]) / d, d / 4.0, (r[c, 1, 0] - r[c, 0, 1]) / d), axis=1)
+
+	q /= np.linalg.norm(q, axis=1)[:, None]
+
+	# q and -q are the same rotation
+	flips = np.cumsum(np.einsum('ij,ij->i', q[1:], q[:-1]) < 0) % 2
+	q[1:][flips == 1] *= -1
+
+	return translations, q, scales
+
+# Values of a track at every frame, interpolated in the same way as the engine (AnimationFiles.zig)
+# keys: the frames that have keys, values: the values at every frame (only the values of the keys are used)
+def interpolateTrack(keys, values, isRotation):
+	keys = np.asarray(keys)
+	frames = np.arange(len(values))
+
+	# Index of the key at or before each frame (the first key for frames before it)
+	a = np.clip(np.searchsorted(keys, frames, side='right') - 1, 0, len(keys) - 1)
+	b = np.minimum(a + 1, len(keys) - 1)
+	span = keys[b] - keys[a]
+	t = np.where(span > 0, (frames - keys[a]) / np.maximum(span, 1), 0.0)
+	t[frames >= keys[-1]] = 0.0
+
+	va = values[keys[a]]
+	vb = values[keys[b]]
+	if isRotation:
+		vb = np.where((np.einsum('ij,ij->i', va, vb) < 0)[:, None], -vb, vb)
+
+	result = va + (vb - va) * t[:, None]
+	if isRotation:
+		result /= np.maximum(np.linalg.norm(result, axis=1), 1e-12)[:, None]
+	return result
+
+# Maximum difference between the original values and the values interpolated from a key at start to a key at each of ends
+# Same as interpolateTrack with keys at start and end, for all of the ends at once
+def segmentErrors(original, stored, start, ends, isRotation):
+	frames = np.arange(start, ends[-1] + 1)
+	va = stored[start]
+	vb = stored[ends]
+	if isRotation:
+		vb = np.where((vb @ va < 0)[:, None], -vb, vb)
+
+	t = (frames[None, :] - start) / (ends[:, None] - start)
+	result = va + (vb[:, None, :] - va) * t[:, :, None]
+
+	# The frame of the second key uses the value of that key
+	result[frames[None, :] == ends[:, None]] = stored[ends]
+
+	if isRotation:
+		result /= np.maximum(np.linalg.norm(result, axis=2), 1e-12)[:, :, None]
+
+	errors = np.abs(result - original[frames]).max(axis=2)
+	errors[t > 1] = 0.0
+	return errors.max(axis=1)
+
+# Errors (as segmentErrors) of interpolating from a key at each of starts to a key at each of the next 'window' frames,
+# for all of the starts at once. Returns (starts, window). Ends after the last frame have an infinite error.
+def windowErrors(original, stored, starts, window, isRotation):
+	n = len(original)
+	spans = np.arange(1, window + 1)
+	offsets = np.arange(window + 1)
+	ends = np.minimum(starts[:, None] + spans, n - 1)
+	frames = np.minimum(starts[:, None] + offsets, n - 1)
+
+	va = stored[starts]
+	vb = stored[ends]
+	if isRotation:
+		vb = np.where((np.einsum('ik,ijk->ij', va, vb) < 0)[:, :, None], -vb, vb)
+
+	t = offsets[None, :] / spans[:, None]
+	result = va[:, None, None, :] + (vb[:, :, None, :] - va[:, None, None, :]) * t[None, :, :, None]
+	result[:, offsets[None, :] == spans[:, None]] = stored[ends]
+
+	if isRotation:
+		result /= np.maximum(np.linalg.norm(result, axis=3), 1e-12)[:, :, :, None]
+
+	errors = np.abs(result - original[frames][:, None, :, :]).max(axis=3)
+	errors[:, t > 1] = 0.0
+	errors = errors.max(axis=2)
+	errors[starts[:, None] + spans > n - 1] = np.inf
+	return errors
+
+# Chooses keys so that interpolating between them (using the stored values) is within tolerance of the original values
+# at every frame. Keys are added greedily: each key is as far from the previous key as the tolerance allows.
+# Most keys are close together so the errors of the next few frames are found for blocks of frames at once,
+# longer segments are then extended 32 frames at a time.
+def reduceKeyframes(original, stored, tolerance, isRotation):
+	n = len(original)
+	window = 8
+	blockSize = 1024
+
+	# Constant (within tolerance)
+	if np.abs(interpolateTrack([0], stored, isRotation) - original).max() <= tolerance:
+		return [0]
+
+	blocks = {}
+
+	keys = [0]
+	while keys[-1] < n - 1:
+		start = keys[-1]
+
+		# Distance to the next key for each start in the block, or 0 if all ends in the window are within tolerance.
+		# The next key is before the first end that is not within tolerance.
+		block = start // blockSize
+		if block not in blocks:
+			withinTolerance = windowErrors(original, stored, np.arange(block * blockSize, min((block + 1) * blockSize, n - 1)), window, isRotation)[:, 1:] <= tolerance
+			blocks[block] = np.where(withinTolerance.all(axis=1), 0, 1 + np.argmin(withinTolerance, axis=1)).tolist()
+
+		span = blocks[block][start - block * blockSize]
+		if span > 0:
+			keys.append(start + span)
+			continue
+
+		end = start + window
+		while end + 1 < n:
+			ends = np.arange(end + 1, min(end + 33, n))
+			withinTolerance = segmentErrors(original, stored, start, ends, isRotation) <= tolerance
+			if withinTolerance.all():
+				end = int(ends[-1])
+			else:
+				end = int(ends[np.argmin(withinTolerance)]) - 1
+				break
+
+		keys.append(end)
+	return keys
+
+# Returns the data of a track in the format 2 .anim file layout (as u32s)
+# values: the value at every frame
+def trackData(values, tolerance, isRotation, quantise):
+	values = np.asarray(values, dtype=np.float64)
+	components = values.shape[1]
+
+	if quantise:
+		# 16-bit values between the smallest and the biggest value of each component
+		valueOffset = values.min(axis=0).astype(np.float32)
+		valueScale = ((values.max(axis=0) - valueOffset) / 65535.0).astype(np.float32)
+		q = np.where(valueScale > 0, np.rint((values - valueOffset) / np.where(valueScale > 0, valueScale, 1.0)), 0.0)
+		q = np.clip(q, 0, 65535).astype(np.uint16)
+		stored = valueOffset.astype(np.float64) + q * valueScale.astype(np.float64)
+	else:
+		stored = values.astype(np.float32).astype(np.float64)
+
+	keys = reduceKeyframes(values, stored, tolerance, isRotation)
+
+	data = [np.array([len(keys)], dtype='<u4')]
+	if quantise:
+		data.append(valueOffset.astype('<f4').view('<u4'))
+		data.append(valueScale.astype('<f4').view('<u4'))
+
+	def u16Words(a):
+		a = np.asarray(a, dtype='<u2').reshape(-1)
+		if len(a) % 2 != 0:
+			a = np.append(a, np.zeros(1, dtype='<u2'))
+		return a.view('<u4')
+
+	data.append(u16Words(keys))
+	if quantise:
+		data.append(u16Words(q[keys]))
+	else:
+		data.append(values[keys].astype('<f4').view('<u4').reshape(-1))
+
+	return np.concatenate(data), len(keys)
+
+# Blender <-> OpenGL coordinate system (y,z = z,-y)
+TO_OPENGL_COORDS = np.array([
+	[1.0, 0.0, 0.0, 0.0],
+	[0.0, 0.0, 1.0, 0.0],
+	[0.0, -1.0, 0.0, 0.0],
+	[0.0, 0.0, 0.0, 1.0],
+])
+
+# Matches the data path of a pose bone property: pose.bones["name"].property
+POSE_BONE_PATH = re.compile(r'^pose\.bones\["((?:[^"\\]|\\.)*)"\]\.(\w+)$')
+
+# Pose bone properties that are sampled and their values in the rest pose
+POSE_BONE_CHANNELS = (
+	('location', (0.0, 0.0, 0.0)),
+	('rotation_quaternion', (1.0, 0.0, 0.0, 0.0)),
+	('rotation_euler', (0.0, 0.0, 0.0)),
+	('rotation_axis_angle', (0.0, 0.0, 1.0, 0.0)),
+	('scale', (1.0, 1.0, 1.0)),
+)
+
+def armatureObjects():
+	return [obj for obj in bpy.data.objects if hasattr(obj.data, 'bones') and hasattr(obj, 'pose') and obj.pose != None]
+
+# Actions that animate at least one bone of the armature
+def armatureActions(obj):
+	boneNames = set(b.name for b in obj.data.bones)
+	actions = []
+	for action in bpy.data.actions:
+		for fc in action.fcurves:
+			m = POSE_BONE_PATH.match(fc.data_path)
+			if m is not None and re.sub(r'\\(.)', r'\1', m.group(1)) in boneNames:
+				actions.append(action)
+				break
+	return actions
+
+# Frames of an action, from its first to its last keyframe
+def actionFrames(action):
+	start, end = action.frame_range
+	return list(range(int(round(start)), int(round(end)) + 1))
+
+# Values of the pose bone properties of every bone at every frame. Returns a dictionary of (bone name, property) -> (frames, components)
+# Properties that are not animated by the action keep the current value of the pose bone (usePoseValues)
+# or the value of the rest pose
+def sampleChannels(obj, action, frames, usePoseValues):
+	channels = {}
+	for b in obj.data.bones:
+		pbone = obj.pose.bones[b.name]
+		for attribute, restValue in POSE_BONE_CHANNELS:
+			value = tuple(getattr(pbone, attribute)) if usePoseValues else restValue
+			channels[(b.name, attribute)] = np.tile(np.array(value, dtype=np.float64), (len(frames), 1))
+
+	if action is not None:
+		for fc in action.fcurves:
+			m = POSE_BONE_PATH.match(fc.data_path)
+			if fc.mute or m is None:
+				continue
+
+			values = channels.get((re.sub(r'\\(.)', r'\1', m.group(1)), m.group(2)))
+			if values is not None and fc.array_index < values.shape[1]:
+				values[:, fc.array_index] = [fc.evaluate(f) for f in frames]
+
+	return channels
+
+# (n,3,3) rotation matrices around the x (0), y (1) or z (2) axis
+def axisRotationMatrices(angles, axis):
+	a, b = ((1, 2), (2, 0), (0, 1))[axis]
+	c = np.cos(angles)
+	s = np.sin(angles)
+
+	m = np.zeros((len(angles), 3, 3))
+	m[:, axis, axis] = 1.0
+	m[:, a, a] = c
+	m[:, b, b] = c
+	m[:, a, b] = -s
+	m[:, b, a] = s
+	return m
+
+# (n,3,3) rotation matrices from (n,4) quaternions (w, x, y, z, as in Blender). The quaternions do not need to be normalised.
+def quaternionMatrices(q):
+	lengths = np.linalg.norm(q, axis=1)
+	q = np.where((lengths > 0)[:, None], q / np.where(lengths > 0, lengths, 1.0)[:, None], [1.0, 0.0, 0.0, 0.0])
+	w, x, y, z = q[:, 0], q[:, 1], q[:, 2], q[:, 3]
+
+	return np.stack((
+		np.stack((1.0 - 2.0 * (y*y + z*z), 2.0 * (x*y - z*w), 2.0 * (x*z + y*w)), axis=1),
+		np.stack((2.0 * (x*y + z*w), 1.0 - 2.0 * (x*x + z*z), 2.0 * (y*z - x*w)), axis=1),
+		np.stack((2.0 * (x*z - y*w), 2.0 * (y*z + x*w), 1.0 - 2.0 * (x*x + y*y)), axis=1),
+	), axis=1)
+
+# Rotation of a pose bone at every frame, using the rotation mode of the bone
+def rotationMatrices(pbone, channels):
+	mode = pbone.rotation_mode
+
+	if mode == 'QUATERNION':
+		return quaternionMatrices(channels[(pbone.name, 'rotation_quaternion')])
+
+	if mode == 'AXIS_ANGLE':
+		angleAxis = channels[(pbone.name, 'rotation_axis_angle')]
+		axes = angleAxis[:, 1:]
+		lengths = np.linalg.norm(axes, axis=1)
+		halfAngles = np.where(lengths > 0, angleAxis[:, 0], 0.0) / 2.0
+		axes = axes / np.where(lengths > 0, lengths, 1.0)[:, None]
+		return quaternionMatrices(np.concatenate((np.cos(halfAngles)[:, None], axes * np.sin(halfAngles)[:, None]), axis=1))
+
+	# Euler. The rotation around the first axis of the mode is applied first.
+	euler = channels[(pbone.name, 'rotation_euler')]
+	m = None
+	for axisName in mode:
+		axis = 'XYZ'.index(axisName)
+		r = axisRotationMatrices(euler[:, axis], axis)
+		m = r if m is None else r @ m
+	return m
+
+def restMatrices(obj):
+	return np.array([np.array(b.matrix_local, dtype=np.float64) for b in obj.data.bones]).reshape(-1, 4, 4)
+
+# Pose matrices (frames, bones, 4, 4) of the bones in armature space (pbone.matrix) for every frame of the action
+# Only the bone properties are evaluated, the scene is not updated. Bones must inherit the rotation and scale of their parents
+# (the default), constraints, drivers and IK are not evaluated: use the scene sampler for those.
+# The bones at each depth of the hierarchy are transformed at the same time for all frames.
+def samplePoses(obj, action, frames, usePoseValues):
+	bones = list(obj.data.bones)
+	boneIndices = {b.name: i for i, b in enumerate(bones)}
+	parents = np.array([-1 if b.parent is None else boneIndices[b.parent.name] for b in bones], dtype=np.int64)
+
+	channels = sampleChannels(obj, action, frames, usePoseValues)
+
+	# Local transformation of each bone (pbone.matrix_basis)
+	basis = np.zeros((len(frames), len(bones), 4, 4))
+	basis[:, :, 3, 3] = 1.0
+	for i, b in enumerate(bones):
+		pbone = obj.pose.bones[b.name]
+		basis[:, i, :3, :3] = rotationMatrices(pbone, channels) * channels[(b.name, 'scale')][:, None, :]
+		basis[:, i, :3, 3] = channels[(b.name, 'location')]
+
+	# Rest transformation of each bone relative to its parent
+	rest = restMatrices(obj)
+	relativeRest = rest.copy()
+	hasParent = parents >= 0
+	relativeRest[hasParent] = np.linalg.inv(rest[parents[hasParent]]) @ rest[hasParent]
+
+	depths = [0] * len(bones)
+	for i in range(len(bones)):
+		p = parents[i]
+		while p >= 0:
+			depths[i] += 1
+			p = parents[p]
+	depths = np.array(depths, dtype=np.int64)
+
+	poses = np.empty_like(basis)
+	for depth in range(depths.max() + 1 if len(bones) > 0 else 0):
+		level = np.nonzero(depths == depth)[0]
+		m = relativeRest[level] @ basis[:, level]
+		if depth > 0:
+			m = poses[:, parents[level]] @ m
+		poses[:, level] = m
+
+	return poses
+
+# Pose matrices (frames, bones, 4, 4) and world matrices (frames, 4, 4) of the armatures, by stepping through the frames of the scene
+# Slow, but includes everything that Blender evaluates (constraints, drivers, IK, animated objects)
+def sampleScenePoses(sce, armatures, frames):
+	poses = [np.empty((len(frames), len(obj.data.bones), 4, 4)) for obj in armatures]
+	worlds = [np.empty((len(frames), 4, 4)) for obj in armatures]
+
+	for i, f in enumerate(frames):
+		sce.frame_set(f)
+		for obj, p, w in zip(armatures, poses, worlds):
+			w[i] = np.array(obj.matrix_world, dtype=np.float64)
+			for j, b in enumerate(obj.data.bones):
+				p[i, j] = np.array(obj.pose.bones[b.name].matrix, dtype=np.float64)
+
+	return poses, worlds
 
-def main():	
-	global file
+# Final transformation (frames, bones, 4, 4) of each bone in OpenGL coordinates, from the rest position to the posed position
+# world: the world matrix of the armature (4, 4) or its world matrix on every frame (frames, 4, 4)
+def skinningMatrices(obj, poses, world):
+	a = (TO_OPENGL_COORDS @ world).reshape(-1, 1, 4, 4)
+	return a @ poses @ np.linalg.inv(restMatrices(obj)) @ np.linalg.inv(a)
+
+# Returns the data of a .anim file
+# matrices: final transformation (frames, bones, 4, 4) of the bones. Bones that are not animated (identity on every frame) are left out.
+def encodeAnimation(boneNames, matrices, frameDuration, animationFormat, quantiseTracks, translationTolerance, rotationTolerance, scaleTolerance):
+	numberOfFrames = matrices.shape[0]
+
+	isAnimated = (np.abs(matrices - np.identity(4)) > 1e-6).any(axis=(0, 2, 3))
+	animatedBones = np.nonzero(isAnimated)[0]
+	print(len(animatedBones), 'animated bones')
+
+	file = io.BytesIO()
+
+	writeDWord(file, 0xee334507 if animationFormat == 1 else 0xee334508)
+	writeDWord(file, numberOfFrames)
+	writeDWord(file, frameDuration)
+	writeDWord(file, len(animatedBones))
+
+	if animationFormat == 2:
+		writeDWord(file, 1 if quantiseTracks else 0) # Flags
+
+	for b in animatedBones:
+		writeUTF8(file, boneNames[b])
+
+	if animationFormat == 1:
+		# Relative matrices are not used
+		file.write(np.tile(np.identity(4, dtype='<f4'), (numberOfFrames * len(animatedBones), 1)).tobytes())
+
+		# Column-major
+		file.write(np.ascontiguousarray(matrices[:, animatedBones].transpose(0, 1, 3, 2)).astype('<f4').tobytes())
+	else:
+		# Translation, rotation and scale track of each bone
+		tracks = []
+		keyCount = 0
+		for b in animatedBones:
+			translations, rotations, scales = decomposeMatrices(matrices[:, b])
+			for values, tolerance, isRotation in ((translations, translationTolerance, False), (rotations, rotationTolerance, True), (scales, scaleTolerance, False)):
+				track, keys = trackData(values, tolerance, isRotation, quantiseTracks)
+				tracks.append(track)
+				keyCount += keys
+
+		print('%d keys (%d without keyframe reduction)' % (keyCount, len(tracks) * numberOfFrames))
+
+		# Track offsets are in u32s from the start of the file
+		offset = file.tell() // 4 + len(tracks)
+		for t in tracks:
+			writeDWord(file, offset)
+			offset += len(t)
+
+		for t in tracks:
+			file.write(t.tobytes())
+
+	return file.getvalue()
+
+def fcurveHashValues(action):
+	values = []
+	if action is not None:
+		for fc in action.fcurves:
+			points = []
+			for attribute in ('co', 'handle_left', 'handle_right'):
+				a = np.empty(len(fc.keyframe_points) * 2, dtype=np.float32)
+				fc.keyframe_points.foreach_get(attribute, a)
+				points.append(a)
+
+			values.append((fc.data_path, fc.array_index, fc.mute, points,
+				[k.interpolation for k in fc.keyframe_points], [m.type for m in fc.modifiers]))
+	return values
+
+def armatureHashValues(obj):
+	values = [obj.name, [list(row) for row in obj.matrix_world]]
+	for b in obj.data.bones:
+		pbone = obj.pose.bones[b.name]
+		values.append((b.name, [list(row) for row in b.matrix_local], None if b.parent is None else b.parent.name,
+			pbone.rotation_mode, [list(getattr(pbone, attribute)) for attribute, _ in POSE_BONE_CHANNELS]))
+	return values
+
+# Hash of the data that the animation is made from: the frame range, the armatures and their actions
+# Animation that comes from drivers or from constraints that target other objects is not included,
+# do not use the cache for files that have them
+def animationHash(sce):
+	values = [sce.frame_start, sce.frame_end, sce.render.fps]
+
+	for obj in armatureObjects():
+		values.append(armatureHashValues(obj))
+		if obj.animation_data is not None:
+			values.append(fcurveHashValues(obj.animation_data.action))
+
+	return exportcache.hashValues(*values)
+
+# Exports the animation of all armatures in the open blend file (the frame range of the scene) to one .anim file
+# If exportFile is '' the blend file name is used with '.blend' changed to '.anim'
+# The settings are the same as the configuration at the top of this file, which they default to
+# Returns False if the animation could not be exported
+def exportAnimation(exportFile, sampler=SAMPLER, animationFormat=ANIMATION_FORMAT, quantiseTracks=QUANTISE_TRACKS, translationTolerance=TRANSLATION_TOLERANCE,
+		rotationTolerance=ROTATION_TOLERANCE, scaleTolerance=SCALE_TOLERANCE,
+		compress=COMPRESS, compressionLevel=COMPRESSION_LEVEL, compressionThreads=COMPRESSION_THREADS,
+		cacheDirectory=CACHE_DIRECTORY, cacheSizeLimit=CACHE_SIZE_LIMIT):
+	if exportFile == '':
+		exportFile = os.path.splitext(bpy.data.filepath)[0] + '.anim'
+
+	print('Exporting ' + exportFile)
 	
 	sce = bpy.context.scene
 	
-	writeDWord(file, 0xee334507)
-	numberOfFrames = 1 + sce.frame_end - sce.frame_start
-	writeDWord(file, numberOfFrames)
-	writeDWord(file, int(1000000 / sce.render.fps))
+	frames = list(range(sce.frame_start, sce.frame_end + 1))
 	
+	if sampler not in ('POSE', 'SCENE'):
+		print("Sampler must be 'POSE' or 'SCENE'")
+		return False
 	
-	# coordinateConversion: Blender <-> OpenGL coordinate system
+	if animationFormat not in (1, 2):
+		print('Animation format must be 1 or 2')
+		return False
+	
+	if animationFormat == 2 and len(frames) > 65536:
+		print('Animations can have at most 65536 frames')
+		return False
+	
+	armatures = armatureObjects()
+	boneNames = [b.name for obj in armatures for b in obj.data.bones]
+	
+	if len(boneNames) < 1:
+		print('No bones!')
+		return False
+	
+	# The file is reused from the cache if the animation has not changed
+	
+	cache = None
+	if cacheDirectory != '':
+		cache = exportcache.ExportCache(cacheDirectory, cacheSizeLimit * 1024 * 1024)
+		key = exportcache.hashValues(exportcache.hashFiles([__file__, compressedfile.__file__]), sampler, animationFormat, quantiseTracks,
+			translationTolerance, rotationTolerance, scaleTolerance, compress, compressionLevel, animationHash(sce))
 		
-	toOpenGLCoords = Matrix()
+		data = cache.get(key)
+		if data is not None:
+			compressedfile.writeFileIfChanged(compressedfile.outputPath(exportFile, compress), data)
+			cache.finish()
+			print('Animation export complete\n')
+			return True
 	
-	# y,z = z,-y
-
-	toOpenGLCoords[1][1] = 0.0
-	toOpenGLCoords[1][2] = 1.0
-	toOpenGLCoords[2][1] = -1.0
-	toOpenGLCoords[2][2] = 0.0
+	start = time.perf_counter()
+	
+	if sampler == 'SCENE':
+		poses, worlds = sampleScenePoses(sce, armatures, frames)
+	else:
+		poses = []
+		worlds = []
+		for obj in armatures:
+			action = None if obj.animation_data is None else obj.animation_data.action
+			poses.append(samplePoses(obj, action, frames, True))
+			worlds.append(np.array(obj.matrix_world, dtype=np.float64))
+	
+	matrices = np.concatenate([skinningMatrices(obj, p, w) for obj, p, w in zip(armatures, poses, worlds)], axis=1)
+	
+	print('%d frames sampled in %.2f s' % (len(frames), time.perf_counter() - start))
+	
+	data = encodeAnimation(boneNames, matrices, int(1000000 / sce.render.fps), animationFormat, quantiseTracks,
+		translationTolerance, rotationTolerance, scaleTolerance)
+	
+	# If compressing, the file is kept in memory and compressed when it is closed
+	file = compressedfile.openOutputFile(exportFile, compress, compressionLevel, compressionThreads)
+	file.write(data)
+	file.close()
+	
+	if cache is not None:
+		cache.put(key, file.data)
+		cache.finish()
+	
+	print('Animation export complete\n')
+	return True
 
-	toBlenderCoords = toOpenGLCoords.inverted()
+# Exports every action of an armature to one .animbank file, with one clip (.anim data) per action (see docs/animation file format.md)
+# Each clip is the frame range of its action. Bone properties that are not animated by an action are in their rest pose.
+# armature: name of the armature object, '' uses the first armature in the blend file
+# actions: names of the actions to export, in the order of the clips. None exports every action that animates the armature.
+# If exportFile is '' the blend file name is used with '.blend' changed to '.animbank'
+# The other settings are the same as for exportAnimation
+def exportAnimationBank(exportFile, armature=ARMATURE, actions=None, sampler=SAMPLER, animationFormat=ANIMATION_FORMAT, quantiseTracks=QUANTISE_TRACKS,
+		translationTolerance=TRANSLATION_TOLERANCE, rotationTolerance=ROTATION_TOLERANCE, scaleTolerance=SCALE_TOLERANCE,
+		compress=COMPRESS, compressionLevel=COMPRESSION_LEVEL, compressionThreads=COMPRESSION_THREADS,
+		cacheDirectory=CACHE_DIRECTORY, cacheSizeLimit=CACHE_SIZE_LIMIT):
+	if exportFile == '':
+		exportFile = os.path.splitext(bpy.data.filepath)[0] + '.animbank'
 
+	print('Exporting ' + exportFile)
 	
+	sce = bpy.context.scene
 	
-	class BoneAnim:
-		pass
+	if sampler not in ('POSE', 'SCENE'):
+		print("Sampler must be 'POSE' or 'SCENE'")
+		return False
 	
-	bones = []
+	if animationFormat not in (1, 2):
+		print('Animation format must be 1 or 2')
+		return False
 	
-	i = 0
-	for obj in bpy.data.objects:
-		if hasattr(obj.data, 'bones') and hasattr(obj, 'pose') and obj.pose != None:
-			for b in obj.data.bones:
-				bone = BoneAnim()
-				bone.index = i
-				bone.matrices = [None] * numberOfFrames
-				bone.matrices_pre_mul = [None] * numberOfFrames
-				bone.name = b.name
-				bone.isAnimated = False
-				bones.append(bone)
-				i += 1
+	armatures = armatureObjects()
+	if armature != '':
+		armatures = [obj for obj in armatures if obj.name == armature]
 	
-	if len(bones) < 1:
-		print('No bones!')
-		return
-	
-	for f in range(numberOfFrames):
-		sce.frame_set(f + sce.frame_start)
-		i = 0
-		for obj in bpy.data.objects:
-			if hasattr(obj.data, 'bones') and hasattr(obj, 'pose') and obj.pose != None:	
-				for bone in obj.data.bones:
-					pbone = obj.pose.bones[bone.name]
-
-					editModeTailTransform = obj.matrix_world @ bone.matrix_local
-					poseModeTailTransform = obj.matrix_world @ pbone.matrix
-
-					bones[i].isAnimated = editModeTailTransform != poseModeTailTransform
-
-					m_pre_mul = toOpenGLCoords @ poseModeTailTransform @ editModeTailTransform.inverted() @ toBlenderCoords
-				
-					bones[i].matrices[f] = Matrix()
-					bones[i].matrices_pre_mul[f] = m_pre_mul
-					i += 1
-			
-			
-	# Check for bones which are not modified
+	if len(armatures) < 1:
+		print('No armature!' if armature == '' else 'No armature called ' + armature)
+		return False
+	
+	obj = armatures[0]
+	boneNames = [b.name for b in obj.data.bones]
+	
+	if actions is None:
+		actions = armatureActions(obj)
+	else:
+		if any(name not in bpy.data.actions for name in actions):
+			print('Actions not found: ' + ', '.join(name for name in actions if name not in bpy.data.actions))
+			return False
+		actions = [bpy.data.actions[name] for name in actions]
+	
+	if len(actions) < 1:
+		print('No actions!')
+		return False
+	
+	for action in actions:
+		if animationFormat == 2 and len(actionFrames(action)) > 65536:
+			print(action.name + ': Animations can have at most 65536 frames')
+			return False
+	
+	frameDuration = int(1000000 / sce.render.fps)
+	
+	cache = None
+	if cacheDirectory != '':
+		cache = exportcache.ExportCache(cacheDirectory, cacheSizeLimit * 1024 * 1024)
+		key = exportcache.hashValues(exportcache.hashFiles([__file__, compressedfile.__file__]), 'bank', sampler, animationFormat, quantiseTracks,
+			translationTolerance, rotationTolerance, scaleTolerance, compress, compressionLevel, frameDuration, armatureHashValues(obj),
+			[(action.name, actionFrames(action), fcurveHashValues(action)) for action in actions])
 		
-	animatedBones = [x for x in bones if x.isAnimated]
-				
-	writeDWord(file, len(animatedBones))
-	print(len(animatedBones), 'animated bones')
+		data = cache.get(key)
+		if data is not None:
+			compressedfile.writeFileIfChanged(compressedfile.outputPath(exportFile, compress), data)
+			cache.finish()
+			print('Animation export complete\n')
+			return True
 	
-	for b in animatedBones:
-		writeUTF8(file, b.name)
+	start = time.perf_counter()
 	
-	for f in range(numberOfFrames):
-		for b in animatedBones:
-			writeMatrix(file, b.matrices[f])
+	clips = []
 	
-	for f in range(numberOfFrames):
-		for b in animatedBones:
-			writeMatrix(file, b.matrices_pre_mul[f])
+	if sampler == 'SCENE':
+		if obj.animation_data is None:
+			obj.animation_data_create()
+		originalAction = obj.animation_data.action
+		originalFrame = sce.frame_current
+	
+	try:
+		for action in actions:
+			print('Clip ' + action.name)
+			frames = actionFrames(action)
+	
+			if sampler == 'SCENE':
+				obj.animation_data.action = action
+				poses, worlds = sampleScenePoses(sce, [obj], frames)
+				matrices = skinningMatrices(obj, poses[0], worlds[0])
+			else:
+				matrices = skinningMatrices(obj, samplePoses(obj, action, frames, False), np.array(obj.matrix_world, dtype=np.float64))
+	
+			clips.append((action.name, encodeAnimation(boneNames, matrices, frameDuration, animationFormat, quantiseTracks,
+				translationTolerance, rotationTolerance, scaleTolerance)))
+	finally:
+		if sampler == 'SCENE':
+			obj.animation_data.action = originalAction
+			sce.frame_set(originalFrame)
+	
+	print('%d clips sampled and encoded in %.2f s' % (len(clips), time.perf_counter() - start))
+	
+	file = compressedfile.openOutputFile(exportFile, compress, compressionLevel, compressionThreads)
+	
+	writeDWord(file, 0xee334509)
+	writeDWord(file, len(clips))
+	
+	# Clip index. Offsets are in bytes from the start of the file.
+	index = io.BytesIO()
+	for name, _ in clips:
+		writeUTF8(index, name)
+	
+	offset = 8 + len(clips) * 8 + len(index.getvalue())
+	for _, data in clips:
+		writeDWord(file, offset)
+		writeDWord(file, len(data))
+		offset += len(data)
+	
+	file.write(index.getvalue())
+	
+	for _, data in clips:
+		file.write(data)
+	
+	file.close()
+	
+	if cache is not None:
+		cache.put(key, file.data)
+		cache.finish()
 	
 	print('Animation export complete\n')
-main()
+	return True
 
-file.close()
+# Run from the Blender text editor or with blender --python. Not run when imported by batch-export.py
+if __name__ == '__main__':
+	if EXPORT_BANK:
+		exportAnimationBank(ANIMATION_EXPORT_FILE)
+	else:
+		exportAnimation(ANIMATION_EXPORT_FILE)
 
 
@@ -1,15 +1,39 @@
-EXPORT_FILE = 'C:/Users/dabbo/GameEngine/DemoAssets/Farm.scene'
+EXPORT_FILE = 'C:/Users/dabbo/GameEngine/DemoAssets/Farm.scene' # if set to '' will use the blend file name but change '.blend' to '.scene'
 AMBIENT = (0.1, 0.1, 0.15)
 CLEAR_COLOUR = (0.1, 0.1, 0.15)
-USING_COMPRESSED_MODELS = True # if true, model file names are *.model.compressed
+USING_COMPRESSED_MODELS = False # if true, model file names are *.model.compressed. Must be the same as COMPRESS in blender-export.py
 USE_FLAT_SHADING = True # Set all objects to use flat (per-face) shading
+BVH_LEAF_SIZE = 4 # Maximum number of objects in each leaf of the bounding volume hierarchy. 0 to not write the hierarchy
+STATIC_BATCH_CELL_SIZE = 0 # Merge static objects with the same materials in each cell of a grid of this size into one model (see staticbatch.py). Must be the same as STATIC_BATCH_CELL_SIZE in blender-export.py. 0 disables
+TEXTURE_ATLAS_SIZE = 0 # Pack the textures and normal maps of materials into atlases of up to this many pixels wide and high, written next to the scene file (see textureatlas.py). Must be the same as TEXTURE_ATLAS_SIZE in blender-export.py. 0 disables
+TEXTURE_ATLAS_PADDING = 8 # Pixels around each texture in an atlas. Atlases have mip-map levels down to 1 pixel of padding. Must be the same as TEXTURE_ATLAS_PADDING in blender-export.py
 
 import bpy
+import os
 import struct
+import sys
 import mathutils
 from mathutils import Vector,Matrix
 from math import sin,cos,radians
 
+# compressedfile.py is in the same directory as this script
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import compressedfile
+import meshinstances
+import staticbatch
+import scenebvh
+import textureatlas
+
+# Version 2 of the scene file format (see docs/scene file format.md)
+MAGIC = 0x1a98fd35
+
+# Materials are (texture index, normal map index, specular size, specular intensity, specular colourisation, flat shading)
+# The engine uses this material for slots that a scene file does not set. Same as MeshRenderer.Material (MeshRenderer.zig)
+DEFAULT_MATERIAL = (0xffffffff, 0xffffffff, 0.05, 1.0, 0.025, 0)
+
+# Min filter of atlas textures (LinearMipMapLinear, see Texture Filtering in docs/scene file format.md)
+ATLAS_MIN_FILTER = 5
+
 # coordinateConversion: Blender <-> OpenGL coordinate system
 		
 toOpenGLCoords = Matrix()
@@ -68,6 +92,14 @@ def writeString(file, s, encoding):
 def writeUTF8(file, s):
 	writeString(file, s, 'utf8')
 
+def writeMaterial(file, m):
+	writeDWord(file, m[0]) # texture
+	writeDWord(file, m[1]) # normal
+	writeFloat(file, m[2]) # specular size
+	writeFloat(file, m[3]) # specular intensity
+	writeFloat(file, m[4]) # specular colourisation
+	writeDWord(file, m[5]) # flat shading
+
 def stringToNBytes(s, n):
 	b = s.encode('utf8')
 	if len(b) > n:
@@ -80,122 +112,241 @@ def stringToNBytes(s, n):
 		print('Error1')
 	return b
 
-f = open(EXPORT_FILE, 'wb')
-
-# Magic
-writeDWord(f, 0x1a98fd34)
-
-# Scene
-writeFloat(f, AMBIENT[0])
-writeFloat(f, AMBIENT[1])
-writeFloat(f, AMBIENT[2])
-
-writeFloat(f, CLEAR_COLOUR[0])
-writeFloat(f, CLEAR_COLOUR[1])
-writeFloat(f, CLEAR_COLOUR[2])
-
-objects = []
-lights = bpy.data.lights
-
-for obj in bpy.data.objects:
-	if hasattr(obj.data, 'polygons'):
-		objects.append(obj)
-
-# assets
-
-assetNames = []
-assetNamesDataLength = 0
-
-file_path_append = '.model'
-if USING_COMPRESSED_MODELS:
-	file_path_append += '.compressed'
-
-for obj in objects:
-	n = obj.name
-	if len(n) >= 5 and n[-4] == '.' and n[-3:].isdigit():
-		continue
-	assetNames.append(n)
-	assetNamesDataLength += (len((n + file_path_append).encode('utf8')) + 1 + 3) // 4
-
-assetNames.sort()
-print(assetNames)
-
-writeDWord(f, assetNamesDataLength)
-writeDWord(f, len(assetNames))
-for n in assetNames:
-	writeUTF8(f, n + file_path_append)
-
-
-# Meshes
-
-writeDWord(f, len(assetNames))
-for i in range(len(assetNames)):
-	writeDWord(f, i) # Asset index
-	writeDWord(f, 0) # Read-only
-
-# Textures
-writeDWord(f, 0)
-
-# objects
-
-writeDWord(f, len(objects) + len(lights))
-
-for obj in objects:
-	f.write(stringToNBytes(obj.name, 16))
-	print(stringToNBytes(obj.name, 16))
-	
-
-	n = obj.name # asset name (without file extension)
-	if len(n) >= 5 and n[-4] == '.' and n[-3:].isdigit():
-		n = n[:-4]
-
-	writeDWord(f, 0xffffffff) # no parent
-	writeDWord(f, 1) # has mesh renderer
-	writeDWord(f, 0) # does not have light
-	writeDWord(f, 0) # is not camera
-	writeDWord(f, 0) # does not inherit parent transform
-	writeMatrix(f, convertMatrix(obj.matrix_world))
-
-	# Mesh renderer
-	writeDWord(f, assetNames.index(n)) # Mesh
-	for i in range(32):
-		writeDWord(f, 0xffffffff) # texture
-		writeDWord(f, 0xffffffff) # normal
-		writeFloat(f, 0.05) # specular size
-		writeFloat(f, 1.00) # specular intensity
-		writeFloat(f, 0.025) # specular colourisation
-		writeDWord(f, 1 if USE_FLAT_SHADING else 0)
-
-# lights
-
-for obj in lights:
-	f.write(stringToNBytes(obj.name, 16))
-
-	writeDWord(f, 0xffffffff) # parent
-	writeDWord(f, 0) # does not have mesh renderer
-	writeDWord(f, 1) # has light
-	writeDWord(f, 0) # is not camera
-	writeDWord(f, 0) # does not inherit parent transform
-	writeMatrix(f, convertMatrix(bpy.data.objects[obj.name].matrix_world @ rotate_light))	
-
-	if obj.type == 'POINT':
-		writeDWord(f, 0)
-	elif obj.type == 'SPOT':
-		writeDWord(f, 1)
-	else: # Directional
-		writeDWord(f, 2)
-
-	writeFloat(f, obj.color[0]*obj.energy)
-	writeFloat(f, obj.color[1]*obj.energy)
-	writeFloat(f, obj.color[2]*obj.energy)
-
-	writeDWord(f, 1) # cast shadows
-	writeFloat(f, obj.shadow_buffer_clip_start)
-	writeFloat(f, obj.shadow_cascade_max_distance)
-
-	if obj.type == 'SPOT':
-		writeFloat(f, obj.spot_size)
-
-f.close()
-
-print('Done.')
\ No newline at end of file
+# Exports the objects and lights in the open blend file to a .scene file
+# Mesh objects with the same geometry (see meshinstances.py) use the same model file, named after the first of the objects
+# (without a .001 etc. suffix), as blender-export.py does with SEPARATE_OBJECTS
+# If staticBatchCellSize is not 0, static objects are merged into chunks (see staticbatch.py) which use the model file named after
+# the chunk and have no transform
+# If textureAtlasSize is not 0, the textures of materials are packed into atlases (see textureatlas.py) which are written next to
+# the scene file as <scene name>_Atlas<i>.bctexture and <scene name>_Atlas<i>_normal.bctexture
+# If exportFile is '' the blend file name is used with '.blend' changed to '.scene'
+# The settings are the same as the configuration at the top of this file, which they default to
+def exportScene(exportFile, ambient=AMBIENT, clearColour=CLEAR_COLOUR, usingCompressedModels=USING_COMPRESSED_MODELS, useFlatShading=USE_FLAT_SHADING,
+		bvhLeafSize=BVH_LEAF_SIZE, staticBatchCellSize=STATIC_BATCH_CELL_SIZE, textureAtlasSize=TEXTURE_ATLAS_SIZE,
+		textureAtlasPadding=TEXTURE_ATLAS_PADDING):
+	if exportFile == '':
+		exportFile = os.path.splitext(bpy.data.filepath)[0] + '.scene'
+
+	print('Exporting ' + exportFile)
+
+	# The file is only written if it has changed
+	f = compressedfile.openOutputFile(exportFile, False)
+
+	# Magic
+	writeDWord(f, MAGIC)
+
+	# Scene
+	writeFloat(f, ambient[0])
+	writeFloat(f, ambient[1])
+	writeFloat(f, ambient[2])
+
+	writeFloat(f, clearColour[0])
+	writeFloat(f, clearColour[1])
+	writeFloat(f, clearColour[2])
+
+	objects = []
+	lights = bpy.data.lights
+
+	for obj in bpy.data.objects:
+		if hasattr(obj.data, 'polygons'):
+			objects.append(obj)
+
+	# Texture atlases
+	# Slot i of the mesh renderers is region i of the models, which is materials[i] (the same merging as blender-export.py)
+
+	atlases = textureatlas.buildAtlases(bpy.data.materials, objects, textureAtlasSize, textureAtlasPadding)
+	materials, _ = textureatlas.mergeMaterials(bpy.data.materials, atlases)
+	atlasIndices = textureatlas.atlasOfMaterials(atlases)
+	if textureAtlasSize > 0:
+		textureatlas.printStatistics(atlases)
+
+	textureNames = [] # (asset name, index of the atlas)
+	for i, atlas in enumerate(atlases):
+		name = os.path.splitext(os.path.basename(exportFile))[0] + '_Atlas%d' % i
+		diffuseData, normalData = textureatlas.encodeAtlas(atlas, bpy.data.materials)
+
+		compressedfile.writeFileIfChanged(os.path.join(os.path.dirname(exportFile), name + '.bctexture'), diffuseData)
+		textureNames.append((name + '.bctexture', i))
+		if normalData is not None:
+			compressedfile.writeFileIfChanged(os.path.join(os.path.dirname(exportFile), name + '_normal.bctexture'), normalData)
+			textureNames.append((name + '_normal.bctexture', i))
+
+	# assets
+	# Each chunk of static objects has its own asset. Other objects with the same geometry share an asset.
+	# The objects that use each asset are written next to each other.
+
+	chunks, objects = staticbatch.buildChunks(objects, staticBatchCellSize)
+	staticbatch.printStatistics(chunks, objects, staticBatchCellSize)
+
+	instances = meshinstances.groupInstances(objects)
+	assetNames = [name for name, _ in chunks + instances]
+
+	# (name, transform, objects) for each game object with a mesh renderer
+	sceneObjects = [(name, Matrix(), group) for name, group in chunks] + [(obj.name, obj.matrix_world, [obj]) for _, group in instances for obj in group]
+	objectAssets = list(range(len(chunks))) + [len(chunks) + i for i, (_, group) in enumerate(instances) for _ in group]
+
+	file_path_append = '.model'
+	if usingCompressedModels:
+		file_path_append += '.compressed'
+
+	# Textures are after the models
+	assetFileNames = [n + file_path_append for n in assetNames] + [n for n, _ in textureNames]
+
+	assetNamesDataLength = 0
+	for n in assetFileNames:
+		assetNamesDataLength += (len(n.encode('utf8')) + 1 + 3) // 4
+
+	print(assetNames)
+	print('Assets: %d, objects: %d' % (len(assetFileNames), len(sceneObjects)))
+
+	writeDWord(f, assetNamesDataLength)
+	writeDWord(f, len(assetFileNames))
+	for n in assetFileNames:
+		writeUTF8(f, n)
+
+
+	# Meshes
+
+	writeDWord(f, len(assetNames))
+	for i in range(len(assetNames)):
+		writeDWord(f, i) # Asset index
+		writeDWord(f, 0) # Read-only
+
+	# Textures
+
+	writeDWord(f, len(textureNames))
+	for i in range(len(textureNames)):
+		writeDWord(f, len(assetNames) + i) # Asset index
+		writeDWord(f, 0) # Read-only
+		writeDWord(f, 1) # Smooth when magnified
+		writeDWord(f, ATLAS_MIN_FILTER)
+
+	# Material of each atlas: (texture, normal map)
+	atlasTextures = [[0xffffffff, 0xffffffff] for _ in atlases]
+	for i, (name, atlas) in enumerate(textureNames):
+		atlasTextures[atlas][1 if name.endswith('_normal.bctexture') else 0] = i
+
+	# Materials
+	# Each object has a material for all 32 of its slots and overrides for the slots that use a different material.
+	# Materials are only stored once.
+
+	materialTable = []
+	materialIndices = {}
+
+	def tableIndex(m):
+		if m not in materialIndices:
+			materialIndices[m] = len(materialTable)
+			materialTable.append(m)
+		return materialIndices[m]
+
+	slots = [(0xffffffff, 0xffffffff, 0.05, 1.00, 0.025, 1 if useFlatShading else 0)] * 32
+
+	# Slots of materials in atlases use the atlas textures. All materials in an atlas with the same colour are one slot.
+	for i, mat in enumerate(materials[:32]):
+		if mat.name in atlasIndices:
+			texture, normalMap = atlasTextures[atlasIndices[mat.name]]
+			slots[i] = (texture, normalMap) + slots[i][2:]
+
+	# All objects use the same slots: the most common material (0xffffffff for the default material) and
+	# overrides [(slot, material index)] for the other slots
+	material = 0xffffffff
+	overrides = []
+	if len(sceneObjects) > 0:
+		common = max(set(slots), key=slots.count)
+		overrides = [(i, tableIndex(m)) for i, m in enumerate(slots) if m != common]
+		if common != DEFAULT_MATERIAL:
+			material = tableIndex(common)
+
+	writeDWord(f, len(materialTable))
+	for m in materialTable:
+		writeMaterial(f, m)
+
+	print('Materials: %d, %d slot overrides' % (len(materialTable), len(overrides) * len(sceneObjects)))
+
+	# objects
+
+	writeDWord(f, len(sceneObjects) + len(lights))
+
+	for (name, matrix, _), asset in zip(sceneObjects, objectAssets):
+		f.write(stringToNBytes(name, 16))
+		print(stringToNBytes(name, 16))
+
+		writeDWord(f, 0xffffffff) # no parent
+		writeDWord(f, 1) # has mesh renderer
+		writeDWord(f, 0) # does not have light
+		writeDWord(f, 0) # is not camera
+		writeDWord(f, 0) # does not inherit parent transform
+		writeMatrix(f, convertMatrix(matrix))
+
+		# Mesh renderer
+		writeDWord(f, asset) # Mesh
+		writeDWord(f, material)
+		writeDWord(f, len(overrides))
+		for slot, m in overrides:
+			writeDWord(f, slot)
+			writeDWord(f, m)
+
+	# lights
+
+	for obj in lights:
+		f.write(stringToNBytes(obj.name, 16))
+
+		writeDWord(f, 0xffffffff) # parent
+		writeDWord(f, 0) # does not have mesh renderer
+		writeDWord(f, 1) # has light
+		writeDWord(f, 0) # is not camera
+		writeDWord(f, 0) # does not inherit parent transform
+		writeMatrix(f, convertMatrix(bpy.data.objects[obj.name].matrix_world @ rotate_light))	
+
+		if obj.type == 'POINT':
+			writeDWord(f, 0)
+		elif obj.type == 'SPOT':
+			writeDWord(f, 1)
+		else: # Directional
+			writeDWord(f, 2)
+
+		writeFloat(f, obj.color[0]*obj.energy)
+		writeFloat(f, obj.color[1]*obj.energy)
+		writeFloat(f, obj.color[2]*obj.energy)
+
+		writeDWord(f, 1) # cast shadows
+		writeFloat(f, obj.shadow_buffer_clip_start)
+		writeFloat(f, obj.shadow_cascade_max_distance)
+
+		if obj.type == 'SPOT':
+			writeFloat(f, obj.spot_size)
+
+	# Bounding volume hierarchy of the mesh objects
+	# Lights are not in it: they light everything in their direction, however far away
+
+	if bvhLeafSize > 0:
+		# World space bounding boxes. obj.bound_box includes the modifiers (in the rest pose for armatures).
+		# The box of a chunk contains the boxes of its objects.
+		boxes = [scenebvh.unionBox([scenebvh.pointsBox([switchCoordSystem(obj.matrix_world @ Vector(corner)) for corner in obj.bound_box])
+			for obj in group]) for _, _, group in sceneObjects]
+
+		order, nodes = scenebvh.buildBVH(boxes, bvhLeafSize)
+
+		writeDWord(f, len(order))
+		for i in order:
+			writeDWord(f, i) # Object index (mesh objects are first)
+			for v in boxes[i][0] + boxes[i][1]:
+				writeFloat(f, v)
+
+		writeDWord(f, len(nodes))
+		for boxMin, boxMax, first, count in nodes:
+			for v in boxMin + boxMax:
+				writeFloat(f, v)
+			writeDWord(f, first)
+			writeDWord(f, count)
+
+		print('BVH: %d objects, %d nodes' % (len(order), len(nodes)))
+
+	f.close()
+
+	print('Done.')
+	return True
+
+# Run from the Blender text editor or with blender --python. Not run when imported by batch-export.py
+if __name__ == '__main__':
+	exportScene(EXPORT_FILE)
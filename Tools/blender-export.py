@@ -9,13 +9,34 @@
 
 # N.B.  THE MATERIAL COLOURS COME FROM THE 'VIEWPORT DISPLAY -> COLOR' SETTING
 
+# TO EXPORT WITHOUT OPENING BLENDER (E.G. MANY .BLEND FILES AT ONCE) SEE batch-export.py
+
 # CONFIGURATION
 
 EXPORT_FILE = 'C:/Users/dabbo/GameEngine/DemoAssets/FarmStatic.model' # if set to '' will use the blend file name but change '.blend' to '.model'
 EXPORT_BONES = False
 EXPORT_TEX_COORDS = False
-#EXPORT_INTERLEAVED = True# TODO
+EXPORT_INTERLEAVED = False # Group the vertex data by vertex instead of by attribute
 EXPORT_TANGENTS = False # Needed for normal maps
+QUANTISE_POSITIONS = 0 # 0 (32-bit floats), 16 or 10 bits per component. 10 bits is only precise enough for small objects
+OPTIMISE_VERTEX_CACHE = False # Reorder triangles and vertices for the GPU's vertex cache (slow for very large meshes)
+OPTIMISE_OVERDRAW = False # Also reorder clusters of triangles to reduce overdraw. Requires OPTIMISE_VERTEX_CACHE
+VERTEX_CACHE_SIZE = 16
+OVERDRAW_THRESHOLD = 1.05 # How much worse than the optimised vertex cache efficiency the overdraw optimisation may make it
+COMPRESS = False # Write a *.model.compressed file (zstd) instead of a *.model file. Requires the zstandard module (see compressedfile.py)
+COMPRESSION_LEVEL = 22 # 1-22
+COMPRESSION_THREADS = -1 # -1 uses all CPU cores
+SEPARATE_OBJECTS = False # Export each object to its own file named after the object, in the object's local space (as blender-export-scene.py expects). Objects with the same mesh share one file (see meshinstances.py). EXPORT_FILE is then a directory
+CACHE_DIRECTORY = '' # Reuse the files of unchanged objects from previous exports. '' disables the cache
+CACHE_SIZE_LIMIT = 1024 # MB. The least recently used files are removed from the cache
+LOD_LEVELS = () # Simplified levels of detail as (fraction of the triangles, screen size), e.g. ((0.5, 0.2), (0.25, 0.1), (0.1, 0.04)). A level is drawn when the model's bounding sphere covers less than its screen size (fraction of the screen height). () for no levels of detail
+LOD_MAX_ERROR = 0.02 # Fraction of the model's radius. Levels of detail are not simplified further than this
+LOD_MAX_BONE_WEIGHT_CHANGE = 0.5 # Vertices are only merged into vertices whose bone weights differ by at most this much (sum of the differences, 0 to 2)
+CLUSTER_TRIANGLES = 0 # Split the full model into clusters of up to this many triangles that the engine culls separately. 0 disables
+DEPTH_VERTICES = False # Also write the vertex positions (and bones) without the other attributes, with vertices that have the same position merged, for drawing shadow maps
+STATIC_BATCH_CELL_SIZE = 0 # With SEPARATE_OBJECTS, merge static objects with the same materials in each cell of a grid of this size into one file (see staticbatch.py). Must be the same as STATIC_BATCH_CELL_SIZE in blender-export-scene.py. 0 disables
+TEXTURE_ATLAS_SIZE = 0 # Move the UV coordinates of materials that blender-export-scene.py packs into texture atlases of this size (see textureatlas.py). Requires EXPORT_TEX_COORDS. Must be the same as TEXTURE_ATLAS_SIZE in blender-export-scene.py. 0 disables
+TEXTURE_ATLAS_PADDING = 8 # Must be the same as TEXTURE_ATLAS_PADDING in blender-export-scene.py
 
 
 # IMPORTS
@@ -28,35 +49,231 @@ import sys
 import mathutils
 from mathutils import Vector
 import math
+import numpy as np
+
+# meshoptimise.py, meshsimplify.py, meshinstances.py, staticbatch.py, textureatlas.py, compressedfile.py and exportcache.py are in the same directory as this script
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import meshoptimise
+import meshsimplify
+import meshinstances
+import staticbatch
+import textureatlas
+import compressedfile
+import exportcache
+
+# Patterns for splitting polygons into triangles.
+# Triangles use the first 3 entries, quadrilaterals are split into (0,1,2) and (2,3,0)
+POLYGON_CORNER_PATTERN = np.array([0, 1, 2, 2, 3, 0], dtype=np.int64)
+
+# Mesh data of one object, read in bulk into flat arrays.
+# Positions, normals and tangents are in world space (or the object's local space) and in the OpenGL coordinate system.
+class MeshArrays:
+	pass
+
+def switchCoordSystem(coords):
+	return [coords[0], coords[2], -coords[1]]
+
+# Same as switchCoordSystem but for an (n,3) array
+def switchCoordSystemArray(coords):
+	return np.stack((coords[:, 0], coords[:, 2], -coords[:, 1]), axis=1)
+
+def transformPoints(matrix, points):
+	m = np.array(matrix, dtype=np.float64)
+	return points @ m[:3, :3].T + m[:3, 3]
+
+def transformDirections(matrix, directions):
+	m = np.array(matrix, dtype=np.float64)
+	return directions @ m[:3, :3].T
+
+# Packs (n,3) vectors in the range -1 to 1 into the 10-bit format used for normals and tangents
+# The first component is in the least significant bits
+def packNormals(vectors):
+	v = np.trunc(vectors * 511.0).astype(np.int64) & 1023
+	return (v[:, 0] | (v[:, 1] << 10) | (v[:, 2] << 20)).astype(np.uint32)
+
+# Keeps the 4 biggest bone influences of each vertex, ordered from biggest to smallest
+# Influences of vertex groups that are not bones (bone index -1) and zero weights are ignored
+# The weights are renormalised so that the weights of each vertex add up to 255 (unless the vertex has no influences)
+# Returns the bone indices and weights of each vertex (vertexCount x 4 u8 arrays)
+def selectBoneInfluences(vertices, bones, weights, vertexCount):
+	boneIndices = np.zeros((vertexCount, 4), dtype=np.uint8)
+	boneWeights = np.zeros((vertexCount, 4), dtype=np.uint8)
+
+	valid = (bones >= 0) & (weights > 0)
+	vertices = vertices[valid]
+	bones = bones[valid]
+	weights = weights[valid]
+
+	if len(vertices) == 0:
+		return boneIndices, boneWeights
+
+	# Group by vertex, biggest weight first
+	order = np.lexsort((-weights, vertices))
+	vertices = vertices[order]
+	bones = bones[order]
+	weights = weights[order]
+
+	ranks = np.arange(len(vertices)) - np.searchsorted(vertices, vertices)
+	top4 = ranks < 4
+	vertices = vertices[top4]
+	ranks = ranks[top4]
+
+	w = np.zeros((vertexCount, 4))
+	w[vertices, ranks] = weights[top4]
+	boneIndices[vertices, ranks] = bones[top4]
+
+	weightSums = w.sum(axis=1, keepdims=True)
+	w = np.divide(w, weightSums, out=np.zeros_like(w), where=weightSums != 0)
+	w = np.rint(w * 255.0).astype(np.int64)
+
+	# Rounding may make the sum 254-256, the difference goes to the biggest influence
+	hasInfluences = weightSums[:, 0] > 0
+	w[hasInfluences, 0] += 255 - w[hasInfluences].sum(axis=1)
+
+	boneWeights[:] = w
+	return boneIndices, boneWeights
+
+# Quantises positions to 16 or 10 bits per component within the bounding box of the model
+# The same scale is used for all 3 axes so that normals and bone transformations are not affected
+# Returns the positions as u32s (2 per vertex if 16-bit, 1 if 10-bit), the offset and the scale
+def quantisePositions(positions, bits):
+	positions = np.asarray(positions, dtype=np.float64)
+
+	offset = np.zeros(3)
+	scale = 1.0
+	if len(positions) > 0:
+		offset = positions.min(axis=0)
+		scale = (positions.max(axis=0) - offset).max()
+		if scale <= 0:
+			scale = 1.0
+
+	# Use the values that will be in the file
+	offset = offset.astype(np.float32).astype(np.float64)
+	scale = float(np.float32(scale))
+
+	maxValue = (1 << bits) - 1
+	q = np.clip(np.rint((positions - offset) * (maxValue / scale)), 0, maxValue).astype(np.uint32)
+
+	if bits == 16:
+		# 3 components + padding
+		q = np.hstack((q, np.zeros((len(q), 1), dtype=np.uint32))).astype('<u2')
+		return np.ascontiguousarray(q).view('<u4'), offset, scale
+
+	return (q[:, 0] | (q[:, 1] << 10) | (q[:, 2] << 20)).astype('<u4').reshape(-1, 1), offset, scale
+
+# Reads the vertices, loops and polygons of a mesh object
+# Returns None if a polygon has more than 4 sides
+def readMeshArrays(obj, readTangents, localSpace=False):
+	mesh = obj.data
+	matrix = mathutils.Matrix() if localSpace else obj.matrix_world
+
+	m = MeshArrays()
+
+	vertexCount = len(mesh.vertices)
+	co = np.empty(vertexCount * 3, dtype=np.float32)
+	mesh.vertices.foreach_get('co', co)
+	normals = np.empty(vertexCount * 3, dtype=np.float32)
+	mesh.vertices.foreach_get('normal', normals)
+
+	m.positions = switchCoordSystemArray(transformPoints(matrix, co.reshape(-1, 3).astype(np.float64)))
+	m.normals = switchCoordSystemArray(transformDirections(matrix, normals.reshape(-1, 3).astype(np.float64)))
+
+	polygonCount = len(mesh.polygons)
+	loopStart = np.empty(polygonCount, dtype=np.int32)
+	mesh.polygons.foreach_get('loop_start', loopStart)
+	loopTotal = np.empty(polygonCount, dtype=np.int32)
+	mesh.polygons.foreach_get('loop_total', loopTotal)
+	m.polygonMaterialSlots = np.empty(polygonCount, dtype=np.int32)
+	mesh.polygons.foreach_get('material_index', m.polygonMaterialSlots)
+
+	if np.any(loopTotal > 4):
+		return None
+
+	# Polygons with fewer than 3 vertices are skipped
+	cornersPerPolygon = np.where(loopTotal == 4, 6, np.where(loopTotal == 3, 3, 0))
+
+	# Index into mesh.polygons for each triangle
+	m.trianglePolygons = np.repeat(np.arange(polygonCount), cornersPerPolygon // 3)
+
+	cornerPolygon = np.repeat(np.arange(polygonCount), cornersPerPolygon)
+	cornerFirst = np.repeat(np.cumsum(cornersPerPolygon) - cornersPerPolygon, cornersPerPolygon)
+	cornerLoops = loopStart[cornerPolygon] + POLYGON_CORNER_PATTERN[np.arange(len(cornerPolygon)) - cornerFirst]
+
+	loopCount = len(mesh.loops)
+	loopVertices = np.empty(loopCount, dtype=np.int32)
+	mesh.loops.foreach_get('vertex_index', loopVertices)
+
+	# Index into obj.data.vertices for each triangle corner
+	m.cornerVertices = loopVertices[cornerLoops].astype(np.int64)
+
+	m.cornerUVs = None
+	if mesh.uv_layers.active is not None:
+		uvs = np.empty(loopCount * 2, dtype=np.float32)
+		mesh.uv_layers.active.data.foreach_get('uv', uvs)
+		m.cornerUVs = uvs.reshape(-1, 2)[cornerLoops]
+
+	m.cornerTangents = None
+	m.cornerBiTangentSigns = None
+	if readTangents:
+		mesh.calc_tangents()
+		tangents = np.empty(loopCount * 3, dtype=np.float32)
+		mesh.loops.foreach_get('tangent', tangents)
+		signs = np.empty(loopCount, dtype=np.float32)
+		mesh.loops.foreach_get('bitangent_sign', signs)
+
+		tangents = switchCoordSystemArray(transformDirections(matrix, tangents.reshape(-1, 3).astype(np.float64)))
+		m.cornerTangents = tangents[cornerLoops]
+		m.cornerBiTangentSigns = signs[cornerLoops]
+
+	return m
+
+# Finds identical rows in a 2D array.
+# Returns the index of the first occurrence of each unique row and, for every row, the index of its unique row.
+# Rows are hashed as raw bytes so the cost is linear in the number of rows. Unique rows keep the order in which
+# they first appear.
+def weldRows(rows):
+	rows = np.ascontiguousarray(rows)
+	keys = rows.view(np.dtype((np.void, rows.dtype.itemsize * rows.shape[1]))).ravel().tolist()
+
+	lookup = {}
+	remap = np.fromiter((lookup.setdefault(k, len(lookup)) for k in keys), dtype=np.int64, count=len(keys))
+
+	# A row is the first occurrence if it introduced a new (and so higher) index
+	isFirst = np.ones(len(remap), dtype=bool)
+	isFirst[1:] = remap[1:] > np.maximum.accumulate(remap)[:-1]
+	return np.nonzero(isFirst)[0], remap
+
+# Generates the levels of detail of a model (see LOD_LEVELS)
+# indexLists: index list of each material
+# vertexWeights: None or the bone weights of each vertex as a (vertex count, bone count) array
+# Returns the index lists of each level, the screen size below which the level is used and the error of the level
+def simplifyModel(positions, indexLists, lodLevels, maxError, vertexWeights, maxBoneWeightChange):
+	triangleCount = sum(len(l) for l in indexLists) // 3
+	targets = [int(triangleCount * ratio) for ratio, _ in lodLevels]
+
+	levels = meshsimplify.simplify(positions, indexLists, targets, maxError, vertexWeights, maxBoneWeightChange)
+
+	# Levels that are no smaller than the level before them are left out
+	lods = []
+	previousCount = triangleCount
+	for (lists, error), (_, screenSize) in zip(levels, lodLevels):
+		count = sum(len(l) for l in lists) // 3
+		if count < previousCount:
+			lods.append((lists, screenSize, error))
+			previousCount = count
+	return lods
+
+# Writes a .model file containing the mesh objects
+# meshes: the MeshArrays of the objects
+# localSpace: the file has one object and its meshes were read in the object's local space
+def writeModel(file, meshObjects, meshes, exportBones, exportTexCoords, exportInterleaved, exportTangents, positionBits,
+		optimiseVertexCache, optimiseOverdraw, vertexCacheSize, overdrawThreshold, lodLevels, lodMaxError, lodMaxBoneWeightChange,
+		clusterTriangles, depthVertices, localSpace, atlases):
+	# Materials with the same colour (and texture atlas) are merged
+	# materials: unique materials (these are written to the .model file)
+	# materialsMapping: converts material name to index into materials
+	materials, materialsMapping = textureatlas.mergeMaterials(bpy.data.materials, atlases)
 
-file = None
-
-def main():
-	global EXPORT_FILE
-	global EXPORT_BONES
-	global EXPORT_TEX_COORDS
-	global EXPORT_TANGENTS
-	global file
-
-	if EXPORT_TANGENTS and not EXPORT_TEX_COORDS:
-		print('EXPORT_TANGENTS requires EXPORT_TEX_COORDS')
-		return
-
-	materials = [] # unique materials (these are written to the .model file)
-	materialsMapping = [None] * len(bpy.data.materials) # converts index into bpy.data.materials to index into materials
-
-	for i, m in enumerate(bpy.data.materials, start=0):
-		isNewMat = True
-		for j, m2 in enumerate(materials, start=0):
-			if m2.diffuse_color == m.diffuse_color:
-				isNewMat = False
-				materialsMapping[i] = j
-				break
-
-		if isNewMat:
-			materialsMapping[i] = len(materials)
-			materials.append(m)
-		
 
 	if len(materials) > 8:
 		print('Too many materials. Maximum is 8.')
@@ -64,207 +281,377 @@ def main():
 	# bpy.ops.object.mode_set(mode='OBJECT', toggle=False)
 
 	# FUNCTIONS
-	
+
 	def writeByte(file, i, signed=False):
 		file.write(i.to_bytes(1, byteorder='little', signed=signed))
-	
+
 	def writeWord(file, i, signed=False):
 		file.write(i.to_bytes(2, byteorder='little', signed=signed))
-	
+
 	def writeDWord(file, i, signed=False):
 		file.write(i.to_bytes(4, byteorder='little', signed=signed))
-		
+
 	def writeFloat(file, f):
 		file.write(bytearray(struct.pack("f", f)))
-		
+
 	# Writes string length and string data then aligns to 4 bytes
 	def writeString(file, s, encoding):
 		encodedName = s.encode(encoding)
 		writeByte(file, len(encodedName))
 		file.write(encodedName)
-				
+
 		padding = 4 - ((len(encodedName)+1) % 4)
 		if padding != 4:
 			zero = 0
 			file.write(zero.to_bytes(padding, byteorder='little', signed=False))
-			
+
 	def writeUTF8(file, s):
 		writeString(file, s, 'utf8')
-	
+
 	def writeASCII(file, s):
 		writeString(file, s, 'ascii')
-		
-	def switchCoordSystem(coords):
-		return [coords[0], coords[2], -coords[1]]
-		
-		
-	# EXECUTION BEGINS
-
-	if EXPORT_FILE == '':
-		EXPORT_FILE = os.path.splitext(bpy.data.filepath)[0] + '.model'
-		
-	print('Exporting ' + EXPORT_FILE)
 
-	# Get vertices and indices
 
-	class Vertex:
-		pass
-		
-	vertices = []
-	# size of vertices ^ before splitting vertices
-	originalVertexArraySize = 0
 	# index into vertices for each object in the blender scene
 	objVertexOffsets = []
 
-	i = 0
-	for obj in bpy.data.objects:
-		if hasattr(obj.data, 'polygons'):
-			if EXPORT_TANGENTS:
-				obj.data.calc_tangents()
-			
-			objVertexOffsets.append(i)
-			for vertex in obj.data.vertices:
-
-				v = Vertex()
-				v.visited = False
-				v.obj = obj
-				v.co = vertex.co
-				v.normal = vertex.normal
-
-				# UV coordinates are not stored per-vertex in blender
-				# They are added to our vertex objects later in the script
-				v.uv = None
-
-				# Tangent depends on uv coords ^ and is per-face. The value for each vertex is the average of it's faces tangents
-				v.tangent = Vector((0.0,0.0,0.0),)
-				v.tangentN = 0 # For calculating the average
-				v.biTangentMul = 1.0
-
-				vertices.append(v)
-			originalVertexArraySize += len(obj.data.vertices)
-			i += len(obj.data.vertices)
-
-	indices = []
-	
-	# Used for exporting bone indices of new vertices
-	# Vertices may be created where necessary where two textures meet
-	newVerticies_listIndex = []
-	newVertices_originalVertexIndex = []
-
-	i = 0
-	for obj in bpy.data.objects:
-		if hasattr(obj.data, 'polygons'):
-			for polygon in obj.data.polygons:
-				if len(polygon.vertices) > 4:
-					print('Only triangles and quadrilaterals are supported. Triangulate the mesh(es).')
-					return
-				elif len(polygon.vertices) < 3:
-					continue
-
-					
-				if len(polygon.vertices) == 4:
-					polygonIndices = [polygon.vertices[0], polygon.vertices[1], polygon.vertices[2], polygon.vertices[2], polygon.vertices[3], polygon.vertices[0]]
-					polygonLoopIndices = (polygon.loop_indices[0], polygon.loop_indices[1], polygon.loop_indices[2], polygon.loop_indices[2], polygon.loop_indices[3], polygon.loop_indices[0])
-				else:
-					# Index into obj.data.vertices
-					polygonIndices = [polygon.vertices[0], polygon.vertices[1], polygon.vertices[2]]
-
-					# Index into uv layer
-					polygonLoopIndices = polygon.loop_indices
-			
-				thisPolyTangent = obj.data.loops[polygonLoopIndices[0]].tangent
-				biTangentMul = obj.data.loops[polygonLoopIndices[0]].bitangent_sign
-
-				j = 0
-				for vertex in polygonIndices:
-					uv = obj.data.uv_layers.active.data[polygonLoopIndices[j]].uv if obj.data.uv_layers.active is not None else None
-					v = vertices[objVertexOffsets[i] + vertex]
-
-					def newVertex():
-						indices.append(len(vertices))
-						newVerticies_listIndex.append(len(vertices))
-						newVertices_originalVertexIndex.append(objVertexOffsets[i] + vertex)
-						newVertex = Vertex()
-						newVertex.co = v.co
-						newVertex.normal = v.normal
-						newVertex.uv = uv
-						newVertex.obj = obj
-						newVertex.tangent = thisPolyTangent
-						newVertex.tangentN = 1
-						newVertex.biTangentMul = biTangentMul
-						vertices.append(newVertex)	
-						
-					if (uv is None) or not EXPORT_TEX_COORDS:
-						v.tangent = v.tangent + thisPolyTangent
-						v.tangentN += 1
-						v.biTangentMul = biTangentMul
-						indices.append(objVertexOffsets[i] + vertex)
-					elif v.uv is None:
-						v.uv = uv
-						v.tangent = v.tangent + thisPolyTangent
-						v.tangentN += 1
-						v.biTangentMul = biTangentMul
-						indices.append(objVertexOffsets[i] + vertex)
-					elif v.uv[0] == uv.x and v.uv[1] == uv.y:
-						v.tangent = v.tangent + thisPolyTangent
-						v.tangentN += 1
-						v.biTangentMul = biTangentMul
-						indices.append(objVertexOffsets[i] + vertex)
-					else:						
-						newVertex()	
-					v.visited = True				
-						
-					j += 1
-						
-			i += 1
+	originalVertexArraySize = 0
+	for obj in meshObjects:
+		objVertexOffsets.append(originalVertexArraySize)
+		originalVertexArraySize += len(obj.data.vertices)
+
+	positions = np.concatenate([m.positions for m in meshes]) if meshes else np.zeros((0, 3))
+	normals = np.concatenate([m.normals for m in meshes]) if meshes else np.zeros((0, 3))
+
+	# Index into positions for each triangle corner
+	cornerVertices = np.concatenate([m.cornerVertices + objVertexOffsets[i] for i, m in enumerate(meshes)] + [np.zeros(0, dtype=np.int64)])
+	cornerCount = len(cornerVertices)
+
+	# UV coordinates are not stored per-vertex in blender
+	cornerHasUV = np.zeros(cornerCount, dtype=bool)
+	cornerUVs = np.zeros((cornerCount, 2), dtype=np.float32)
+	cornerTangents = np.zeros((cornerCount, 3))
+	cornerBiTangentSigns = np.ones(cornerCount, dtype=np.float32)
+
+	offset = 0
+	for obj, m in zip(meshObjects, meshes):
+		n = len(m.cornerVertices)
+		if m.cornerUVs is not None and exportTexCoords:
+			cornerHasUV[offset:offset+n] = True
+			cornerUVs[offset:offset+n] = m.cornerUVs
+
+			# Materials in texture atlases use their rectangle of the atlas
+			if len(atlases) > 0:
+				scales, offsets = textureatlas.slotUVTransforms(obj, atlases)
+				cornerSlots = np.repeat(np.minimum(m.polygonMaterialSlots[m.trianglePolygons], len(scales) - 1), 3)
+				cornerUVs[offset:offset+n] = m.cornerUVs * scales[cornerSlots] + offsets[cornerSlots]
+		if m.cornerTangents is not None:
+			cornerTangents[offset:offset+n] = m.cornerTangents
+			cornerBiTangentSigns[offset:offset+n] = m.cornerBiTangentSigns
+		offset += n
+
+	# Bone Weights
+
+	# Stored per blender vertex, corners take the bone data of their vertex
+
+	if exportBones:
+		allbones = []
+		allbones_objects = []
 
-	# Materials
+		for o in bpy.data.objects:
+			if hasattr(o.data, 'bones') and hasattr(o, 'pose') and o.pose != None:
+				for b in o.data.bones:
+					allbones.append(b)
+					allbones_objects.append(o)
 
-	indexLists = [[] for i in range(len(materials))]
 
-	currentIndex = 0 # index into indices list
-	for obj in bpy.data.objects:
-		if hasattr(obj.data, 'polygons'):
-			hasMaterials = len(obj.data.materials) > 0
-			for polygon in obj.data.polygons:
-				if len(polygon.vertices) < 3:
-					continue
-
-				# TODO: Cache values
-				if len(obj.data.materials) > 0:
-					matIndex = materialsMapping[bpy.data.materials.find(obj.data.materials[polygon.material_index].name)]
-				else:
-					matIndex = 0
+		# If there are bones with the same name the first one is used
+		boneIndexFromName = {}
+		for k, bone in enumerate(allbones):
+			boneIndexFromName.setdefault(bone.name, k)
+
+		# Every (vertex, bone, weight) membership of every mesh
+		membershipVertices = []
+		membershipBones = []
+		membershipWeights = []
+
+		for objIndex, obj in enumerate(meshObjects):
+			# Vertex group index -> bone index. -1 if the vertex group is not for a bone
+			groupBones = [boneIndexFromName.get(vgroup.name, -1) for vgroup in obj.vertex_groups]
+
+			vertexOffset = objVertexOffsets[objIndex]
+			for j, vertex in enumerate(obj.data.vertices):
+				for g in vertex.groups:
+					membershipVertices.append(vertexOffset + j)
+					membershipBones.append(groupBones[g.group])
+					membershipWeights.append(g.weight)
+
+		boneIndices, boneWeights = selectBoneInfluences(np.array(membershipVertices, dtype=np.int64),
+			np.array(membershipBones, dtype=np.int64), np.array(membershipWeights, dtype=np.float64), originalVertexArraySize)
+
+	# Weld vertices
+
+	# Every triangle corner is turned into the values that would be written to the file for it.
+	# Corners with identical values share one vertex, so vertices are only split where the UV coordinates,
+	# normals, tangent direction or bone data actually differ.
+
+	cornerPositions = positions[cornerVertices].astype(np.float32) + np.float32(0.0) # + 0.0 turns -0.0 into 0.0
+	cornerNormals = packNormals(normals[cornerVertices])
+
+	key = [cornerPositions.view(np.uint32), cornerNormals[:, None]]
+
+	if exportTexCoords:
+		# Corners with no UV coordinates are written as 0
+		x = (np.clip(cornerUVs[:, 0], 0.0, 1.0) * 65535.0).astype(np.uint32)
+		y = (np.clip(1.0 - cornerUVs[:, 1], 0.0, 1.0) * 65535.0).astype(np.uint32)
+		cornerPackedUVs = np.where(cornerHasUV, x | (y << 16), 0).astype(np.uint32)
+		key.append(cornerPackedUVs[:, None])
+
+	if exportTangents:
+		# Tangents are averaged over the corners that share a vertex (below), so only the handedness
+		# is part of the key. Mirrored UVs still get their own vertex.
+		cornerTangentW = np.where(cornerBiTangentSigns == -1.0, 1 << 30, 3 << 30).astype(np.uint32)
+		key.append(cornerTangentW[:, None])
+
+	if exportBones:
+		key.append(boneIndices[cornerVertices].view(np.uint32))
+		key.append(boneWeights[cornerVertices].view(np.uint32))
+
+	# firstCorners: the first corner that uses each vertex
+	# indices: index into vertices for each triangle corner
+	firstCorners, indices = weldRows(np.concatenate(key, axis=1))
+	vertexCount = len(firstCorners)
+
+	print('Vertices: %d in blender, %d triangle corners, %d after welding' % (originalVertexArraySize, cornerCount, vertexCount))
+
+	positions = cornerPositions[firstCorners]
+	packedNormals = cornerNormals[firstCorners]
+	if exportTexCoords:
+		packedUVs = cornerPackedUVs[firstCorners]
+	if exportBones:
+		boneIndices = boneIndices[cornerVertices[firstCorners]]
+		boneWeights = boneWeights[cornerVertices[firstCorners]]
+
+	# Tangent depends on uv coords and is per-face. The value for each vertex is the average of its faces' tangents
+	if exportTangents:
+		tangents = np.zeros((vertexCount, 3))
+		for axis in range(3):
+			tangents[:, axis] = np.bincount(indices, weights=cornerTangents[:, axis], minlength=vertexCount)
+		tangents /= np.bincount(indices, minlength=vertexCount)[:, None]
+		packedTangents = packNormals(tangents) | cornerTangentW[firstCorners]
+
+	# Materials
 
-				if matIndex < 0:
-					print('polygon.material_index invalid')
-					continue
+	indexLists = [[] for i in range(len(materials))]
 
-				if len(polygon.vertices) == 4:
-					polygonIndices = [polygon.vertices[0], polygon.vertices[1], polygon.vertices[2], polygon.vertices[2], polygon.vertices[3], polygon.vertices[0]]
+	# Material of each triangle, -1 for triangles that are not exported
+	triangleMaterials = []
+	for mi, obj in enumerate(meshObjects):
+		polygonMaterialSlots = meshes[mi].polygonMaterialSlots[meshes[mi].trianglePolygons]
+
+		if len(obj.data.materials) > 0:
+			# Material slot -> index into materials
+			slotMaterials = np.empty(len(obj.data.materials), dtype=np.int64)
+			for slot, mat in enumerate(obj.data.materials):
+				if mat is None or mat.name not in materialsMapping:
+					print('Material slot ' + str(slot) + ' of ' + obj.name + ' is empty or invalid')
+					slotMaterials[slot] = -1
 				else:
-					polygonIndices = [polygon.vertices[0], polygon.vertices[1], polygon.vertices[2]]
+					slotMaterials[slot] = materialsMapping[mat.name]
 
-				for i in range(len(polygonIndices)):
-					indexLists[matIndex].append(indices[currentIndex+i])
+			# Blender uses the last slot if the index is too big
+			triangleMaterials.append(slotMaterials[np.minimum(polygonMaterialSlots, len(slotMaterials) - 1)])
+		else:
+			triangleMaterials.append(np.zeros(len(polygonMaterialSlots), dtype=np.int64))
 
+	triangleMaterials = np.concatenate(triangleMaterials + [np.zeros(0, dtype=np.int64)])
 
-				currentIndex += len(polygonIndices)
+	# Sort the triangles into materials (keeping their order within each material)
+	triangles = indices.reshape(-1, 3)
+	triangleOrder = np.argsort(triangleMaterials, kind='stable')
+	materialTriangleCounts = np.bincount(triangleMaterials[triangleMaterials >= 0], minlength=len(materials))
+	firstTriangle = np.count_nonzero(triangleMaterials < 0)
+	for i in range(len(materials)):
+		indexLists[i] = triangles[triangleOrder[firstTriangle:firstTriangle+materialTriangleCounts[i]]].reshape(-1)
+		firstTriangle += materialTriangleCounts[i]
 
 	totalIndices = 0
 	for i in indexLists:
 		totalIndices += len(i)
-	
-	if EXPORT_TANGENTS:
-		for v in vertices:
-			if v.tangentN != 0:
-				v.tangent = v.tangent / float(v.tangentN)
 
+	# Levels of detail
+
+	# Each level is a set of index lists (one per material) over the same vertices as the full model
+	lods = []
+
+	if len(lodLevels) > 0 and totalIndices > 0:
+		# Bounding sphere, used by the engine to choose the level of detail
+		p = positions.astype(np.float64)
+		boundsCentre = (p.min(axis=0) + p.max(axis=0)) * 0.5
+		boundsRadius = float(np.linalg.norm(p - boundsCentre, axis=1).max())
+
+		vertexWeights = None
+		if exportBones:
+			vertexWeights = np.zeros((vertexCount, max(len(allbones), 1)))
+			np.add.at(vertexWeights, (np.repeat(np.arange(vertexCount), 4), boneIndices.reshape(-1).astype(np.int64)),
+				boneWeights.reshape(-1) / 255.0)
+
+		lods = simplifyModel(positions, indexLists, lodLevels, lodMaxError * boundsRadius, vertexWeights, lodMaxBoneWeightChange)
+
+		print('LOD 0: %d triangles' % (totalIndices // 3))
+		for i, (lists, screenSize, error) in enumerate(lods, start=1):
+			triangleCount = sum(len(l) for l in lists) // 3
+			print('LOD %d: %d triangles (%.1f%%), error %.4g (%.2f%% of the radius), screen size < %g' % (i, triangleCount,
+				100.0 * triangleCount / (totalIndices // 3), error, 100.0 * error / boundsRadius if boundsRadius > 0 else 0.0, screenSize))
+		if len(lods) < len(lodLevels):
+			print('%d of %d levels of detail could not be simplified enough without exceeding LOD_MAX_ERROR' % (len(lodLevels) - len(lods), len(lodLevels)))
+
+	# Clusters
+
+	# The triangles of each material are split into clusters which are stored one after another
+	clusterLists = None
+
+	if clusterTriangles > 0 and totalIndices > 0:
+		clusterLists = [meshoptimise.buildClusters(l, positions, clusterTriangles) for l in indexLists]
+		indexLists = [np.concatenate(c + [np.zeros(0, dtype=np.int64)]) for c in clusterLists]
+
+	# Optimise for the vertex cache
+
+	if optimiseVertexCache and totalIndices > 0:
+		acmrBefore, atvrBefore = meshoptimise.vertexCacheStatistics(np.concatenate(indexLists), vertexCount, vertexCacheSize)
+
+		if clusterLists is not None:
+			# Triangles are only reordered within their cluster
+			for i, clusters in enumerate(clusterLists):
+				clusters = [meshoptimise.optimiseVertexCache(c, vertexCount, vertexCacheSize) for c in clusters]
+				if optimiseOverdraw:
+					clusters = meshoptimise.optimiseClusterOverdraw(clusters, positions)
+				clusterLists[i] = clusters
+				indexLists[i] = np.concatenate(clusters + [np.zeros(0, dtype=np.int64)])
+
+		for lists in ([] if clusterLists is not None else [indexLists]) + [lod[0] for lod in lods]:
+			for i in range(len(lists)):
+				lists[i] = meshoptimise.optimiseVertexCache(lists[i], vertexCount, vertexCacheSize)
+				if optimiseOverdraw:
+					lists[i] = meshoptimise.optimiseOverdraw(lists[i], positions, vertexCacheSize, overdrawThreshold)
+
+		acmrAfter, atvrAfter = meshoptimise.vertexCacheStatistics(np.concatenate(indexLists), vertexCount, vertexCacheSize)
+		print('Vertex cache (%d entries): ACMR %.3f -> %.3f, ATVR %.3f -> %.3f' % (vertexCacheSize, acmrBefore, acmrAfter, atvrBefore, atvrAfter))
+
+		# Put the vertices in the order that they are first used in (by the full model, then by the levels of detail)
+
+		order = meshoptimise.vertexFetchOrder(np.concatenate(indexLists + [l for lod in lods for l in lod[0]]), vertexCount)
+		remap = np.empty_like(order)
+		remap[order] = np.arange(vertexCount)
+		indexLists = [remap[l] for l in indexLists]
+		lods = [([remap[l] for l in lists], screenSize, error) for lists, screenSize, error in lods]
+		if clusterLists is not None:
+			clusterLists = [[remap[c] for c in clusters] for clusters in clusterLists]
+
+		positions = positions[order]
+		packedNormals = packedNormals[order]
+		if exportTexCoords:
+			packedUVs = packedUVs[order]
+		if exportBones:
+			boneIndices = boneIndices[order]
+			boneWeights = boneWeights[order]
+		if exportTangents:
+			packedTangents = packedTangents[order]
 
 
 	# Write file
-	
-	file = open(EXPORT_FILE, 'wb')
+
+	# Index ranges
+
+	# Models with more than 65536 vertices are split into blocks of vertices so that their indices can be 16-bit offsets
+	# from the start of a block (see docs/model file format.md). Vertices used by more than one block are copied.
+	indexRanges = None
+
+	if vertexCount > 65536 and totalIndices > 0:
+		# The full model keeps its triangle order (clusters and vertex cache order). Levels of detail use the vertices of the
+		# full model where they can.
+		lodLists = [l for lod in lods for l in lod[0]]
+		order, newLists, indexRanges = meshoptimise.splitIndexRanges(indexLists + lodLists,
+			[False] * len(indexLists) + [True] * len(lodLists), vertexCount)
+
+		# The copies must take less space than is saved by using 16-bit indices
+		vertexSize = (12, 8, 4)[(0, 16, 10).index(positionBits)] + 4 * (1 + exportTexCoords + 2 * exportBones + exportTangents)
+		indexCount = sum(len(l) for l in newLists)
+		if (len(order) - vertexCount) * vertexSize >= indexCount * 2:
+			print('Indices: 32-bit (16-bit indices would need %d copies of vertices)' % (len(order) - vertexCount))
+			indexRanges = None
+		else:
+			print('Indices: 16-bit in %d ranges, %d vertices after copying vertices used by more than one range' % (len(indexRanges),
+				len(order)))
+
+	if indexRanges is not None:
+		# Vertex index of each index (base vertex + index) for the cluster bounds
+		if clusterLists is not None:
+			rangeStarts = np.array([r[0] for r in indexRanges])
+			baseVertices = np.array([r[2] for r in indexRanges])
+			regionStart = 0
+			for i, clusters in enumerate(clusterLists):
+				n = len(newLists[i])
+				vertexIndices = newLists[i] + baseVertices[np.searchsorted(rangeStarts, regionStart + np.arange(n), side='right') - 1]
+				clusterLists[i] = np.split(vertexIndices, np.cumsum([len(c) for c in clusters])[:-1])
+				regionStart += n
+
+		indexLists = newLists[:len(indexLists)]
+		newLodLists = newLists[len(indexLists):]
+		lods = [([newLodLists.pop(0) for _ in lists], screenSize, error) for lists, screenSize, error in lods]
+
+		vertexCount = len(order)
+		positions = positions[order]
+		packedNormals = packedNormals[order]
+		if exportTexCoords:
+			packedUVs = packedUVs[order]
+		if exportBones:
+			boneIndices = boneIndices[order]
+			boneWeights = boneWeights[order]
+		if exportTangents:
+			packedTangents = packedTangents[order]
+
+	# The levels of detail are stored after the full model in the index data
+	lodIndexLists = [l for lod in lods for l in lod[0]]
+	allIndices = np.concatenate(indexLists + lodIndexLists + [np.zeros(0, dtype=np.int64)])
+
+	if positionBits != 0:
+		quantisedPositions, positionOffset, positionScale = quantisePositions(positions, positionBits)
+		positionColumns = quantisedPositions
+	else:
+		positionColumns = np.ascontiguousarray(positions, dtype='<f4').view('<u4')
+
+	# Depth vertices
+
+	# Shadow maps only need the positions (and bones), so vertices that are only different in their other attributes (normals
+	# and texture coordinates at hard edges and seams) are merged. The depth indices draw the same triangles in the same order.
+	depthVertexData = None
+
+	if depthVertices and len(allIndices) > 0:
+		depthColumns = [positionColumns]
+		if exportBones:
+			depthColumns.append(np.ascontiguousarray(boneIndices).view('<u4'))
+			depthColumns.append(np.ascontiguousarray(boneWeights).view('<u4'))
+		depthRows = np.hstack(depthColumns)
+
+		vertexIndices = allIndices
+		if indexRanges is not None:
+			rangeStarts = np.array([r[0] for r in indexRanges])
+			baseVertices = np.array([r[2] for r in indexRanges])
+			vertexIndices = allIndices + baseVertices[np.searchsorted(rangeStarts, np.arange(len(allIndices)), side='right') - 1]
+
+		usedVertices, usedIndices = np.unique(vertexIndices, return_inverse=True)
+		firstRows, weldedIndices = weldRows(depthRows[usedVertices])
+		depthIndices = weldedIndices[usedIndices]
+
+		# In the order that they are first used in, like the vertices
+		order = meshoptimise.vertexFetchOrder(depthIndices, len(firstRows))
+		remap = np.empty_like(order)
+		remap[order] = np.arange(len(order))
+		depthIndices = remap[depthIndices]
+		depthVertexData = depthRows[usedVertices[firstRows[order]]]
+
+		print('Depth vertices: %d (%d vertices)' % (len(depthVertexData), vertexCount))
 
 	# Write magic
 
@@ -272,166 +659,95 @@ def main():
 
 	# Write number of indices
 
-	writeDWord(file, totalIndices)
+	writeDWord(file, totalIndices + sum(len(l) for l in lodIndexLists))
 
 
 	# Specify vertex components
 
 	attribs = 1 | (1 << 3)
 
-	if EXPORT_TEX_COORDS:
+	if exportTexCoords:
 		attribs = attribs | (1 << 2)
-	
-	if EXPORT_BONES:
+
+	if exportBones:
 		attribs = attribs | (1 << 4)
 		attribs = attribs | (1 << 5)
 
-	if EXPORT_TANGENTS:
+	if exportTangents:
 		attribs = attribs | (1 << 6)
-				
+
+	# Position format
+	if positionBits == 16:
+		attribs = attribs | (1 << 8)
+	elif positionBits == 10:
+		attribs = attribs | (2 << 8)
+
+	if len(lods) > 0:
+		attribs = attribs | (1 << 10)
+
+	if clusterLists is not None:
+		attribs = attribs | (1 << 11)
+
+	if indexRanges is not None:
+		attribs = attribs | (1 << 12)
+
+	if depthVertexData is not None:
+		attribs = attribs | (1 << 13)
+
 	writeDWord(file, attribs)
-		
-	writeDWord(file, 0) # Not interleaved
-		
-	writeDWord(file, len(vertices))
+
+	writeDWord(file, 1 if exportInterleaved else 0)
+
+	writeDWord(file, vertexCount)
+
+	if positionBits != 0:
+		writeFloat(file, positionOffset[0])
+		writeFloat(file, positionOffset[1])
+		writeFloat(file, positionOffset[2])
+		writeFloat(file, positionScale)
 
 
 
 	# Write Vertices
-	
-	# All vertex attributes are stored in seperate arrays
-
-	# TODO: Store vertex positions as 32-bit unsigned normalised integers and shrink the model down (doesn't need to stay in proportion)
-	# and translate it to fit in the 1x1x1 box. then store the models scale and offset in the file to be used in the 
-	# transformation matrix.
-	# ^ actually that might mess up bone deformation
-			
-	for vertex in vertices:
-		# loc = switchCoordSystem(vertex.co)
-		loc = switchCoordSystem(vertex.obj.matrix_world @ vertex.co)
-		for i in range(3):
-			writeFloat(file, loc[i])
-		
-	if EXPORT_TEX_COORDS:
-		for vertex in vertices:		
-			if vertex.uv is None:
-				writeDWord(file, 0)
-			else:
-				x = int(max(min(vertex.uv[0], 1.0), 0.0) * 65535.0)
-				writeWord(file, x, False)
-				
-				y = int(max(min(1.0 - vertex.uv[1], 1.0), 0.0) * 65535.0)
-				writeWord(file, y, False)
-				
-	
-	for vertex in vertices:
-		# normals = switchCoordSystem(vertex.normal)
-		normals = switchCoordSystem(vertex.obj.matrix_world @ vertex.normal)
-		
-		nx = int(normals[2] * 511.0)
-		ny = int(normals[1] * 511.0)
-		nz = int(normals[0] * 511.0)
-		
-		x = (nz & 1023) | ((ny & 1023) << 10) | ((nx & 1023) << 20)
-		writeDWord(file, x)	
-
-	if EXPORT_BONES:
-		# Bone Weights
 
-		allbones = []
-		allbones_objects = []
-		
-		for o in bpy.data.objects:
-			if hasattr(o.data, 'bones') and hasattr(o, 'pose') and o.pose != None:
-				for b in o.data.bones:
-					allbones.append(b)
-					allbones_objects.append(o)
-		
-		
-		boneIndices = [[0,0,0,0] for i in range(len(vertices))]
-		boneWeights = [[0.0,0.0,0.0,0.0] for i in range(len(boneIndices))]
-		
-		def findIndexOfBone(allbones, name):
-			k = 0
-			for bone in allbones:
-				if bone.name == name:
-					return k
-				k += 1
-			return -1
-				
-				
-		objIndex = 0
-		for obj in bpy.data.objects:
-			if hasattr(obj.data, 'polygons'):
-				for j in range(len(obj.data.vertices)):
-					k = 0
-					for vgroup in obj.vertex_groups:
-						try:
-							weight = vgroup.weight(j)
-							if weight > 0.0:
-								# TODO pick 4 most significant weights (and order from biggest to smallest influence)
-								boneIndices[objVertexOffsets[objIndex] + j][k] = findIndexOfBone(allbones, vgroup.name)
-								boneWeights[objVertexOffsets[objIndex] + j][k] = weight
-								k += 1
-								if k >= 4:
-									break
-						except:
-							pass
-				objIndex += 1
-				
-		for i in range(len(newVerticies_listIndex)):
-			boneIndices[newVerticies_listIndex[i]] = boneIndices[newVertices_originalVertexIndex[i]]
-			boneWeights[newVerticies_listIndex[i]] = boneWeights[newVertices_originalVertexIndex[i]]
-	
-		for i in boneIndices:
-			for j in i:
-				writeByte(file, j)
-			
-		for i in boneWeights:
-			sum = i[0] + i[1] + i[2] + i[3]
-			multiplier = 1.0 / sum
-			for j in i:
-				writeByte(file, int((j*multiplier) * 255.0))
-	
-
-	if EXPORT_TANGENTS:		
-		for vertex in vertices:
-			# tangent = switchCoordSystem(vertex.tangent)
-			tangent = switchCoordSystem(vertex.obj.matrix_world @ vertex.tangent)
-			
-			tx = int(tangent[2] * 511.0)
-			ty = int(tangent[1] * 511.0)
-			tz = int(tangent[0] * 511.0)
-			
-			if vertex.biTangentMul == -1.0:
-				w = 1 << 30
-			else:
-				w = 3 << 30
-			
-			
-			x = (tz & 1023) | ((ty & 1023) << 10) | ((tx & 1023) << 20) | w
-			writeDWord(file, x)
-		
-
-			
+	# Each attribute as u32 columns, in the order of the attribute bits
+
+	attributeColumns = [positionColumns]
+
+	if exportTexCoords:
+		attributeColumns.append(packedUVs.astype('<u4').reshape(-1, 1))
+
+	attributeColumns.append(packedNormals.astype('<u4').reshape(-1, 1))
+
+	if exportBones:
+		attributeColumns.append(np.ascontiguousarray(boneIndices).view('<u4'))
+		attributeColumns.append(np.ascontiguousarray(boneWeights).view('<u4'))
+
+	if exportTangents:
+		attributeColumns.append(packedTangents.astype('<u4').reshape(-1, 1))
+
+	if exportInterleaved:
+		# All attributes of a vertex are stored together
+		file.write(np.hstack(attributeColumns).tobytes())
+	else:
+		# All vertex attributes are stored in seperate arrays
+		for a in attributeColumns:
+			file.write(a.tobytes())
+
+
+
 	# Write Indices
-	
-	if len(vertices) <= 65536:
-		totalLen = 0
-		for j in indexLists:
-			for i in j:
-				writeWord(file, i)
-			totalLen += len(j)
-		if totalLen % 2 != 0:
+
+	if vertexCount <= 65536 or indexRanges is not None:
+		file.write(allIndices.astype('<u2').tobytes())
+		if len(allIndices) % 2 != 0:
 			writeWord(file, 0)
 	else:
-		for j in indexLists:
-			for i in j:
-				writeDWord(file, i)
+		file.write(allIndices.astype('<u4').tobytes())
 
 
 	# Write materials
-	
+
 	writeDWord(file, len(materials))
 
 	indexStart = 0
@@ -442,46 +758,255 @@ def main():
 		writeFloat(file, mat.diffuse_color[0])
 		writeFloat(file, mat.diffuse_color[1])
 		writeFloat(file, mat.diffuse_color[2])
-		
+
 		writeUTF8(file, mat.name)
-	
-	if EXPORT_BONES and len(allbones) > 0:
-		
+
+	if exportBones and len(allbones) > 0:
+
+		# Bones are in the same space as the vertices
+		boneSpace = meshObjects[0].matrix_world.inverted() if localSpace else mathutils.Matrix()
+
 		writeDWord(file, len(allbones))
 		i = 0
 		for b in allbones:
 			# Position around which the vertices rotate
-			head = allbones_objects[i].matrix_world @ b.head_local
+			head = boneSpace @ allbones_objects[i].matrix_world @ b.head_local
 			switchCoordSystem(head)
-			
+
 			# End of bone
-			tail = allbones_objects[i].matrix_world @ b.tail_local
+			tail = boneSpace @ allbones_objects[i].matrix_world @ b.tail_local
 			switchCoordSystem(tail)
-			
+
 			for i in range(3):
 				writeFloat(file, head[i])
 			for i in range(3):
 				writeFloat(file, tail[i])
-			
+
 			# Bone parent index
 			if b.parent is None:
 				writeDWord(file, -1, True)
 			else:
 				index = allbones.index(b.parent)
 				writeDWord(file, index, True)
-			
-				
+
+
 			writeUTF8(file, b.name)
-			
+
 			i += 1
 
-		
+
 	else:
 		writeDWord(file, 0)
 
+	# Write levels of detail
+
+	if len(lods) > 0:
+		writeDWord(file, len(lods))
+
+		for i in range(3):
+			writeFloat(file, boundsCentre[i])
+		writeFloat(file, boundsRadius)
+
+		for lists, screenSize, error in lods:
+			writeFloat(file, screenSize)
+			writeFloat(file, error)
+
+			# Same regions as the materials
+			for l in lists:
+				writeDWord(file, indexStart)
+				writeDWord(file, len(l))
+				indexStart += len(l)
+
+	# Write clusters
+
+	if clusterLists is not None:
+		clusters = [c for clusters in clusterLists for c in clusters]
+		bounds = meshoptimise.clusterBounds(clusters, positions)
+
+		writeDWord(file, len(clusters))
+
+		indexStart = 0
+		for c, b in zip(clusters, bounds):
+			writeDWord(file, indexStart)
+			writeDWord(file, len(c))
+			indexStart += len(c)
+			file.write(b.astype('<f4').tobytes())
+
+		print('Clusters: %d, %.1f triangles and %.1f vertices on average, %.0f%% have normal cones' % (len(clusters),
+			totalIndices / 3 / len(clusters), np.mean([len(np.unique(c)) for c in clusters]),
+			100.0 * np.count_nonzero(bounds[:, 13] < 1.0) / len(clusters)))
+
+	# Write index ranges
+
+	if indexRanges is not None:
+		writeDWord(file, len(indexRanges))
+		for first, count, baseVertex in indexRanges:
+			writeDWord(file, first)
+			writeDWord(file, count)
+			writeDWord(file, baseVertex)
+
+	# Write depth vertices
+
+	if depthVertexData is not None:
+		writeDWord(file, len(depthVertexData))
+		file.write(depthVertexData.tobytes())
+
+		if len(depthVertexData) <= 65536:
+			file.write(depthIndices.astype('<u2').tobytes())
+			if len(depthIndices) % 2 != 0:
+				writeWord(file, 0)
+		else:
+			file.write(depthIndices.astype('<u4').tobytes())
+
+# Hash of the data of a mesh object that affects the .model file
+def meshObjectHash(obj, m, exportBones):
+	values = [[None if mat is None else mat.name for mat in obj.data.materials], m.positions, m.normals, m.polygonMaterialSlots,
+		m.trianglePolygons, m.cornerVertices, m.cornerUVs, m.cornerTangents, m.cornerBiTangentSigns]
+
+	if exportBones:
+		values.append([vgroup.name for vgroup in obj.vertex_groups])
+		values.append([[(g.group, g.weight) for g in vertex.groups] for vertex in obj.data.vertices])
+
+	return exportcache.hashValues(*values)
+
+# Hash of the data that affects the .model files but is not part of a mesh object (materials and bones)
+def sharedDataHash(exportBones):
+	values = [[(m.name, tuple(m.diffuse_color)) for m in bpy.data.materials]]
+
+	if exportBones:
+		for o in bpy.data.objects:
+			if hasattr(o.data, 'bones') and hasattr(o, 'pose') and o.pose != None:
+				for b in o.data.bones:
+					values.append((b.name, tuple(o.matrix_world @ b.head_local), tuple(o.matrix_world @ b.tail_local),
+						None if b.parent is None else b.parent.name))
+
+	return exportcache.hashValues(*values)
+
+# Exports all mesh objects in the open blend file to one .model file
+# If exportFile is '' the blend file name is used with '.blend' changed to '.model'
+# If separateObjects is True each object is exported to its own file in the exportFile directory instead
+# ('' is the directory of the blend file), in the object's local space. Objects with the same geometry share a file.
+# With separateObjects, static objects are merged into chunks (in world space) if staticBatchCellSize is not 0
+# The settings are the same as the configuration at the top of this file, which they default to
+# Returns False if the model could not be exported
+def exportModel(exportFile, exportBones=EXPORT_BONES, exportTexCoords=EXPORT_TEX_COORDS, exportInterleaved=EXPORT_INTERLEAVED,
+		exportTangents=EXPORT_TANGENTS, positionBits=QUANTISE_POSITIONS, optimiseVertexCache=OPTIMISE_VERTEX_CACHE,
+		optimiseOverdraw=OPTIMISE_OVERDRAW, vertexCacheSize=VERTEX_CACHE_SIZE, overdrawThreshold=OVERDRAW_THRESHOLD,
+		compress=COMPRESS, compressionLevel=COMPRESSION_LEVEL, compressionThreads=COMPRESSION_THREADS,
+		separateObjects=SEPARATE_OBJECTS, cacheDirectory=CACHE_DIRECTORY, cacheSizeLimit=CACHE_SIZE_LIMIT, lodLevels=LOD_LEVELS,
+		lodMaxError=LOD_MAX_ERROR, lodMaxBoneWeightChange=LOD_MAX_BONE_WEIGHT_CHANGE, clusterTriangles=CLUSTER_TRIANGLES,
+		depthVertices=DEPTH_VERTICES, staticBatchCellSize=STATIC_BATCH_CELL_SIZE, textureAtlasSize=TEXTURE_ATLAS_SIZE,
+		textureAtlasPadding=TEXTURE_ATLAS_PADDING):
+	if exportTangents and not exportTexCoords:
+		print('Tangents can only be exported with texture coordinates')
+		return False
+
+	if textureAtlasSize > 0 and not exportTexCoords:
+		print('Texture atlases can only be used with texture coordinates')
+		return False
+
+	if positionBits not in (0, 16, 10):
+		print('Positions must be quantised to 0 (not quantised), 16 or 10 bits')
+		return False
+
+	for i, (ratio, screenSize) in enumerate(lodLevels):
+		if not 0 < ratio < 1 or screenSize <= 0 or (i > 0 and (ratio >= lodLevels[i-1][0] or screenSize >= lodLevels[i-1][1])):
+			print('Levels of detail must have fewer triangles and smaller screen sizes than the level before them')
+			return False
+
+	# EXECUTION BEGINS
+
+	if exportFile == '':
+		if separateObjects:
+			exportFile = os.path.dirname(bpy.data.filepath)
+		else:
+			exportFile = os.path.splitext(bpy.data.filepath)[0] + '.model'
+
+	# Get vertices and indices
+
+	meshObjects = [obj for obj in bpy.data.objects if hasattr(obj.data, 'polygons')]
+
+	chunks = []
+	if separateObjects:
+		chunks, unmergedObjects = staticbatch.buildChunks(meshObjects, staticBatchCellSize)
+		staticbatch.printStatistics(chunks, unmergedObjects, staticBatchCellSize)
+
+	# Objects in chunks are in world space
+	mergedObjects = set(obj.name for _, group in chunks for obj in group)
+
+	# Same atlases as blender-export-scene.py
+	atlases = textureatlas.buildAtlases(bpy.data.materials, meshObjects, textureAtlasSize, textureAtlasPadding)
+	if textureAtlasSize > 0:
+		textureatlas.printStatistics(atlases)
+
+	meshes = []
+	for obj in meshObjects:
+		m = readMeshArrays(obj, exportTangents, separateObjects and obj.name not in mergedObjects)
+		if m is None:
+			print('Only triangles and quadrilaterals are supported. Triangulate the mesh(es).')
+			return False
+		meshes.append(m)
+
+	# Output files and the objects in them
+
+	if separateObjects:
+		# Objects with the same geometry use one model in scenes (see meshinstances.py and blender-export-scene.py)
+		outputs = []
+		for name, group in chunks:
+			outputs.append((os.path.join(exportFile, name + '.model'), group, [meshes[meshObjects.index(obj)] for obj in group], False))
+		for name, instances in meshinstances.groupInstances(unmergedObjects):
+			obj = instances[0]
+			outputs.append((os.path.join(exportFile, name + '.model'), [obj], [meshes[meshObjects.index(obj)]], True))
+	else:
+		outputs = [(exportFile, meshObjects, meshes, False)]
+
+	# Files are reused from the cache if the objects in them, the materials, the bones and the settings are unchanged
+
+	cache = None
+	if cacheDirectory != '':
+		cache = exportcache.ExportCache(cacheDirectory, cacheSizeLimit * 1024 * 1024)
+
+		# Compression threads do not matter, the file is valid either way
+		settingsHash = exportcache.hashValues(exportcache.hashFiles([__file__, meshoptimise.__file__, meshsimplify.__file__,
+			meshinstances.__file__, staticbatch.__file__, textureatlas.__file__, compressedfile.__file__]), exportBones, exportTexCoords, exportInterleaved, exportTangents, positionBits, optimiseVertexCache,
+			optimiseOverdraw, vertexCacheSize, overdrawThreshold, compress, compressionLevel, lodLevels, lodMaxError,
+			lodMaxBoneWeightChange, clusterTriangles, depthVertices, textureatlas.layoutHash(atlases), sharedDataHash(exportBones))
+
+		objectHashes = {obj.name: meshObjectHash(obj, m, exportBones) for obj, m in zip(meshObjects, meshes)}
+
+		# Bones are moved into the object's local space
+		if separateObjects and exportBones:
+			for obj in unmergedObjects:
+				objectHashes[obj.name] = exportcache.hashValues(objectHashes[obj.name], [list(row) for row in obj.matrix_world])
+
+	for path, objects, objectMeshes, localSpace in outputs:
+		print('Exporting ' + path)
+
+		data = None
+		if cache is not None:
+			key = exportcache.hashValues(settingsHash, [objectHashes[obj.name] for obj in objects])
+			data = cache.get(key)
+
+		if data is None:
+			# If compressing, the file is kept in memory and compressed when it is closed
+			file = compressedfile.openOutputFile(path, compress, compressionLevel, compressionThreads)
+			writeModel(file, objects, objectMeshes, exportBones, exportTexCoords, exportInterleaved, exportTangents, positionBits,
+				optimiseVertexCache, optimiseOverdraw, vertexCacheSize, overdrawThreshold, lodLevels, lodMaxError, lodMaxBoneWeightChange,
+				clusterTriangles, depthVertices, localSpace, atlases)
+			file.close()
+
+			if cache is not None:
+				cache.put(key, file.data)
+		else:
+			compressedfile.writeFileIfChanged(compressedfile.outputPath(path, compress), data)
+
+	if cache is not None:
+		cache.finish()
+
 	print('Mesh export complete')
+	return True
 
-main()
 
-if file != None:
-	file.close()
+# Run from the Blender text editor or with blender --python. Not run when imported by batch-export.py
+if __name__ == '__main__':
+	exportModel(EXPORT_FILE)
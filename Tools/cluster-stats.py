@@ -0,0 +1,173 @@
+# PRINTS STATISTICS ABOUT THE CLUSTERS AND LEVELS OF DETAIL OF .MODEL FILES (SEE CLUSTER_TRIANGLES AND LOD_LEVELS IN blender-export.py)
+# RUN WITH PYTHON 3 (NOT FROM BLENDER): python cluster-stats.py FarmStatic.model.compressed [more files] [--views N]
+# READING *.compressed FILES REQUIRES THE zstandard MODULE (SEE compressedfile.py). THE FILES ARE READ WITH assetfiles.py
+
+# The culling estimates use the same tests as MeshRenderer.zig: the normal cone test for random view directions
+# (as in the shadow pass of directional lights), and the view frustum and normal cone tests for random cameras inside the
+# model's bounding box (for large models like scenes that are seen from the inside).
+
+import argparse
+import math
+import os
+import sys
+
+import numpy as np
+
+# assetfiles.py is in the same directory as this script
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import assetfiles
+
+# Same as the projection in RTRenderEngine.zig
+FIELD_OF_VIEW = 30.0 # Degrees, vertical
+ASPECT_RATIO = 16.0 / 9.0
+
+class ModelClusters:
+	pass
+
+# Reads the parts of a .model file that are needed for the statistics
+def readModel(path):
+	model = assetfiles.read(path)
+	if not isinstance(model, assetfiles.Model):
+		raise ValueError('Not a .model file')
+
+	m = ModelClusters()
+	m.indices = model.vertexIndices() if model.indexCount > 0 else np.zeros(0, dtype=np.int64)
+	m.regions = [(r.firstIndex, r.count) for r in model.regions]
+
+	# (screen size, error, regions) for each level
+	m.lods = [(lod.screenSize, lod.error, [tuple(r) for r in lod.regions.tolist()]) for lod in model.lods]
+
+	c = model.clusters
+	m.clusterRanges = np.stack((c['firstIndex'], c['indexCount']), axis=1).astype(np.int64)
+	m.clusterBounds = np.hstack((c['sphereCentre'], c['sphereRadius'][:, None], c['boxMin'], c['boxMax'], c['coneAxis'],
+		c['coneCutoff'][:, None])).astype(np.float64)
+	return m
+
+# Clusters that are not culled by the normal cone test, for a camera at position (perspective) or looking in direction
+# (orthographic). bounds: the bounds of the clusters as in the file (sphere, box minimum, box maximum, cone axis, cutoff)
+def coneVisible(bounds, position=None, direction=None):
+	axes = bounds[:, 10:13]
+	cutoffs = bounds[:, 13]
+	if direction is not None:
+		return axes @ direction < cutoffs
+
+	v = bounds[:, 0:3] - position
+	return np.einsum('ij,ij->i', v, axes) < cutoffs * np.linalg.norm(v, axis=1) + bounds[:, 3]
+
+# Clusters whose bounding spheres are (at least partly) inside the view frustum
+def frustumVisible(bounds, position, forward, up):
+	right = np.cross(forward, up)
+	right /= np.linalg.norm(right)
+	up = np.cross(right, forward)
+
+	v = bounds[:, 0:3] - position
+	radii = bounds[:, 3]
+
+	tanY = math.tan(math.radians(FIELD_OF_VIEW) * 0.5)
+	tanX = tanY * ASPECT_RATIO
+
+	visible = np.ones(len(bounds), dtype=bool)
+	for side, tangent in ((right, tanX), (up, tanY)):
+		for sign in (1.0, -1.0):
+			# Plane through the camera, normal pointing into the frustum
+			normal = forward * tangent - sign * side
+			normal /= np.linalg.norm(normal)
+			visible &= v @ normal > -radii
+	return visible
+
+# Number of draw calls when consecutive visible clusters are drawn together
+def drawCalls(ranges, visible):
+	runs = 0
+	previousEnd = -1
+	for (first, count), v in zip(ranges.tolist(), visible.tolist()):
+		if v:
+			if first != previousEnd:
+				runs += 1
+			previousEnd = first + count
+	return runs
+
+def randomDirections(rng, n):
+	d = rng.normal(size=(n, 3))
+	return d / np.linalg.norm(d, axis=1, keepdims=True)
+
+def printStatistics(path, views):
+	m = readModel(path)
+	print(path)
+
+	triangleCount = sum(count for _, count in m.regions) // 3
+	print('  Triangles: %d, %d materials' % (triangleCount, len(m.regions)))
+
+	for i, (screenSize, error, regions) in enumerate(m.lods, start=1):
+		lodTriangles = sum(count for _, count in regions) // 3
+		print('  LOD %d: %d triangles (%.1f%%), error %.4g, screen size < %g' % (i, lodTriangles,
+			100.0 * lodTriangles / max(triangleCount, 1), error, screenSize))
+
+	clusterCount = len(m.clusterRanges)
+	if clusterCount == 0:
+		print('  No clusters')
+		return
+
+	bounds = m.clusterBounds
+	clusterTriangles = m.clusterRanges[:, 1] // 3
+	clusterVertices = np.array([len(np.unique(m.indices[first:first+count])) for first, count in m.clusterRanges.tolist()])
+
+	boxMin = bounds[:, 4:7].min(axis=0)
+	boxMax = bounds[:, 7:10].max(axis=0)
+	modelSize = float(np.linalg.norm(boxMax - boxMin))
+
+	print('  Clusters: %d' % clusterCount)
+	print('  Triangles per cluster: min %d, mean %.1f, max %d' % (clusterTriangles.min(), clusterTriangles.mean(), clusterTriangles.max()))
+	print('  Vertices per cluster: min %d, mean %.1f, max %d' % (clusterVertices.min(), clusterVertices.mean(), clusterVertices.max()))
+	if modelSize > 0:
+		print('  Bounding sphere radius: mean %.2f%%, max %.2f%% of the model size' % (100.0 * bounds[:, 3].mean() / modelSize,
+			100.0 * bounds[:, 3].max() / modelSize))
+
+	# The cutoff is the sine of the biggest angle between the axis and a triangle normal
+	hasCone = bounds[:, 13] < 1.0
+	report = '  Normal cones: %.1f%% of clusters' % (100.0 * np.count_nonzero(hasCone) / clusterCount)
+	if np.any(hasCone):
+		report += ', mean half angle %.1f degrees' % np.degrees(np.arcsin(bounds[hasCone, 13])).mean()
+	print(report)
+
+	rng = np.random.default_rng(0)
+
+	# Directional light shadow pass
+	culledClusters = []
+	culledTriangles = []
+	for d in randomDirections(rng, views):
+		visible = coneVisible(bounds, direction=d)
+		culledClusters.append(1.0 - np.count_nonzero(visible) / clusterCount)
+		culledTriangles.append(1.0 - clusterTriangles[visible].sum() / max(clusterTriangles.sum(), 1))
+	print('  Back-facing, %d view directions: %.1f%% of clusters, %.1f%% of triangles' % (views, 100.0 * np.mean(culledClusters),
+		100.0 * np.mean(culledTriangles)))
+
+	# Cameras inside the model
+	culledClusters = []
+	culledTriangles = []
+	calls = []
+	for d in randomDirections(rng, views):
+		position = boxMin + rng.uniform(size=3) * (boxMax - boxMin)
+		up = np.array([0.0, 1.0, 0.0]) if abs(d[1]) < 0.99 else np.array([1.0, 0.0, 0.0])
+		visible = frustumVisible(bounds, position, d, up) & coneVisible(bounds, position=position)
+		culledClusters.append(1.0 - np.count_nonzero(visible) / clusterCount)
+		culledTriangles.append(1.0 - clusterTriangles[visible].sum() / max(clusterTriangles.sum(), 1))
+		calls.append(drawCalls(m.clusterRanges, visible))
+	print('  Outside the view or back-facing, %d cameras inside the model: %.1f%% of clusters, %.1f%% of triangles, %.1f draw calls'
+		% (views, 100.0 * np.mean(culledClusters), 100.0 * np.mean(culledTriangles), np.mean(calls)))
+
+def main():
+	parser = argparse.ArgumentParser(description='Print statistics about the clusters and levels of detail of .model files')
+	parser.add_argument('files', nargs='+', help='.model or .model.compressed files')
+	parser.add_argument('--views', type=int, default=256, help='number of random views for the culling estimates (default: 256)')
+	args = parser.parse_args()
+
+	for path in args.files:
+		try:
+			printStatistics(path, args.views)
+		except (OSError, ValueError) as e:
+			print(path + ': ' + str(e))
+			return 1
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
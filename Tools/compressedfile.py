@@ -0,0 +1,108 @@
+# WRITES THE OUTPUT FILES OF THE EXPORT SCRIPTS, COMPRESSED (SEE docs/zstd compressed file format.md) OR NOT, AND READS THEM BACK.
+# DOES NOT DEPEND ON BLENDER. KEEP THIS FILE IN THE SAME DIRECTORY AS THE EXPORT SCRIPTS.
+
+# COMPRESSION REQUIRES THE zstandard MODULE. TO INSTALL IT FOR BLENDER'S PYTHON:
+#	<blender python executable> -m ensurepip
+#	<blender python executable> -m pip install zstandard
+
+import io
+import os
+import struct
+
+MAGIC = bytes([0x88, 0x7c, 0x77, 0x6a, 0xee, 0x55, 0xdd, 0xcc, 0x37, 0x9a, 0x8b, 0xef])
+
+DEFAULT_LEVEL = 22 # Same as compress-file (src/Compress/CompressApp.zig)
+
+# Returns the data in the *.compressed container format or None if the compressed data would be bigger than the original
+# threads: number of compression threads, -1 uses all CPU cores, 0 compresses on the calling thread
+def compress(data, level=DEFAULT_LEVEL, threads=-1):
+	import zstandard
+
+	if len(data) == 0:
+		return None
+
+	compressed = zstandard.ZstdCompressor(level=level, threads=threads).compress(data)
+
+	# Same rule as compress-file
+	if len(compressed) >= len(data):
+		return None
+
+	return MAGIC + struct.pack('<I', len(data)) + compressed
+
+# Returns the path of the output file. If compressed is True, '.compressed' is appended to the path (if not already there)
+def outputPath(path, compressed):
+	if compressed and not path.endswith('.compressed'):
+		path += '.compressed'
+	return path
+
+# Returns the bytes to write to a (*.compressed) output file
+# If compressing does not make the data smaller the data is returned uncompressed (the engine loads both)
+def outputData(path, data, compressed, level=DEFAULT_LEVEL, threads=-1):
+	if not compressed:
+		return data
+
+	compressedData = compress(data, level, threads)
+	if compressedData is None:
+		print(path + ': Compressed data would be bigger than the original. Writing uncompressed data.')
+		return data
+
+	print(path + ': ' + str(len(data)) + ' -> ' + str(len(compressedData)) + ' bytes')
+	return compressedData
+
+# Writes data to path unless the file already contains exactly that data
+# Unchanged files keep their modification time so that later build steps can skip them
+# Returns True if the file was written
+def writeFileIfChanged(path, data):
+	try:
+		if os.path.getsize(path) == len(data):
+			with open(path, 'rb') as f:
+				if f.read() == data:
+					print(path + ': unchanged')
+					return False
+	except OSError:
+		pass
+
+	with open(path, 'wb') as f:
+		f.write(data)
+	return True
+
+# Returns the contents of a file that may be in the *.compressed container format, decompressed
+# Raises ValueError for files that the engine does not load (no compressed data or an original size of 0)
+def readFile(path):
+	with open(path, 'rb') as f:
+		data = f.read()
+
+	if data[:len(MAGIC)] != MAGIC:
+		return data
+
+	if len(data) <= len(MAGIC) + 4:
+		raise ValueError('Invalid compressed file')
+
+	size = struct.unpack_from('<I', data, len(MAGIC))[0]
+	if size == 0:
+		raise ValueError('Invalid compressed file (original size is 0)')
+
+	import zstandard
+	return zstandard.ZstdDecompressor().decompress(data[len(MAGIC)+4:], max_output_size=size)
+
+# File object for the export scripts. Data is kept in memory and is compressed (if compressed is True) and
+# written when the file is closed. Nothing is written to disk if close() is not called.
+# After closing, data is the bytes of the file.
+class OutputFile(io.BytesIO):
+	def __init__(self, path, compressed, level=DEFAULT_LEVEL, threads=-1):
+		super().__init__()
+		self.path = outputPath(path, compressed)
+		self.compressed = compressed
+		self.level = level
+		self.threads = threads
+		self.data = None
+
+	def close(self):
+		if not self.closed:
+			self.data = outputData(self.path, self.getvalue(), self.compressed, self.level, self.threads)
+			writeFileIfChanged(self.path, self.data)
+		super().close()
+
+# Opens an output file for an export script
+def openOutputFile(path, compressed, level=DEFAULT_LEVEL, threads=-1):
+	return OutputFile(path, compressed, level, threads)
@@ -0,0 +1,195 @@
+# CONVERTS THE IMAGES IN AN ASSET DIRECTORY INTO TEXTURES WITH PRECOMPUTED MIP-MAPS (.bctexture OR .rgb10a2 FILES)
+# RUN WITH PYTHON 3 (NOT FROM BLENDER): python convert-textures.py ../DemoAssets [--output DIR] [--format auto] [--jobs N]
+# IMAGES ARE CONVERTED IN PARALLEL, BY DEFAULT IN ONE PROCESS PER CPU CORE. IMAGES OLDER THAN THEIR TEXTURE FILE ARE SKIPPED (SEE --force)
+# READING IMAGES REQUIRES THE Pillow MODULE (python -m pip install pillow). --compress REQUIRES THE zstandard MODULE (SEE compressedfile.py)
+
+# Formats (see docs/block compressed texture format.md and docs/rgb10a2 image format.md):
+#	auto - bc5 for normal maps, bc3 for images with transparent pixels and bc1 for other images
+#	bc1, bc3, bc5 - block compressed (4 or 8 bits per pixel), .bctexture files
+#	rgb10a2 - 10 bits per colour channel and 2 bits of alpha (32 bits per pixel), .rgb10a2 files
+# Normal maps are images with 'normal' in their name (such as minotaur_normal.png) or images that look like tangent space
+# normal maps. Their mip-maps are made from the normalised average of the normals instead of the average colour.
+# Pillow reads 16-bit colour PNGs as 8 bits per channel. Use rgb10a2convert (src/RGB10A2) for those.
+
+import argparse
+import concurrent.futures
+import os
+import sys
+import time
+
+import numpy as np
+
+# compressedfile.py and textureencode.py are in the same directory as this script
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import compressedfile
+import textureencode
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.tga', '.bmp')
+
+FORMATS = ('auto', 'bc1', 'bc3', 'bc5', 'rgb10a2')
+
+# Pixels with less alpha than this are transparent (auto format)
+OPAQUE_ALPHA = 254.5 / 255.0
+
+# Returns the image as a float32 array of shape (height, width, channels) with values from 0 to 1
+def readImage(path):
+	from PIL import Image
+
+	with Image.open(path) as image:
+		if image.mode in ('I;16', 'I;16B', 'I;16L', 'I'):
+			# 16-bit grey
+			return (np.asarray(image, dtype=np.float32) / 65535.0)[:, :, None]
+
+		if image.mode not in ('L', 'LA', 'RGB', 'RGBA'):
+			image = image.convert('RGBA' if 'A' in image.mode or 'transparency' in image.info else 'RGB')
+
+		pixels = np.asarray(image, dtype=np.float32) / 255.0
+
+	if pixels.ndim == 2:
+		pixels = pixels[:, :, None]
+	return pixels
+
+def isNormalMapName(path):
+	name = os.path.splitext(os.path.basename(path))[0].lower()
+	return 'normal' in name or name.endswith(('_n', '_nrm', '_nor'))
+
+def hasTransparentPixels(image):
+	return image.shape[2] in (2, 4) and bool(np.any(image[:, :, -1] < OPAQUE_ALPHA))
+
+# Output file path for an image (without '.compressed')
+def texturePath(imagePath, inputDirectory, outputDirectory, textureFormat):
+	relativePath = os.path.relpath(imagePath, inputDirectory)
+	extension = '.rgb10a2' if textureFormat == 'rgb10a2' else '.bctexture'
+	return os.path.join(outputDirectory, os.path.splitext(relativePath)[0] + extension)
+
+# Peak signal to noise ratio (dB) of the decoded level 0 of the block compressed data
+def blockCompressionPSNR(image, data, blockFormat):
+	height, width = image.shape[:2]
+	decoded = textureencode.decodeBlocks(data, width, height, blockFormat)
+
+	if blockFormat == 'bc5':
+		original = image[:, :, :2]
+	else:
+		original = image if image.shape[2] >= 3 else np.concatenate([image[:, :, :1]] * 3 + [image[:, :, 1:]], axis=2)
+		original = original[:, :, :decoded.shape[2]]
+		if original.shape[2] < decoded.shape[2]:
+			decoded = decoded[:, :, :original.shape[2]]
+
+	meanSquaredError = float(np.mean((decoded - original) ** 2))
+	return 10.0 * np.log10(1.0 / max(meanSquaredError, 1e-12))
+
+# Converts one image. Runs in a worker process. Returns the line to print
+def convertImage(imagePath, outputPath, requestedFormat, mipMaps, compress, compressionLevel):
+	start = time.perf_counter()
+
+	image = readImage(imagePath)
+	height, width = image.shape[:2]
+	if width > 32768 or height > 32768:
+		raise ValueError('Images can be at most 32768 pixels wide and high')
+
+	normalMap = image.shape[2] >= 3 and (isNormalMapName(imagePath) or textureencode.looksLikeNormalMap(image))
+
+	textureFormat = requestedFormat
+	if textureFormat == 'auto':
+		if normalMap:
+			textureFormat = 'bc5'
+		elif hasTransparentPixels(image):
+			textureFormat = 'bc3'
+		else:
+			textureFormat = 'bc1'
+
+	if textureFormat == 'bc5' and image.shape[2] < 3:
+		raise ValueError('bc5 is for normal maps, the image has no colour channels')
+
+	chain = textureencode.mipMaps(image, normalMap, 0 if mipMaps else 1)
+
+	if textureFormat == 'rgb10a2':
+		data = textureencode.rgb10a2File(width, height, [textureencode.encodeRGB10A2(level) for level in chain])
+		quality = ''
+	else:
+		levels = [textureencode.encodeBlocks(level, textureFormat) for level in chain]
+		data = textureencode.blockCompressedFile(width, height, textureFormat, levels)
+		quality = ', PSNR %.1f dB' % blockCompressionPSNR(image, levels[0], textureFormat)
+
+	fileData = data
+	if compress:
+		# One compression thread, the images are converted in parallel
+		fileData = compressedfile.compress(data, compressionLevel, 0) or data
+
+	os.makedirs(os.path.dirname(os.path.abspath(outputPath)), exist_ok=True)
+	compressedfile.writeFileIfChanged(compressedfile.outputPath(outputPath, compress), fileData)
+
+	return '%s -> %s: %dx%d%s, %d levels, %s, %d bytes%s (%.1f s)' % (imagePath, os.path.basename(compressedfile.outputPath(outputPath, compress)),
+		width, height, ' normal map' if normalMap else '', len(chain), textureFormat, len(fileData), quality, time.perf_counter() - start)
+
+def findImages(path):
+	if os.path.isfile(path):
+		return [path]
+
+	images = []
+	for directory, _, files in os.walk(path):
+		for name in sorted(files):
+			if name.lower().endswith(IMAGE_EXTENSIONS):
+				images.append(os.path.join(directory, name))
+	return sorted(images)
+
+def main():
+	parser = argparse.ArgumentParser(description='Convert images to textures with precomputed mip-maps')
+	parser.add_argument('input', help='image file or directory of images (searched recursively)')
+	parser.add_argument('--output', '-o', default=None, help='output directory (default: next to the images)')
+	parser.add_argument('--format', '-f', choices=FORMATS, default='auto', help='texture format (default: auto)')
+	parser.add_argument('--no-mipmaps', action='store_true', help='only write the full size image')
+	parser.add_argument('--compress', action='store_true', help='write *.compressed files (zstd)')
+	parser.add_argument('--compression-level', type=int, default=compressedfile.DEFAULT_LEVEL, help='1-22 (default: 22)')
+	parser.add_argument('--jobs', '-j', type=int, default=os.cpu_count() or 1, help='number of processes (default: number of CPU cores)')
+	parser.add_argument('--force', action='store_true', help='also convert images that are older than their texture file')
+	args = parser.parse_args()
+
+	if args.jobs < 1:
+		parser.error('--jobs must be at least 1')
+
+	inputDirectory = args.input if os.path.isdir(args.input) else os.path.dirname(os.path.abspath(args.input))
+	outputDirectory = inputDirectory if args.output is None else args.output
+
+	images = findImages(args.input)
+	if len(images) == 0:
+		print('No images found')
+		return 1
+
+	jobs = []
+	skipped = 0
+	for imagePath in images:
+		outputPath = texturePath(imagePath, inputDirectory, outputDirectory, args.format)
+		existingPath = compressedfile.outputPath(outputPath, args.compress)
+		if not args.force and os.path.exists(existingPath) and os.path.getmtime(existingPath) >= os.path.getmtime(imagePath):
+			skipped += 1
+			continue
+		jobs.append((imagePath, outputPath))
+
+	# Biggest images first so that the processes finish at about the same time
+	jobs.sort(key=lambda j: os.path.getsize(j[0]), reverse=True)
+
+	print('Converting %d images with %d processes (%d up to date)' % (len(jobs), args.jobs, skipped))
+	start = time.perf_counter()
+	failed = []
+
+	with concurrent.futures.ProcessPoolExecutor(max_workers=args.jobs) as pool:
+		futures = {pool.submit(convertImage, imagePath, outputPath, args.format, not args.no_mipmaps, args.compress, args.compression_level):
+			imagePath for imagePath, outputPath in jobs}
+
+		for n, future in enumerate(concurrent.futures.as_completed(futures), start=1):
+			try:
+				print('[%d/%d] %s' % (n, len(jobs), future.result()))
+			except (OSError, ValueError, ImportError) as e:
+				print('[%d/%d] %s: FAILED: %s' % (n, len(jobs), futures[future], e))
+				failed.append(futures[future])
+
+	print('Finished in %.1f s' % (time.perf_counter() - start))
+
+	if len(failed) > 0:
+		print('%d of %d images failed' % (len(failed), len(jobs)))
+		return 1
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,110 @@
+# ON-DISK CACHE OF EXPORTED FILES USED BY THE EXPORT SCRIPTS
+# DOES NOT DEPEND ON BLENDER. KEEP THIS FILE IN THE SAME DIRECTORY AS THE EXPORT SCRIPTS.
+
+# Each entry is the finished (compressed) output file, stored under a hash of everything the file was made from:
+# the mesh or animation data, the export settings and the source code of the export scripts.
+# The cache directory can be shared by several Blender processes (batch-export.py).
+
+import hashlib
+import os
+
+import numpy as np
+
+# Hashes numbers, strings, bytes, NumPy arrays, None and (nested) lists and tuples of them
+# Returns the hash as a hexadecimal string
+def hashValues(*values):
+	h = hashlib.blake2b(digest_size=20)
+
+	def update(v):
+		if isinstance(v, np.ndarray):
+			h.update(b'a' + v.dtype.str.encode() + repr(v.shape).encode())
+			h.update(np.ascontiguousarray(v).tobytes())
+		elif isinstance(v, (list, tuple)):
+			h.update(b'l' + str(len(v)).encode() + b':')
+			for x in v:
+				update(x)
+		elif isinstance(v, bytes):
+			h.update(b'b' + str(len(v)).encode() + b':' + v)
+		elif isinstance(v, str):
+			update(v.encode('utf8'))
+		else:
+			h.update(b'v' + repr(v).encode() + b';')
+
+	for v in values:
+		update(v)
+	return h.hexdigest()
+
+# Hash of the contents of the files, used to invalidate the cache when the export scripts change
+def hashFiles(paths):
+	return hashValues(*[open(p, 'rb').read() for p in paths])
+
+class ExportCache:
+	# sizeLimit: maximum total size of the cache in bytes. The least recently used entries are removed when it is exceeded.
+	def __init__(self, directory, sizeLimit):
+		self.directory = directory
+		self.sizeLimit = sizeLimit
+		self.hits = 0
+		self.misses = 0
+		self.evicted = 0
+
+		os.makedirs(directory, exist_ok=True)
+
+	def path(self, key):
+		return os.path.join(self.directory, key)
+
+	# Returns the cached data or None
+	def get(self, key):
+		try:
+			with open(self.path(key), 'rb') as f:
+				data = f.read()
+
+			# Modification time is the time the entry was last used
+			os.utime(self.path(key))
+		except OSError:
+			self.misses += 1
+			return None
+
+		self.hits += 1
+		return data
+
+	def put(self, key, data):
+		# Written to a temporary file first so that other processes never read a partial entry
+		temporaryPath = self.path(key) + '.' + str(os.getpid()) + '.tmp'
+		with open(temporaryPath, 'wb') as f:
+			f.write(data)
+		os.replace(temporaryPath, self.path(key))
+
+	# Removes the least recently used entries until the cache is no bigger than the size limit
+	def evict(self):
+		entries = []
+		for e in os.scandir(self.directory):
+			if e.name.endswith('.tmp'):
+				continue
+			try:
+				s = e.stat()
+			except OSError:
+				continue # Removed by another process
+			entries.append((s.st_mtime, s.st_size, e.path))
+
+		entries.sort()
+		totalSize = sum(e[1] for e in entries)
+
+		for _, size, path in entries:
+			if totalSize <= self.sizeLimit:
+				break
+			try:
+				os.remove(path)
+				self.evicted += 1
+			except OSError:
+				pass
+			totalSize -= size
+
+	# Evicts entries and prints the number of hits and misses
+	# batch-export.py adds up these lines for all .blend files
+	def finish(self):
+		self.evict()
+
+		report = 'Export cache: %d hits, %d misses' % (self.hits, self.misses)
+		if self.evicted > 0:
+			report += ', %d entries evicted' % self.evicted
+		print(report)
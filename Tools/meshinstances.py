@@ -0,0 +1,59 @@
+# FINDS MESH OBJECTS WITH THE SAME GEOMETRY SO THAT THEY CAN SHARE A .MODEL FILE. USED BY blender-export.py AND blender-export-scene.py
+# DOES NOT IMPORT BLENDER MODULES (THE OBJECTS ARE PASSED IN). KEEP THIS FILE IN THE SAME DIRECTORY AS THE EXPORT SCRIPTS.
+
+# Objects are compared by a hash of the data that blender-export.py writes to .model files (in the object's local space),
+# not by their names. Linked duplicates and copies of a mesh share a model file whatever they are called, and objects that
+# have the same name apart from a '.001' style suffix but different meshes do not.
+
+import numpy as np
+
+import exportcache
+
+def readArray(collection, attribute, dtype, size):
+	a = np.empty(len(collection) * size, dtype=dtype)
+	collection.foreach_get(attribute, a)
+	return a
+
+# Hash of the mesh of the object (vertices, polygons, UVs and materials) and the object's vertex groups
+def geometryHash(obj):
+	mesh = obj.data
+
+	values = [readArray(mesh.vertices, 'co', np.float32, 3), readArray(mesh.vertices, 'normal', np.float32, 3),
+		readArray(mesh.polygons, 'loop_total', np.int32, 1), readArray(mesh.polygons, 'material_index', np.int32, 1),
+		readArray(mesh.loops, 'vertex_index', np.int32, 1), [None if m is None else m.name for m in mesh.materials]]
+
+	if mesh.uv_layers.active is not None:
+		values.append(readArray(mesh.uv_layers.active.data, 'uv', np.float32, 2))
+
+	if len(obj.vertex_groups) > 0:
+		values.append([vgroup.name for vgroup in obj.vertex_groups])
+		values.append([[(g.group, g.weight) for g in vertex.groups] for vertex in mesh.vertices])
+
+	return exportcache.hashValues(*values)
+
+# Name without a '.001' style suffix
+def baseName(name):
+	if len(name) >= 5 and name[-4] == '.' and name[-3:].isdigit():
+		return name[:-4]
+	return name
+
+# Groups the objects by geometryHash
+# Returns (name, objects) for each group, in the order of the names of the first objects in the groups. Objects are sorted by
+# name. name is for the model file: the name of the first object without its suffix, unless another group already has that name.
+def groupInstances(objects):
+	groups = {}
+	for obj in sorted(objects, key=lambda o: o.name):
+		groups.setdefault(geometryHash(obj), []).append(obj)
+
+	result = []
+	usedNames = set()
+	for group in groups.values():
+		name = baseName(group[0].name)
+		if name in usedNames:
+			name = group[0].name
+		while name in usedNames:
+			name += '_'
+		usedNames.add(name)
+		result.append((name, group))
+
+	return result
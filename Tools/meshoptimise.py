@@ -0,0 +1,444 @@
+# MESH OPTIMISATION FUNCTIONS USED BY blender-export.py
+# DOES NOT DEPEND ON BLENDER. KEEP THIS FILE IN THE SAME DIRECTORY AS THE EXPORT SCRIPTS.
+
+# All index arrays are flat NumPy arrays of triangle list indices (3 per triangle).
+
+import heapq
+import math
+
+import numpy as np
+
+# Simulates a FIFO post-transform vertex cache.
+# Returns the number of cache misses for each triangle.
+def simulateVertexCache(indices, vertexCount, cacheSize):
+	indices = np.asarray(indices).tolist()
+	timestamps = [0] * vertexCount
+	timestamp = cacheSize + 1
+
+	misses = [0] * (len(indices) // 3)
+	for t in range(len(misses)):
+		m = 0
+		for v in indices[t*3:t*3+3]:
+			if timestamp - timestamps[v] > cacheSize:
+				timestamps[v] = timestamp
+				timestamp += 1
+				m += 1
+		misses[t] = m
+	return misses
+
+# Average cache miss ratio (misses per triangle) and average transformed vertex ratio (misses per vertex used)
+# 0.5 is the best possible ACMR for large regular meshes, 1.0 is the best possible ATVR
+def vertexCacheStatistics(indices, vertexCount, cacheSize):
+	indices = np.asarray(indices)
+	if len(indices) == 0:
+		return 0.0, 0.0
+
+	misses = sum(simulateVertexCache(indices, vertexCount, cacheSize))
+	return misses / (len(indices) // 3), misses / len(np.unique(indices))
+
+# Builds a list of triangles for every vertex (compressed sparse rows)
+def vertexTriangles(indices, vertexCount):
+	order = np.argsort(indices, kind='stable')
+	offsets = np.zeros(vertexCount + 1, dtype=np.int64)
+	offsets[1:] = np.cumsum(np.bincount(indices, minlength=vertexCount))
+	return (order // 3).tolist(), offsets.tolist()
+
+# Reorders triangles for post-transform vertex cache locality.
+# Tipsify (Sander, Nehab & Barczak, Fast Triangle Reordering for Vertex Locality and Reduced Overdraw, 2007).
+# Runs in linear time. Triangles are fanned around a vertex; the next fanning vertex is the vertex that was
+# used most recently and will still be in the cache after its remaining triangles have been emitted.
+def optimiseVertexCache(indices, vertexCount, cacheSize):
+	indices = np.asarray(indices, dtype=np.int64)
+	triangleCount = len(indices) // 3
+	if triangleCount == 0:
+		return indices.copy()
+
+	vertexTris, offsets = vertexTriangles(indices, vertexCount)
+	tris = indices.tolist()
+
+	liveTriangles = np.bincount(indices, minlength=vertexCount).tolist()
+	timestamps = [0] * vertexCount
+	emitted = [False] * triangleCount
+	deadEnds = []
+
+	output = []
+	timestamp = cacheSize + 1
+	cursor = 0
+
+	def skipDeadEnd():
+		nonlocal cursor
+		while deadEnds:
+			d = deadEnds.pop()
+			if liveTriangles[d] > 0:
+				return d
+		while cursor < vertexCount:
+			if liveTriangles[cursor] > 0:
+				return cursor
+			cursor += 1
+		return -1
+
+	fanVertex = skipDeadEnd()
+	while fanVertex >= 0:
+		candidates = []
+		for t in vertexTris[offsets[fanVertex]:offsets[fanVertex+1]]:
+			if emitted[t]:
+				continue
+			emitted[t] = True
+
+			for v in tris[t*3:t*3+3]:
+				output.append(v)
+				deadEnds.append(v)
+				candidates.append(v)
+				liveTriangles[v] -= 1
+				if timestamp - timestamps[v] > cacheSize:
+					timestamps[v] = timestamp
+					timestamp += 1
+
+		# Pick the candidate that is most likely to still be in the cache
+		fanVertex = -1
+		bestPriority = -1
+		for v in candidates:
+			if liveTriangles[v] > 0:
+				priority = 0
+				if timestamp - timestamps[v] + 2 * liveTriangles[v] <= cacheSize:
+					priority = timestamp - timestamps[v]
+				if priority > bestPriority:
+					bestPriority = priority
+					fanVertex = v
+
+		if fanVertex < 0:
+			fanVertex = skipDeadEnd()
+
+	return np.array(output, dtype=np.int64)
+
+# Reorders clusters of triangles so that triangles facing away from the centre of the mesh are drawn first.
+# Those triangles are the most likely to occlude the rest of the mesh, so fewer fragments are shaded.
+# The clusters are chosen so that the vertex cache efficiency of the input order is mostly kept: a new cluster
+# starts wherever the input order already misses the cache for all three vertices, and clusters are split further
+# once their running ACMR is within 'threshold' times the ACMR of the whole cluster.
+# Should be used on the output of optimiseVertexCache.
+def optimiseOverdraw(indices, positions, cacheSize, threshold=1.05):
+	indices = np.asarray(indices, dtype=np.int64)
+	triangleCount = len(indices) // 3
+	if triangleCount == 0:
+		return indices.copy()
+
+	vertexCount = len(positions)
+
+	misses = simulateVertexCache(indices, vertexCount, cacheSize)
+	hardBoundaries = [t for t in range(triangleCount) if t == 0 or misses[t] == 3]
+	hardBoundaries.append(triangleCount)
+
+	tris = indices.tolist()
+	timestamps = [0] * vertexCount
+	timestamp = cacheSize + 1
+
+	boundaries = []
+	for c in range(len(hardBoundaries) - 1):
+		start = hardBoundaries[c]
+		end = hardBoundaries[c+1]
+
+		clusterThreshold = threshold * sum(misses[start:end]) / (end - start)
+
+		boundaries.append(start)
+		timestamp += cacheSize + 1 # Flush the cache
+		runningMisses = 0
+		runningTriangles = 0
+		for t in range(start, end):
+			for v in tris[t*3:t*3+3]:
+				if timestamp - timestamps[v] > cacheSize:
+					timestamps[v] = timestamp
+					timestamp += 1
+					runningMisses += 1
+			runningTriangles += 1
+
+			if runningMisses / runningTriangles <= clusterThreshold and t + 1 < end:
+				# Target reached, start a new cluster with an empty cache
+				boundaries.append(t + 1)
+				timestamp += cacheSize + 1
+				runningMisses = 0
+				runningTriangles = 0
+
+	boundaries.append(triangleCount)
+	boundaries = np.array(boundaries, dtype=np.int64)
+	clusterSizes = np.diff(boundaries)
+	clusterCount = len(clusterSizes)
+
+	p = np.asarray(positions, dtype=np.float64)[indices].reshape(-1, 3, 3)
+	normals = np.cross(p[:, 1] - p[:, 0], p[:, 2] - p[:, 0])
+	areas = np.linalg.norm(normals, axis=1)
+	centroids = p.mean(axis=1)
+
+	meshCentroid = p.reshape(-1, 3).mean(axis=0)
+
+	triangleClusters = np.repeat(np.arange(clusterCount), clusterSizes)
+
+	clusterAreas = np.bincount(triangleClusters, weights=areas, minlength=clusterCount)
+	clusterCentroids = np.zeros((clusterCount, 3))
+	clusterNormals = np.zeros((clusterCount, 3))
+	for axis in range(3):
+		clusterCentroids[:, axis] = np.bincount(triangleClusters, weights=centroids[:, axis] * areas, minlength=clusterCount)
+		clusterNormals[:, axis] = np.bincount(triangleClusters, weights=normals[:, axis], minlength=clusterCount)
+
+	hasArea = clusterAreas > 0
+	clusterCentroids[hasArea] /= clusterAreas[hasArea, None]
+	normalLengths = np.linalg.norm(clusterNormals, axis=1)
+	clusterNormals[normalLengths > 0] /= normalLengths[normalLengths > 0, None]
+
+	sortKeys = np.einsum('ij,ij->i', clusterCentroids - meshCentroid, clusterNormals)
+	clusterOrder = np.argsort(-sortKeys, kind='stable')
+
+	triangleOrder = np.concatenate([np.arange(boundaries[c], boundaries[c+1]) for c in clusterOrder])
+	return indices.reshape(-1, 3)[triangleOrder].reshape(-1)
+
+# Returns an array of vertex indices in the order in which the vertices are first used by the index buffer.
+# Vertices that are not used by any triangle are put at the end.
+# Reordering the vertex buffer like this makes vertex fetches more sequential.
+def vertexFetchOrder(indices, vertexCount):
+	indices = np.asarray(indices, dtype=np.int64)
+	first = np.full(vertexCount, len(indices), dtype=np.int64)
+	np.minimum.at(first, indices, np.arange(len(indices)))
+	return np.argsort(first, kind='stable')
+
+# Splits the vertex data into blocks of up to maxVertices vertices so that indices can be stored as 16-bit offsets from the
+# start of a block (base vertex). Every triangle uses the vertices of one block. Vertices that are used by triangles in
+# more than one block are copied into each of them.
+# lists: index arrays in the order that they are stored in the file
+# reorder: for each list, True if its triangles can be reordered. The triangles of these lists use the blocks made for the
+#	lists before them where they can, and are sorted by block. Other lists keep their order and fill the blocks in order.
+# Returns (vertices, lists, ranges):
+#	vertices - the original index of each vertex of the blocks, one block after another
+#	lists - the lists with indices relative to the base vertices of their triangles
+#	ranges - (first index, index count, base vertex) for each run of triangles that use the same block, covering all lists
+def splitIndexRanges(lists, reorder, vertexCount, maxVertices=65536):
+	blockVertices = [] # original index of the vertices of each block, in parts
+	blockLocal = [] # for each block, the index in the block of each vertex or -1 if the vertex is not in the block
+	blockSizes = []
+
+	def newBlock():
+		blockVertices.append([])
+		blockLocal.append(np.full(vertexCount, -1, dtype=np.int64))
+		blockSizes.append(0)
+
+	# Adds the triangles to the last block, and to new blocks when it is full. Returns the block of each triangle.
+	def fill(triangles):
+		blocks = np.empty(len(triangles), dtype=np.int64)
+		start = 0
+		while start < len(triangles):
+			if len(blockSizes) == 0:
+				newBlock()
+			local = blockLocal[-1]
+
+			# Running count of the vertices of the block, including the first use of each vertex that is not in it yet
+			flat = triangles[start:].reshape(-1)
+			_, first = np.unique(flat, return_index=True)
+			isNew = np.zeros(len(flat), dtype=bool)
+			isNew[first] = True
+			isNew &= local[flat] < 0
+			fits = blockSizes[-1] + np.cumsum(isNew)[2::3] <= maxVertices
+
+			count = len(fits) if fits.all() else int(np.argmin(fits))
+			if count == 0:
+				newBlock()
+				continue
+
+			added = flat[:count*3][isNew[:count*3]]
+			local[added] = blockSizes[-1] + np.arange(len(added))
+			blockVertices[-1].append(added)
+			blockSizes[-1] += len(added)
+			blocks[start:start+count] = len(blockSizes) - 1
+			start += count
+		return blocks
+
+	newLists = []
+	triangleBlocks = []
+	for indices, canReorder in zip(lists, reorder):
+		triangles = np.asarray(indices, dtype=np.int64).reshape(-1, 3)
+		blocks = np.full(len(triangles), -1, dtype=np.int64)
+
+		if canReorder:
+			for k, local in enumerate(blockLocal):
+				blocks[(blocks < 0) & np.all(local[triangles] >= 0, axis=1)] = k
+
+		unassigned = blocks < 0
+		blocks[unassigned] = fill(triangles[unassigned])
+
+		if canReorder:
+			order = np.argsort(blocks, kind='stable')
+			triangles = triangles[order]
+			blocks = blocks[order]
+
+		local = np.empty_like(triangles)
+		for k in np.unique(blocks):
+			inBlock = blocks == k
+			local[inBlock] = blockLocal[k][triangles[inBlock]]
+
+		newLists.append(local.reshape(-1))
+		triangleBlocks.append(blocks)
+
+	vertices = np.concatenate([v for parts in blockVertices for v in parts] + [np.zeros(0, dtype=np.int64)])
+	baseVertices = np.cumsum([0] + blockSizes)
+
+	# Runs of triangles in the same block
+	triangleBlocks = np.concatenate(triangleBlocks + [np.zeros(0, dtype=np.int64)])
+	starts = np.flatnonzero(np.diff(triangleBlocks, prepend=-1) != 0)
+	ends = np.append(starts[1:], len(triangleBlocks))
+	ranges = [(int(s) * 3, int(e - s) * 3, int(baseVertices[triangleBlocks[s]])) for s, e in zip(starts, ends)]
+
+	return vertices, newLists, ranges
+
+# Interleaves the bits of 10-bit integers (Morton code / Z-order curve)
+def mortonCodes(x, y, z):
+	def spread(v):
+		v = v & 0x3ff
+		v = (v | (v << 16)) & 0x30000ff
+		v = (v | (v << 8)) & 0x300f00f
+		v = (v | (v << 4)) & 0x30c30c3
+		v = (v | (v << 2)) & 0x9249249
+		return v
+	return spread(x) | (spread(y) << 1) | (spread(z) << 2)
+
+# Unit normals of the triangles (zero for triangles with no area) and their areas (x2)
+def triangleNormals(indices, positions):
+	p = np.asarray(positions, dtype=np.float64)[np.asarray(indices, dtype=np.int64)].reshape(-1, 3, 3)
+	normals = np.cross(p[:, 1] - p[:, 0], p[:, 2] - p[:, 0])
+	areas = np.linalg.norm(normals, axis=1)
+	normals = np.divide(normals, areas[:, None], out=np.zeros_like(normals), where=areas[:, None] > 0)
+	return normals, areas
+
+# Splits triangles into spatially coherent clusters of up to maxTriangles triangles, for culling.
+# A cluster grows from a seed triangle through triangles that share a vertex with it, preferring triangles that are
+# close to the centre of the cluster and face the same way (so that the normal cone stays narrow). Seeds are taken in
+# Morton order of the triangle centres so that small disconnected pieces are grouped with nearby pieces.
+# Returns a list of index arrays, one per cluster.
+def buildClusters(indices, positions, maxTriangles):
+	indices = np.asarray(indices, dtype=np.int64)
+	triangleCount = len(indices) // 3
+	if triangleCount == 0:
+		return []
+
+	centres = np.asarray(positions, dtype=np.float64)[indices].reshape(-1, 3, 3).mean(axis=1)
+	normals, _ = triangleNormals(indices, positions)
+
+	low = centres.min(axis=0)
+	extent = (centres.max(axis=0) - low).max()
+	q = np.rint((centres - low) * (1023.0 / extent if extent > 0 else 0.0)).astype(np.int64)
+	seeds = np.argsort(mortonCodes(q[:, 0], q[:, 1], q[:, 2]), kind='stable').tolist()
+
+	vertexTris, offsets = vertexTriangles(indices, int(indices.max()) + 1)
+	tris = indices.tolist()
+	C = centres.tolist()
+	N = normals.tolist()
+
+	assigned = [False] * triangleCount
+	clusters = []
+	cursor = 0
+
+	while True:
+		while cursor < triangleCount and assigned[seeds[cursor]]:
+			cursor += 1
+		if cursor == triangleCount:
+			break
+
+		cluster = []
+		centre = [0.0, 0.0, 0.0]
+		normal = [0.0, 0.0, 0.0]
+		candidates = [(0.0, seeds[cursor])]
+
+		while len(cluster) < maxTriangles:
+			if len(candidates) == 0:
+				# Nothing connected is left, continue with the next piece
+				while cursor < triangleCount and assigned[seeds[cursor]]:
+					cursor += 1
+				if cursor == triangleCount:
+					break
+				candidates.append((0.0, seeds[cursor]))
+
+			_, t = heapq.heappop(candidates)
+			if assigned[t]:
+				continue
+			assigned[t] = True
+			cluster.append(t)
+
+			n = len(cluster)
+			for i in range(3):
+				centre[i] += (C[t][i] - centre[i]) / n
+				normal[i] += N[t][i]
+			normalLength = math.sqrt(normal[0]*normal[0] + normal[1]*normal[1] + normal[2]*normal[2])
+
+			for v in tris[t*3:t*3+3]:
+				for u in vertexTris[offsets[v]:offsets[v+1]]:
+					if assigned[u]:
+						continue
+					c = C[u]
+					distance = math.sqrt((c[0] - centre[0])**2 + (c[1] - centre[1])**2 + (c[2] - centre[2])**2)
+					facing = 1.0
+					if normalLength > 0:
+						facing = (N[u][0]*normal[0] + N[u][1]*normal[1] + N[u][2]*normal[2]) / normalLength
+					heapq.heappush(candidates, (distance * (2.0 - facing), u))
+
+		clusters.append(indices.reshape(-1, 3)[cluster].reshape(-1))
+
+	return clusters
+
+# Bounding volumes of each cluster, as an (n, 14) array:
+# bounding sphere centre and radius, box minimum, box maximum, normal cone axis and cutoff.
+# All triangles of a cluster face away from a camera at c if
+# dot(centre - c, axis) >= cutoff * length(centre - c) + radius (perspective), or
+# dot(view direction, axis) >= cutoff (orthographic).
+# Clusters with triangles facing more than 90 degrees away from the average normal have a zero axis and a cutoff of 1,
+# so they are never back-facing.
+def clusterBounds(clusters, positions):
+	positions = np.asarray(positions, dtype=np.float64)
+	bounds = np.zeros((len(clusters), 14))
+
+	for i, c in enumerate(clusters):
+		p = positions[np.unique(c)]
+		boxMin = p.min(axis=0)
+		boxMax = p.max(axis=0)
+		centre = (boxMin + boxMax) * 0.5
+		radius = np.linalg.norm(p - centre, axis=1).max()
+
+		axis = np.zeros(3)
+		cutoff = 1.0
+
+		normals, areas = triangleNormals(c, positions)
+		normals = normals[areas > 0]
+		if len(normals) > 0:
+			a = (normals * areas[areas > 0, None]).sum(axis=0)
+			length = np.linalg.norm(a)
+			if length > 0:
+				a /= length
+				minDot = (normals @ a).min()
+				if minDot > 0:
+					axis = a
+					cutoff = math.sqrt(1.0 - minDot * minDot)
+
+		bounds[i, 0:3] = centre
+		bounds[i, 3] = radius
+		bounds[i, 4:7] = boxMin
+		bounds[i, 7:10] = boxMax
+		bounds[i, 10:13] = axis
+		bounds[i, 13] = cutoff
+
+	return bounds
+
+# Orders clusters (from buildClusters) so that clusters facing away from the centre of the mesh are drawn first.
+# Same idea as optimiseOverdraw, but the clusters are kept whole.
+def optimiseClusterOverdraw(clusters, positions):
+	if len(clusters) == 0:
+		return clusters
+
+	positions = np.asarray(positions, dtype=np.float64)
+	meshCentroid = positions[np.concatenate(clusters)].mean(axis=0)
+
+	sortKeys = []
+	for c in clusters:
+		normals, areas = triangleNormals(c, positions)
+		normal = (normals * areas[:, None]).sum(axis=0)
+		length = np.linalg.norm(normal)
+		if length > 0:
+			normal /= length
+		sortKeys.append(np.dot(positions[c].mean(axis=0) - meshCentroid, normal))
+
+	return [clusters[i] for i in np.argsort(-np.array(sortKeys), kind='stable')]
@@ -0,0 +1,300 @@
+# MESH SIMPLIFICATION (LEVELS OF DETAIL) USED BY blender-export.py
+# DOES NOT DEPEND ON BLENDER. KEEP THIS FILE IN THE SAME DIRECTORY AS THE EXPORT SCRIPTS.
+
+# Quadric error metric edge collapse (Garland & Heckbert, Surface Simplification Using Quadric Error Metrics, 1997).
+# Each collapse merges a vertex into one of its neighbours. Vertices are only removed, never moved or created, so every
+# level of detail can use the vertex buffer of the full mesh.
+# Index lists are flat NumPy arrays of triangle list indices, one list per material (as in meshoptimise.py).
+
+import heapq
+import numpy as np
+
+# Weight of the planes that keep open borders in place (see simplify)
+BORDER_WEIGHT = 10.0
+
+# A collapse is not done if it would turn a triangle by more than about 75 degrees (cosine of the angle)
+FLIP_THRESHOLD = 0.25
+
+# Quadrics (symmetric 4x4 matrices) are stored as 10 values: a11 a12 a13 a14 a22 a23 a24 a33 a34 a44
+# Returns the quadrics (n,10) of (n,4) planes (a,b,c,d with ax+by+cz+d = 0)
+def planeQuadrics(planes, weights):
+	a, b, c, d = planes.T
+	return weights[:, None] * np.stack((a*a, a*b, a*c, a*d, b*b, b*c, b*d, c*c, c*d, d*d), axis=1)
+
+# Sum of the squared distances from the point to the planes of the quadric
+def quadricError(q, p):
+	x, y, z = p
+	return (q[0]*x*x + 2.0*q[1]*x*y + 2.0*q[2]*x*z + 2.0*q[3]*x + q[4]*y*y + 2.0*q[5]*y*z + 2.0*q[6]*y
+		+ q[7]*z*z + 2.0*q[8]*z + q[9])
+
+# Not normalised
+def triangleNormal(a, b, c):
+	e0 = (b[0] - a[0], b[1] - a[1], b[2] - a[2])
+	e1 = (c[0] - a[0], c[1] - a[1], c[2] - a[2])
+	return (e0[1]*e1[2] - e0[2]*e1[1], e0[2]*e1[0] - e0[0]*e1[2], e0[0]*e1[1] - e0[1]*e1[0])
+
+# Planes (n,4) through the point on each row of points with the given unit normals
+def planesThroughPoints(normals, points):
+	return np.column_stack((normals, -np.einsum('ij,ij->i', normals, points)))
+
+# Simplifies the mesh to each of the triangle counts in targets (biggest first). Each level continues from the previous one.
+# Vertices at the same position (seams: UV seams, hard edges, etc.) are collapsed together as one vertex, each of them into
+# the vertex at the other end of its edge, so attributes are not mixed. Vertices on a seam only move along the seam and
+# vertices on an open border only move along the border. Where seams or borders meet (more than two seam/border edges)
+# the vertex is only moved along a seam or border to another such vertex, so UV islands keep their corners but flat shaded
+# meshes, where every edge is a seam, can still be simplified. Copies of that vertex whose triangles are not next to the
+# edge are merged into one of the copies at the other end. Vertices used by more than one material are never moved, so
+# material boundaries are kept exactly. A collapse is not done if it would flip a triangle or join two surfaces (link
+# condition).
+# vertexWeights: optional (vertices, n) array, such as bone weights. A vertex is only merged into a vertex whose weights
+# differ by at most maxWeightDifference (sum of the absolute differences).
+# Collapses with an error bigger than maxError are not done.
+# Returns a list of (index lists, error), one for each target that was reached. If a target cannot be reached the list
+# ends with the smallest mesh that could be made (if it is smaller than the previous entry). The error is the biggest
+# collapse error so far (square root of the quadric error): an estimate of the distance to the original surface.
+def simplify(positions, indexLists, targets, maxError, vertexWeights=None, maxWeightDifference=0.0):
+	positions = np.asarray(positions, dtype=np.float64)
+
+	triangles = np.concatenate([np.asarray(l, dtype=np.int64).reshape(-1, 3) for l in indexLists] + [np.zeros((0, 3), dtype=np.int64)])
+	triangleMaterials = np.repeat(np.arange(len(indexLists)), [len(l) // 3 for l in indexLists])
+	triangleCount = len(triangles)
+
+	if triangleCount == 0:
+		return []
+
+	# Collapses are done on positions: vertices with the same position are in the same group
+
+	groupPositions, positionGroups = np.unique(positions, axis=0, return_inverse=True)
+	positionGroups = positionGroups.reshape(-1)
+	groupCount = len(groupPositions)
+
+	# Material boundaries
+
+	groupMaterials = np.unique(np.stack((positionGroups[triangles.reshape(-1)], np.repeat(triangleMaterials, 3)), axis=1), axis=0)
+	locked = np.bincount(groupMaterials[:, 0], minlength=groupCount) > 1
+
+	# Quadric of each position: the planes of its triangles
+
+	p = positions[triangles]
+	normals = np.cross(p[:, 1] - p[:, 0], p[:, 2] - p[:, 0])
+	lengths = np.linalg.norm(normals, axis=1)
+	normals = np.divide(normals, lengths[:, None], out=np.zeros_like(normals), where=lengths[:, None] > 0)
+
+	q = planeQuadrics(planesThroughPoints(normals, p[:, 0]), (lengths > 0).astype(np.float64))
+	quadrics = np.zeros((groupCount, 10))
+	for corner in range(3):
+		np.add.at(quadrics, positionGroups[triangles[:, corner]], q)
+
+	# Open borders: edges that are used by one triangle. Positions are compared so that seams are not borders.
+	# A plane through each border edge, perpendicular to its triangle, stops the border from moving inwards.
+
+	edges = triangles[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2)
+	_, edgeGroups, edgeCounts = np.unique(np.sort(positionGroups[edges], axis=1), axis=0, return_inverse=True, return_counts=True)
+	isBorder = edgeCounts[edgeGroups.reshape(-1)] == 1
+
+	borderEdges = edges[isBorder]
+	borderTriangles = np.repeat(np.arange(triangleCount), 3)[isBorder]
+	borderNormals = np.cross(positions[borderEdges[:, 1]] - positions[borderEdges[:, 0]], normals[borderTriangles])
+	borderLengths = np.linalg.norm(borderNormals, axis=1)
+	borderNormals = np.divide(borderNormals, borderLengths[:, None], out=np.zeros_like(borderNormals), where=borderLengths[:, None] > 0)
+
+	q = planeQuadrics(planesThroughPoints(borderNormals, positions[borderEdges[:, 0]]), BORDER_WEIGHT * (borderLengths > 0))
+	np.add.at(quadrics, positionGroups[borderEdges[:, 0]], q)
+	np.add.at(quadrics, positionGroups[borderEdges[:, 1]], q)
+
+	# Collapses
+
+	tris = triangles.tolist()
+	alive = [True] * triangleCount
+	liveTriangles = triangleCount
+
+	group = positionGroups.tolist()
+	groupTriangles = [set() for _ in range(groupCount)]
+	for t, tri in enumerate(tris):
+		for x in tri:
+			groupTriangles[group[x]].add(t)
+
+	P = groupPositions.tolist()
+	Q = quadrics.tolist()
+	locked = locked.tolist()
+	if vertexWeights is not None:
+		vertexWeights = np.asarray(vertexWeights, dtype=np.float64)
+
+	def neighbours(g):
+		n = set()
+		for t in groupTriangles[g]:
+			n.update(group[x] for x in tris[t])
+		n.discard(g)
+		return n
+
+	# Whether g is a vertex where seams or borders meet (see simplify) and the groups that it may be collapsed into
+	def kind(g):
+		if locked[g] or len(groupTriangles[g]) == 0:
+			return False, []
+
+		# (vertex of g, vertex of h) of each triangle that uses the edge to h
+		edgeVertices = {}
+		for t in groupTriangles[g]:
+			u = [x for x in tris[t] if group[x] == g][0]
+			for x in tris[t]:
+				if group[x] != g:
+					edgeVertices.setdefault(group[x], []).append((u, x))
+
+		if any(len(e) > 2 for e in edgeVertices.values()):
+			return False, []
+
+		borders = [h for h, e in edgeVertices.items() if len(e) == 1]
+		seams = [h for h, e in edgeVertices.items() if len(e) == 2 and e[0] != e[1]]
+
+		# One vertex at this position. If a seam ends here then moving it would stretch the seam over its triangles
+		if len(set(u for e in edgeVertices.values() for u, _ in e)) == 1:
+			if len(seams) > 0:
+				return False, []
+			return False, borders if len(borders) > 0 else list(edgeVertices)
+
+		if len(borders) not in (0, 2) or len(borders) + len(seams) < 2:
+			return False, []
+		return len(borders) + len(seams) > 2, borders if len(borders) > 0 else seams
+
+	# Possible collapses of u as (error, v), lowest error first
+	def collapses(u):
+		isJunction, candidates = kind(u)
+		if isJunction:
+			candidates = [v for v in candidates if kind(v)[0]]
+
+		result = [(quadricError(Q[u], P[v]) + quadricError(Q[v], P[v]), v) for v in candidates]
+		result.sort()
+		return result
+
+	# The vertex of v that each vertex of u is merged into. None if that would mix up the attributes of the vertices.
+	def vertexMapping(u, v, isJunction):
+		targets = {}
+		for t in groupTriangles[u]:
+			x = [x for x in tris[t] if group[x] == u][0]
+			targets.setdefault(x, set()).update(y for y in tris[t] if group[y] == v)
+
+		if not isJunction and any(len(y) > 1 for y in targets.values()):
+			return None
+		onEdge = sorted(y for ys in targets.values() for y in ys)
+
+		mapping = {}
+		for x, ys in targets.items():
+			if len(ys) > 0:
+				mapping[x] = min(ys)
+			elif isJunction:
+				mapping[x] = onEdge[0]
+			else:
+				return None
+
+			if vertexWeights is not None and np.abs(vertexWeights[x] - vertexWeights[mapping[x]]).sum() > maxWeightDifference:
+				return None
+		return mapping
+
+	def isValid(u, v):
+		shared = [t for t in groupTriangles[u] if any(group[x] == v for x in tris[t])]
+
+		# The only vertices next to both u and v must be those of the triangles that are removed
+		third = set()
+		for t in shared:
+			third.update(group[x] for x in tris[t])
+		third.discard(u)
+		third.discard(v)
+		if (neighbours(u) & neighbours(v)) != third:
+			return False
+
+		# Triangles must not flip over (or turn so far that a few more collapses could flip them)
+		pv = P[v]
+		for t in groupTriangles[u]:
+			g = [group[x] for x in tris[t]]
+			if v in g:
+				continue
+			n0 = triangleNormal(*[P[x] for x in g])
+			n1 = triangleNormal(*[pv if x == u else P[x] for x in g])
+			d = n0[0]*n1[0] + n0[1]*n1[1] + n0[2]*n1[2]
+			if d <= 0 or d*d <= FLIP_THRESHOLD*FLIP_THRESHOLD * (n0[0]*n0[0] + n0[1]*n0[1] + n0[2]*n0[2]) * (n1[0]*n1[0] + n1[1]*n1[1] + n1[2]*n1[2]):
+				return False
+		return True
+
+	version = [0] * groupCount
+	heap = []
+
+	def update(u):
+		version[u] += 1
+		c = collapses(u)
+		if len(c) > 0:
+			heapq.heappush(heap, (c[0][0], u, version[u]))
+
+	for u in range(groupCount):
+		update(u)
+
+	maxCost = maxError * maxError
+	error = 0.0
+
+	levels = []
+
+	def addLevel():
+		lists = [[] for _ in indexLists]
+		for t, tri in enumerate(tris):
+			if alive[t]:
+				lists[triangleMaterials[t]].extend(tri)
+		levels.append(([np.array(l, dtype=np.int64) for l in lists], float(np.sqrt(error))))
+
+	targetIndex = 0
+	while targetIndex < len(targets):
+		if liveTriangles <= targets[targetIndex]:
+			addLevel()
+			targetIndex += 1
+			continue
+
+		if len(heap) == 0:
+			break
+
+		_, u, queuedVersion = heapq.heappop(heap)
+		if queuedVersion != version[u]:
+			continue
+
+		isJunction = kind(u)[0]
+		for cost, v in collapses(u):
+			if cost > maxCost:
+				break
+
+			if not isValid(u, v):
+				continue
+
+			mapping = vertexMapping(u, v, isJunction)
+			if mapping is None:
+				continue
+
+			# A cheaper collapse may have become possible since u was queued
+			if len(heap) > 0 and cost > heap[0][0]:
+				heapq.heappush(heap, (cost, u, version[u]))
+				break
+
+			for t in list(groupTriangles[u]):
+				if any(group[x] == v for x in tris[t]):
+					alive[t] = False
+					liveTriangles -= 1
+					for x in tris[t]:
+						if group[x] != u:
+							groupTriangles[group[x]].discard(t)
+				else:
+					tris[t] = [mapping.get(x, x) for x in tris[t]]
+					groupTriangles[v].add(t)
+			groupTriangles[u] = set()
+
+			Q[v] = [a + b for a, b in zip(Q[u], Q[v])]
+
+			error = max(error, cost)
+
+			update(u)
+			update(v)
+			for w in neighbours(v):
+				update(w)
+			break
+
+	# Smallest mesh that could be made
+	smallest = triangleCount if len(levels) == 0 else sum(len(l) for l in levels[-1][0]) // 3
+	if targetIndex < len(targets) and liveTriangles < smallest:
+		addLevel()
+
+	return levels
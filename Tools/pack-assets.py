@@ -0,0 +1,148 @@
+# PACKS THE ASSETS OF SCENES INTO ONE ARCHIVE FILE THAT THE ENGINE MEMORY-MAPS (SEE docs/asset archive format.md AND assets.openArchive)
+# RUN WITH PYTHON 3 (NOT FROM BLENDER): python pack-assets.py ../DemoAssets/Farm.scene [more .scene files or asset files] [-o Farm.assets]
+# THE ASSETS LISTED IN EACH .scene FILE ARE PACKED IN THE ORDER THAT THE ENGINE LOADS THEM. OTHER FILES (E.G. ANIMATIONS THAT
+# ARE LOADED BY THE GAME'S CODE) ARE PACKED AFTER THEM. THE .scene FILES THEMSELVES ARE NOT PACKED.
+
+# Asset names are the file paths relative to the assets directory (the directory given to assets.setAssetsDirectory, by default
+# the directory of the first input file), the same as in the .scene files and in the calls to Asset.init.
+# The files are stored as they are: *.compressed files stay compressed and are decompressed by the engine when they are loaded.
+
+import argparse
+import os
+import struct
+import sys
+
+# compressedfile.py is in the same directory as this script
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import compressedfile
+
+MAGIC = bytes([0x00, 0x61, 0x73, 0x73, 0x65, 0x74, 0x73, 0x31])
+
+HEADER_SIZE = 16
+ENTRY_SIZE = 32
+ALIGNMENT = 16
+
+# Extension -> asset type (Asset.AssetType in Assets.zig)
+ASSET_TYPES = {
+	'.model': 0,
+	'.png': 1,
+	'.jpg': 1,
+	'.tga': 1,
+	'.bmp': 1,
+	'.rgb10a2': 2,
+	'.anim': 3,
+	'.animbank': 4,
+	'.bctexture': 5,
+}
+
+# Flags of the table of contents entries
+FLAG_COMPRESSED = 1 # The data has the header of docs/zstd compressed file format.md
+
+MAX_NAME_LENGTH = 64 # Asset.file_path in Assets.zig
+
+# 64-bit FNV-1a hash of the UTF8 asset name (std.hash.Fnv1a_64)
+def nameHash(name):
+	h = 0xcbf29ce484222325
+	for b in name.encode('utf8'):
+		h = ((h ^ b) * 0x100000001b3) & 0xffffffffffffffff
+	return h
+
+def assetType(name):
+	if name.endswith('.compressed'):
+		name = name[:-len('.compressed')]
+	return ASSET_TYPES.get(os.path.splitext(name)[1].lower())
+
+# Names of the assets in a .scene file, in the order that they are loaded (see getAssets in Scene.zig)
+def sceneAssetNames(scenePath):
+	with open(scenePath, 'rb') as f:
+		data = f.read()
+
+	if len(data) < 36 or struct.unpack_from('<I', data, 0)[0] not in (0x1a98fd34, 0x1a98fd35):
+		raise ValueError(scenePath + ' is not a scene file')
+
+	names = []
+	offset = 36
+	for _ in range(struct.unpack_from('<I', data, 32)[0]):
+		length = data[offset]
+		names.append(data[offset+1:offset+1+length].decode('utf8'))
+		offset += (1 + length + 3) // 4 * 4
+	return names
+
+# Returns the archive file contents
+# assets: (name, data) in the order that the data is stored
+def packAssets(assets):
+	entries = []
+	offset = HEADER_SIZE + len(assets) * ENTRY_SIZE
+	offset += -offset % ALIGNMENT
+
+	for name, data in assets:
+		flags = 0
+		originalSize = len(data)
+		if data[:len(compressedfile.MAGIC)] == compressedfile.MAGIC and len(data) > 16:
+			flags |= FLAG_COMPRESSED
+			originalSize = struct.unpack_from('<I', data, 12)[0]
+
+		entries.append((nameHash(name), offset, len(data), originalSize, assetType(name), flags))
+		offset += len(data) + (-len(data) % ALIGNMENT)
+
+	# The table of contents is sorted by hash so that the engine can binary search it
+	toc = b''.join(struct.pack('<QQIIII', *e) for e in sorted(entries))
+	header = MAGIC + struct.pack('<II', len(assets), 0)
+
+	parts = [header, toc, bytes(-(len(header) + len(toc)) % ALIGNMENT)]
+	for _, data in assets:
+		parts.append(data)
+		parts.append(bytes(-len(data) % ALIGNMENT))
+	return b''.join(parts)
+
+def main():
+	parser = argparse.ArgumentParser(description='Pack the assets of scenes into one archive file')
+	parser.add_argument('inputs', nargs='+', help='.scene files (their assets are packed) and asset files')
+	parser.add_argument('--output', '-o', default=None, help='archive file (default: the first input with the extension .assets)')
+	parser.add_argument('--assets-directory', '-d', default=None, help='directory that asset names are relative to (default: directory of the first input)')
+	args = parser.parse_args()
+
+	assetsDirectory = args.assets_directory or os.path.dirname(os.path.abspath(args.inputs[0]))
+	output = args.output or os.path.splitext(args.inputs[0])[0] + '.assets'
+
+	# Scene assets first, in load order, then the other files. Each asset is stored once.
+	names = []
+	for path in args.inputs:
+		if path.endswith('.scene'):
+			names += sceneAssetNames(path)
+	for path in args.inputs:
+		if not path.endswith('.scene'):
+			names.append(os.path.relpath(path, assetsDirectory).replace(os.sep, '/'))
+	names = list(dict.fromkeys(names))
+
+	hashes = {}
+	for name in names:
+		if assetType(name) is None:
+			print('Unknown asset type: ' + name)
+			return 1
+		if len(name.encode('utf8')) > MAX_NAME_LENGTH:
+			print('Asset name is longer than %d bytes: %s' % (MAX_NAME_LENGTH, name))
+			return 1
+		if nameHash(name) in hashes:
+			print('Asset names have the same hash, rename one of them: %s, %s' % (hashes[nameHash(name)], name))
+			return 1
+		hashes[nameHash(name)] = name
+
+	assets = []
+	for name in names:
+		try:
+			with open(os.path.join(assetsDirectory, name), 'rb') as f:
+				assets.append((name, f.read()))
+		except OSError as e:
+			print('Cannot read %s: %s' % (name, e))
+			return 1
+
+	data = packAssets(assets)
+	compressedfile.writeFileIfChanged(output, data)
+
+	compressedCount = sum(1 for _, d in assets if d[:len(compressedfile.MAGIC)] == compressedfile.MAGIC)
+	print('%s: %d assets (%d compressed), %d bytes' % (output, len(assets), compressedCount, len(data)))
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
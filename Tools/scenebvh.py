@@ -0,0 +1,64 @@
+# BOUNDING VOLUME HIERARCHY OF THE OBJECTS IN A SCENE, USED BY blender-export-scene.py
+# DOES NOT DEPEND ON BLENDER. KEEP THIS FILE IN THE SAME DIRECTORY AS THE EXPORT SCRIPTS.
+
+# Boxes are (min, max) pairs of 3D points (world space, OpenGL coordinate system).
+# See the Bounding Volume Hierarchy section of docs/scene file format.md for how the tree is stored.
+
+import math
+
+# Smallest box that contains all of the boxes
+def unionBox(boxes):
+	boxMin = [math.inf] * 3
+	boxMax = [-math.inf] * 3
+	for bMin, bMax in boxes:
+		for axis in range(3):
+			boxMin[axis] = min(boxMin[axis], bMin[axis])
+			boxMax[axis] = max(boxMax[axis], bMax[axis])
+	return boxMin, boxMax
+
+# Box around points, such as the corners of a transformed bounding box
+def pointsBox(points):
+	return [min(p[axis] for p in points) for axis in range(3)], [max(p[axis] for p in points) for axis in range(3)]
+
+def boxCentre(box):
+	return [(box[0][axis] + box[1][axis]) * 0.5 for axis in range(3)]
+
+# Builds the tree by splitting the boxes in half (by the position of their centres) along the axis where the centres are
+# most spread out, until there are no more than leafSize boxes in each leaf.
+# Returns (order, nodes):
+#	order - indices of the boxes, in the order that they are in the leaves
+#	nodes - (boxMin, boxMax, first, count) for each node. Node 0 is the root.
+#		Leaves have count > 0 and contain order[first:first+count]. Other nodes have count 0 and their children are
+#		nodes[first] and nodes[first+1], which always come after them.
+def buildBVH(boxes, leafSize):
+	order = list(range(len(boxes)))
+	nodes = []
+
+	if len(boxes) == 0:
+		return order, nodes
+
+	centres = [boxCentre(b) for b in boxes]
+
+	def build(nodeIndex, start, end):
+		boxMin, boxMax = unionBox([boxes[i] for i in order[start:end]])
+
+		if end - start <= leafSize:
+			nodes[nodeIndex] = (boxMin, boxMax, start, end - start)
+			return
+
+		centresMin, centresMax = pointsBox([centres[i] for i in order[start:end]])
+		axis = max(range(3), key=lambda a: centresMax[a] - centresMin[a])
+		order[start:end] = sorted(order[start:end], key=lambda i: centres[i][axis])
+
+		children = len(nodes)
+		nodes.extend([None, None])
+		nodes[nodeIndex] = (boxMin, boxMax, children, 0)
+
+		middle = (start + end) // 2
+		build(children, start, middle)
+		build(children + 1, middle, end)
+
+	nodes.append(None)
+	build(0, 0, len(boxes))
+
+	return order, nodes
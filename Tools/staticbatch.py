@@ -0,0 +1,93 @@
+# MERGES STATIC MESH OBJECTS INTO CHUNKS (ONE .MODEL FILE PER CHUNK). USED BY blender-export.py AND blender-export-scene.py
+# DOES NOT IMPORT BLENDER MODULES (THE OBJECTS ARE PASSED IN). KEEP THIS FILE IN THE SAME DIRECTORY AS THE EXPORT SCRIPTS.
+
+# Objects that are not animated are put into the cells of a grid (by the centre of their bounding box) and the objects in
+# each cell that use the same materials are merged into a chunk. A chunk is drawn with one draw call per material instead of
+# one per object and material, and is still culled on its own (it has its own bounding box in the scene and clusters in its
+# model file). Chunks are in world space. Both export scripts must use the same cell size so that they make the same chunks.
+
+import math
+
+import numpy as np
+
+# True if the object can be merged with other objects: it has no animation, armature or shape keys
+def isStatic(obj):
+	if obj.animation_data is not None and obj.animation_data.action is not None:
+		return False
+	if obj.parent is not None and obj.parent.type == 'ARMATURE':
+		return False
+	if any(m.type == 'ARMATURE' for m in obj.modifiers):
+		return False
+	return obj.data.shape_keys is None
+
+# Names of the materials in the object's material slots (sorted, without empty slots)
+def materialKey(obj):
+	return tuple(sorted(set(m.name for m in obj.data.materials if m is not None)))
+
+# World space bounding box of the object (Blender coordinate system)
+def worldBox(obj):
+	matrix = np.array([list(row) for row in obj.matrix_world], dtype=np.float64)
+	corners = np.array([list(c) for c in obj.bound_box], dtype=np.float64) @ matrix[:3, :3].T + matrix[:3, 3]
+	return corners.min(axis=0), corners.max(axis=0)
+
+def triangleCount(obj):
+	loopTotal = np.empty(len(obj.data.polygons), dtype=np.int32)
+	obj.data.polygons.foreach_get('loop_total', loopTotal)
+	return int(np.count_nonzero(loopTotal == 3) + np.count_nonzero(loopTotal == 4) * 2)
+
+# Splits the objects into chunks of static objects and objects that are not merged
+# Cells with only one static object with a set of materials are not merged.
+# Returns (chunks, others):
+#	chunks - (name, objects) for each chunk, objects sorted by name. The chunks are sorted by their names.
+#	others - the objects that are not in a chunk, in the same order as in objects
+def buildChunks(objects, cellSize):
+	if cellSize <= 0:
+		return [], list(objects)
+
+	keys = {}
+	for obj in objects:
+		if isStatic(obj):
+			boxMin, boxMax = worldBox(obj)
+			cell = tuple(int(math.floor(c)) for c in (boxMin + boxMax) * 0.5 / cellSize)
+			keys.setdefault((cell, materialKey(obj)), []).append(obj)
+
+	# Material sets are numbered in the order of their names so that the chunk names do not depend on the order of the objects
+	materialSets = sorted(set(materials for _, materials in keys))
+
+	chunks = []
+	merged = set()
+	for (cell, materials), group in keys.items():
+		if len(group) < 2:
+			continue
+		name = 'Static_%d_%d_%d_%d' % (cell + (materialSets.index(materials),))
+		chunks.append((name, sorted(group, key=lambda o: o.name)))
+		merged.update(obj.name for obj in group)
+
+	chunks.sort(key=lambda c: c[0])
+	return chunks, [obj for obj in objects if obj.name not in merged]
+
+# Prints the number of draw calls (one per material of each model) with and without the chunks and the sizes of the chunks
+def printStatistics(chunks, others, cellSize):
+	if cellSize <= 0:
+		return
+
+	chunkObjects = [len(group) for _, group in chunks]
+	print('Static batching: %d objects merged into %d chunks (cell size %g), %d objects not merged' % (sum(chunkObjects), len(chunks),
+		cellSize, len(others)))
+
+	if len(chunks) == 0:
+		return
+
+	drawCallsBefore = sum(max(len(materialKey(obj)), 1) for obj in others) + sum(max(len(materialKey(obj)), 1) for _, group in chunks for obj in group)
+	drawCallsAfter = sum(max(len(materialKey(obj)), 1) for obj in others) + sum(max(len(materialKey(group[0])), 1) for _, group in chunks)
+	print('  Draw calls (all objects visible): %d -> %d' % (drawCallsBefore, drawCallsAfter))
+
+	triangles = np.array([sum(triangleCount(obj) for obj in group) for _, group in chunks])
+	sizes = []
+	for _, group in chunks:
+		boxes = [worldBox(obj) for obj in group]
+		sizes.append(float(np.linalg.norm(np.max([b[1] for b in boxes], axis=0) - np.min([b[0] for b in boxes], axis=0))))
+
+	print('  Objects per chunk: min %d, mean %.1f, max %d' % (min(chunkObjects), np.mean(chunkObjects), max(chunkObjects)))
+	print('  Triangles per chunk: min %d, mean %.1f, max %d' % (triangles.min(), triangles.mean(), triangles.max()))
+	print('  Chunk bounding box diagonal: min %.2f, mean %.2f, max %.2f' % (min(sizes), np.mean(sizes), max(sizes)))
@@ -0,0 +1,283 @@
+# PACKS THE TEXTURES OF MATERIALS INTO SHARED TEXTURE ATLASES. USED BY blender-export.py AND blender-export-scene.py
+# DOES NOT IMPORT BLENDER MODULES (THE OBJECTS ARE PASSED IN). KEEP THIS FILE IN THE SAME DIRECTORY AS THE EXPORT SCRIPTS.
+
+# A material can be put into an atlas if its Principled BSDF's Base Color comes from an image texture and the UV coordinates
+# of all polygons that use it are between 0 and 1 (textures that repeat cannot be packed). Its normal map is the image
+# texture of the Normal Map node connected to the Normal input, if there is one. Materials with and without normal maps are
+# put into different atlases. Each atlas is one texture (and one normal map texture) in the scene, so the materials in an
+# atlas with the same colour become one material: blender-export.py merges their regions of the .model files and moves their
+# UV coordinates to their rectangle in the atlas.
+# Both export scripts must use the same atlas size and padding so that the UV coordinates match the atlases.
+
+import numpy as np
+
+import textureencode
+
+# Pixels with less alpha than this are transparent (atlases with transparent pixels are BC3 instead of BC1)
+OPAQUE_ALPHA = 254.5 / 255.0
+
+# UV coordinates can be this far outside of 0 to 1 (rounding errors of UV unwrapping)
+UV_TOLERANCE = 0.001
+
+class Atlas:
+	def __init__(self, normalMaps, mipLevels):
+		self.normalMaps = normalMaps # True if the materials have normal maps
+		self.mipLevels = mipLevels # Number of mip-map levels, limited so that the padding stops textures bleeding into each other
+		self.width = 0
+		self.height = 0
+		self.cells = {} # material name -> (x, y, width, height) of the image and its padding, in pixels from the top left
+		self.rects = {} # material name -> (x, y, width, height) of the image
+
+	# Scale and offset that move UV coordinates (Blender, v up) of the material to its rectangle
+	def uvTransform(self, materialName):
+		x, y, width, height = self.rects[materialName]
+		scale = (width / self.width, height / self.height)
+		return scale, (x / self.width, 1.0 - (y + height) / self.height)
+
+def linkedImage(socket):
+	if socket.is_linked:
+		node = socket.links[0].from_node
+		if node.type == 'TEX_IMAGE' and node.image is not None and node.image.size[0] > 0 and node.image.size[1] > 0:
+			return node.image
+	return None
+
+# Returns (diffuse image, normal map image) of the material. Either can be None
+def materialImages(mat):
+	if mat is None or not mat.use_nodes or mat.node_tree is None:
+		return None, None
+
+	for node in mat.node_tree.nodes:
+		if node.type == 'BSDF_PRINCIPLED':
+			normal = None
+			normalInput = node.inputs['Normal']
+			if normalInput.is_linked and normalInput.links[0].from_node.type == 'NORMAL_MAP':
+				normal = linkedImage(normalInput.links[0].from_node.inputs['Color'])
+			return linkedImage(node.inputs['Base Color']), normal
+
+	return None, None
+
+# Names of the materials that are used by polygons with UV coordinates outside of 0 to 1 or by objects without UV coordinates
+def materialsWithRepeatingUVs(objects):
+	repeating = set()
+	for obj in objects:
+		mesh = obj.data
+		if len(mesh.materials) == 0:
+			continue
+
+		polygonSlots = np.empty(len(mesh.polygons), dtype=np.int32)
+		mesh.polygons.foreach_get('material_index', polygonSlots)
+		polygonSlots = np.minimum(polygonSlots, len(mesh.materials) - 1)
+
+		if mesh.uv_layers.active is None:
+			repeating.update(mesh.materials[slot].name for slot in np.unique(polygonSlots) if mesh.materials[slot] is not None)
+			continue
+
+		loopTotal = np.empty(len(mesh.polygons), dtype=np.int32)
+		mesh.polygons.foreach_get('loop_total', loopTotal)
+		uvs = np.empty(len(mesh.loops) * 2, dtype=np.float32)
+		mesh.uv_layers.active.data.foreach_get('uv', uvs)
+
+		outside = np.any((uvs.reshape(-1, 2) < -UV_TOLERANCE) | (uvs.reshape(-1, 2) > 1.0 + UV_TOLERANCE), axis=1)
+		for slot in np.unique(np.repeat(polygonSlots, loopTotal)[outside]):
+			if mesh.materials[slot] is not None:
+				repeating.add(mesh.materials[slot].name)
+
+	return repeating
+
+# Places the rectangles (name, width, height) on shelves in atlases of at most atlasSize*atlasSize pixels
+# Returns a list of {name: (x, y)} for each atlas
+def packRectangles(rectangles, atlasSize):
+	atlases = [] # (positions, shelves), a shelf is [y, height, used width]
+
+	# Tallest first so that each shelf is filled with rectangles of about the same height
+	for name, width, height in sorted(rectangles, key=lambda r: (-r[2], -r[1], r[0])):
+		for positions, shelves in atlases:
+			shelf = next((s for s in shelves if s[1] >= height and s[2] + width <= atlasSize), None)
+			if shelf is None:
+				top = shelves[-1][0] + shelves[-1][1]
+				if top + height > atlasSize:
+					continue
+				shelf = [top, height, 0]
+				shelves.append(shelf)
+			break
+		else:
+			positions, shelves = {}, [[0, height, 0]]
+			atlases.append((positions, shelves))
+			shelf = shelves[0]
+
+		positions[name] = (shelf[2], shelf[0])
+		shelf[2] += width
+
+	return [positions for positions, _ in atlases]
+
+# Works out which materials go into atlases and where. Only the sizes of the images are read, not the pixels.
+# objects: the mesh objects. Only materials used by the objects are packed.
+# padding: pixels around each image that repeat its edges, so that mip-maps and filtering do not mix in other images
+# Returns a list of Atlas, sorted so that the same blend file always gives the same atlases
+def buildAtlases(materials, objects, atlasSize, padding):
+	if atlasSize <= 0:
+		return []
+
+	usedMaterials = set(m.name for obj in objects for m in obj.data.materials if m is not None)
+	repeating = materialsWithRepeatingUVs(objects)
+
+	# The padding is halved at each mip-map level. Levels with less than 1 pixel of padding are not used.
+	mipLevels = max(padding, 1).bit_length()
+
+	# Cells start and end on multiples of the alignment so that no 4x4 compression block of any level has pixels of two materials
+	alignment = 4 << (mipLevels - 1)
+	align = lambda x: (x + alignment - 1) // alignment * alignment
+
+	groups = {False: [], True: []}
+	for mat in sorted(materials, key=lambda m: m.name):
+		diffuse, normal = materialImages(mat)
+		if diffuse is None or mat.name not in usedMaterials or mat.name in repeating:
+			continue
+
+		width, height = diffuse.size
+		if align(width + 2 * padding) > atlasSize or align(height + 2 * padding) > atlasSize:
+			continue
+
+		groups[normal is not None].append((mat.name, width, height))
+
+	atlases = []
+	for normalMaps in (False, True):
+		rectangles = groups[normalMaps]
+		cellSizes = {name: (align(width + 2 * padding), align(height + 2 * padding)) for name, width, height in rectangles}
+
+		# An atlas with one material does not save anything
+		for positions in packRectangles([(name,) + cellSizes[name] for name, _, _ in rectangles], atlasSize):
+			if len(positions) < 2:
+				continue
+
+			atlas = Atlas(normalMaps, mipLevels)
+			for name, width, height in rectangles:
+				if name in positions:
+					x, y = positions[name]
+					atlas.cells[name] = (x, y) + cellSizes[name]
+					atlas.rects[name] = (x + padding, y + padding, width, height)
+					atlas.width = max(atlas.width, x + cellSizes[name][0])
+					atlas.height = max(atlas.height, y + cellSizes[name][1])
+
+			atlas.mipLevels = min(mipLevels, textureencode.mipLevelCount(atlas.width, atlas.height))
+			atlases.append(atlas)
+
+	return atlases
+
+# Index of the atlas of each material name
+def atlasOfMaterials(atlases):
+	return {name: i for i, atlas in enumerate(atlases) for name in atlas.rects}
+
+# Merges materials with the same colour and atlas (all materials that are not in an atlas are in the same group)
+# These are the materials of the .model files, materials[i] is region i (and mesh renderer slot i in scenes)
+# Returns (unique materials, {material name: index into unique materials})
+def mergeMaterials(materials, atlases):
+	atlasIndices = atlasOfMaterials(atlases)
+
+	unique = []
+	mapping = {}
+	indices = {}
+	for m in materials:
+		key = (tuple(m.diffuse_color), atlasIndices.get(m.name, -1))
+		if key not in indices:
+			indices[key] = len(unique)
+			unique.append(m)
+		mapping[m.name] = indices[key]
+
+	return unique, mapping
+
+# Returns arrays of the UV scale and offset of each of the object's material slots (no change for slots not in an atlas)
+def slotUVTransforms(obj, atlases):
+	slotCount = max(len(obj.data.materials), 1)
+	scales = np.ones((slotCount, 2), dtype=np.float32)
+	offsets = np.zeros((slotCount, 2), dtype=np.float32)
+
+	atlasIndices = atlasOfMaterials(atlases)
+	for slot, mat in enumerate(obj.data.materials):
+		if mat is not None and mat.name in atlasIndices:
+			scales[slot], offsets[slot] = atlases[atlasIndices[mat.name]].uvTransform(mat.name)
+
+	return scales, offsets
+
+# Layout of the atlases, for the export cache
+def layoutHash(atlases):
+	return [(a.normalMaps, a.mipLevels, a.width, a.height, sorted(a.rects.items())) for a in atlases]
+
+# Pixels of a Blender image as a float32 array of shape (height, width, 4), top row first
+def readImagePixels(image):
+	width, height = image.size
+	channels = image.channels
+	pixels = np.empty(width * height * channels, dtype=np.float32)
+	image.pixels.foreach_get(pixels)
+	pixels = pixels.reshape(height, width, channels)[::-1]
+
+	if channels < 3:
+		pixels = np.concatenate([pixels[:, :, :1]] * 3 + [pixels[:, :, 1:]], axis=2)
+	if pixels.shape[2] < 4:
+		pixels = np.concatenate([pixels[:, :, :3], np.ones((height, width, 1), dtype=np.float32)], axis=2)
+	return np.clip(pixels[:, :, :4], 0.0, 1.0)
+
+# Bilinear resize (for normal maps that are not the same size as their material's texture)
+def resizeImage(image, width, height):
+	h, w = image.shape[:2]
+	if (w, h) == (width, height):
+		return image
+
+	y = np.clip((np.arange(height) + 0.5) * h / height - 0.5, 0, h - 1)
+	x = np.clip((np.arange(width) + 0.5) * w / width - 0.5, 0, w - 1)
+	y0, x0 = y.astype(np.int64), x.astype(np.int64)
+	y1, x1 = np.minimum(y0 + 1, h - 1), np.minimum(x0 + 1, w - 1)
+	fy, fx = (y - y0)[:, None, None], (x - x0)[None, :, None]
+
+	top = image[y0][:, x0] * (1 - fx) + image[y0][:, x1] * fx
+	bottom = image[y1][:, x0] * (1 - fx) + image[y1][:, x1] * fx
+	return top * (1 - fy) + bottom * fy
+
+# Draws the images into an atlas image. The padding of each image repeats its edges.
+# images: material name -> float32 array of shape (height, width, channels), top row first
+def atlasPixels(atlas, images):
+	channels = next(iter(images.values())).shape[2]
+	pixels = np.zeros((atlas.height, atlas.width, channels), dtype=np.float32)
+
+	for name, (x, y, width, height) in atlas.rects.items():
+		cellX, cellY, cellWidth, cellHeight = atlas.cells[name]
+		image = resizeImage(images[name], width, height)
+		pixels[cellY:cellY+cellHeight, cellX:cellX+cellWidth] = np.pad(image, ((y - cellY, cellY + cellHeight - y - height),
+			(x - cellX, cellX + cellWidth - x - width), (0, 0)), mode='edge')
+
+	return pixels
+
+# Reads the images of the materials in the atlas and returns the contents of its .bctexture files:
+# (texture, normal map texture or None). Textures are BC1 (BC3 if they have transparent pixels), normal maps are BC5.
+def encodeAtlas(atlas, materials):
+	materials = {m.name: m for m in materials}
+	images = [materialImages(materials[name]) for name in atlas.rects]
+
+	diffuseImages = {name: readImagePixels(d) for name, (d, _) in zip(atlas.rects, images)}
+	blockFormat = 'bc3' if any(np.any(image[:, :, 3] < OPAQUE_ALPHA) for image in diffuseImages.values()) else 'bc1'
+	diffuse = atlasPixels(atlas, diffuseImages)
+	levels = [textureencode.encodeBlocks(level, blockFormat) for level in textureencode.mipMaps(diffuse, False, atlas.mipLevels)]
+	diffuseFile = textureencode.blockCompressedFile(atlas.width, atlas.height, blockFormat, levels)
+
+	normalFile = None
+	if atlas.normalMaps:
+		normals = atlasPixels(atlas, {name: readImagePixels(n)[:, :, :3] for name, (_, n) in zip(atlas.rects, images)})
+		levels = [textureencode.encodeBlocks(level, 'bc5') for level in textureencode.mipMaps(normals, True, atlas.mipLevels)]
+		normalFile = textureencode.blockCompressedFile(atlas.width, atlas.height, 'bc5', levels)
+
+	return diffuseFile, normalFile
+
+# Prints the atlases and the number of textures that the materials in them used before
+def printStatistics(atlases):
+	if len(atlases) == 0:
+		print('Texture atlases: no materials packed')
+		return
+
+	for i, atlas in enumerate(atlases):
+		used = sum(w * h for _, _, w, h in atlas.rects.values())
+		print('Texture atlas %d: %dx%d, %d materials%s, %d mip-map levels, %.0f%% used' % (i, atlas.width, atlas.height, len(atlas.rects),
+			' with normal maps' if atlas.normalMaps else '', atlas.mipLevels, 100.0 * used / (atlas.width * atlas.height)))
+
+	materialCount = sum(len(a.rects) for a in atlases)
+	print('  Textures: %d -> %d' % (sum(2 if a.normalMaps else 1 for a in atlases for _ in a.rects),
+		sum(2 if a.normalMaps else 1 for a in atlases)) + ' (%d materials in %d atlases)' % (materialCount, len(atlases)))
@@ -0,0 +1,275 @@
+# MIP-MAP GENERATION AND TEXTURE ENCODERS (RGB10A2 AND BC1/BC3/BC5 BLOCK COMPRESSION). USED BY convert-textures.py AND textureatlas.py
+# DOES NOT DEPEND ON BLENDER. KEEP THIS FILE IN THE SAME DIRECTORY AS THE EXPORT SCRIPTS.
+
+# Images are float32 arrays of shape (height, width, channels) with values from 0 to 1, top row first (as decoded by
+# stb_image in the engine). The encoders work on all 4x4 blocks of an image at once with NumPy.
+
+import struct
+
+import numpy as np
+
+GAMMA = 2.2 # Same as PostProcess.fs
+
+# Magic bytes of the file formats (see docs/rgb10a2 image format.md and docs/block compressed texture format.md)
+RGB10A2_MAGIC = bytes([0x00, 0x72, 0x67, 0x62, 0x31, 0x30, 0x61, 0x32])
+BC_MAGIC = bytes([0x00, 0x62, 0x63, 0x74, 0x65, 0x78, 0x30, 0x31])
+
+# Format field of .bctexture files
+BC_FORMATS = {'bc1': 1, 'bc3': 3, 'bc5': 5}
+
+# Size of mip-map level 'level' of a width*height image, the same as OpenGL
+def mipLevelSize(width, height, level):
+	return max(width >> level, 1), max(height >> level, 1)
+
+def mipLevelCount(width, height):
+	return max(width, height).bit_length()
+
+# Averages the pixels of the image into newWidth*newHeight boxes. Boxes are 2x2 pixels, or 3 pixels wide or high at odd sizes.
+def downsample(image, newWidth, newHeight):
+	height, width = image.shape[:2]
+	rows = np.arange(newHeight + 1) * height // newHeight
+	columns = np.arange(newWidth + 1) * width // newWidth
+	sums = np.add.reduceat(np.add.reduceat(image, rows[:-1], axis=0), columns[:-1], axis=1)
+	return sums / (np.diff(rows)[:, None, None] * np.diff(columns)[None, :, None])
+
+# Returns the levels of the mip-map chain, starting with the image itself
+# Colours are averaged in linear space (gamma correct) and weighted by alpha so that transparent pixels do not change the
+# colour of the pixels next to them. Normal maps are averaged as vectors and normalised.
+# levels: number of levels, 0 for a full chain (down to 1x1)
+def mipMaps(image, normalMap=False, levels=0):
+	height, width, channels = image.shape
+	if levels <= 0:
+		levels = mipLevelCount(width, height)
+
+	# Grey and alpha images have 2 channels
+	hasAlpha = channels in (2, 4) and not normalMap
+	colourChannels = channels - 1 if hasAlpha else channels
+
+	if normalMap:
+		linear = image[:, :, :3] * 2.0 - 1.0
+	else:
+		linear = image.astype(np.float64)
+		linear[:, :, :colourChannels] = linear[:, :, :colourChannels] ** GAMMA
+		if hasAlpha:
+			linear[:, :, :colourChannels] *= linear[:, :, colourChannels:]
+
+	chain = [image]
+	for level in range(1, levels):
+		linear = downsample(linear, *mipLevelSize(width, height, level))
+
+		if normalMap:
+			lengths = np.linalg.norm(linear, axis=2, keepdims=True)
+			vectors = np.where(lengths > 1e-6, linear / np.maximum(lengths, 1e-6), np.array([0.0, 0.0, 1.0]))
+			chain.append((vectors * 0.5 + 0.5).astype(np.float32))
+			continue
+
+		colour = linear[:, :, :colourChannels]
+		if hasAlpha:
+			alpha = linear[:, :, colourChannels:]
+			colour = np.where(alpha > 1e-6, colour / np.maximum(alpha, 1e-6), 0.0)
+		encoded = np.concatenate([np.clip(colour, 0.0, 1.0) ** (1.0 / GAMMA), linear[:, :, colourChannels:]], axis=2)
+		chain.append(encoded.astype(np.float32))
+
+	return chain
+
+# True if the image looks like a tangent space normal map: almost all pixels are unit vectors pointing out of the surface
+def looksLikeNormalMap(image):
+	if image.shape[2] < 3:
+		return False
+	vectors = image[::4, ::4, :3] * 2.0 - 1.0
+	lengths = np.linalg.norm(vectors, axis=2)
+	return np.mean(np.abs(lengths - 1.0) < 0.1) > 0.95 and np.mean(vectors[:, :, 2] > 0.0) > 0.95
+
+# RGB10A2
+
+# Pixels as u32 with red in the most significant bits (GL_UNSIGNED_INT_10_10_10_2, the same as rgb10a2convert)
+def encodeRGB10A2(image):
+	rgba = np.ones(image.shape[:2] + (4,), dtype=np.float32)
+	rgba[:, :, :image.shape[2]] = image
+	if image.shape[2] < 3:
+		rgba[:, :, 1:3] = image[:, :, :1] # grey
+	r, g, b = (np.round(np.clip(rgba[:, :, i], 0.0, 1.0) * 1023.0).astype(np.uint32) for i in range(3))
+	a = np.round(np.clip(rgba[:, :, 3], 0.0, 1.0) * 3.0).astype(np.uint32)
+	return ((r << 22) | (g << 12) | (b << 2) | a).astype('<u4').tobytes()
+
+# levels: the encoded mip-map levels, biggest first
+def rgb10a2File(width, height, levels):
+	return RGB10A2_MAGIC + struct.pack('<II', width, height) + b''.join(levels)
+
+# Block compression
+
+# Splits the image into 4x4 blocks, copying the last row and column into the padding.
+# Returns an array of shape (block count, 16, channels), blocks in rows, pixels of each block in rows
+def imageBlocks(image):
+	height, width, channels = image.shape
+	paddedHeight, paddedWidth = (height + 3) // 4 * 4, (width + 3) // 4 * 4
+	padded = np.pad(image, ((0, paddedHeight - height), (0, paddedWidth - width), (0, 0)), mode='edge')
+	blocks = padded.reshape(paddedHeight // 4, 4, paddedWidth // 4, 4, channels).transpose(0, 2, 1, 3, 4)
+	return blocks.reshape(-1, 16, channels).astype(np.float64)
+
+def packRGB565(colours):
+	q = np.round(np.clip(colours, 0.0, 1.0) * np.array([31.0, 63.0, 31.0])).astype(np.uint32)
+	return (q[:, 0] << 11) | (q[:, 1] << 5) | q[:, 2]
+
+def unpackRGB565(packed):
+	return np.stack([(packed >> 11) & 31, (packed >> 5) & 63, packed & 31], axis=1) / np.array([31.0, 63.0, 31.0])
+
+# Chooses the nearest of the 4 colours for each pixel. Returns (indices, squared error of each block)
+# The colours are endpoint 0, endpoint 1, 2/3 * e0 + 1/3 * e1 and 1/3 * e0 + 2/3 * e1 (index order of BC1)
+def colourIndices(blocks, e0, e1):
+	palette = np.stack([e0, e1, (2.0 * e0 + e1) / 3.0, (e0 + 2.0 * e1) / 3.0], axis=1)
+	distances = np.sum((blocks[:, :, None, :] - palette[:, None, :, :]) ** 2, axis=3)
+	indices = np.argmin(distances, axis=2)
+	return indices, np.take_along_axis(distances, indices[:, :, None], axis=2).sum(axis=(1, 2))
+
+# Endpoints that best fit the pixels for the chosen indices (least squares)
+def fitEndpoints(blocks, indices, e0, e1):
+	w = np.array([1.0, 0.0, 2.0 / 3.0, 1.0 / 3.0])[indices] # weight of endpoint 0
+	aa = np.sum(w * w, axis=1)
+	bb = np.sum((1.0 - w) ** 2, axis=1)
+	ab = np.sum(w * (1.0 - w), axis=1)
+	ax = np.einsum('ni,nic->nc', w, blocks)
+	bx = np.einsum('ni,nic->nc', 1.0 - w, blocks)
+	det = aa * bb - ab * ab
+
+	# Blocks where all pixels use the same index keep their endpoints
+	ok = np.abs(det) > 1e-8
+	safeDet = np.where(ok, det, 1.0)[:, None]
+	newE0 = np.where(ok[:, None], (ax * bb[:, None] - bx * ab[:, None]) / safeDet, e0)
+	newE1 = np.where(ok[:, None], (bx * aa[:, None] - ax * ab[:, None]) / safeDet, e1)
+	return np.clip(newE0, 0.0, 1.0), np.clip(newE1, 0.0, 1.0)
+
+# Returns the 8 byte BC1 colour blocks of the (block count, 16, 3) colours, in 4 colour mode
+def encodeColourBlocks(blocks):
+	blockCount = len(blocks)
+
+	# Endpoints at the ends of the principal axis of the colours, moved in by 1/16 of the range (like stb_dxt)
+	mean = blocks.mean(axis=1)
+	centred = blocks - mean[:, None, :]
+	covariance = np.einsum('nic,nid->ncd', centred, centred)
+	# Power iteration, starting from the column of the channel that varies the most
+	axis = covariance[np.arange(blockCount), :, np.argmax(np.diagonal(covariance, axis1=1, axis2=2), axis=1)]
+	for _ in range(8):
+		axis = np.einsum('ncd,nd->nc', covariance, axis)
+		axis /= np.maximum(np.linalg.norm(axis, axis=1, keepdims=True), 1e-12)
+	projected = np.einsum('nic,nc->ni', centred, axis)
+	low, high = projected.min(axis=1), projected.max(axis=1)
+	inset = (high - low) / 16.0
+	e0 = np.clip(mean + axis * (high - inset)[:, None], 0.0, 1.0)
+	e1 = np.clip(mean + axis * (low + inset)[:, None], 0.0, 1.0)
+
+	# Quantise, then refine the endpoints once for the chosen indices and keep whichever is better
+	bestPacked = None
+	for _ in range(2):
+		c0, c1 = packRGB565(e0), packRGB565(e1)
+		indices, error = colourIndices(blocks, unpackRGB565(c0), unpackRGB565(c1))
+		if bestPacked is None:
+			bestPacked, bestIndices, bestError = (c0, c1), indices, error
+		else:
+			better = error < bestError
+			bestPacked = tuple(np.where(better, new, old) for new, old in zip((c0, c1), bestPacked))
+			bestIndices = np.where(better[:, None], indices, bestIndices)
+		e0, e1 = fitEndpoints(blocks, indices, unpackRGB565(c0), unpackRGB565(c1))
+
+	c0, c1 = bestPacked
+	indices = bestIndices
+
+	# 4 colour mode needs c0 > c1. Swapping the endpoints swaps indices 0 and 1 and indices 2 and 3.
+	swap = c0 < c1
+	c0, c1 = np.where(swap, c1, c0), np.where(swap, c0, c1)
+	indices = np.where(swap[:, None], indices ^ 1, indices)
+
+	# If the endpoints are the same the block is in 3 colour mode, where index 3 is black
+	indices[c0 == c1] = 0
+
+	packedIndices = np.sum(indices.astype(np.uint64) << (2 * np.arange(16, dtype=np.uint64)), axis=1)
+
+	out = np.empty((blockCount, 8), dtype=np.uint8)
+	out[:, 0:2] = c0.astype('<u2').view(np.uint8).reshape(-1, 2)
+	out[:, 2:4] = c1.astype('<u2').view(np.uint8).reshape(-1, 2)
+	out[:, 4:8] = packedIndices.astype('<u4').view(np.uint8).reshape(-1, 4)
+	return out
+
+# Returns the 8 byte BC4 blocks (also the alpha blocks of BC3 and the channels of BC5) of the (block count, 16) values
+# Uses 8 value mode: endpoint 0 is the maximum and endpoint 1 the minimum
+def encodeChannelBlocks(values):
+	a0 = np.round(values.max(axis=1) * 255.0).astype(np.int64)
+	a1 = np.round(values.min(axis=1) * 255.0).astype(np.int64)
+
+	# Index 0 is a0, 1 is a1, 2 to 7 are ((7 - i) * a0 + i * a1) / 7 for i from 1 to 6
+	weights = np.array([0.0, 7.0, 1.0, 2.0, 3.0, 4.0, 5.0, 6.0]) / 7.0
+	palette = (a0[:, None] * (1.0 - weights) + a1[:, None] * weights) / 255.0
+	indices = np.argmin(np.abs(values[:, :, None] - palette[:, None, :]), axis=2).astype(np.uint64)
+
+	# If the endpoints are the same the block is in 6 value mode, all pixels use a0
+	indices[a0 == a1] = 0
+
+	packedIndices = np.sum(indices << (3 * np.arange(16, dtype=np.uint64)), axis=1)
+
+	out = np.empty((len(values), 8), dtype=np.uint8)
+	out[:, 0] = a0
+	out[:, 1] = a1
+	out[:, 2:8] = packedIndices.astype('<u8').view(np.uint8).reshape(-1, 8)[:, :6]
+	return out
+
+# Returns the block compressed image data (blocks in rows, top row first)
+# bc1: RGB. bc3: RGBA (BC4 alpha block then BC1 colour block). bc5: RG (two BC4 blocks), for normal maps
+def encodeBlocks(image, blockFormat):
+	blocks = imageBlocks(image)
+
+	if blockFormat == 'bc5':
+		parts = [encodeChannelBlocks(blocks[:, :, 0]), encodeChannelBlocks(blocks[:, :, 1])]
+	else:
+		if blocks.shape[2] < 3:
+			blocks = np.concatenate([blocks[:, :, :1]] * 3 + [blocks[:, :, 1:]], axis=2)
+		parts = [encodeColourBlocks(blocks[:, :, :3])]
+		if blockFormat == 'bc3':
+			alpha = blocks[:, :, 3] if blocks.shape[2] == 4 else np.ones(blocks.shape[:2])
+			parts.insert(0, encodeChannelBlocks(alpha))
+
+	return np.concatenate(parts, axis=1).tobytes()
+
+# levels: the encoded mip-map levels, biggest first
+def blockCompressedFile(width, height, blockFormat, levels):
+	return BC_MAGIC + struct.pack('<IIII', width, height, BC_FORMATS[blockFormat], len(levels)) + b''.join(levels)
+
+# Decodes block compressed data back to an image (for checking the encoders)
+def decodeBlocks(data, width, height, blockFormat):
+	blocksWide, blocksHigh = (width + 3) // 4, (height + 3) // 4
+	blockSize = 8 if blockFormat == 'bc1' else 16
+	raw = np.frombuffer(data, dtype=np.uint8)[:blocksWide * blocksHigh * blockSize].reshape(-1, blockSize)
+
+	def decodeChannel(b):
+		a0, a1 = b[:, 0].astype(np.float64), b[:, 1].astype(np.float64)
+		bits = np.zeros(len(b), dtype=np.uint64)
+		for i in range(6):
+			bits |= b[:, 2 + i].astype(np.uint64) << np.uint64(8 * i)
+		indices = ((bits[:, None] >> (3 * np.arange(16, dtype=np.uint64))) & np.uint64(7)).astype(np.int64)
+		weights = np.array([0.0, 7.0, 1.0, 2.0, 3.0, 4.0, 5.0, 6.0]) / 7.0
+		eightValues = a0[:, None] * (1.0 - weights) + a1[:, None] * weights
+		sixValues = np.concatenate([eightValues[:, :2], a0[:, None] * (1.0 - weights[2:6] * 7.0 / 5.0) + a1[:, None] * weights[2:6] * 7.0 / 5.0,
+			np.zeros((len(b), 1)), np.full((len(b), 1), 255.0)], axis=1)
+		palette = np.where((a0 > a1)[:, None], eightValues, sixValues)
+		return np.take_along_axis(palette, indices, axis=1) / 255.0
+
+	def decodeColour(b):
+		c0 = b[:, 0].astype(np.uint32) | (b[:, 1].astype(np.uint32) << 8)
+		c1 = b[:, 2].astype(np.uint32) | (b[:, 3].astype(np.uint32) << 8)
+		bits = b[:, 4:8].copy().view('<u4').ravel()
+		indices = (bits[:, None] >> (2 * np.arange(16, dtype=np.uint32))) & 3
+		e0, e1 = unpackRGB565(c0), unpackRGB565(c1)
+		fourColours = np.stack([e0, e1, (2.0 * e0 + e1) / 3.0, (e0 + 2.0 * e1) / 3.0], axis=1)
+		threeColours = np.stack([e0, e1, (e0 + e1) / 2.0, np.zeros_like(e0)], axis=1)
+		palette = np.where((c0 > c1)[:, None, None], fourColours, threeColours)
+		return np.take_along_axis(palette, indices[:, :, None].astype(np.int64), axis=1)
+
+	if blockFormat == 'bc1':
+		pixels = decodeColour(raw)
+	elif blockFormat == 'bc3':
+		pixels = np.concatenate([decodeColour(raw[:, 8:]), decodeChannel(raw[:, :8])[:, :, None]], axis=2)
+	else:
+		pixels = np.stack([decodeChannel(raw[:, :8]), decodeChannel(raw[:, 8:])], axis=2)
+
+	channels = pixels.shape[2]
+	image = pixels.reshape(blocksHigh, blocksWide, 4, 4, channels).transpose(0, 2, 1, 3, 4).reshape(blocksHigh * 4, blocksWide * 4, channels)
+	return image[:height, :width].astype(np.float32)
@@ -84,6 +84,20 @@ pub fn build(b: *Builder) void {
     addSettings(rgb10a2convert_exe);
     b.installArtifact(rgb10a2convert_exe);
 
+    // benchmarks
+
+    const vertex_layout_benchmark_exe = b.addExecutable("vertex-layout-benchmark", "src/VertexLayoutBenchmark.zig");
+    vertex_layout_benchmark_exe.setBuildMode(mode);
+    vertex_layout_benchmark_exe.setMainPkgPath("src");
+    addSettings(vertex_layout_benchmark_exe);
+    b.installArtifact(vertex_layout_benchmark_exe);
+
+    const asset_load_benchmark_exe = b.addExecutable("asset-load-benchmark", "src/AssetLoadBenchmark.zig");
+    asset_load_benchmark_exe.setBuildMode(mode);
+    asset_load_benchmark_exe.setMainPkgPath("src");
+    addSettings(asset_load_benchmark_exe);
+    b.installArtifact(asset_load_benchmark_exe);
+
     // tests
 
     comptime var i: u32 = 0;
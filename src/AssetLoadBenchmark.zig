@@ -0,0 +1,154 @@
+// Measures how long the asset loader takes to load and decode the assets of a scene with different numbers of decode threads.
+// Each run starts the asset loader the same way as the demos do and waits for it to finish.
+// If DemoAssets contains an asset archive for the scene (e.g. Farm.assets, see Tools/pack-assets.py) then the runs are repeated
+// with the assets read from the archive.
+// The first run is not counted so that all runs read the files from the operating system's file cache.
+//
+// Usage: asset-load-benchmark [scene file in DemoAssets] [runs]
+// Defaults to Farm.scene and 10 runs. Run from the repository root.
+
+const std = @import("std");
+const warn = std.debug.warn;
+const c_allocator = std.heap.c_allocator;
+const Files = @import("Files.zig");
+const loadFile = Files.loadFile;
+const assets = @import("Assets/Assets.zig");
+const Asset = assets.Asset;
+const scenes = @import("Scene/Scene.zig");
+
+const RunResults = struct {
+    wall_time: u64 = 0, // start of loading to last asset decoded (µs)
+    decode_time: u64 = 0, // sum of the decode times of all assets (µs)
+    longest_decode: u64 = 0, // µs
+    longest_wait: u64 = 0, // longest time between an asset being read and decoding starting (µs)
+};
+
+var run_results: RunResults = RunResults{};
+
+// Called on a decoder thread
+fn assetTimed(a: *Asset) void {
+    const t = a.load_times;
+    if (t.decoded == 0) {
+        return;
+    }
+
+    const decode = (t.decoded - t.decode_start) / 1000;
+    const wait = (t.decode_start - t.file_loaded) / 1000;
+
+    // Results are only read after all threads have finished
+    _ = @atomicRmw(u64, &run_results.decode_time, .Add, decode, .SeqCst);
+    _ = @atomicRmw(u64, &run_results.longest_decode, .Max, decode, .SeqCst);
+    _ = @atomicRmw(u64, &run_results.longest_wait, .Max, wait, .SeqCst);
+}
+
+fn run(scene_file: []align(4) const u8, decode_threads: u32) !RunResults {
+    var assets_list = std.ArrayList(Asset).init(c_allocator);
+    defer assets_list.deinit();
+
+    try scenes.getAssets(scene_file, &assets_list);
+    defer {
+        for (assets_list.items) |*a| {
+            a.*.free(true);
+        }
+    }
+
+    for (assets_list.items) |*a| {
+        a.whenAssetTimed = assetTimed;
+    }
+
+    run_results = RunResults{};
+    assets.setDecodeThreadCount(decode_threads);
+
+    var timer = try std.time.Timer.start();
+
+    try assets.startAssetLoader1(assets_list.items, c_allocator);
+
+    while (!assets.assetsLoaded()) {
+        std.time.sleep(100 * 1000);
+    }
+
+    var results = run_results;
+    results.wall_time = timer.read() / 1000;
+
+    assets.assetLoaderCleanup();
+
+    try assets.verifyAllAssetsLoaded(assets_list.items);
+
+    return results;
+}
+
+fn benchmark(scene_file: []align(4) const u8, decode_threads: u32, runs: u32) !void {
+    _ = try run(scene_file, decode_threads);
+
+    var total = RunResults{};
+    var min_wall_time: u64 = std.math.maxInt(u64);
+
+    var i: u32 = 0;
+    while (i < runs) : (i += 1) {
+        const r = try run(scene_file, decode_threads);
+        total.wall_time += r.wall_time;
+        total.decode_time += r.decode_time;
+        total.longest_decode += r.longest_decode;
+        total.longest_wait += r.longest_wait;
+        min_wall_time = std.math.min(min_wall_time, r.wall_time);
+    }
+
+    warn("    {} decode thread(s): wall time avg {} us, min {} us. Decode time total {} us, longest {} us. Longest queue wait {} us\n", .{
+        decode_threads,
+        total.wall_time / runs,
+        min_wall_time,
+        total.decode_time / runs,
+        total.longest_decode / runs,
+        total.longest_wait / runs,
+    });
+}
+
+fn benchmarkThreadCounts(scene_file: []align(4) const u8, runs: u32) !void {
+    const cores = @intCast(u32, std.math.min(std.Thread.cpuCount() catch 1, 64));
+
+    var threads: u32 = 1;
+    while (threads < cores) : (threads *= 2) {
+        try benchmark(scene_file, threads, runs);
+    }
+    try benchmark(scene_file, cores, runs);
+}
+
+pub fn main() !void {
+    const args = try std.process.argsAlloc(c_allocator);
+    defer std.process.argsFree(c_allocator, args);
+
+    if (args.len > 3) {
+        warn("Usage: asset-load-benchmark [scene file] [runs]\n", .{});
+        return error.InvalidParameters;
+    }
+
+    const scene_file_name = if (args.len >= 2) args[1] else "Farm.scene";
+    const runs = if (args.len >= 3) try std.fmt.parseInt(u32, args[2], 10) else 10;
+
+    if (runs == 0) {
+        return error.InvalidParameters;
+    }
+
+    assets.setAssetsDirectory("DemoAssets" ++ Files.path_seperator);
+
+    var path: [256]u8 = undefined;
+    const scene_file = try loadFile(try std.fmt.bufPrint(path[0..], "DemoAssets{}{}", .{ Files.path_seperator, scene_file_name }), c_allocator);
+    defer c_allocator.free(scene_file);
+
+    warn("{} ({} runs)\n", .{ scene_file_name, runs });
+
+    warn("Asset files:\n", .{});
+    try benchmarkThreadCounts(scene_file, runs);
+
+    const scene_name = scene_file_name[0 .. std.mem.lastIndexOfScalar(u8, scene_file_name, '.') orelse scene_file_name.len];
+    const archive_path = try std.fmt.bufPrint(path[0..], "DemoAssets{}{}.assets", .{ Files.path_seperator, scene_name });
+
+    assets.openArchive(archive_path, c_allocator) catch {
+        warn("No asset archive ({})\n", .{archive_path});
+        return;
+    };
+    defer assets.closeArchive();
+
+    warn("Asset archive:\n", .{});
+    try benchmarkThreadCounts(scene_file, runs);
+}
@@ -1,9 +1,12 @@
 const std = @import("std");
+const builtin = @import("builtin");
 const assert = std.debug.assert;
 const loadFile = @import("../Files.zig").loadFile;
+const loadFileAligned = @import("../Files.zig").loadFileAligned;
 const compress = @import("../Compress/Compress.zig");
 const ModelData = @import("../ModelFiles/ModelFiles.zig").ModelData;
 const AnimationData = @import("../ModelFiles/AnimationFiles.zig").AnimationData;
+const AnimationBank = @import("../ModelFiles/AnimationFiles.zig").AnimationBank;
 const wgi = @import("../WindowGraphicsInput/WindowGraphicsInput.zig");
 const ConditionVariable = @import("../ConditionVariable.zig").ConditionVariable;
 const ReferenceCounter = @import("../RefCount.zig").ReferenceCounter;
@@ -18,6 +21,133 @@ pub fn setAssetsDirectory(dir: []const u8) void {
 // Static buffer used for appending asset file path to global asset directory path
 var path: [256]u8 = undefined;
 
+// Assets can be loaded from an archive made by Tools/pack-assets.py (see docs/asset archive format.md) instead of from
+// separate files. The archive is memory-mapped and assets are decompressed straight from it.
+
+pub const ArchiveEntry = extern struct {
+    name_hash: u64, // FNV-1a hash of the asset file path
+    offset: u64,
+    size: u32,
+    original_size: u32, // Size after decompression
+    asset_type: u32, // Asset.AssetType
+    flags: u32,
+};
+
+const Archive = struct {
+    data: []align(std.mem.page_size) u8,
+    entries: []const ArchiveEntry, // Sorted by name_hash
+    mapped: bool, // If false the archive was read into memory
+    allocator: *std.mem.Allocator,
+};
+
+var archive: ?Archive = null;
+
+// Returns the table of contents of the archive
+fn parseArchive(data: []align(16) const u8) ![]const ArchiveEntry {
+    if (data.len < 16) {
+        return error.FileTooSmall;
+    }
+
+    const data_u32 = std.mem.bytesAsSlice(u32, data[0..16]);
+    if (data_u32[0] != 0x73736100 or data_u32[1] != 0x31737465) {
+        return error.InvalidMagic;
+    }
+
+    const entry_count = data_u32[2];
+    if (entry_count > (data.len - 16) / @sizeOf(ArchiveEntry)) {
+        return error.FileTooSmall;
+    }
+
+    const entries = std.mem.bytesAsSlice(ArchiveEntry, @alignCast(@alignOf(ArchiveEntry), data[16 .. 16 + entry_count * @sizeOf(ArchiveEntry)]));
+
+    var i: u32 = 0;
+    while (i < entry_count) : (i += 1) {
+        const e = entries[i];
+        if (e.offset % 16 != 0 or e.offset > @intCast(u64, data.len)) {
+            return error.InvalidArchiveEntry;
+        }
+        if (e.size > data.len - @intCast(usize, e.offset)) {
+            return error.InvalidArchiveEntry;
+        }
+        if (i > 0 and e.name_hash <= entries[i - 1].name_hash) {
+            return error.InvalidArchiveEntry;
+        }
+    }
+
+    return entries;
+}
+
+fn findInArchive(entries: []const ArchiveEntry, file_path: []const u8) ?ArchiveEntry {
+    const hash = std.hash.Fnv1a_64.hash(file_path);
+
+    var low: usize = 0;
+    var high: usize = entries.len;
+    while (low < high) {
+        const middle = low + (high - low) / 2;
+        if (entries[middle].name_hash < hash) {
+            low = middle + 1;
+        } else if (entries[middle].name_hash > hash) {
+            high = middle;
+        } else {
+            return entries[middle];
+        }
+    }
+    return null;
+}
+
+// Assets in the archive are loaded from it, other assets are loaded from their files.
+// Call before starting the asset loader. Only one archive can be open.
+// The data of uncompressed assets stays in the archive, call closeArchive after the assets have been freed.
+pub fn openArchive(file_path: []const u8, allocator: *std.mem.Allocator) !void {
+    if (archive != null) {
+        return error.InvalidState;
+    }
+
+    var data: []align(std.mem.page_size) u8 = undefined;
+    var mapped = false;
+
+    if (builtin.os.tag == builtin.Os.Tag.windows) {
+        data = try loadFileAligned(std.mem.page_size, file_path, allocator);
+    } else {
+        var file = try std.fs.cwd().openFile(file_path, std.fs.File.OpenFlags{});
+        defer file.close();
+
+        const size = try file.getEndPos();
+        if (size < 16) {
+            return error.FileTooSmall;
+        }
+
+        // Private mapping: decoders can write to the data without changing the file
+        data = try std.os.mmap(null, @intCast(usize, size), std.os.PROT_READ | std.os.PROT_WRITE, std.os.MAP_PRIVATE, file.handle, 0);
+        mapped = true;
+    }
+    errdefer {
+        if (mapped) {
+            std.os.munmap(data);
+        } else {
+            allocator.free(data);
+        }
+    }
+
+    archive = Archive{
+        .data = data,
+        .entries = try parseArchive(data),
+        .mapped = mapped,
+        .allocator = allocator,
+    };
+}
+
+pub fn closeArchive() void {
+    if (archive != null) {
+        if (archive.?.mapped) {
+            std.os.munmap(archive.?.data);
+        } else {
+            archive.?.allocator.free(archive.?.data);
+        }
+        archive = null;
+    }
+}
+
 pub const Asset = struct {
     ref_count: ReferenceCounter = ReferenceCounter{},
 
@@ -32,6 +162,8 @@ pub const Asset = struct {
         Texture,
         RGB10A2Texture,
         Animation,
+        AnimationBank,
+        BlockCompressedTexture,
         // Shader
     };
 
@@ -41,6 +173,8 @@ pub const Asset = struct {
         false,
         false,
         true,
+        true,
+        false,
     };
 
     pub const AssetState = enum {
@@ -59,14 +193,39 @@ pub const Asset = struct {
     data: ?[]align(4) u8,
     allocator: ?*std.mem.Allocator = null,
 
+    // If true data is part of the archive and is not freed
+    data_in_archive: bool = false,
+
     // -- Configuration variables --
 
     // if asset_type == AssetType.Texture
     texture_channels: u32 = 0,
 
+    // The asset loader reads assets with a priority above 0 first and decodes assets with higher priorities first
+    load_priority: u32 = 0,
+
     whenFileLoaded: ?(fn (*Asset) void) = null,
     whenAssetDecoded: ?(fn (*Asset) void) = null,
 
+    // Called by the asset loader after the asset has been decoded (or failed to load), with load_times set
+    whenAssetTimed: ?(fn (*Asset) void) = null,
+
+    // -- Load statistics --
+
+    // Size of the data after decompression. Set by load(). Assets of the same priority are decoded biggest first
+    decoded_size: u32 = 0,
+
+    // Set by the asset loader
+    load_times: LoadTimes = LoadTimes{},
+
+    // Nanoseconds since the asset loader was started. 0 if the step did not happen
+    pub const LoadTimes = struct {
+        file_load_start: u64 = 0,
+        file_loaded: u64 = 0,
+        decode_start: u64 = 0,
+        decoded: u64 = 0,
+    };
+
     // -- Asset (meta)data --
 
     // if asset_type == AssetType.Model
@@ -75,14 +234,23 @@ pub const Asset = struct {
     // if asset_type == AssetType.Animation
     animation: ?AnimationData,
 
-    // if asset_type == AssetType.Texture or asset_type == AssetType.RGB10A2Texture
+    // if asset_type == AssetType.AnimationBank
+    animation_bank: ?AnimationBank,
+
+    // if asset_type == AssetType.Texture or asset_type == AssetType.RGB10A2Texture or asset_type == AssetType.BlockCompressedTexture
     texture_width: ?u32,
     texture_height: ?u32,
     texture_type: ?wgi.image.ImageType,
 
+    // Number of mip-map levels in rgb10a2_data or block_compressed_data. 1 if the mip-maps are not precomputed
+    texture_mip_levels: u32 = 1,
+
     // if asset_type == AssetType.RGB10A2Texture
     rgb10a2_data: ?[]u8,
 
+    // if asset_type == AssetType.BlockCompressedTexture
+    block_compressed_data: ?[]u8 = null,
+
     // file_path_ is copied into the returned Asset struct
     // Don't forget to set the relvant configuration variables
     pub fn init(file_path_: []const u8) !Asset {
@@ -104,6 +272,8 @@ pub const Asset = struct {
             asset_type = AssetType.Model;
         } else if (file_path.len >= 5 and std.mem.eql(u8, file_path[file_path.len - 5 ..], ".anim")) {
             asset_type = AssetType.Animation;
+        } else if (file_path.len >= 9 and std.mem.eql(u8, file_path[file_path.len - 9 ..], ".animbank")) {
+            asset_type = AssetType.AnimationBank;
         } else if (file_path.len >= 4 and std.mem.eql(u8, file_path[file_path.len - 4 ..], ".png")) {
             asset_type = AssetType.Texture;
         } else if (file_path.len >= 4 and std.mem.eql(u8, file_path[file_path.len - 4 ..], ".jpg")) {
@@ -114,6 +284,8 @@ pub const Asset = struct {
             asset_type = AssetType.Texture;
         } else if (file_path.len >= 8 and std.mem.eql(u8, file_path[file_path.len - 8 ..], ".rgb10a2")) {
             asset_type = AssetType.RGB10A2Texture;
+        } else if (file_path.len >= 10 and std.mem.eql(u8, file_path[file_path.len - 10 ..], ".bctexture")) {
+            asset_type = AssetType.BlockCompressedTexture;
         }
         // else if(file_path.len >= 3 and  std.mem.eql(u8,
         //     file_path[file_path.len-3..], ".vs")) {
@@ -139,6 +311,7 @@ pub const Asset = struct {
             .state = AssetState.NotLoaded,
             .model = null,
             .animation = null,
+            .animation_bank = null,
             .data = null,
             .texture_width = null,
             .texture_height = null,
@@ -157,11 +330,30 @@ pub const Asset = struct {
         }
         self.allocator = allocator_;
 
-        if (assets_directory == null) {
-            self.data = try loadFile(self.file_path[0..self.file_path_len], allocator_);
+        const entry = if (archive == null) null else findInArchive(archive.?.entries, self.file_path[0..self.file_path_len]);
+
+        if (entry != null) {
+            if (entry.?.asset_type != @enumToInt(self.asset_type)) {
+                return error.InvalidArchiveEntry;
+            }
+            const offset = @intCast(usize, entry.?.offset);
+            self.data = @alignCast(4, archive.?.data[offset .. offset + entry.?.size]);
+            self.data_in_archive = true;
+            self.decoded_size = entry.?.original_size;
         } else {
-            const n = std.fmt.bufPrint(path[0..], "{}{}", .{ assets_directory, self.file_path[0..self.file_path_len] }) catch unreachable;
-            self.data = try loadFile(n, allocator_);
+            if (assets_directory == null) {
+                self.data = try loadFile(self.file_path[0..self.file_path_len], allocator_);
+            } else {
+                const n = std.fmt.bufPrint(path[0..], "{}{}", .{ assets_directory, self.file_path[0..self.file_path_len] }) catch unreachable;
+                self.data = try loadFile(n, allocator_);
+            }
+
+            var original_size: u32 = 0;
+            if (self.compressed and (compress.isCompressedFile(self.data.?, &original_size) catch false)) {
+                self.decoded_size = original_size;
+            } else {
+                self.decoded_size = @intCast(u32, self.data.?.len);
+            }
         }
         self.state = AssetState.Loaded;
 
@@ -178,22 +370,34 @@ pub const Asset = struct {
 
         if (self.compressed) {
             const newData = try compress.decompress(self.data.?, self.allocator.?);
-            self.allocator.?.free(self.data.?);
-            self.data = newData;
+
+            // decompress returns the same data if it is not compressed
+            if (newData.ptr != self.data.?.ptr) {
+                if (!self.data_in_archive) {
+                    self.allocator.?.free(self.data.?);
+                }
+                self.data = newData;
+                self.data_in_archive = false;
+            }
         }
 
         if (self.asset_type == AssetType.Model) {
             self.model = try ModelData.init(self.data.?, self.allocator.?);
         } else if (self.asset_type == AssetType.Animation) {
             self.animation = try AnimationData.init(self.data.?);
+        } else if (self.asset_type == AssetType.AnimationBank) {
+            self.animation_bank = try AnimationBank.init(self.data.?, self.allocator.?);
         } else if (self.asset_type == AssetType.Texture) {
             var w: u32 = 0;
             var h: u32 = 0;
             const newData = try wgi.image.decodeImage(self.data.?, &self.texture_channels, &w, &h, self.allocator.?);
             self.texture_width = w;
             self.texture_height = h;
-            wgi.image.freeDecodedImage(self.data.?);
+            if (!self.data_in_archive) {
+                wgi.image.freeDecodedImage(self.data.?);
+            }
             self.data = newData;
+            self.data_in_archive = false;
 
             if (self.texture_channels == 3) {
                 self.texture_type = wgi.image.ImageType.RGB;
@@ -226,6 +430,44 @@ pub const Asset = struct {
             self.rgb10a2_data = self.data.?[16..];
 
             self.texture_type = wgi.image.ImageType.RGB10A2;
+
+            // Mip-map levels can follow the image
+            self.texture_mip_levels = try wgi.image.mipLevelsInData(w, h, wgi.image.ImageType.RGB10A2, self.rgb10a2_data.?.len);
+        } else if (self.asset_type == AssetType.BlockCompressedTexture) {
+            if (self.data.?.len < 24) {
+                return error.FileTooSmall;
+            }
+
+            const file_data_u32: []u32 = std.mem.bytesAsSlice(u32, self.data.?);
+            if (file_data_u32[0] != 0x74636200 or file_data_u32[1] != 0x31307865) {
+                return error.InvalidMagic;
+            }
+
+            const w = file_data_u32[2];
+            const h = file_data_u32[3];
+
+            if (w == 0 or h == 0 or w > 32768 or h > 32768) {
+                return error.InvalidDimensions;
+            }
+
+            if (file_data_u32[4] == 1) {
+                self.texture_type = wgi.image.ImageType.BC1;
+            } else if (file_data_u32[4] == 3) {
+                self.texture_type = wgi.image.ImageType.BC3;
+            } else if (file_data_u32[4] == 5) {
+                self.texture_type = wgi.image.ImageType.BC5;
+            } else {
+                return error.InvalidTextureFormat;
+            }
+
+            self.texture_width = w;
+            self.texture_height = h;
+            self.block_compressed_data = self.data.?[24..];
+
+            self.texture_mip_levels = try wgi.image.mipLevelsInData(w, h, self.texture_type.?, self.block_compressed_data.?.len);
+            if (self.texture_mip_levels != file_data_u32[5]) {
+                return error.InvalidDataSize;
+            }
         }
         // else if(self.asset_type == AssetType.Shader) {
         // }
@@ -244,7 +486,9 @@ pub const Asset = struct {
             return;
         }
         self.ref_count2.deinit();
-        self.allocator.?.free(self.data.?);
+        if (!self.data_in_archive) {
+            self.allocator.?.free(self.data.?);
+        }
         self.data = null;
     }
 
@@ -256,11 +500,15 @@ pub const Asset = struct {
         if (self.state == AssetState.Ready) {
             if (self.asset_type == AssetType.Model) {
                 self.model.?.free(self.allocator.?);
+            } else if (self.asset_type == AssetType.AnimationBank) {
+                self.animation_bank.?.free(self.allocator.?);
             }
         }
 
         if (self.data != null) {
-            self.allocator.?.free(self.data.?);
+            if (!self.data_in_archive) {
+                self.allocator.?.free(self.data.?);
+            }
             self.data = null;
         }
         self.state = AssetState.Freed;
@@ -271,10 +519,49 @@ var assets_to_load = std.atomic.Int(u32).init(0);
 var cv: ?ConditionVariable = null;
 
 var assets_to_load_queue: std.atomic.Queue(*Asset) = std.atomic.Queue(*Asset).init();
-var assets_to_decompress_queue: std.atomic.Queue(*Asset) = std.atomic.Queue(*Asset).init();
+
+// Loaded assets waiting to be decoded, see decodeFirst
+var decode_queue: ?std.PriorityQueue(*Asset) = null;
+var decode_queue_mutex = std.Mutex.init();
+
+// The file loader thread and the decoder threads
+var loader_threads = std.atomic.Int(u32).init(0);
+
+// 0: number of CPU cores - 1 (at least 1)
+var decode_thread_count: u32 = 0;
+
+var load_timer: ?std.time.Timer = null;
 
 var abort_load = std.atomic.Int(u32).init(0);
 
+// Sets the number of threads that decompress and decode assets. 0 (the default) uses one less than the number of CPU cores
+// Files are read by one thread. Takes effect the next time the asset loader is started.
+pub fn setDecodeThreadCount(count: u32) void {
+    decode_thread_count = count;
+}
+
+fn decodeThreads() u32 {
+    if (decode_thread_count > 0) {
+        return decode_thread_count;
+    }
+    const cores = std.Thread.cpuCount() catch 2;
+    return std.math.max(@intCast(u32, std.math.min(cores, 64)), 2) - 1;
+}
+
+// Nanoseconds since the asset loader was started
+fn loadTime() u64 {
+    return load_timer.?.read();
+}
+
+// True if a should be decoded before b: higher load_priority first, then the biggest assets so that a big asset does not
+// finish long after all of the others
+fn decodeFirst(a: *Asset, b: *Asset) bool {
+    if (a.load_priority != b.load_priority) {
+        return a.load_priority > b.load_priority;
+    }
+    return a.decoded_size > b.decoded_size;
+}
+
 // Do not call this while assets are being loaded
 pub fn addAssetToQueue(asset: *Asset, allocator: *std.mem.Allocator) !void {
     if (asset.state != Asset.AssetState.NotLoaded) {
@@ -289,62 +576,136 @@ pub fn addAssetToQueue(asset: *Asset, allocator: *std.mem.Allocator) !void {
     _ = assets_to_load.incr();
 }
 
+// Called when an asset has been decoded or has failed to load
+fn assetFinished(asset: *Asset) void {
+    if (asset.whenAssetTimed != null) {
+        asset.whenAssetTimed.?(asset);
+    }
+
+    if (assets_to_load.decr() == 1) {
+        // Last asset, wake the decoders so that they exit
+        cv.?.notifyAll();
+    }
+}
+
 fn fileLoader(allocator: *std.mem.Allocator) void {
     while (abort_load.get() != 1) {
         const asset_node = assets_to_load_queue.get();
 
         if (asset_node == null) {
             break;
-        } else {
-            asset_node.?.data.*.load(allocator) catch |e| {
-                std.debug.warn("Asset '{}' load error: {}\n", .{ asset_node.?.data.file_path[0..asset_node.?.data.file_path_len], e });
-                _ = assets_to_load.decr();
+        }
+
+        const asset = asset_node.?.data;
+        allocator.destroy(asset_node.?);
+
+        asset.load_times.file_load_start = loadTime();
+
+        asset.load(allocator) catch |e| {
+            std.debug.warn("Asset '{}' load error: {}\n", .{ asset.file_path[0..asset.file_path_len], e });
+            assetFinished(asset);
+            continue;
+        };
+
+        asset.load_times.file_loaded = loadTime();
+
+        {
+            const held = decode_queue_mutex.acquire();
+            defer held.release();
+
+            decode_queue.?.add(asset) catch |e| {
+                std.debug.warn("Asset '{}' load error: {}\n", .{ asset.file_path[0..asset.file_path_len], e });
+                assetFinished(asset);
                 continue;
             };
-
-            assets_to_decompress_queue.put(asset_node.?);
-            cv.?.notify();
         }
+        cv.?.notify();
+    }
+
+    _ = loader_threads.decr();
+}
+
+fn nextAssetToDecode() ?*Asset {
+    const held = decode_queue_mutex.acquire();
+    defer held.release();
+
+    const asset = decode_queue.?.removeOrNull();
+
+    // Wake another decoder if there are more assets waiting
+    if (asset != null and decode_queue.?.count() > 0) {
+        cv.?.notify();
     }
+    return asset;
 }
 
-fn assetDecompressor(allocator: *std.mem.Allocator) void {
+fn assetDecoder(allocator: *std.mem.Allocator) void {
     while (assets_to_load.get() > 0) {
-        const asset = assets_to_decompress_queue.get();
+        const asset = nextAssetToDecode();
 
         if (asset == null) {
             cv.?.wait();
         } else {
-            if (asset.?.data.*.state == Asset.AssetState.Loaded) {
-                asset.?.data.*.decompress() catch |e| {
-                    std.debug.warn("Asset '{}' decompress error: {}\n", .{ asset.?.data.file_path[0..asset.?.data.file_path_len], e });
+            asset.?.load_times.decode_start = loadTime();
+
+            if (asset.?.state == Asset.AssetState.Loaded) {
+                asset.?.decompress() catch |e| {
+                    std.debug.warn("Asset '{}' decompress error: {}\n", .{ asset.?.file_path[0..asset.?.file_path_len], e });
                 };
             }
 
-            allocator.destroy(asset);
-
-            if (assets_to_load.decr() == 1) {
-                break;
-            }
+            asset.?.load_times.decoded = loadTime();
+            assetFinished(asset.?);
         }
     }
+
+    _ = loader_threads.decr();
 }
 
 pub fn startAssetLoader_(assets_list: ?([]Asset), allocator: *std.mem.Allocator) !void {
     cv = ConditionVariable.init();
+    decode_queue = std.PriorityQueue(*Asset).init(allocator, decodeFirst);
+    load_timer = try std.time.Timer.start();
+
     if (assets_list != null) {
+        // Assets with a priority are read first
         for (assets_list.?) |*a| {
-            addAssetToQueue(a, allocator) catch {
-                std.debug.warn("Asset {} added to load queue but is already loaded\n", .{a.file_path[0..a.file_path_len]});
-            };
+            if (a.load_priority > 0) {
+                addAssetToQueue(a, allocator) catch {
+                    std.debug.warn("Asset {} added to load queue but is already loaded\n", .{a.file_path[0..a.file_path_len]});
+                };
+            }
+        }
+        for (assets_list.?) |*a| {
+            if (a.load_priority == 0) {
+                addAssetToQueue(a, allocator) catch {
+                    std.debug.warn("Asset {} added to load queue but is already loaded\n", .{a.file_path[0..a.file_path_len]});
+                };
+            }
         }
     }
     abort_load.set(0);
 
     errdefer abort_load.set(1);
 
-    _ = try std.Thread.spawn(allocator, fileLoader);
-    _ = try std.Thread.spawn(allocator, assetDecompressor);
+    _ = loader_threads.incr();
+    _ = std.Thread.spawn(allocator, fileLoader) catch |e| {
+        _ = loader_threads.decr();
+        return e;
+    };
+
+    var i: u32 = 0;
+    const threads = decodeThreads();
+    while (i < threads) : (i += 1) {
+        _ = loader_threads.incr();
+        _ = std.Thread.spawn(allocator, assetDecoder) catch |e| {
+            _ = loader_threads.decr();
+            if (i > 0) {
+                // The threads that did start decode the assets
+                break;
+            }
+            return e;
+        };
+    }
 }
 
 pub fn startAssetLoader(allocator: *std.mem.Allocator) !void {
@@ -355,12 +716,15 @@ pub fn startAssetLoader1(assets_list: []Asset, allocator: *std.mem.Allocator) !v
     try startAssetLoader_(assets_list, allocator);
 }
 
+// Call after assetsLoaded() returns true
 pub fn assetLoaderCleanup() void {
+    decode_queue.?.deinit();
+    decode_queue = null;
     cv.?.free();
 }
 
 pub fn assetsLoaded() bool {
-    return assets_to_load.get() == 0;
+    return assets_to_load.get() == 0 and loader_threads.get() == 0;
 }
 
 pub fn verifyAllAssetsLoaded(assets_list: []Asset) !void {
@@ -375,4 +739,63 @@ pub fn verifyAllAssetsLoaded(assets_list: []Asset) !void {
 test "assets" {
     var asset = try Asset.init("bleh.jpg");
     std.testing.expect(asset.asset_type == Asset.AssetType.Texture);
+
+    asset = try Asset.init("bleh.bctexture.compressed");
+    std.testing.expect(asset.asset_type == Asset.AssetType.BlockCompressedTexture and asset.compressed);
+}
+
+test "archive" {
+    // Header, 2 entries (sorted by hash), data of a.anim at 80 and b.model at 96
+    var data align(16) = [_]u8{0} ** 112;
+    std.mem.copy(u8, data[0..8], &[_]u8{ 0x00, 0x61, 0x73, 0x73, 0x65, 0x74, 0x73, 0x31 });
+    std.mem.writeIntSliceLittle(u32, data[8..12], 2);
+
+    const names = [2][]const u8{ "a.anim", "b.model" };
+    var entries = [2]ArchiveEntry{
+        ArchiveEntry{ .name_hash = std.hash.Fnv1a_64.hash(names[0]), .offset = 80, .size = 16, .original_size = 16, .asset_type = @enumToInt(Asset.AssetType.Animation), .flags = 0 },
+        ArchiveEntry{ .name_hash = std.hash.Fnv1a_64.hash(names[1]), .offset = 96, .size = 12, .original_size = 12, .asset_type = @enumToInt(Asset.AssetType.Model), .flags = 0 },
+    };
+    if (entries[0].name_hash > entries[1].name_hash) {
+        std.mem.swap(ArchiveEntry, &entries[0], &entries[1]);
+    }
+    std.mem.copy(u8, data[16..80], std.mem.sliceAsBytes(entries[0..]));
+
+    const toc = try parseArchive(data[0..]);
+    std.testing.expect(toc.len == 2);
+    std.testing.expect(findInArchive(toc, "a.anim").?.offset == 80);
+    std.testing.expect(findInArchive(toc, "b.model").?.size == 12);
+    std.testing.expect(findInArchive(toc, "c.model") == null);
+
+    // Data outside of the file
+    std.mem.writeIntSliceLittle(u64, data[24..32], 112);
+    std.testing.expectError(error.InvalidArchiveEntry, parseArchive(data[0..]));
+
+    std.mem.writeIntSliceLittle(u32, data[8..12], 5);
+    std.testing.expectError(error.FileTooSmall, parseArchive(data[0..]));
+}
+
+test "archive file loading" {
+    // The Windows path of openArchive reads the file with loadFileAligned. Used here so that it is compiled on all platforms
+    std.testing.expectError(error.FileNotFound, loadFileAligned(std.mem.page_size, "does not exist.assets", std.testing.allocator));
+    std.testing.expectError(error.FileNotFound, openArchive("does not exist.assets", std.testing.allocator));
+}
+
+test "decode order" {
+    var a = try Asset.init("a.model");
+    var b = try Asset.init("b.model");
+    var c = try Asset.init("c.model");
+    a.decoded_size = 100;
+    b.decoded_size = 1000;
+    c.decoded_size = 10;
+    c.load_priority = 1;
+
+    var queue = std.PriorityQueue(*Asset).init(std.testing.allocator, decodeFirst);
+    defer queue.deinit();
+    try queue.add(&a);
+    try queue.add(&b);
+    try queue.add(&c);
+
+    std.testing.expect(queue.remove() == &c);
+    std.testing.expect(queue.remove() == &b);
+    std.testing.expect(queue.remove() == &a);
 }
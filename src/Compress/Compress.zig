@@ -8,41 +8,47 @@ pub const c = @cImport({
     @cInclude("zstd.h");
 });
 
-fn writeCompressed(path: []const u8, data: []const u8, original_size: u32) !void {
-    var file = try std.fs.cwd().openFile(path, std.fs.File.OpenFlags{ .write = true });
-    defer file.close();
-
-    const header = [12]u8{ 0x88, 0x7c, 0x77, 0x6a, 0xee, 0x55, 0xdd, 0xcc, 0x37, 0x9a, 0x8b, 0xef };
-    _ = try file.write(header[0..]);
-
-    _ = try file.write(@ptrCast([*c]const u8, &original_size)[0..4]);
-
-    _ = try file.write(data);
-}
-
-pub fn compressFile(input_file_path: []const u8, output_file_path: []const u8, allocator: *std.mem.Allocator) !void {
-    var input_file_data = try loadFile(input_file_path, allocator);
-    defer allocator.free(input_file_data);
+const header = [12]u8{ 0x88, 0x7c, 0x77, 0x6a, 0xee, 0x55, 0xdd, 0xcc, 0x37, 0x9a, 0x8b, 0xef };
 
-    if (input_file_data.len == 0) {
+// Returns the data in the same format as a *.compressed file (header followed by the zstd data)
+// Free the returned data with the same allocator
+pub fn compress(data: []const u8, allocator: *std.mem.Allocator) ![]align(4) u8 {
+    if (data.len == 0) {
         return error.EmptyFile;
     }
 
-    const max_size = c.ZSTD_compressBound(input_file_data.len);
+    const max_size = c.ZSTD_compressBound(data.len);
 
-    var compressed_data = try allocator.alignedAlloc(u8, 16, max_size);
+    var compressed_data = try allocator.alignedAlloc(u8, 4, 16 + max_size);
+    errdefer allocator.free(compressed_data);
 
-    const compressed_size = c.ZSTD_compress(compressed_data.ptr, max_size, input_file_data.ptr, input_file_data.len, 22);
+    const compressed_size = c.ZSTD_compress(compressed_data[16..].ptr, max_size, data.ptr, data.len, 22);
 
-    if (compressed_size == 0) {
+    if (compressed_size == 0 or c.ZSTD_isError(compressed_size) != 0) {
         return error.ZSTDError;
     }
 
-    if (@intCast(usize, compressed_size) >= input_file_data.len) {
+    if (@intCast(usize, compressed_size) >= data.len) {
         return error.CompressedBiggerThanOriginal;
-    } else {
-        try writeCompressed(output_file_path, compressed_data[0..@intCast(usize, compressed_size)], @intCast(u32, input_file_data.len));
     }
+
+    std.mem.copy(u8, compressed_data[0..12], header[0..]);
+    std.mem.writeIntSliceLittle(u32, compressed_data[12..16], @intCast(u32, data.len));
+
+    return allocator.shrink(compressed_data, 16 + @intCast(usize, compressed_size));
+}
+
+pub fn compressFile(input_file_path: []const u8, output_file_path: []const u8, allocator: *std.mem.Allocator) !void {
+    var input_file_data = try loadFile(input_file_path, allocator);
+    defer allocator.free(input_file_data);
+
+    const compressed_data = try compress(input_file_data, allocator);
+    defer allocator.free(compressed_data);
+
+    var file = try std.fs.cwd().openFile(output_file_path, std.fs.File.OpenFlags{ .write = true });
+    defer file.close();
+
+    _ = try file.write(compressed_data);
 }
 
 pub fn isCompressedFile(file_data: []const u8, original_data_size: ?*u32) !bool {
@@ -103,3 +109,20 @@ test "isCompressedFile" {
     var file_data = [5]u32{ 0x6a777c88, 0xccdd55ee, 0xef8b9a37, 0, 111 };
     std.testing.expectError(error.InvalidFile, isCompressedFile(std.mem.sliceAsBytes(file_data[0..]), &original_data_size));
 }
+
+test "compress" {
+    var data = [_]u8{7} ** 1024;
+    data[100] = 1;
+
+    const compressed_data = try compress(data[0..], std.testing.allocator);
+    defer std.testing.allocator.free(compressed_data);
+
+    var original_data_size: u32 = 0;
+    std.testing.expect(try isCompressedFile(compressed_data, &original_data_size));
+    std.testing.expect(original_data_size == 1024);
+
+    const decompressed_data = try decompress(compressed_data, std.testing.allocator);
+    defer std.testing.allocator.free(decompressed_data);
+
+    std.testing.expect(std.mem.eql(u8, decompressed_data, data[0..]));
+}
@@ -4,6 +4,7 @@ const std = @import("std");
 extern fn InitializeConditionVariable(*c_void) void;
 extern fn SleepConditionVariableCS(*c_void, *c_void, u32) void;
 extern fn WakeConditionVariable(*c_void) void;
+extern fn WakeAllConditionVariable(*c_void) void;
 
 extern fn InitializeCriticalSection(*c_void) void;
 extern fn EnterCriticalSection(*c_void) void;
@@ -19,10 +20,12 @@ pub const ConditionVariable = switch (builtin.os.tag) {
         condition_variable: u64,
 
         need_to_wake: bool,
+        wake_all: bool,
 
         pub fn init() ConditionVariable {
             var c: ConditionVariable = undefined;
             c.need_to_wake = false;
+            c.wake_all = false;
             InitializeCriticalSection(&c.mutex);
             InitializeConditionVariable(&c.condition_variable);
             return c;
@@ -31,7 +34,7 @@ pub const ConditionVariable = switch (builtin.os.tag) {
         // Puts current thread to sleep until another thread calls notify()
         pub fn wait(self: *ConditionVariable) void {
             EnterCriticalSection(&self.mutex);
-            if (!self.need_to_wake) {
+            if (!self.need_to_wake and !self.wake_all) {
                 // Releases the lock and sleeps
                 SleepConditionVariableCS(&self.condition_variable, &self.mutex, 0xffffffff);
             }
@@ -47,6 +50,14 @@ pub const ConditionVariable = switch (builtin.os.tag) {
             LeaveCriticalSection(&self.mutex);
         }
 
+        // Wakes all threads that have called wait(). wait() then returns immediately until init() is called again
+        pub fn notifyAll(self: *ConditionVariable) void {
+            EnterCriticalSection(&self.mutex);
+            self.wake_all = true;
+            WakeAllConditionVariable(&self.condition_variable);
+            LeaveCriticalSection(&self.mutex);
+        }
+
         pub fn free(self: *ConditionVariable) void {
             DeleteCriticalSection(&self.mutex);
         }
@@ -54,15 +65,17 @@ pub const ConditionVariable = switch (builtin.os.tag) {
     else => struct {
         // Inefficient implementation using an atomic integer and sleeping
         need_to_wake: std.atomic.Int(u32),
+        wake_all: std.atomic.Int(u32),
 
         pub fn init() ConditionVariable {
             return ConditionVariable{
                 .need_to_wake = std.atomic.Int(u32).init(0),
+                .wake_all = std.atomic.Int(u32).init(0),
             };
         }
 
         pub fn wait(self: *ConditionVariable) void {
-            while (self.need_to_wake.get() == 0) {
+            while (self.need_to_wake.xchg(0) == 0 and self.wake_all.get() == 0) {
                 std.time.sleep(1000 * 1000 * 5); // 5ms
             }
         }
@@ -71,6 +84,10 @@ pub const ConditionVariable = switch (builtin.os.tag) {
             self.need_to_wake.set(1);
         }
 
+        pub fn notifyAll(self: *ConditionVariable) void {
+            self.wake_all.set(1);
+        }
+
         pub fn free(self: *ConditionVariable) void {}
     },
 };
@@ -83,6 +83,13 @@ pub fn main() !void {
     // Specify root folder for assets
     assets.setAssetsDirectory("DemoAssets" ++ Files.path_seperator);
 
+    // If Farm.assets (made by Tools/pack-assets.py) exists, the scene's assets are loaded from it instead of from their files
+    var archive_opened = true;
+    assets.openArchive("DemoAssets" ++ Files.path_seperator ++ "Farm.assets", c_allocator) catch {
+        archive_opened = false;
+    };
+    defer if (archive_opened) assets.closeArchive();
+
     // Loads the scene file
     // This is a text file which containts a list of assets and game objects
     const scene_file = try loadFile("DemoAssets" ++ Files.path_seperator ++ "Farm.scene", c_allocator);
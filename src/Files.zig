@@ -48,13 +48,14 @@ pub fn loadFile(file_path: []const u8, allocator: *std.mem.Allocator) ![]align(4
     return buf;
 }
 
-pub fn loadFileAligned(alignment: u32, file_path: []const u8, allocator: *std.mem.Allocator) ![]u8 {
+pub fn loadFileAligned(comptime alignment: u29, file_path: []const u8, allocator: *std.mem.Allocator) ![]align(alignment) u8 {
     var in_file = try std.fs.cwd().openFile(file_path, std.fs.File.OpenFlags{});
     defer in_file.close();
 
     var size: usize = try in_file.getEndPos();
 
     var buf = try allocator.alignedAlloc(u8, alignment, size);
+    errdefer allocator.free(buf);
 
     const bytesRead = try in_file.read(buf[0..]);
     if (bytesRead != size) {
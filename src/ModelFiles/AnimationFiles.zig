@@ -4,12 +4,27 @@ const warn = std.debug.warn;
 const mem = std.mem;
 
 pub const AnimationData = struct {
+    pub const Format = enum {
+        Matrices, // A matrix for every bone on every frame
+        Tracks, // Keyframed translation, rotation and scale of every bone
+    };
+
+    format: Format,
     frame_count: u32,
     frame_duration: u32, // microseconds
     bone_count: u32,
     bone_names: []const u8,
-    matrices_relative: []const f32,
-    matrices_absolute: []const f32,
+
+    // Matrices format
+    matrices_relative: []const f32 = &[_]f32{},
+    matrices_absolute: []const f32 = &[_]f32{},
+
+    // Tracks format
+    quantised: bool = false,
+    track_offsets: []const u32 = &[_]u32{}, // translation, rotation, scale track of each bone (offsets into file_data)
+    file_data: []const u32 = &[_]u32{},
+
+    const track_components = [3]u32{ 3, 4, 3 };
 
     // This struct references (read-only) the data until delete is called (unless this function returns with an error)
     pub fn init(data: []align(4) const u8) !AnimationData {
@@ -25,7 +40,12 @@ pub const AnimationData = struct {
         const data_u32 = std.mem.bytesAsSlice(u32, data);
         const data_f32 = std.mem.bytesAsSlice(f32, data);
 
-        if (data_u32[0] != 0xee334507) {
+        var format: Format = undefined;
+        if (data_u32[0] == 0xee334507) {
+            format = Format.Matrices;
+        } else if (data_u32[0] == 0xee334508) {
+            format = Format.Tracks;
+        } else {
             warn("AnimationData.init: Magic field incorrect. Value was {}\n", .{data_u32[0]});
             return error.NotAnAnimationFile;
         }
@@ -41,7 +61,20 @@ pub const AnimationData = struct {
 
         var offset: u32 = 4;
 
-        if (4 + bone_count > data_u32.len) {
+        var flags: u32 = 0;
+        if (format == Format.Tracks) {
+            if (data_u32.len < 5) {
+                return error.FileTooSmall;
+            }
+            flags = data_u32[4];
+            offset += 1;
+
+            if (flags > 1) {
+                return error.UnsupportedFlags;
+            }
+        }
+
+        if (offset + bone_count > data_u32.len) {
             return error.FileTooSmall;
         }
 
@@ -66,6 +99,30 @@ pub const AnimationData = struct {
 
         const bone_names = std.mem.sliceAsBytes(data_u32[bone_names_list_start..offset]);
 
+        if (format == Format.Tracks) {
+            if (bone_count > data_u32.len or offset + bone_count * 3 > data_u32.len) {
+                return error.FileTooSmall;
+            }
+
+            var a = AnimationData{
+                .format = format,
+                .frame_count = frame_count,
+                .frame_duration = frame_duration,
+                .bone_count = bone_count,
+                .bone_names = bone_names,
+                .quantised = (flags & 1) != 0,
+                .track_offsets = data_u32[offset .. offset + bone_count * 3],
+                .file_data = data_u32,
+            };
+
+            const tracks_start = offset + bone_count * 3;
+            for (a.track_offsets) |track_offset, track_index| {
+                try a.validateTrack(track_offset, track_components[track_index % 3], tracks_start);
+            }
+
+            return a;
+        }
+
         const matrix_array_size = bone_count * frame_count * 4 * 4;
 
         if (offset + matrix_array_size * 2 > data_u32.len) {
@@ -76,6 +133,7 @@ pub const AnimationData = struct {
         const matrices_absolute = data_f32[offset + matrix_array_size .. offset + matrix_array_size * 2];
 
         return AnimationData{
+            .format = format,
             .frame_count = frame_count,
             .frame_duration = frame_duration,
             .bone_count = bone_count,
@@ -85,6 +143,150 @@ pub const AnimationData = struct {
         };
     }
 
+    // Size of a track in u32s
+    fn trackSize(self: AnimationData, key_count: u32, components: u32) u32 {
+        if (self.quantised) {
+            return 1 + components * 2 + (key_count + 1) / 2 + (key_count * components + 1) / 2;
+        } else {
+            return 1 + (key_count + 1) / 2 + key_count * components;
+        }
+    }
+
+    fn trackKeyFrames(self: AnimationData, offset: u32, key_count: u32, components: u32) []const u16 {
+        const frames_offset = offset + 1 + (if (self.quantised) components * 2 else 0);
+        const frames_u32 = self.file_data[frames_offset .. frames_offset + (key_count + 1) / 2];
+        return std.mem.bytesAsSlice(u16, std.mem.sliceAsBytes(frames_u32))[0..key_count];
+    }
+
+    fn validateTrack(self: AnimationData, offset: u32, components: u32, tracks_start: u32) !void {
+        if (offset < tracks_start or offset >= self.file_data.len) {
+            return error.InvalidTrackOffset;
+        }
+
+        const key_count = self.file_data[offset];
+        if (key_count == 0 or key_count > 65536) {
+            return error.InvalidKeyCount;
+        }
+
+        if (offset + self.trackSize(key_count, components) > self.file_data.len) {
+            return error.FileTooSmall;
+        }
+
+        // Key frames must be in order for sampleTrack
+        const frames = self.trackKeyFrames(offset, key_count, components);
+        var i: u32 = 1;
+        while (i < key_count) : (i += 1) {
+            if (frames[i] <= frames[i - 1]) {
+                return error.KeyFramesNotInOrder;
+            }
+        }
+    }
+
+    fn trackValue(self: AnimationData, offset: u32, key_count: u32, components: u32, key: u32, component: u32) f32 {
+        if (self.quantised) {
+            const value_offset = @bitCast(f32, self.file_data[offset + 1 + component]);
+            const value_scale = @bitCast(f32, self.file_data[offset + 1 + components + component]);
+            const values_offset = offset + 1 + components * 2 + (key_count + 1) / 2;
+            const values_u32 = self.file_data[values_offset .. values_offset + (key_count * components + 1) / 2];
+            const values = std.mem.bytesAsSlice(u16, std.mem.sliceAsBytes(values_u32));
+            return value_offset + @intToFloat(f32, values[key * components + component]) * value_scale;
+        } else {
+            const values_offset = offset + 1 + (key_count + 1) / 2;
+            return @bitCast(f32, self.file_data[values_offset + key * components + component]);
+        }
+    }
+
+    // Linear interpolation between the keys either side of the frame
+    // Rotations (quaternions) are interpolated along the shortest path and normalised
+    fn sampleTrack(self: AnimationData, offset: u32, components: u32, frame: u32, out: []f32) void {
+        const key_count = self.file_data[offset];
+        const frames = self.trackKeyFrames(offset, key_count, components);
+
+        var a: u32 = 0;
+        var b: u32 = 0;
+        var t: f32 = 0.0;
+
+        if (frame >= frames[key_count - 1]) {
+            a = key_count - 1;
+            b = a;
+        } else if (frame > frames[0]) {
+            // frames[a] <= frame < frames[b]
+            b = key_count - 1;
+            while (b - a > 1) {
+                const middle = (a + b) / 2;
+                if (frames[middle] <= frame) {
+                    a = middle;
+                } else {
+                    b = middle;
+                }
+            }
+            t = @intToFloat(f32, frame - frames[a]) / @intToFloat(f32, frames[b] - frames[a]);
+        }
+
+        var sign: f32 = 1.0;
+        if (components == 4) {
+            var dot: f32 = 0.0;
+            var c: u32 = 0;
+            while (c < 4) : (c += 1) {
+                dot += self.trackValue(offset, key_count, components, a, c) * self.trackValue(offset, key_count, components, b, c);
+            }
+            if (dot < 0.0) {
+                sign = -1.0;
+            }
+        }
+
+        var c: u32 = 0;
+        while (c < components) : (c += 1) {
+            const value_a = self.trackValue(offset, key_count, components, a, c);
+            const value_b = self.trackValue(offset, key_count, components, b, c) * sign;
+            out[c] = value_a + (value_b - value_a) * t;
+        }
+
+        if (components == 4) {
+            const length = std.math.sqrt(out[0] * out[0] + out[1] * out[1] + out[2] * out[2] + out[3] * out[3]);
+            if (length > 0.0) {
+                c = 0;
+                while (c < 4) : (c += 1) {
+                    out[c] /= length;
+                }
+            }
+        }
+    }
+
+    // Returns the final transformation of the bone (matrices_absolute) for the frame
+    pub fn getBoneMatrix(self: AnimationData, bone: u32, frame: u32) [16]f32 {
+        assert(bone < self.bone_count and frame < self.frame_count);
+
+        var m: [16]f32 = undefined;
+
+        if (self.format == Format.Matrices) {
+            const o = (frame * self.bone_count + bone) * 4 * 4;
+            std.mem.copy(f32, m[0..], self.matrices_absolute[o .. o + 4 * 4]);
+            return m;
+        }
+
+        var translation: [3]f32 = undefined;
+        var q: [4]f32 = undefined; // x, y, z, w
+        var scale: [3]f32 = undefined;
+        self.sampleTrack(self.track_offsets[bone * 3], 3, frame, translation[0..]);
+        self.sampleTrack(self.track_offsets[bone * 3 + 1], 4, frame, q[0..]);
+        self.sampleTrack(self.track_offsets[bone * 3 + 2], 3, frame, scale[0..]);
+
+        const x = q[0];
+        const y = q[1];
+        const z = q[2];
+        const w = q[3];
+
+        // Each row is an axis of the rotation multiplied by the scale on that axis
+        m = [16]f32{
+            (1.0 - 2.0 * (y * y + z * z)) * scale[0], 2.0 * (x * y + z * w) * scale[0],         2.0 * (x * z - y * w) * scale[0],         0.0,
+            2.0 * (x * y - z * w) * scale[1],         (1.0 - 2.0 * (x * x + z * z)) * scale[1], 2.0 * (y * z + x * w) * scale[1],         0.0,
+            2.0 * (x * z + y * w) * scale[2],         2.0 * (y * z - x * w) * scale[2],         (1.0 - 2.0 * (x * x + y * y)) * scale[2], 0.0,
+            translation[0],                           translation[1],                           translation[2],                           1.0,
+        };
+        return m;
+    }
+
     pub fn getBoneIndex(self: AnimationData, bone_name: []const u8) !u32 {
         var i: u32 = 0;
         var offset: u32 = 0;
@@ -104,3 +306,265 @@ pub const AnimationData = struct {
         return error.NoSuchBone;
     }
 };
+
+// Many animations (clips) of one armature in one file. Each clip is a complete animation file.
+pub const AnimationBank = struct {
+    clips: []AnimationData,
+    clip_names: []const u8,
+
+    // This struct references (read-only) the data until free is called (unless this function returns with an error)
+    pub fn init(data: []align(4) const u8, allocator: *mem.Allocator) !AnimationBank {
+        if (data.len < 8) {
+            warn("AnimationBank.init: Data length is only {}\n", .{data.len});
+            return error.FileTooSmall;
+        }
+
+        if (data.len % 4 != 0) {
+            return error.InvalidFileSize;
+        }
+
+        const data_u32 = std.mem.bytesAsSlice(u32, data);
+
+        if (data_u32[0] != 0xee334509) {
+            warn("AnimationBank.init: Magic field incorrect. Value was {}\n", .{data_u32[0]});
+            return error.NotAnAnimationBank;
+        }
+
+        const clip_count = data_u32[1];
+
+        if (clip_count > (data_u32.len - 2) / 2) {
+            return error.FileTooSmall;
+        }
+
+        var offset: u32 = 2 + clip_count * 2;
+        const clip_names_list_start = offset;
+
+        var i: u32 = 0;
+        while (i < clip_count) : (i += 1) {
+            if (offset + 1 > data_u32.len) {
+                return error.FileTooSmall;
+            }
+
+            const stringLen = data_u32[offset] & 0xff;
+
+            if (offset + (1 + stringLen + 3) / 4 > data_u32.len) {
+                return error.FileTooSmall;
+            }
+
+            offset += (1 + stringLen + 3) / 4;
+        }
+
+        var clips = try allocator.alloc(AnimationData, clip_count);
+        errdefer allocator.free(clips);
+
+        i = 0;
+        while (i < clip_count) : (i += 1) {
+            const clip_offset = data_u32[2 + i * 2];
+            const clip_size = data_u32[2 + i * 2 + 1];
+
+            if (clip_offset % 4 != 0 or clip_offset < offset * 4 or clip_size > data.len or clip_offset > data.len - clip_size) {
+                return error.InvalidClipOffset;
+            }
+
+            clips[i] = try AnimationData.init(@alignCast(4, data[clip_offset .. clip_offset + clip_size]));
+        }
+
+        return AnimationBank{
+            .clips = clips,
+            .clip_names = std.mem.sliceAsBytes(data_u32[clip_names_list_start..offset]),
+        };
+    }
+
+    pub fn getClipIndex(self: AnimationBank, clip_name: []const u8) !u32 {
+        var i: u32 = 0;
+        var offset: u32 = 0;
+        while (i < self.clips.len) : (i += 1) {
+            const stringLen = self.clip_names[offset];
+
+            if (std.mem.eql(u8, self.clip_names[offset + 1 .. offset + 1 + stringLen], clip_name)) {
+                return i;
+            }
+
+            offset += 1 + stringLen;
+
+            if (offset % 4 != 0) {
+                offset += 4 - (offset % 4);
+            }
+        }
+        return error.NoSuchClip;
+    }
+
+    pub fn getClip(self: *AnimationBank, clip_name: []const u8) !*AnimationData {
+        return &self.clips[try self.getClipIndex(clip_name)];
+    }
+
+    pub fn free(self: *AnimationBank, allocator: *mem.Allocator) void {
+        allocator.free(self.clips);
+        self.clips = &[_]AnimationData{};
+    }
+};
+
+test "Animation import test (tracks)" {
+    const testData = [_]u32{
+        0xee334508,
+        3,
+        16667,
+        1,
+
+        0,
+
+        0x00006201,
+
+        9,
+        17,
+        23,
+
+        2,
+        0x00020000,
+        @bitCast(u32, @as(f32, 0.0)),
+        @bitCast(u32, @as(f32, 0.0)),
+        @bitCast(u32, @as(f32, 0.0)),
+        @bitCast(u32, @as(f32, 2.0)),
+        @bitCast(u32, @as(f32, 4.0)),
+        @bitCast(u32, @as(f32, 6.0)),
+
+        1,
+        0,
+        @bitCast(u32, @as(f32, 0.0)),
+        @bitCast(u32, @as(f32, 0.0)),
+        @bitCast(u32, @as(f32, 0.0)),
+        @bitCast(u32, @as(f32, 1.0)),
+
+        1,
+        0,
+        @bitCast(u32, @as(f32, 1.0)),
+        @bitCast(u32, @as(f32, 1.0)),
+        @bitCast(u32, @as(f32, 1.0)),
+    };
+
+    const a = try AnimationData.init(std.mem.sliceAsBytes(testData[0..]));
+    std.testing.expect(a.format == AnimationData.Format.Tracks);
+    std.testing.expect(a.quantised == false);
+    std.testing.expect((try a.getBoneIndex("b")) == 0);
+
+    const m = a.getBoneMatrix(0, 1);
+    std.testing.expect(std.mem.eql(f32, m[0..], &[16]f32{
+        1.0, 0.0, 0.0, 0.0,
+        0.0, 1.0, 0.0, 0.0,
+        0.0, 0.0, 1.0, 0.0,
+        1.0, 2.0, 3.0, 1.0,
+    }));
+
+    // Held after the last key
+    std.testing.expect(a.getBoneMatrix(0, 2)[12] == 2.0);
+}
+
+test "Animation import test (quantised tracks)" {
+    const testData = [_]u32{
+        0xee334508,
+        2,
+        16667,
+        1,
+
+        1,
+
+        0x00006201,
+
+        9,
+        20,
+        32,
+
+        // Translation: offset, scale, 2 keys
+        2,
+        @bitCast(u32, @as(f32, 1.0)),
+        @bitCast(u32, @as(f32, 0.0)),
+        @bitCast(u32, @as(f32, 0.0)),
+        @bitCast(u32, @as(f32, 0.5)),
+        @bitCast(u32, @as(f32, 1.0)),
+        @bitCast(u32, @as(f32, 1.0)),
+        0x00010000,
+        0x00000000,
+        0x00020000,
+        0x00060004,
+
+        // Rotation: 1 key, 90 degrees around z
+        1,
+        @bitCast(u32, @as(f32, 0.0)),
+        @bitCast(u32, @as(f32, 0.0)),
+        @bitCast(u32, @as(f32, 0.0)),
+        @bitCast(u32, @as(f32, 0.0)),
+        @bitCast(u32, @as(f32, 0.0)),
+        @bitCast(u32, @as(f32, 0.0)),
+        @bitCast(u32, @as(f32, 1.0)),
+        @bitCast(u32, @as(f32, 1.0)),
+        0,
+        0x00000000,
+        0x00010001,
+
+        // Scale: 1 key
+        1,
+        @bitCast(u32, @as(f32, 2.0)),
+        @bitCast(u32, @as(f32, 2.0)),
+        @bitCast(u32, @as(f32, 2.0)),
+        @bitCast(u32, @as(f32, 1.0)),
+        @bitCast(u32, @as(f32, 1.0)),
+        @bitCast(u32, @as(f32, 1.0)),
+        0,
+        0,
+        0,
+    };
+
+    const a = try AnimationData.init(std.mem.sliceAsBytes(testData[0..]));
+    std.testing.expect(a.quantised == true);
+
+    const m = a.getBoneMatrix(0, 1);
+    const expected = [16]f32{
+        0.0,  2.0, 0.0, 0.0,
+        -2.0, 0.0, 0.0, 0.0,
+        0.0,  0.0, 2.0, 0.0,
+        2.0,  4.0, 6.0, 1.0,
+    };
+    for (expected) |x, i| {
+        std.testing.expect(std.math.approxEq(f32, m[i], x, 0.0001));
+    }
+}
+
+test "Animation bank import test" {
+    const testData = [_]u32{
+        0xee334509,
+        2,
+
+        // Clip index
+        36,
+        20,
+        56,
+        20,
+
+        0x6c617704, // "walk"
+        0x0000006b,
+        0x6e757203, // "run"
+
+        // walk
+        0xee334508,
+        1,
+        16667,
+        0,
+        0,
+
+        // run
+        0xee334508,
+        2,
+        16667,
+        0,
+        1,
+    };
+
+    var bank = try AnimationBank.init(std.mem.sliceAsBytes(testData[0..]), std.testing.allocator);
+    defer bank.free(std.testing.allocator);
+
+    std.testing.expect(bank.clips.len == 2);
+    std.testing.expect((try bank.getClipIndex("run")) == 1);
+    std.testing.expect((try bank.getClip("walk")).frame_count == 1);
+    std.testing.expect((try bank.getClip("run")).quantised == true);
+    std.testing.expectError(error.NoSuchClip, bank.getClipIndex("jump"));
+}
@@ -14,7 +14,47 @@ pub const ModelData = struct {
         Tangent = 6,
     };
 
-    // If bigger than 65536 then indices are 32-bit
+    // Stored in bits 8 and 9 of the vertex attributes field
+    pub const PositionFormat = enum(u2) {
+        Float32 = 0, // 3xf32
+        UNorm16 = 1, // 3xu16 + 16 bits of padding
+        UNorm10 = 2, // u32 (x10y10z10 lsb->msb-2)
+    };
+
+    // Bit 10 of the vertex attributes field. Set if the file has levels of detail
+    pub const LODS_FLAG: u32 = 1 << 10;
+
+    // Bit 11 of the vertex attributes field. Set if the file has clusters
+    pub const CLUSTERS_FLAG: u32 = 1 << 11;
+
+    // A group of triangles of the full model (level of detail 0), for culling. Same layout as in the file.
+    pub const Cluster = extern struct {
+        first_index: u32,
+        index_count: u32,
+        bounding_sphere: [4]f32, // Model space centre (xyz) and radius (w)
+        box_min: [3]f32,
+        box_max: [3]f32,
+
+        // All triangles face away from cameras that are more than cone_cutoff (sine of an angle) along the axis
+        // See model file format.md. No cone if the axis is 0,0,0 and cone_cutoff is 1
+        cone_axis: [3]f32,
+        cone_cutoff: f32,
+    };
+
+    // Bit 12 of the vertex attributes field. Set if the indices are 16-bit and have base vertices (index_ranges)
+    pub const INDEX_RANGES_FLAG: u32 = 1 << 12;
+
+    // Indices from first_index to first_index + index_count are offsets from base_vertex. Same layout as in the file.
+    pub const IndexRange = extern struct {
+        first_index: u32,
+        index_count: u32,
+        base_vertex: u32,
+    };
+
+    // Bit 13 of the vertex attributes field. Set if the file has depth vertices
+    pub const DEPTH_VERTICES_FLAG: u32 = 1 << 13;
+
+    // If bigger than 65536 then indices are 32-bit (unless there are index ranges)
     vertex_count: u32 = 0,
 
     // If zero then use non-indexed rendering
@@ -27,10 +67,18 @@ pub const ModelData = struct {
 
     interleaved: bool = false,
 
+    // Quantised positions are in the range 0-1 and are converted to model space with:
+    // position * position_scale + position_offset
+    // The scale is the same for all axes so that normals and bone transformations are not affected
+    position_format: PositionFormat = PositionFormat.Float32,
+    position_offset: [3]f32 = [3]f32{ 0, 0, 0 },
+    position_scale: f32 = 1,
+
     vertex_data: ?[]const u32 = null,
 
     // These are used if interleaved == false
-    positions: ?[]const f32 = null, // 3 per vertex
+    positions: ?[]const f32 = null, // 3 per vertex, position_format == Float32
+    quantised_positions: ?[]const u32 = null, // 2 per vertex if position_format == UNorm16, 1 per vertex if UNorm10
     colours: ?[]const u32 = null, // each u32 is a rgba8 packed colour
     tex_coords: ?[]const u32 = null, // each u32 is a u,v pair
     normals: ?[]const u32 = null, // each u32 is a packed normal
@@ -55,6 +103,32 @@ pub const ModelData = struct {
 
     bones: ?[]u8 = null,
 
+    // Levels of detail. Level 0 is the full model (the material regions), lod_count does not include it
+    lod_count: u32 = 0,
+
+    // Model space centre (xyz) and radius (w). Only used for choosing the level of detail
+    bounding_sphere: [4]f32 = [4]f32{ 0, 0, 0, 0 },
+
+    // For each level: screen size (f32), error (f32), then first index and index count for each material
+    lods: ?[]u32 = null,
+
+    // Sorted by first index. The clusters of each material cover the material's region.
+    clusters: ?[]Cluster = null,
+
+    // Null if the indices do not have base vertices. Otherwise the ranges are sorted and cover all of the indices.
+    index_ranges: ?[]IndexRange = null,
+
+    // Vertices with only the position (and bone indices and weights if the model has them), interleaved, for drawing
+    // shadow maps and depth only. Vertices with the same position are merged.
+    // The depth indices draw the same triangles as the indices (index_count of them) with these vertices.
+    depth_vertex_count: u32 = 0,
+    depth_vertex_size: u32 = 0, // in bytes
+    depth_vertex_data: ?[]const u32 = null,
+
+    // If the file has depth vertices, one of these is not null. 32-bit if depth_vertex_count is bigger than 65536.
+    depth_indices_u16: ?[]const u16 = null,
+    depth_indices_u32: ?[]const u32 = null,
+
     // This struct references (read-only) the data until delete is called (unless this function returns with an error)
     pub fn init(data: []align(4) const u8, allocator: *mem.Allocator) !ModelData {
         if (data.len < 7 * 4) {
@@ -77,6 +151,12 @@ pub const ModelData = struct {
         }
         model_data.attributes_bitmap = @intCast(u8, data_u32[2] & 0x7f);
 
+        const position_format = (data_u32[2] >> 8) & 3;
+        if (position_format > @enumToInt(PositionFormat.UNorm10)) {
+            return error.InvalidPositionFormat;
+        }
+        model_data.position_format = @intToEnum(PositionFormat, @intCast(u2, position_format));
+
         // Number of bits set
         model_data.attributes_count = @popCount(u8, model_data.attributes_bitmap);
 
@@ -96,20 +176,42 @@ pub const ModelData = struct {
         // offset into data_u32
         var offset: u32 = 5;
 
+        if (model_data.position_format != PositionFormat.Float32) {
+            if (data_u32.len < 9) {
+                return error.FileTooSmall;
+            }
+
+            model_data.position_offset[0] = data_f32[5];
+            model_data.position_offset[1] = data_f32[6];
+            model_data.position_offset[2] = data_f32[7];
+            model_data.position_scale = data_f32[8];
+            offset += 4;
+
+            if (!(model_data.position_scale > 0)) {
+                return error.InvalidPositionScale;
+            }
+        }
+
+        const vertex_data_start = offset;
+
+        // in u32s
+        const position_size = model_data.positionSize();
+
         if (model_data.interleaved) {
             if (model_data.attributes_bitmap & (1 << @enumToInt(VertexAttributeType.Position)) != 0) {
-                model_data.vertex_size = 3 * 4;
+                model_data.vertex_size = position_size * 4;
             }
             model_data.vertex_size += @popCount(u8, model_data.attributes_bitmap >> 1) * 4;
 
-            const vertex_data_size = model_data.vertex_count * model_data.vertex_size;
-
-            model_data.vertex_data = data_u32[5..(5 + vertex_data_size)];
+            // in u32s
+            const vertex_data_size = model_data.vertex_count * (model_data.vertex_size / 4);
 
-            if (5 + vertex_data_size > data_u32.len) {
+            if (vertex_data_start + vertex_data_size > data_u32.len) {
                 return error.FileTooSmall;
             }
 
+            model_data.vertex_data = data_u32[vertex_data_start..(vertex_data_start + vertex_data_size)];
+
             offset += vertex_data_size;
         } else {
             var attrib_i: u3 = 0;
@@ -117,7 +219,7 @@ pub const ModelData = struct {
                 const attrib_bit_set = (model_data.attributes_bitmap & (@as(u8, 1) << attrib_i)) != 0;
                 if (attrib_bit_set) {
                     if (attrib_i == @enumToInt(VertexAttributeType.Position)) {
-                        if (offset + model_data.vertex_count * 3 > data_u32.len) {
+                        if (offset + model_data.vertex_count * position_size > data_u32.len) {
                             return error.FileTooSmall;
                         }
                     } else {
@@ -127,7 +229,11 @@ pub const ModelData = struct {
                     }
 
                     if (attrib_i == @enumToInt(VertexAttributeType.Position)) {
-                        model_data.positions = data_f32[offset..(offset + model_data.vertex_count * 3)];
+                        if (model_data.position_format == PositionFormat.Float32) {
+                            model_data.positions = data_f32[offset..(offset + model_data.vertex_count * 3)];
+                        } else {
+                            model_data.quantised_positions = data_u32[offset..(offset + model_data.vertex_count * position_size)];
+                        }
                     } else {
                         const a = data_u32[offset..(offset + model_data.vertex_count)];
                         if (attrib_i == @enumToInt(VertexAttributeType.Colour)) {
@@ -146,20 +252,20 @@ pub const ModelData = struct {
                     }
 
                     if (attrib_i == @enumToInt(VertexAttributeType.Position)) {
-                        offset += model_data.vertex_count * 3;
+                        offset += model_data.vertex_count * position_size;
                     } else {
                         offset += model_data.vertex_count;
                     }
                 }
             }
-            model_data.vertex_data = data_u32[5..offset];
+            model_data.vertex_data = data_u32[vertex_data_start..offset];
+        }
 
-            const has_bone_indices = (model_data.attributes_bitmap & (1 << @enumToInt(VertexAttributeType.BoneIndices))) != 0;
-            const has_bone_weights = (model_data.attributes_bitmap & (1 << @enumToInt(VertexAttributeType.BoneWeights))) != 0;
+        const has_bone_indices = (model_data.attributes_bitmap & (1 << @enumToInt(VertexAttributeType.BoneIndices))) != 0;
+        const has_bone_weights = (model_data.attributes_bitmap & (1 << @enumToInt(VertexAttributeType.BoneWeights))) != 0;
 
-            if (has_bone_indices != has_bone_weights and (has_bone_indices or has_bone_weights)) {
-                return error.VertexWeightsRequireBoneIndices;
-            }
+        if (has_bone_indices != has_bone_weights and (has_bone_indices or has_bone_weights)) {
+            return error.VertexWeightsRequireBoneIndices;
         }
 
         // index data
@@ -168,7 +274,7 @@ pub const ModelData = struct {
             model_data.indices_u32 = null;
             model_data.indices_u16 = null;
         } else {
-            if (model_data.vertex_count > 65536) {
+            if (model_data.vertex_count > 65536 and (data_u32[2] & INDEX_RANGES_FLAG) == 0) {
                 // large indices
                 if (offset + model_data.index_count > data_u32.len) {
                     return error.FileTooSmall;
@@ -287,13 +393,255 @@ pub const ModelData = struct {
                 i += 1;
             }
             model_data.bones = try allocator.alloc(u8, (offset - offsetAtBonesListStart) * 4);
-            errdefer allocator.free(model_data.bones.?);
             mem.copy(u8, model_data.bones.?, std.mem.sliceAsBytes(data_u32[offsetAtBonesListStart..offset]));
         }
+        errdefer {
+            if (model_data.bones != null) {
+                allocator.free(model_data.bones.?);
+            }
+        }
+
+        // Levels of detail
+
+        if ((data_u32[2] & LODS_FLAG) != 0) {
+            if (offset + 5 > data_u32.len) {
+                return error.FileTooSmall;
+            }
+
+            model_data.lod_count = data_u32[offset];
+            model_data.bounding_sphere[0] = data_f32[offset + 1];
+            model_data.bounding_sphere[1] = data_f32[offset + 2];
+            model_data.bounding_sphere[2] = data_f32[offset + 3];
+            model_data.bounding_sphere[3] = data_f32[offset + 4];
+            offset += 5;
+
+            if (model_data.lod_count == 0 or model_data.index_count == 0) {
+                return error.InvalidModelLOD;
+            }
+
+            if (model_data.lod_count > (data_u32.len - offset) / model_data.lodSize()) {
+                return error.FileTooSmall;
+            }
+
+            const lods_size = model_data.lod_count * model_data.lodSize();
+
+            i = 0;
+            while (i < model_data.lod_count) : (i += 1) {
+                var j: u32 = 0;
+                while (j < model_data.material_count) : (j += 1) {
+                    const region = offset + i * model_data.lodSize() + 2 + j * 2;
+                    if (data_u32[region] > model_data.index_count or data_u32[region + 1] > model_data.index_count - data_u32[region]) {
+                        return error.InvalidModelLOD;
+                    }
+                }
+            }
+
+            model_data.lods = try allocator.alloc(u32, lods_size);
+            mem.copy(u32, model_data.lods.?, data_u32[offset..(offset + lods_size)]);
+            offset += lods_size;
+        }
+        errdefer {
+            if (model_data.lods != null) {
+                allocator.free(model_data.lods.?);
+            }
+        }
+
+        // Clusters
+
+        if ((data_u32[2] & CLUSTERS_FLAG) != 0) {
+            if (offset + 1 > data_u32.len) {
+                return error.FileTooSmall;
+            }
+
+            const cluster_count = data_u32[offset];
+            offset += 1;
+
+            if (cluster_count == 0 or model_data.index_count == 0) {
+                return error.InvalidModelCluster;
+            }
+
+            if (cluster_count > (data_u32.len - offset) / (@sizeOf(Cluster) / 4)) {
+                return error.FileTooSmall;
+            }
+
+            const clusters_size = cluster_count * (@sizeOf(Cluster) / 4);
+
+            const clusters = std.mem.bytesAsSlice(Cluster, std.mem.sliceAsBytes(data_u32[offset..(offset + clusters_size)]));
+
+            var end: u32 = 0;
+            for (clusters) |c| {
+                if (c.first_index < end or c.first_index > model_data.index_count or c.index_count > model_data.index_count - c.first_index) {
+                    return error.InvalidModelCluster;
+                }
+                end = c.first_index + c.index_count;
+            }
+
+            model_data.clusters = try allocator.alloc(Cluster, cluster_count);
+            mem.copy(Cluster, model_data.clusters.?, clusters);
+            offset += clusters_size;
+        }
+        errdefer {
+            if (model_data.clusters != null) {
+                allocator.free(model_data.clusters.?);
+            }
+        }
+
+        // Index ranges
+
+        if ((data_u32[2] & INDEX_RANGES_FLAG) != 0) {
+            if (offset + 1 > data_u32.len) {
+                return error.FileTooSmall;
+            }
+
+            const range_count = data_u32[offset];
+            offset += 1;
+
+            if (range_count == 0 or model_data.index_count == 0) {
+                return error.InvalidIndexRange;
+            }
+
+            if (range_count > (data_u32.len - offset) / (@sizeOf(IndexRange) / 4)) {
+                return error.FileTooSmall;
+            }
+
+            const ranges_size = range_count * (@sizeOf(IndexRange) / 4);
+
+            const ranges = std.mem.bytesAsSlice(IndexRange, std.mem.sliceAsBytes(data_u32[offset..(offset + ranges_size)]));
+
+            // Each range starts where the previous one ends
+            var end: u32 = 0;
+            for (ranges) |r| {
+                if (r.first_index != end or r.index_count == 0 or r.index_count > model_data.index_count - end or r.base_vertex >= model_data.vertex_count) {
+                    return error.InvalidIndexRange;
+                }
+
+                // Every vertex used by the range must be in the vertex data
+                const range_indices = model_data.indices_u16.?[r.first_index..(r.first_index + r.index_count)];
+                const max_index = std.mem.max(u16, range_indices);
+                if (max_index >= model_data.vertex_count - r.base_vertex) {
+                    return error.InvalidIndexRange;
+                }
+
+                end += r.index_count;
+            }
+            if (end != model_data.index_count) {
+                return error.InvalidIndexRange;
+            }
+
+            model_data.index_ranges = try allocator.alloc(IndexRange, range_count);
+            mem.copy(IndexRange, model_data.index_ranges.?, ranges);
+            offset += ranges_size;
+        }
+        errdefer {
+            if (model_data.index_ranges != null) {
+                allocator.free(model_data.index_ranges.?);
+            }
+        }
+
+        // Depth vertices
+
+        if ((data_u32[2] & DEPTH_VERTICES_FLAG) != 0) {
+            if (offset + 1 > data_u32.len) {
+                return error.FileTooSmall;
+            }
+
+            model_data.depth_vertex_count = data_u32[offset];
+            offset += 1;
+
+            if (model_data.depth_vertex_count == 0 or model_data.index_count == 0 or
+                (model_data.attributes_bitmap & (1 << @enumToInt(VertexAttributeType.Position))) == 0)
+            {
+                return error.InvalidDepthVertices;
+            }
+
+            model_data.depth_vertex_size = position_size * 4;
+            if (has_bone_indices) {
+                model_data.depth_vertex_size += 8;
+            }
+
+            if (model_data.depth_vertex_count > (data_u32.len - offset) / (model_data.depth_vertex_size / 4)) {
+                return error.FileTooSmall;
+            }
+
+            const depth_vertex_data_size = model_data.depth_vertex_count * (model_data.depth_vertex_size / 4);
+
+            model_data.depth_vertex_data = data_u32[offset..(offset + depth_vertex_data_size)];
+            offset += depth_vertex_data_size;
+
+            if (model_data.depth_vertex_count > 65536) {
+                if (offset + model_data.index_count > data_u32.len) {
+                    return error.FileTooSmall;
+                }
+
+                model_data.depth_indices_u32 = data_u32[offset..(offset + model_data.index_count)];
+                offset += model_data.index_count;
+            } else {
+                if (offset + (model_data.index_count + 1) / 2 > data_u32.len) {
+                    return error.FileTooSmall;
+                }
+
+                model_data.depth_indices_u16 = std.mem.bytesAsSlice(u16, data)[(offset * 2)..(offset * 2 + model_data.index_count)];
+                offset += (model_data.index_count + 1) / 2;
+            }
+        }
 
         return model_data;
     }
 
+    // Size of one position in u32s
+    pub fn positionSize(self: ModelData) u32 {
+        return switch (self.position_format) {
+            PositionFormat.Float32 => 3,
+            PositionFormat.UNorm16 => 2,
+            PositionFormat.UNorm10 => 1,
+        };
+    }
+
+    // Size of the data of one level of detail in u32s
+    fn lodSize(self: ModelData) u32 {
+        return 2 + self.material_count * 2;
+    }
+
+    // Returns the level of detail to draw the model with (0 is the full model)
+    // screen_size: bounding sphere radius / distance to the camera * projection y scale
+    // Levels are used when screen_size is smaller than their screen size
+    pub fn getLOD(self: *const ModelData, screen_size: f32) u32 {
+        var lod: u32 = 0;
+        while (lod < self.lod_count and screen_size < @bitCast(f32, self.lods.?[lod * self.lodSize()])) {
+            lod += 1;
+        }
+        return lod;
+    }
+
+    // Same as getMaterial but for level of detail lod. Level 0 is the full model.
+    pub fn getLODRegion(self: *ModelData, lod: u32, i: u32, first_index: *u32, index_count: *u32) !void {
+        if (lod > self.lod_count) {
+            return error.NoSuchLOD;
+        }
+
+        if (lod == 0) {
+            var colour: [3]f32 = undefined;
+            var utf8_name: []const u8 = undefined;
+            return self.getMaterial(i, first_index, index_count, &colour, &utf8_name);
+        }
+
+        if (i >= self.material_count) {
+            return error.NoSuchMaterial;
+        }
+
+        const offset = (lod - 1) * self.lodSize() + 2 + i * 2;
+        first_index.* = self.lods.?[offset];
+        index_count.* = self.lods.?[offset + 1];
+    }
+
+    // Estimate of the distance (model space) between level of detail lod and the full model
+    pub fn getLODError(self: *const ModelData, lod: u32) f32 {
+        if (lod == 0 or lod > self.lod_count) {
+            return 0;
+        }
+        return @bitCast(f32, self.lods.?[(lod - 1) * self.lodSize() + 1]);
+    }
+
     // utf8 string is u8 length (bytes) followed by string data
     pub fn getMaterial(self: *ModelData, i: u32, first_index: *u32, index_vertex_count: *u32, default_colour: *([3]f32), utf8_name: *([]const u8)) !void {
         if (i >= self.material_count) {
@@ -347,6 +695,159 @@ pub const ModelData = struct {
         return self.bones.?[offset .. offset + len];
     }
 
+    // Creates a copy of the model file with the vertex data grouped by vertex instead of by attribute.
+    // Attributes are stored in the order of their bit positions (see VertexAttributeType).
+    // The returned data can be passed to init(). Free it with the same allocator.
+    pub fn interleave(self: *const ModelData, allocator: *mem.Allocator) ![]align(4) u8 {
+        if (self.interleaved) {
+            return error.AlreadyInterleaved;
+        }
+
+        const has_positions = self.positions != null or self.quantised_positions != null;
+        const position_size = self.positionSize();
+
+        const header_size: u32 = if (self.position_format == PositionFormat.Float32) 5 else 9;
+
+        // in u32s
+        var vertex_size: u32 = if (has_positions) position_size else 0;
+        vertex_size += @popCount(u8, self.attributes_bitmap >> 1);
+
+        var index_data_size: u32 = 0;
+        if (self.indices_u32 != null) {
+            index_data_size = self.index_count;
+        } else if (self.indices_u16 != null) {
+            index_data_size = (self.index_count + 1) / 2;
+        }
+
+        const materials_size = if (self.materials == null) 0 else @intCast(u32, self.materials.?.len);
+        const bones_size = if (self.bones == null) 0 else @intCast(u32, self.bones.?.len / 4);
+        const lods_size = if (self.lods == null) 0 else 5 + @intCast(u32, self.lods.?.len);
+        const clusters_size = if (self.clusters == null) 0 else 1 + @intCast(u32, self.clusters.?.len * @sizeOf(Cluster) / 4);
+        const ranges_size = if (self.index_ranges == null) 0 else 1 + @intCast(u32, self.index_ranges.?.len * @sizeOf(IndexRange) / 4);
+
+        var depth_size: u32 = 0;
+        if (self.depth_vertex_data != null) {
+            depth_size = 1 + @intCast(u32, self.depth_vertex_data.?.len);
+            depth_size += if (self.depth_indices_u32 != null) self.index_count else (self.index_count + 1) / 2;
+        }
+
+        const size = header_size + self.vertex_count * vertex_size + index_data_size + 1 + materials_size + 1 + bones_size + lods_size + clusters_size + ranges_size + depth_size;
+
+        var data = try allocator.alignedAlloc(u8, 4, size * 4);
+        const data_u32 = std.mem.bytesAsSlice(u32, data);
+
+        data_u32[0] = 0xaaeecdbb;
+        data_u32[1] = self.index_count;
+        data_u32[2] = self.attributes_bitmap | (@as(u32, @enumToInt(self.position_format)) << 8);
+        if (self.lods != null) {
+            data_u32[2] |= LODS_FLAG;
+        }
+        if (self.clusters != null) {
+            data_u32[2] |= CLUSTERS_FLAG;
+        }
+        if (self.index_ranges != null) {
+            data_u32[2] |= INDEX_RANGES_FLAG;
+        }
+        if (self.depth_vertex_data != null) {
+            data_u32[2] |= DEPTH_VERTICES_FLAG;
+        }
+        data_u32[3] = 1;
+        data_u32[4] = self.vertex_count;
+
+        if (self.position_format != PositionFormat.Float32) {
+            data_u32[5] = @bitCast(u32, self.position_offset[0]);
+            data_u32[6] = @bitCast(u32, self.position_offset[1]);
+            data_u32[7] = @bitCast(u32, self.position_offset[2]);
+            data_u32[8] = @bitCast(u32, self.position_scale);
+        }
+
+        var offset: u32 = header_size;
+
+        const attributes = [_]?[]const u32{ self.colours, self.tex_coords, self.normals, self.bone_indices, self.vertex_weights, self.tangents };
+
+        var i: u32 = 0;
+        while (i < self.vertex_count) : (i += 1) {
+            if (self.positions != null) {
+                data_u32[offset] = @bitCast(u32, self.positions.?[i * 3]);
+                data_u32[offset + 1] = @bitCast(u32, self.positions.?[i * 3 + 1]);
+                data_u32[offset + 2] = @bitCast(u32, self.positions.?[i * 3 + 2]);
+                offset += 3;
+            } else if (self.quantised_positions != null) {
+                mem.copy(u32, data_u32[offset..(offset + position_size)], self.quantised_positions.?[(i * position_size)..((i + 1) * position_size)]);
+                offset += position_size;
+            }
+
+            for (attributes) |a| {
+                if (a != null) {
+                    data_u32[offset] = a.?[i];
+                    offset += 1;
+                }
+            }
+        }
+
+        if (self.indices_u32 != null) {
+            mem.copy(u32, data_u32[offset..], self.indices_u32.?);
+        } else if (self.indices_u16 != null) {
+            // Zero the padding
+            data_u32[offset + index_data_size - 1] = 0;
+            mem.copy(u16, std.mem.bytesAsSlice(u16, data)[(offset * 2)..], self.indices_u16.?);
+        }
+        offset += index_data_size;
+
+        data_u32[offset] = self.material_count;
+        offset += 1;
+        if (self.materials != null) {
+            mem.copy(u32, data_u32[offset..], self.materials.?);
+        }
+        offset += materials_size;
+
+        data_u32[offset] = self.bone_count;
+        offset += 1;
+        if (self.bones != null) {
+            mem.copy(u8, data[(offset * 4)..], self.bones.?);
+        }
+        offset += bones_size;
+
+        if (self.lods != null) {
+            data_u32[offset] = self.lod_count;
+            data_u32[offset + 1] = @bitCast(u32, self.bounding_sphere[0]);
+            data_u32[offset + 2] = @bitCast(u32, self.bounding_sphere[1]);
+            data_u32[offset + 3] = @bitCast(u32, self.bounding_sphere[2]);
+            data_u32[offset + 4] = @bitCast(u32, self.bounding_sphere[3]);
+            mem.copy(u32, data_u32[(offset + 5)..], self.lods.?);
+        }
+        offset += lods_size;
+
+        if (self.clusters != null) {
+            data_u32[offset] = @intCast(u32, self.clusters.?.len);
+            mem.copy(u8, data[((offset + 1) * 4)..], std.mem.sliceAsBytes(self.clusters.?));
+        }
+        offset += clusters_size;
+
+        if (self.index_ranges != null) {
+            data_u32[offset] = @intCast(u32, self.index_ranges.?.len);
+            mem.copy(u8, data[((offset + 1) * 4)..], std.mem.sliceAsBytes(self.index_ranges.?));
+        }
+        offset += ranges_size;
+
+        if (self.depth_vertex_data != null) {
+            data_u32[offset] = self.depth_vertex_count;
+            offset += 1;
+            mem.copy(u32, data_u32[offset..], self.depth_vertex_data.?);
+            offset += @intCast(u32, self.depth_vertex_data.?.len);
+
+            if (self.depth_indices_u32 != null) {
+                mem.copy(u32, data_u32[offset..], self.depth_indices_u32.?);
+            } else {
+                // Zero the padding
+                data_u32[offset + (self.index_count + 1) / 2 - 1] = 0;
+                mem.copy(u16, std.mem.bytesAsSlice(u16, data)[(offset * 2)..], self.depth_indices_u16.?);
+            }
+        }
+
+        return data;
+    }
+
     // Does not delete the data that was passed to init()
     pub fn free(self: *ModelData, allocator: *mem.Allocator) void {
         if (self.materials != null) {
@@ -355,9 +856,21 @@ pub const ModelData = struct {
         if (self.bones != null) {
             allocator.free(self.bones.?);
         }
+        if (self.lods != null) {
+            allocator.free(self.lods.?);
+        }
+        if (self.clusters != null) {
+            allocator.free(self.clusters.?);
+        }
+        if (self.index_ranges != null) {
+            allocator.free(self.index_ranges.?);
+        }
         self.vertex_data = null;
         self.indices_u16 = null;
         self.indices_u32 = null;
+        self.depth_vertex_data = null;
+        self.depth_indices_u16 = null;
+        self.depth_indices_u32 = null;
     }
 };
 
@@ -439,3 +952,487 @@ test "Model import test (non-interleaved)" {
     const bone_name = try m.getBoneName(&bone_data_offset);
     std.testing.expect(bone_name.len == 1 and bone_name[0] == 6);
 }
+
+test "Model import test (interleaved)" {
+    const testData = [_]u32{
+        0xaaeecdbb,
+        3,
+
+        9,
+
+        0,
+        2,
+
+        @bitCast(u32, @as(f32, 1.0)),
+        @bitCast(u32, @as(f32, 2.0)),
+        @bitCast(u32, @as(f32, 3.0)),
+        @bitCast(u32, @as(f32, 4.0)),
+        @bitCast(u32, @as(f32, 5.0)),
+        @bitCast(u32, @as(f32, 6.0)),
+
+        0x11,
+        0x22,
+
+        0x00010000,
+        0x00000001,
+
+        1,
+
+        0,
+        3,
+        0,
+        0,
+        0,
+        0,
+
+        0,
+    };
+
+    var buf: [1024]u8 = undefined;
+    const a = &std.heap.FixedBufferAllocator.init(&buf).allocator;
+
+    var planar: ModelData = try ModelData.init(std.mem.sliceAsBytes(testData[0..]), a);
+    defer planar.free(a);
+
+    const interleaved_data = try planar.interleave(a);
+    defer a.free(interleaved_data);
+
+    var m: ModelData = try ModelData.init(interleaved_data, a);
+    defer m.free(a);
+
+    std.testing.expect(m.interleaved == true);
+    std.testing.expect(m.vertex_count == 2);
+    std.testing.expect(m.vertex_size == 16);
+    std.testing.expect(m.vertex_data.?.len == 8);
+    std.testing.expect(@bitCast(f32, m.vertex_data.?[4]) == 4.0);
+    std.testing.expect(m.vertex_data.?[3] == 0x11 and m.vertex_data.?[7] == 0x22);
+    std.testing.expect(m.indices_u16.?.len == 3 and m.indices_u16.?[1] == 1);
+    std.testing.expect(m.material_count == 1);
+    std.testing.expect(m.bone_count == 0);
+}
+
+test "Model import test (quantised positions)" {
+    const testData = [_]u32{
+        0xaaeecdbb,
+        0,
+
+        1 | (1 << 8),
+
+        0,
+        2,
+
+        @bitCast(u32, @as(f32, -1.0)),
+        @bitCast(u32, @as(f32, 0.0)),
+        @bitCast(u32, @as(f32, 1.0)),
+        @bitCast(u32, @as(f32, 2.0)),
+
+        0x0000ffff,
+        0x00000000,
+        0x00008000,
+        0x00000000,
+
+        0,
+
+        0,
+    };
+
+    var buf: [1024]u8 = undefined;
+    const a = &std.heap.FixedBufferAllocator.init(&buf).allocator;
+
+    var m: ModelData = try ModelData.init(std.mem.sliceAsBytes(testData[0..]), a);
+    defer m.free(a);
+
+    std.testing.expect(m.position_format == ModelData.PositionFormat.UNorm16);
+    std.testing.expect(m.position_offset[0] == -1.0 and m.position_offset[2] == 1.0);
+    std.testing.expect(m.position_scale == 2.0);
+    std.testing.expect(m.positions == null);
+    std.testing.expect(m.quantised_positions.?.len == 4);
+    std.testing.expect(m.quantised_positions.?[2] == 0x8000);
+    std.testing.expect(m.vertex_data.?.len == 4);
+
+    const interleaved_data = try m.interleave(a);
+    defer a.free(interleaved_data);
+
+    var m2: ModelData = try ModelData.init(interleaved_data, a);
+    defer m2.free(a);
+
+    std.testing.expect(m2.position_format == ModelData.PositionFormat.UNorm16);
+    std.testing.expect(m2.position_scale == 2.0);
+    std.testing.expect(m2.vertex_size == 8);
+    std.testing.expect(std.mem.eql(u32, m2.vertex_data.?, m.vertex_data.?));
+}
+
+test "Model import test (levels of detail)" {
+    var testData = [_]u32{
+        0xaaeecdbb,
+        9,
+
+        1 | ModelData.LODS_FLAG,
+
+        0,
+        3,
+
+        0,
+        0,
+        0,
+        @bitCast(u32, @as(f32, 1.0)),
+        0,
+        0,
+        0,
+        @bitCast(u32, @as(f32, 1.0)),
+        0,
+
+        0x00010000,
+        0x00010002,
+        0x00010002,
+        0x00020000,
+        0x00000001,
+
+        1,
+
+        0,
+        3,
+        0,
+        0,
+        0,
+        0,
+
+        0,
+
+        2,
+        0,
+        0,
+        0,
+        @bitCast(u32, @as(f32, 2.0)),
+        @bitCast(u32, @as(f32, 0.5)),
+        @bitCast(u32, @as(f32, 0.01)),
+        3,
+        3,
+        @bitCast(u32, @as(f32, 0.25)),
+        @bitCast(u32, @as(f32, 0.1)),
+        6,
+        3,
+    };
+
+    var buf: [1024]u8 = undefined;
+    const a = &std.heap.FixedBufferAllocator.init(&buf).allocator;
+
+    var m: ModelData = try ModelData.init(std.mem.sliceAsBytes(testData[0..]), a);
+    defer m.free(a);
+
+    std.testing.expect(m.attributes_bitmap == 1);
+    std.testing.expect(m.index_count == 9);
+    std.testing.expect(m.lod_count == 2);
+    std.testing.expect(m.bounding_sphere[3] == 2.0);
+
+    std.testing.expect(m.getLOD(1.0) == 0);
+    std.testing.expect(m.getLOD(0.4) == 1);
+    std.testing.expect(m.getLOD(0.1) == 2);
+    std.testing.expect(m.getLODError(2) == 0.1);
+
+    var first_index: u32 = undefined;
+    var index_count: u32 = undefined;
+    try m.getLODRegion(0, 0, &first_index, &index_count);
+    std.testing.expect(first_index == 0 and index_count == 3);
+    try m.getLODRegion(2, 0, &first_index, &index_count);
+    std.testing.expect(first_index == 6 and index_count == 3);
+    std.testing.expectError(error.NoSuchLOD, m.getLODRegion(3, 0, &first_index, &index_count));
+
+    const interleaved_data = try m.interleave(a);
+    defer a.free(interleaved_data);
+
+    var m2: ModelData = try ModelData.init(interleaved_data, a);
+    defer m2.free(a);
+
+    std.testing.expect(m2.lod_count == 2);
+    std.testing.expect(m2.bounding_sphere[3] == 2.0);
+    std.testing.expect(std.mem.eql(u32, m2.lods.?, m.lods.?));
+
+    // Values that would overflow if they were added or multiplied
+
+    testData[testData.len - 1] = 0xfffffffe;
+    std.testing.expectError(error.InvalidModelLOD, ModelData.init(std.mem.sliceAsBytes(testData[0..]), a));
+    testData[testData.len - 1] = 3;
+
+    testData[testData.len - 13] = 0x40000000;
+    std.testing.expectError(error.FileTooSmall, ModelData.init(std.mem.sliceAsBytes(testData[0..]), a));
+}
+
+test "Model import test (clusters)" {
+    var testData = [_]u32{
+        0xaaeecdbb,
+        6,
+
+        1 | ModelData.CLUSTERS_FLAG,
+
+        0,
+        4,
+
+        0,
+        0,
+        0,
+        @bitCast(u32, @as(f32, 1.0)),
+        0,
+        0,
+        0,
+        @bitCast(u32, @as(f32, 1.0)),
+        0,
+        @bitCast(u32, @as(f32, 1.0)),
+        @bitCast(u32, @as(f32, 1.0)),
+        0,
+
+        0x00010000,
+        0x00000002,
+        0x00030002,
+
+        1,
+
+        0,
+        6,
+        0,
+        0,
+        0,
+        0,
+
+        0,
+
+        2,
+
+        0,
+        3,
+        @bitCast(u32, @as(f32, 0.5)),
+        @bitCast(u32, @as(f32, 0.5)),
+        0,
+        @bitCast(u32, @as(f32, 0.75)),
+        0,
+        0,
+        0,
+        @bitCast(u32, @as(f32, 1.0)),
+        @bitCast(u32, @as(f32, 1.0)),
+        0,
+        0,
+        0,
+        @bitCast(u32, @as(f32, 1.0)),
+        0,
+
+        3,
+        3,
+        @bitCast(u32, @as(f32, 0.5)),
+        @bitCast(u32, @as(f32, 0.5)),
+        0,
+        @bitCast(u32, @as(f32, 0.75)),
+        0,
+        0,
+        0,
+        @bitCast(u32, @as(f32, 1.0)),
+        @bitCast(u32, @as(f32, 1.0)),
+        0,
+        0,
+        0,
+        0,
+        @bitCast(u32, @as(f32, 1.0)),
+    };
+
+    var buf: [1024]u8 = undefined;
+    const a = &std.heap.FixedBufferAllocator.init(&buf).allocator;
+
+    var m: ModelData = try ModelData.init(std.mem.sliceAsBytes(testData[0..]), a);
+    defer m.free(a);
+
+    std.testing.expect(m.index_count == 6);
+    std.testing.expect(m.lods == null);
+    std.testing.expect(m.clusters.?.len == 2);
+    std.testing.expect(m.clusters.?[1].first_index == 3 and m.clusters.?[1].index_count == 3);
+    std.testing.expect(m.clusters.?[0].bounding_sphere[3] == 0.75);
+    std.testing.expect(m.clusters.?[0].box_max[1] == 1.0);
+    std.testing.expect(m.clusters.?[0].cone_axis[2] == 1.0 and m.clusters.?[0].cone_cutoff == 0.0);
+    std.testing.expect(m.clusters.?[1].cone_cutoff == 1.0);
+
+    const interleaved_data = try m.interleave(a);
+    defer a.free(interleaved_data);
+
+    var m2: ModelData = try ModelData.init(interleaved_data, a);
+    defer m2.free(a);
+
+    std.testing.expect(m2.clusters.?.len == 2);
+    std.testing.expect(std.mem.eql(u8, std.mem.sliceAsBytes(m2.clusters.?), std.mem.sliceAsBytes(m.clusters.?)));
+
+    // Values that would overflow if they were added or multiplied
+
+    testData[testData.len - 15] = 0xfffffffe;
+    std.testing.expectError(error.InvalidModelCluster, ModelData.init(std.mem.sliceAsBytes(testData[0..]), a));
+    testData[testData.len - 15] = 3;
+
+    testData[testData.len - 33] = 0x10000000;
+    std.testing.expectError(error.FileTooSmall, ModelData.init(std.mem.sliceAsBytes(testData[0..]), a));
+}
+
+test "Model import test (index ranges)" {
+    var testData = [_]u32{
+        0xaaeecdbb,
+        6,
+
+        1 | ModelData.INDEX_RANGES_FLAG,
+
+        0,
+        4,
+
+        0,
+        0,
+        0,
+        @bitCast(u32, @as(f32, 1.0)),
+        0,
+        0,
+        0,
+        @bitCast(u32, @as(f32, 1.0)),
+        0,
+        @bitCast(u32, @as(f32, 1.0)),
+        @bitCast(u32, @as(f32, 1.0)),
+        0,
+
+        0x00010000,
+        0x00000002,
+        0x00020001,
+
+        1,
+
+        0,
+        6,
+        0,
+        0,
+        0,
+        0,
+
+        0,
+
+        2,
+
+        0,
+        3,
+        0,
+
+        3,
+        3,
+        1,
+    };
+
+    var buf: [1024]u8 = undefined;
+    const a = &std.heap.FixedBufferAllocator.init(&buf).allocator;
+
+    var m: ModelData = try ModelData.init(std.mem.sliceAsBytes(testData[0..]), a);
+    defer m.free(a);
+
+    std.testing.expect(m.indices_u16.?.len == 6 and m.indices_u32 == null);
+    std.testing.expect(m.index_ranges.?.len == 2);
+    std.testing.expect(m.index_ranges.?[1].first_index == 3 and m.index_ranges.?[1].base_vertex == 1);
+
+    const interleaved_data = try m.interleave(a);
+    defer a.free(interleaved_data);
+
+    var m2: ModelData = try ModelData.init(interleaved_data, a);
+    defer m2.free(a);
+
+    std.testing.expect(std.mem.eql(u8, std.mem.sliceAsBytes(m2.index_ranges.?), std.mem.sliceAsBytes(m.index_ranges.?)));
+
+    // The ranges must cover all of the indices
+    testData[testData.len - 2] = 2;
+    std.testing.expectError(error.InvalidIndexRange, ModelData.init(std.mem.sliceAsBytes(testData[0..]), a));
+    testData[testData.len - 2] = 3;
+
+    // With a base vertex of 2 the second range uses vertex 4, past the end of the vertex data
+    testData[testData.len - 1] = 2;
+    std.testing.expectError(error.InvalidIndexRange, ModelData.init(std.mem.sliceAsBytes(testData[0..]), a));
+    testData[testData.len - 1] = 1;
+
+    // A range count that would overflow if it was multiplied by the size of a range
+    testData[testData.len - 7] = 0x55555556;
+    std.testing.expectError(error.FileTooSmall, ModelData.init(std.mem.sliceAsBytes(testData[0..]), a));
+}
+
+test "Model import test (depth vertices)" {
+    // Vertices 0 and 3 have the same position
+    var testData = [_]u32{
+        0xaaeecdbb,
+        6,
+
+        1 | ModelData.DEPTH_VERTICES_FLAG,
+
+        0,
+        4,
+
+        0,
+        0,
+        0,
+        @bitCast(u32, @as(f32, 1.0)),
+        0,
+        0,
+        0,
+        @bitCast(u32, @as(f32, 1.0)),
+        0,
+        0,
+        0,
+        0,
+
+        0x00010000,
+        0x00020002,
+        0x00030001,
+
+        1,
+
+        0,
+        6,
+        0,
+        0,
+        0,
+        0,
+
+        0,
+
+        3,
+
+        0,
+        0,
+        0,
+        @bitCast(u32, @as(f32, 1.0)),
+        0,
+        0,
+        0,
+        @bitCast(u32, @as(f32, 1.0)),
+        0,
+
+        0x00010000,
+        0x00020002,
+        0x00000001,
+    };
+
+    var buf: [1024]u8 = undefined;
+    const a = &std.heap.FixedBufferAllocator.init(&buf).allocator;
+
+    var m: ModelData = try ModelData.init(std.mem.sliceAsBytes(testData[0..]), a);
+    defer m.free(a);
+
+    std.testing.expect(m.depth_vertex_count == 3 and m.depth_vertex_size == 12);
+    std.testing.expect(m.depth_vertex_data.?.len == 9);
+    std.testing.expect(m.depth_indices_u16.?.len == 6 and m.depth_indices_u32 == null);
+    std.testing.expect(m.depth_indices_u16.?[5] == 0);
+
+    const interleaved_data = try m.interleave(a);
+    defer a.free(interleaved_data);
+
+    var m2: ModelData = try ModelData.init(interleaved_data, a);
+    defer m2.free(a);
+
+    std.testing.expect(std.mem.eql(u32, m2.depth_vertex_data.?, m.depth_vertex_data.?));
+    std.testing.expect(std.mem.eql(u16, m2.depth_indices_u16.?, m.depth_indices_u16.?));
+
+    // The depth indices are missing
+    std.testing.expectError(error.FileTooSmall, ModelData.init(std.mem.sliceAsBytes(testData[0..(testData.len - 3)]), a));
+
+    // A vertex count that would overflow if it was multiplied by the size of a vertex
+    testData[testData.len - 13] = 0x55555556;
+    std.testing.expectError(error.FileTooSmall, ModelData.init(std.mem.sliceAsBytes(testData[0..]), a));
+}
+
+test "Animation files" {
+    _ = @import("AnimationFiles.zig");
+}
@@ -5,6 +5,7 @@ const Asset = @import("../Assets/Assets.zig").Asset;
 const ShaderInstance = @import("Shader.zig").ShaderInstance;
 const Mesh = @import("Mesh.zig").Mesh;
 const ModelData = @import("../ModelFiles/ModelFiles.zig").ModelData;
+const Matrix = @import("../Mathematics/Mathematics.zig").Matrix;
 const this_frame_time = &@import("RTRenderEngine.zig").this_frame_time;
 
 var identity_matrix_buffer: ?[]f32 = null;
@@ -19,32 +20,69 @@ pub const Animation = struct {
 
     animation_start_time: u64 = 0,
 
+    // Index of the animation bone for each bone of the model. no_bone if the animation does not have the bone.
+    bone_map: []u32,
+
+    // Bone matrices of the frame in matrices_frame_index
     matrices: []f32,
+    matrices_frame_index: ?u32 = null,
+
+    // If the positions are quantised then the bone matrices are converted to work on the quantised positions:
+    // dequantise -> bone transformation -> quantise
+    // The model matrix then dequantises the final positions (see MeshRenderer)
+    dequantise: ?Matrix(f32, 4),
+    quantise: ?Matrix(f32, 4),
+
     allocator: *std.mem.Allocator,
 
     paused: bool = false,
     paused_at_time: u64 = 0,
 
-    fn create_matrices(animation_data: *AnimationData, model: *ModelData, allocator: *std.mem.Allocator) ![]f32 {
-        const num_frames = animation_data.frame_count;
+    const no_bone = 0xffffffff;
 
-        var matrices = try allocator.alloc(f32, num_frames * model.bone_count * 4 * 4);
+    fn createBoneMap(animation_data: *AnimationData, model: *ModelData, allocator: *std.mem.Allocator) ![]u32 {
+        var bone_map = try allocator.alloc(u32, model.bone_count);
+        std.mem.set(u32, bone_map, no_bone);
 
-        var frame_index: u32 = 0;
-        while (frame_index < num_frames) : (frame_index += 1) {
-            var bone_i: u32 = 0;
-            var bone_o: u32 = 0; // offset into bones data used by getBoneName
-            while (bone_i < model.bone_count) : (bone_i += 1) {
-                const name = model.getBoneName(&bone_o) catch break;
-                const animation_bone_index = animation_data.*.getBoneIndex(name) catch continue;
-
-                const animation_bone_matrix_offset = (frame_index * animation_data.bone_count + animation_bone_index) * 4 * 4;
-                const o = (frame_index * model.bone_count + bone_i) * 4 * 4;
-                std.mem.copy(f32, matrices[o .. o + 4 * 4], animation_data.matrices_absolute[animation_bone_matrix_offset .. animation_bone_matrix_offset + 4 * 4]);
+        var bone_i: u32 = 0;
+        var bone_o: u32 = 0; // offset into bones data used by getBoneName
+        while (bone_i < model.bone_count) : (bone_i += 1) {
+            const name = model.getBoneName(&bone_o) catch break;
+            bone_map[bone_i] = animation_data.*.getBoneIndex(name) catch no_bone;
+        }
+
+        return bone_map;
+    }
+
+    // Bone matrices are decoded from the animation data when the frame changes
+    fn updateMatrices(self: *Animation, frame_index: u32) void {
+        if (self.matrices_frame_index != null and self.matrices_frame_index.? == frame_index) {
+            return;
+        }
+
+        for (self.bone_map) |animation_bone_index, bone_i| {
+            const o = bone_i * 4 * 4;
+
+            var bone_matrix: [16]f32 = [16]f32{
+                1.0, 0.0, 0.0, 0.0,
+                0.0, 1.0, 0.0, 0.0,
+                0.0, 0.0, 1.0, 0.0,
+                0.0, 0.0, 0.0, 1.0,
+            };
+
+            if (animation_bone_index != no_bone) {
+                bone_matrix = self.animation_data.getBoneMatrix(animation_bone_index, frame_index);
+
+                if (self.dequantise != null) {
+                    const m = self.dequantise.?.mul(Matrix(f32, 4){ .data = @bitCast([4][4]f32, bone_matrix) }).mul(self.quantise.?);
+                    bone_matrix = @bitCast([16]f32, m.data);
+                }
             }
+
+            std.mem.copy(f32, self.matrices[o .. o + 4 * 4], bone_matrix[0..]);
         }
 
-        return matrices;
+        self.matrices_frame_index = frame_index;
     }
 
     pub fn init(animation_data: *AnimationData, model: *ModelData, allocator: *std.mem.Allocator) !Animation {
@@ -52,12 +90,18 @@ pub const Animation = struct {
             return error.MeshNasNoBones;
         }
 
-        var matrices = try create_matrices(animation_data, model, allocator);
+        var bone_map = try createBoneMap(animation_data, model, allocator);
+        errdefer allocator.free(bone_map);
+
+        var matrices = try allocator.alloc(f32, model.bone_count * 4 * 4);
 
         return Animation{
             .animation_data = animation_data,
             .model = model,
+            .bone_map = bone_map,
             .matrices = matrices,
+            .dequantise = Mesh.dequantisationMatrix(model),
+            .quantise = Mesh.quantisationMatrix(model),
             .allocator = allocator,
             .animation_start_time = this_frame_time.*,
         };
@@ -83,6 +127,27 @@ pub const Animation = struct {
         return a;
     }
 
+    // Plays the clip called clip_name from an animation bank (.animbank) asset
+    pub fn initFromAnimationBankAsset(animation_bank_asset: *Asset, clip_name: []const u8, model_asset: *Asset, allocator: *std.mem.Allocator) !Animation {
+        if (animation_bank_asset.asset_type != Asset.AssetType.AnimationBank or model_asset.asset_type != Asset.AssetType.Model) {
+            return error.InvalidAssetType;
+        }
+        if (animation_bank_asset.state != Asset.AssetState.Ready or model_asset.state != Asset.AssetState.Ready) {
+            return error.InvalidAssetState;
+        }
+
+        var a = try init(try animation_bank_asset.animation_bank.?.getClip(clip_name), &model_asset.model.?, allocator);
+
+        a.animation_asset = animation_bank_asset;
+        a.model_asset = model_asset;
+
+        animation_bank_asset.ref_count.inc();
+        animation_bank_asset.ref_count2.inc();
+        model_asset.ref_count.inc();
+
+        return a;
+    }
+
     fn detatchAssets(self: *Animation, free_if_unused: bool) void {
         if (self.animation_asset != null) {
             self.animation_asset.?.ref_count.dec();
@@ -136,9 +201,9 @@ pub const Animation = struct {
         }
 
         frame_index = frame_index % self.animation_data.frame_count;
-        const o = frame_index * model.bone_count * 4 * 4;
+        self.updateMatrices(frame_index);
 
-        try shader.setBoneMatrices(self.matrices[o .. o + model.bone_count * 4 * 4]);
+        try shader.setBoneMatrices(self.matrices);
     }
 
     pub fn setAnimationIdentityMatrices(shader: *const ShaderInstance, allocator: *std.mem.Allocator) !void {
@@ -161,6 +226,7 @@ pub const Animation = struct {
     pub fn deinit(self: *Animation) void {
         self.ref_count.deinit();
         self.detatchAssets(false);
+        self.allocator.free(self.bone_map);
         self.allocator.free(self.matrices);
     }
 
@@ -171,6 +237,7 @@ pub const Animation = struct {
 
         self.ref_count.deinit();
         self.detatchAssets(true);
+        self.allocator.free(self.bone_map);
         self.allocator.free(self.matrices);
     }
 };
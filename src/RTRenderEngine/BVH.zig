@@ -0,0 +1,185 @@
+const std = @import("std");
+const assert = std.debug.assert;
+const Allocator = std.mem.Allocator;
+const Matrix = @import("../Mathematics/Mathematics.zig").Matrix;
+const Object = @import("RTRenderEngine.zig").Object;
+
+// Planes (a, b, c, d) of a view frustum. Points (x,y,z) with x*a + y*b + z*c + d < 0 are outside of the plane.
+pub const FrustumPlanes = [6][4]f32;
+
+// Planes of the view frustum of a projection with z in the range [0,1] (the InverseZ projections in Matrix.zig)
+// view_projection_matrix transforms world space to clip space
+pub fn getFrustumPlanes(view_projection_matrix: *const Matrix(f32, 4)) FrustumPlanes {
+    const m = view_projection_matrix.data;
+    var planes: FrustumPlanes = undefined;
+
+    var i: u32 = 0;
+    while (i < 4) : (i += 1) {
+        // -w <= x <= w, -w <= y <= w, 0 <= z <= w
+        planes[0][i] = m[i][3] + m[i][0];
+        planes[1][i] = m[i][3] - m[i][0];
+        planes[2][i] = m[i][3] + m[i][1];
+        planes[3][i] = m[i][3] - m[i][1];
+        planes[4][i] = m[i][2];
+        planes[5][i] = m[i][3] - m[i][2];
+    }
+
+    return planes;
+}
+
+// Returns false if the box is completely outside of one of the planes
+pub fn boxIsVisible(planes: *const FrustumPlanes, box_min: [3]f32, box_max: [3]f32) bool {
+    for (planes) |p| {
+        // The corner of the box that is furthest inside the plane
+        const x = if (p[0] > 0) box_max[0] else box_min[0];
+        const y = if (p[1] > 0) box_max[1] else box_min[1];
+        const z = if (p[2] > 0) box_max[2] else box_min[2];
+        if (x * p[0] + y * p[1] + z * p[2] + p[3] < 0) {
+            return false;
+        }
+    }
+    return true;
+}
+
+// Bounding volume hierarchy of objects in a scene. See scene file format.md
+pub const BVH = struct {
+    // Same layout as in scene files
+    pub const Node = extern struct {
+        box_min: [3]f32,
+        box_max: [3]f32,
+
+        // Leaves: first entry. Other nodes: first of the two child nodes
+        first: u32,
+
+        // Number of entries. 0 if this is not a leaf
+        count: u32,
+    };
+
+    pub const Entry = struct {
+        object: *Object,
+        box_min: [3]f32,
+        box_max: [3]f32,
+    };
+
+    // Limit of the size of the stack in markVisible
+    pub const MAX_DEPTH = 62;
+
+    nodes: []Node,
+    entries: []Entry,
+    allocator: *Allocator,
+
+    // Takes ownership of nodes and entries, which must have been allocated with allocator (unless this function returns with an error)
+    // The objects must not move (see Object.setTransform) while the boxes are being calculated
+    pub fn init(nodes: []Node, entries: []Entry, allocator: *Allocator) !BVH {
+        if (nodes.len == 0 and entries.len != 0) {
+            return error.InvalidBVH;
+        }
+
+        // Children come after their parents so the depth of each node can be found in one pass
+        var depths = try allocator.alloc(u32, nodes.len);
+        defer allocator.free(depths);
+        std.mem.set(u32, depths, 0);
+
+        for (nodes) |n, i| {
+            if (n.count == 0) {
+                if (n.first <= i or n.first >= nodes.len - 1 or depths[i] >= MAX_DEPTH) {
+                    return error.InvalidBVH;
+                }
+                depths[n.first] = depths[i] + 1;
+                depths[n.first + 1] = depths[i] + 1;
+            } else if (n.first >= entries.len or n.count > entries.len - n.first) {
+                return error.InvalidBVH;
+            }
+        }
+
+        for (entries) |e| {
+            e.object.in_bvh = true;
+        }
+
+        return BVH{
+            .nodes = nodes,
+            .entries = entries,
+            .allocator = allocator,
+        };
+    }
+
+    // Sets visible_pass of the objects that are (at least partly) inside the frustum to pass
+    pub fn markVisible(self: *const BVH, planes: *const FrustumPlanes, pass: u32) void {
+        if (self.nodes.len == 0) {
+            return;
+        }
+
+        var stack: [MAX_DEPTH + 2]u32 = undefined;
+        stack[0] = 0;
+        var stack_size: u32 = 1;
+
+        while (stack_size > 0) {
+            stack_size -= 1;
+            const node = &self.nodes[stack[stack_size]];
+
+            if (!boxIsVisible(planes, node.box_min, node.box_max)) {
+                continue;
+            }
+
+            if (node.count == 0) {
+                assert(stack_size + 2 <= stack.len);
+                stack[stack_size] = node.first + 1;
+                stack[stack_size + 1] = node.first;
+                stack_size += 2;
+            } else {
+                for (self.entries[node.first..(node.first + node.count)]) |*e| {
+                    if (boxIsVisible(planes, e.box_min, e.box_max)) {
+                        e.object.visible_pass = pass;
+                    }
+                }
+            }
+        }
+    }
+
+    pub fn free(self: *BVH) void {
+        self.allocator.free(self.nodes);
+        self.allocator.free(self.entries);
+    }
+};
+
+test "BVH" {
+    var buf: [4096]u8 = undefined;
+    const a = &std.heap.FixedBufferAllocator.init(&buf).allocator;
+
+    var objects = [3]Object{ Object{}, Object{}, Object{} };
+
+    var nodes = try a.alloc(BVH.Node, 3);
+    nodes[0] = BVH.Node{ .box_min = [3]f32{ -10, -1, -1 }, .box_max = [3]f32{ 10, 1, 1 }, .first = 1, .count = 0 };
+    nodes[1] = BVH.Node{ .box_min = [3]f32{ -10, -1, -1 }, .box_max = [3]f32{ -8, 1, 1 }, .first = 0, .count = 1 };
+    nodes[2] = BVH.Node{ .box_min = [3]f32{ 8, -1, -1 }, .box_max = [3]f32{ 10, 1, 1 }, .first = 1, .count = 2 };
+
+    var entries = try a.alloc(BVH.Entry, 3);
+    entries[0] = BVH.Entry{ .object = &objects[0], .box_min = [3]f32{ -10, -1, -1 }, .box_max = [3]f32{ -8, 1, 1 } };
+    entries[1] = BVH.Entry{ .object = &objects[1], .box_min = [3]f32{ 8, -1, -1 }, .box_max = [3]f32{ 9, 1, 1 } };
+    entries[2] = BVH.Entry{ .object = &objects[2], .box_min = [3]f32{ 9.5, -1, -1 }, .box_max = [3]f32{ 10, 1, 1 } };
+
+    var bvh = try BVH.init(nodes, entries, a);
+    defer bvh.free();
+
+    std.testing.expect(objects[0].in_bvh and objects[2].in_bvh);
+
+    // Orthographic projection of x in the range [5, 9.75]
+    const projection = Matrix(f32, 4).orthoProjectionOpenGLInverseZ(5.0, 9.75, -5.0, 5.0, -5.0, 5.0);
+    const planes = getFrustumPlanes(&projection);
+
+    bvh.markVisible(&planes, 1);
+    std.testing.expect(objects[0].visible_pass == 0);
+    std.testing.expect(objects[1].visible_pass == 1);
+    std.testing.expect(objects[2].visible_pass == 1);
+
+    const projection2 = Matrix(f32, 4).orthoProjectionOpenGLInverseZ(5.0, 9.25, -5.0, 5.0, -5.0, 5.0);
+    const planes2 = getFrustumPlanes(&projection2);
+
+    bvh.markVisible(&planes2, 2);
+    std.testing.expect(objects[1].visible_pass == 2);
+    std.testing.expect(objects[2].visible_pass == 1);
+
+    // Child before its parent
+    var bad_nodes = [1]BVH.Node{BVH.Node{ .box_min = [3]f32{ 0, 0, 0 }, .box_max = [3]f32{ 0, 0, 0 }, .first = 0, .count = 0 }};
+    std.testing.expectError(error.InvalidBVH, BVH.init(bad_nodes[0..], entries[0..0], a));
+}
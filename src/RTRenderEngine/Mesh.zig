@@ -7,6 +7,7 @@ const Buffer = @import("../WindowGraphicsInput/WindowGraphicsInput.zig").Buffer;
 const VertexMeta = @import("../WindowGraphicsInput/WindowGraphicsInput.zig").VertexMeta;
 const ShaderInstance = @import("Shader.zig").ShaderInstance;
 const Matrix = @import("../Mathematics/Mathematics.zig").Matrix;
+const Vector = @import("../Mathematics/Mathematics.zig").Vector;
 const wgi = @import("../WindowGraphicsInput/WindowGraphicsInput.zig");
 const Texture2D = @import("Texture2D.zig").Texture2D;
 const Animation = @import("Animation.zig").Animation;
@@ -25,6 +26,14 @@ pub const Mesh = struct {
     modifiable: bool,
     model: *ModelData,
 
+    // Converts quantised positions to model space. Null if the positions are not quantised.
+    dequantisation_matrix: ?Matrix(f32, 4) = null,
+
+    // Position-only vertices and their indices for shadow maps and depth passes (see ModelData.depth_vertex_data)
+    // Null if the model does not have depth vertices or the mesh is modifiable (they would not be updated).
+    depth_vertex_buffer: ?Buffer = null,
+    depth_index_buffer: ?Buffer = null,
+
     pub fn initFromAsset(asset: *Asset, modifiable: bool) !Mesh {
         if (asset.asset_type != Asset.AssetType.Model) {
             return error.InvalidAssetType;
@@ -60,14 +69,60 @@ pub const Mesh = struct {
             }
         }
 
+        errdefer {
+            if (ibuf != null) {
+                ibuf.?.free();
+            }
+        }
+
+        var depth_vbuf: ?Buffer = null;
+        var depth_ibuf: ?Buffer = null;
+        if (model.depth_vertex_data != null and !modifiable) {
+            depth_vbuf = try Buffer.init();
+            errdefer depth_vbuf.?.free();
+            try depth_vbuf.?.upload(Buffer.BufferType.VertexData, std.mem.sliceAsBytes(model.depth_vertex_data.?), false);
+
+            depth_ibuf = try Buffer.init();
+            errdefer depth_ibuf.?.free();
+            if (model.depth_indices_u16 != null) {
+                try depth_ibuf.?.upload(Buffer.BufferType.IndexData, std.mem.sliceAsBytes(model.depth_indices_u16.?), false);
+            } else {
+                try depth_ibuf.?.upload(Buffer.BufferType.IndexData, std.mem.sliceAsBytes(model.depth_indices_u32.?), false);
+            }
+        }
+
         return Mesh{
             .vertex_data_buffer = vbuf,
             .index_data_buffer = ibuf,
             .modifiable = modifiable,
             .model = model,
+            .dequantisation_matrix = dequantisationMatrix(model),
+            .depth_vertex_buffer = depth_vbuf,
+            .depth_index_buffer = depth_ibuf,
         };
     }
 
+    // Scale then translate. Null if the positions are not quantised.
+    // Apply this before the model matrix. Bone matrices must be converted to the quantised space (see Animation).
+    pub fn dequantisationMatrix(model: *const ModelData) ?Matrix(f32, 4) {
+        if (model.position_format == ModelData.PositionFormat.Float32) {
+            return null;
+        }
+
+        const s = model.position_scale;
+        return Matrix(f32, 4).scale(Vector(f32, 4).init([4]f32{ s, s, s, 1 })).mul(Matrix(f32, 4).translate(Vector(f32, 3).init(model.position_offset)));
+    }
+
+    pub fn quantisationMatrix(model: *const ModelData) ?Matrix(f32, 4) {
+        if (model.position_format == ModelData.PositionFormat.Float32) {
+            return null;
+        }
+
+        const o = model.position_offset;
+        const s = 1.0 / model.position_scale;
+        return Matrix(f32, 4).translate(Vector(f32, 3).init([3]f32{ -o[0], -o[1], -o[2] })).mul(Matrix(f32, 4).scale(Vector(f32, 4).init([4]f32{ s, s, s, 1 })));
+    }
+
     pub fn uploadVertexData(self: *Mesh, offset: u32, data: []const u8) !void {
         if (!self.modifiable) {
             return error.ReadOnlyMesh;
@@ -93,6 +148,10 @@ pub const Mesh = struct {
         if (self.index_data_buffer != null) {
             self.index_data_buffer.?.free();
         }
+        if (self.depth_vertex_buffer != null) {
+            self.depth_vertex_buffer.?.free();
+            self.depth_index_buffer.?.free();
+        }
     }
 
     // Does not delete the model
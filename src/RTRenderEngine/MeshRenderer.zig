@@ -13,16 +13,95 @@ const Animation = @import("Animation.zig").Animation;
 const rtrenderengine = @import("RTRenderEngine.zig");
 const getSettings = rtrenderengine.getSettings;
 const min = std.math.min;
+const max = std.math.max;
 const ReferenceCounter = @import("../RefCount.zig").ReferenceCounter;
 const Asset = @import("../Assets/Assets.zig").Asset;
 const Mesh = @import("Mesh.zig").Mesh;
 
+// Culls the clusters of a model (see ModelData.Cluster) for one draw
+const ClusterCuller = struct {
+    // Left, right, bottom and top planes of the view frustum in model space.
+    // Points (x,y,z) with x*p[0] + y*p[1] + z*p[2] + p[3] < 0 are outside of plane p.
+    planes: [4][4]f32,
+
+    orthographic: bool,
+
+    // Model space position of the camera, or the direction it is looking in if orthographic is true
+    camera: [3]f32,
+
+    // Matrices transform model space (not quantised positions) to clip space and view space
+    fn init(mvp_matrix: *const Matrix(f32, 4), model_view_matrix: *const Matrix(f32, 4)) !ClusterCuller {
+        const m = mvp_matrix.data;
+        var culler: ClusterCuller = undefined;
+
+        // -w <= x <= w and -w <= y <= w
+        var i: u32 = 0;
+        while (i < 4) : (i += 1) {
+            const column = i / 2;
+            const sign: f32 = if (i % 2 == 0) 1.0 else -1.0;
+            var j: u32 = 0;
+            while (j < 4) : (j += 1) {
+                culler.planes[i][j] = m[j][3] + sign * m[j][column];
+            }
+        }
+
+        // w does not depend on the position
+        culler.orthographic = m[0][3] == 0 and m[1][3] == 0 and m[2][3] == 0;
+
+        const view_to_model = try model_view_matrix.inverse();
+        const v = view_to_model.data;
+
+        if (culler.orthographic) {
+            // The camera looks along -z in view space
+            const length = std.math.sqrt(v[2][0] * v[2][0] + v[2][1] * v[2][1] + v[2][2] * v[2][2]);
+            if (!(length > 0)) {
+                return error.InvalidMatrix;
+            }
+            culler.camera = [3]f32{ -v[2][0] / length, -v[2][1] / length, -v[2][2] / length };
+        } else {
+            culler.camera = [3]f32{ v[3][0], v[3][1], v[3][2] };
+        }
+
+        return culler;
+    }
+
+    // Returns false if the cluster is outside of the view frustum or all of its triangles are back faces
+    fn isVisible(self: *const ClusterCuller, cluster: *const ModelData.Cluster) bool {
+        // The corner of the box that is furthest inside each plane
+        for (self.planes) |p| {
+            const x = if (p[0] > 0) cluster.box_max[0] else cluster.box_min[0];
+            const y = if (p[1] > 0) cluster.box_max[1] else cluster.box_min[1];
+            const z = if (p[2] > 0) cluster.box_max[2] else cluster.box_min[2];
+            if (x * p[0] + y * p[1] + z * p[2] + p[3] < 0) {
+                return false;
+            }
+        }
+
+        // Normal cone (see model file format.md)
+        const a = cluster.cone_axis;
+        if (self.orthographic) {
+            return self.camera[0] * a[0] + self.camera[1] * a[1] + self.camera[2] * a[2] < cluster.cone_cutoff;
+        }
+
+        const d = [3]f32{
+            cluster.bounding_sphere[0] - self.camera[0],
+            cluster.bounding_sphere[1] - self.camera[1],
+            cluster.bounding_sphere[2] - self.camera[2],
+        };
+        const distance = std.math.sqrt(d[0] * d[0] + d[1] * d[1] + d[2] * d[2]);
+        return d[0] * a[0] + d[1] * a[1] + d[2] * a[2] < cluster.cone_cutoff * distance + cluster.bounding_sphere[3];
+    }
+};
+
 pub const MeshRenderer = struct {
     ref_count: ReferenceCounter = ReferenceCounter{},
 
     mesh: ?*Mesh,
     vao: VertexMeta,
 
+    // For drawing shadow maps with the mesh's depth vertices. Null if the mesh does not have them.
+    depth_vao: ?VertexMeta = null,
+
     max_vertex_lights: u32 = 8,
     max_fragment_lights: u32 = 4,
 
@@ -43,6 +122,10 @@ pub const MeshRenderer = struct {
     // Should be disabled for large objects such as terrain.
     enable_per_object_light: bool = true,
 
+    // Skips the parts of the model (clusters) that are outside of the view or facing away from the camera.
+    // Only works if the model file has clusters. Not used for animated meshes or levels of detail.
+    enable_cluster_culling: bool = true,
+
     pub const Material = struct {
         // DO NOT SET THESE VARIABLES USE fn setTexture AND fn setNormalMap
         texture: ?*Texture2D = null,
@@ -82,34 +165,51 @@ pub const MeshRenderer = struct {
 
     animation_object: ?*Animation = null,
 
-    pub fn init(mesh: *Mesh, allocator: *std.mem.Allocator) !MeshRenderer {
-        mesh.ref_count.inc();
-        errdefer mesh.ref_count.dec();
-
-        var inputs: []VertexMeta.VertexInput = try allocator.alloc(VertexMeta.VertexInput, mesh.model.attributes_count);
-        defer allocator.free(inputs);
-
-        const interleaved = mesh.model.interleaved;
-        const stride = if (interleaved) mesh.model.vertex_size else 0;
-        const vertCount = mesh.model.vertex_count;
+    // Sets the vertex inputs (one for each attribute of the model) for the vertex data of the model in vertex_buffer
+    // Returns the index of the bone indices input (the bone weights are the next input) or null if the model has no bones
+    fn vertexInputs(model: *const ModelData, vertex_buffer: *Buffer, inputs: []VertexMeta.VertexInput) ?u32 {
+        const interleaved = model.interleaved;
+        const stride = if (interleaved) model.vertex_size else 0;
+        const vertCount = model.vertex_count;
 
         var attr: u3 = 0;
         var i: u32 = 0;
         var offset: u32 = 0;
+        var bone_indices_input: ?u32 = null;
         while (attr < 7) : (attr += 1) {
-            if ((mesh.model.attributes_bitmap & (@as(u8, 1) << attr)) != 0) {
+            if ((model.attributes_bitmap & (@as(u8, 1) << attr)) != 0) {
                 inputs[i].offset = offset;
                 inputs[i].stride = stride;
-                inputs[i].source = &mesh.vertex_data_buffer;
+                inputs[i].source = vertex_buffer;
 
                 if (attr == @enumToInt(VertexAttributeType.Position)) {
                     // positions
-                    inputs[i].componentCount = 3;
-                    inputs[i].dataType = VertexMeta.VertexInput.DataType.Float;
-                    inputs[i].dataElementSize = 4;
-                    inputs[i].signed = true;
-                    inputs[i].normalised = false;
-                    offset += if (interleaved) (3 * 4) else (vertCount * 3 * 4);
+                    if (model.position_format == ModelData.PositionFormat.Float32) {
+                        inputs[i].componentCount = 3;
+                        inputs[i].dataType = VertexMeta.VertexInput.DataType.Float;
+                        inputs[i].dataElementSize = 4;
+                        inputs[i].signed = true;
+                        inputs[i].normalised = false;
+                    } else if (model.position_format == ModelData.PositionFormat.UNorm16) {
+                        // 3 components + padding. The 4th component is ignored by the shaders (vec3 in_coords).
+                        // Attributes must be a multiple of 4 bytes.
+                        inputs[i].componentCount = 4;
+                        inputs[i].dataType = VertexMeta.VertexInput.DataType.IntegerToFloat;
+                        inputs[i].dataElementSize = 2;
+                        inputs[i].signed = false;
+                        inputs[i].normalised = true;
+
+                        if (!interleaved) {
+                            inputs[i].stride = 8;
+                        }
+                    } else {
+                        inputs[i].componentCount = 0;
+                        inputs[i].dataType = VertexMeta.VertexInput.DataType.CompactInts;
+                        inputs[i].signed = false;
+                        inputs[i].normalised = true;
+                    }
+                    const position_size = model.positionSize() * 4;
+                    offset += if (interleaved) position_size else (vertCount * position_size);
                 } else {
                     if (attr == @enumToInt(VertexAttributeType.Colour)) {
                         // colours
@@ -133,6 +233,7 @@ pub const MeshRenderer = struct {
                         inputs[i].normalised = true;
                     } else if (attr == @enumToInt(VertexAttributeType.BoneIndices)) {
                         // bone indices
+                        bone_indices_input = i;
                         inputs[i].componentCount = 4;
                         inputs[i].dataType = VertexMeta.VertexInput.DataType.Integer;
                         inputs[i].dataElementSize = 1;
@@ -158,8 +259,52 @@ pub const MeshRenderer = struct {
             }
         }
 
+        return bone_indices_input;
+    }
+
+    // Same inputs as the vertex inputs (position, then bone indices and weights) but interleaved in the depth vertex buffer
+    // Returns the number of inputs
+    fn depthVertexInputs(model: *const ModelData, inputs: []const VertexMeta.VertexInput, bone_indices_input: ?u32, depth_vertex_buffer: *Buffer, depth_inputs: *[3]VertexMeta.VertexInput) u32 {
+        depth_inputs[0] = inputs[0];
+        var depth_inputs_count: u32 = 1;
+        if (bone_indices_input != null) {
+            depth_inputs[1] = inputs[bone_indices_input.?];
+            depth_inputs[2] = inputs[bone_indices_input.? + 1];
+            depth_inputs_count = 3;
+        }
+
+        var depth_offset: u32 = 0;
+        for (depth_inputs[0..depth_inputs_count]) |*inp| {
+            inp.offset = depth_offset;
+            inp.stride = model.depth_vertex_size;
+            inp.source = depth_vertex_buffer;
+            depth_offset += if (depth_offset == 0) model.positionSize() * 4 else 4;
+        }
+        return depth_inputs_count;
+    }
+
+    pub fn init(mesh: *Mesh, allocator: *std.mem.Allocator) !MeshRenderer {
+        mesh.ref_count.inc();
+        errdefer mesh.ref_count.dec();
+
+        var inputs: []VertexMeta.VertexInput = try allocator.alloc(VertexMeta.VertexInput, mesh.model.attributes_count);
+        defer allocator.free(inputs);
+
+        const bone_indices_input = vertexInputs(mesh.model, &mesh.vertex_data_buffer, inputs);
+
+        var vao = try VertexMeta.init(inputs, if (mesh.index_data_buffer == null) null else &mesh.index_data_buffer.?);
+        errdefer vao.free();
+
+        var depth_vao: ?VertexMeta = null;
+        if (mesh.depth_vertex_buffer != null) {
+            var depth_inputs: [3]VertexMeta.VertexInput = undefined;
+            const depth_inputs_count = depthVertexInputs(mesh.model, inputs, bone_indices_input, &mesh.depth_vertex_buffer.?, &depth_inputs);
+            depth_vao = try VertexMeta.init(depth_inputs[0..depth_inputs_count], &mesh.depth_index_buffer.?);
+        }
+
         return MeshRenderer{
-            .vao = try VertexMeta.init(inputs, if (mesh.index_data_buffer == null) null else &mesh.index_data_buffer.?),
+            .vao = vao,
+            .depth_vao = depth_vao,
             .mesh = mesh,
         };
     }
@@ -174,6 +319,117 @@ pub const MeshRenderer = struct {
         fragment_light_matrices: [4]Matrix(f32, 4),
     };
 
+    // Chooses the level of detail from the size of the model's bounding sphere on the screen (see ModelData.getLOD)
+    // mvp_matrix is the matrix that transforms model space (not quantised positions) to clip space
+    fn getLOD(self: *MeshRenderer, mvp_matrix: *const Matrix(f32, 4)) u32 {
+        const model = self.mesh.?.model;
+        if (model.lod_count == 0) {
+            return 0;
+        }
+
+        const c = model.bounding_sphere;
+        const m = mvp_matrix.data;
+
+        // Clip space w of the centre of the sphere
+        const w = c[0] * m[0][3] + c[1] * m[1][3] + c[2] * m[2][3] + m[3][3];
+        if (!(w > 0)) {
+            return 0;
+        }
+
+        // Change in clip space y for one unit of model space
+        const y_scale = std.math.sqrt(m[0][1] * m[0][1] + m[1][1] * m[1][1] + m[2][1] * m[2][1]);
+
+        return model.getLOD(c[3] * y_scale / w * getSettings().lod_bias);
+    }
+
+    // Returns null if the clusters should not be culled
+    // Matrices transform model space (not quantised positions) to clip space and view space
+    fn getClusterCuller(self: *MeshRenderer, lod: u32, mvp_matrix: *const Matrix(f32, 4), model_view_matrix: *const Matrix(f32, 4)) ?ClusterCuller {
+        if (!self.enable_cluster_culling or lod != 0 or self.mesh.?.model.clusters == null or self.animation_object != null) {
+            return null;
+        }
+        return ClusterCuller.init(mvp_matrix, model_view_matrix) catch null;
+    }
+
+    // If depth_vertices is true then the depth vertices and indices are used (the shader must only have their inputs)
+    fn drawIndices(self: *MeshRenderer, first_index: u32, index_vertex_count: u32, depth_vertices: bool) !void {
+        const model = self.mesh.?.model;
+        if (depth_vertices) {
+            try self.depth_vao.?.drawWithIndices(VertexMeta.PrimitiveType.Triangles, model.depth_indices_u32 != null, first_index, index_vertex_count);
+        } else if (self.mesh.?.index_data_buffer == null) {
+            try self.vao.draw(VertexMeta.PrimitiveType.Triangles, first_index, index_vertex_count);
+        } else if (model.index_ranges == null) {
+            try self.vao.drawWithIndices(VertexMeta.PrimitiveType.Triangles, model.indices_u32 != null, first_index, index_vertex_count);
+        } else {
+            try self.drawIndexRanges(first_index, index_vertex_count);
+        }
+    }
+
+    // Draws the indices from first_index to first_index + index_count with one draw per index range (see ModelData.IndexRange)
+    fn drawIndexRanges(self: *MeshRenderer, first_index: u32, index_count: u32) !void {
+        const ranges = self.mesh.?.model.index_ranges.?;
+        const end = first_index + index_count;
+
+        // Range that contains first_index
+        var low: usize = 0;
+        var high: usize = ranges.len;
+        while (high - low > 1) {
+            const middle = (low + high) / 2;
+            if (ranges[middle].first_index <= first_index) {
+                low = middle;
+            } else {
+                high = middle;
+            }
+        }
+
+        var i = low;
+        while (i < ranges.len and ranges[i].first_index < end) : (i += 1) {
+            const r = &ranges[i];
+            const first = max(first_index, r.first_index);
+            const last = min(end, r.first_index + r.index_count);
+            try self.vao.drawWithIndicesAndBaseVertex(VertexMeta.PrimitiveType.Triangles, false, first, last - first, r.base_vertex);
+        }
+    }
+
+    // Draws the indices from first_index to first_index + index_count, skipping the clusters that are culled.
+    // Visible clusters that are next to each other are drawn together.
+    fn drawClusters(self: *MeshRenderer, culler: *const ClusterCuller, first_index: u32, index_count: u32, depth_vertices: bool) !void {
+        const clusters = self.mesh.?.model.clusters.?;
+        const end = first_index + index_count;
+
+        // First cluster in the range
+        var low: usize = 0;
+        var high: usize = clusters.len;
+        while (low < high) {
+            const middle = (low + high) / 2;
+            if (clusters[middle].first_index < first_index) {
+                low = middle + 1;
+            } else {
+                high = middle;
+            }
+        }
+
+        // Indices before this have been drawn or culled
+        var culled_up_to: u32 = first_index;
+
+        var i = low;
+        while (i < clusters.len and clusters[i].first_index < end) : (i += 1) {
+            const c = &clusters[i];
+            if (c.first_index + c.index_count > end or culler.isVisible(c)) {
+                continue;
+            }
+
+            if (c.first_index > culled_up_to) {
+                try self.drawIndices(culled_up_to, c.first_index - culled_up_to, depth_vertices);
+            }
+            culled_up_to = c.first_index + c.index_count;
+        }
+
+        if (end > culled_up_to) {
+            try self.drawIndices(culled_up_to, end - culled_up_to, depth_vertices);
+        }
+    }
+
     pub fn draw(self: *MeshRenderer, draw_data: DrawData, allocator: *std.mem.Allocator) !void {
         if (self.mesh == null) {
             return error.MeshRendererDestroyed;
@@ -193,9 +449,23 @@ pub const MeshRenderer = struct {
         };
         var shader: *const ShaderInstance = try ShaderInstance.getShader(shader_config, allocator);
 
-        try shader.setMVPMatrix(draw_data.mvp_matrix);
-        try shader.setModelMatrix(draw_data.model_matrix);
-        try shader.setModelViewMatrix(draw_data.model_view_matrix);
+        const lod = self.getLOD(draw_data.mvp_matrix);
+        const culler = self.getClusterCuller(lod, draw_data.mvp_matrix, draw_data.model_view_matrix);
+
+        var mvp_matrix = draw_data.mvp_matrix.*;
+        var model_matrix = draw_data.model_matrix.*;
+        var model_view_matrix = draw_data.model_view_matrix.*;
+
+        if (self.mesh.?.dequantisation_matrix != null) {
+            const d = self.mesh.?.dequantisation_matrix.?;
+            mvp_matrix = d.mul(mvp_matrix);
+            model_matrix = d.mul(model_matrix);
+            model_view_matrix = d.mul(model_view_matrix);
+        }
+
+        try shader.setMVPMatrix(&mvp_matrix);
+        try shader.setModelMatrix(&model_matrix);
+        try shader.setModelViewMatrix(&model_view_matrix);
         try shader.setPerObjLight(draw_data.light);
         try shader.setVertexLightIndices(draw_data.vertex_light_indices);
         try shader.setFragmentLightIndices(draw_data.fragment_light_indices);
@@ -212,7 +482,7 @@ pub const MeshRenderer = struct {
         }
 
         if (shader.config.non_uniform_scale) {
-            const normal_mat = try draw_data.model_view_matrix.decreaseDimension().transpose().inverse();
+            const normal_mat = try model_view_matrix.decreaseDimension().transpose().inverse();
             try shader.setNormalMatrix(&normal_mat);
         }
 
@@ -239,6 +509,9 @@ pub const MeshRenderer = struct {
             var utf8_name: []const u8 = undefined;
             var colour: [3]f32 = undefined;
             self.mesh.?.model.getMaterial(i, &first_index, &index_vertex_count, &colour, &utf8_name) catch break;
+            if (lod != 0) {
+                try self.mesh.?.model.getLODRegion(lod, i, &first_index, &index_vertex_count);
+            }
 
             if (self.materials[i].colour_override == null) {
                 try shader.setColour(colour);
@@ -249,24 +522,29 @@ pub const MeshRenderer = struct {
             if (index_vertex_count > 0) {
                 shader.validate(allocator);
 
-                if (self.mesh.?.index_data_buffer == null) {
-                    try self.vao.draw(VertexMeta.PrimitiveType.Triangles, first_index, index_vertex_count);
+                if (culler == null) {
+                    try self.drawIndices(first_index, index_vertex_count, false);
                 } else {
-                    try self.vao.drawWithIndices(VertexMeta.PrimitiveType.Triangles, self.mesh.?.model.vertex_count > 65536, first_index, index_vertex_count);
+                    try self.drawClusters(&culler.?, first_index, index_vertex_count, false);
                 }
             }
         }
     }
 
     // For shadow maps
-    pub fn drawDepthOnly(self: *MeshRenderer, allocator: *std.mem.Allocator, mvp_matrix: *const Matrix(f32, 4), model_matrix: *const Matrix(f32, 4)) !void {
+    pub fn drawDepthOnly(self: *MeshRenderer, allocator: *std.mem.Allocator, mvp_matrix: *const Matrix(f32, 4), model_matrix: *const Matrix(f32, 4), model_view_matrix: *const Matrix(f32, 4)) !void {
         if (self.mesh == null) {
             return error.MeshRendererDestroyed;
         }
 
+        // The depth vertices only have the inputs that are used for shadows
+        const depth_vertices = self.depth_vao != null;
+        const depth_inputs_bitmap = self.mesh.?.model.attributes_bitmap & ((1 << @enumToInt(VertexAttributeType.Position)) |
+            (1 << @enumToInt(VertexAttributeType.BoneIndices)) | (1 << @enumToInt(VertexAttributeType.BoneWeights)));
+
         var shader_config = ShaderInstance.ShaderConfig{
             .shadow = true,
-            .inputs_bitmap = self.mesh.?.model.attributes_bitmap,
+            .inputs_bitmap = if (depth_vertices) depth_inputs_bitmap else self.mesh.?.model.attributes_bitmap,
 
             // Not used for shadows
             .max_vertex_lights = 0,
@@ -280,8 +558,19 @@ pub const MeshRenderer = struct {
         };
         var shader: *const ShaderInstance = try ShaderInstance.getShader(shader_config, allocator);
 
-        try shader.setMVPMatrix(mvp_matrix);
-        try shader.setModelMatrix(model_matrix);
+        const lod = self.getLOD(mvp_matrix);
+        const culler = self.getClusterCuller(lod, mvp_matrix, model_view_matrix);
+
+        if (self.mesh.?.dequantisation_matrix != null) {
+            const d = self.mesh.?.dequantisation_matrix.?;
+            const mvp_matrix_ = d.mul(mvp_matrix.*);
+            const model_matrix_ = d.mul(model_matrix.*);
+            try shader.setMVPMatrix(&mvp_matrix_);
+            try shader.setModelMatrix(&model_matrix_);
+        } else {
+            try shader.setMVPMatrix(mvp_matrix);
+            try shader.setModelMatrix(model_matrix);
+        }
         // try shader.setModelViewMatrix(model_view_matrix);
 
         if (self.mesh.?.model.attributes_bitmap & (1 << @enumToInt(ModelData.VertexAttributeType.BoneIndices)) != 0) {
@@ -296,13 +585,11 @@ pub const MeshRenderer = struct {
 
         var first_index: u32 = 0;
         var index_count: u32 = 0;
-        var utf8_name: []const u8 = undefined;
-        var colour: [3]f32 = undefined;
         var i: u32 = 0;
         while (i < self.mesh.?.model.material_count and i < 32) : (i += 1) {
             var first_index_: u32 = undefined;
             var index_count_: u32 = undefined;
-            self.mesh.?.model.getMaterial(i, &first_index_, &index_count_, &colour, &utf8_name) catch break;
+            self.mesh.?.model.getLODRegion(lod, i, &first_index_, &index_count_) catch break;
 
             var do_draw: bool = false;
 
@@ -319,10 +606,10 @@ pub const MeshRenderer = struct {
 
             if (do_draw) {
                 if (index_count > 0) {
-                    if (self.mesh.?.index_data_buffer == null) {
-                        try self.vao.draw(VertexMeta.PrimitiveType.Triangles, first_index, index_count);
+                    if (culler == null) {
+                        try self.drawIndices(first_index, index_count, depth_vertices);
                     } else {
-                        try self.vao.drawWithIndices(VertexMeta.PrimitiveType.Triangles, self.mesh.?.model.vertex_count > 65536, first_index, index_count);
+                        try self.drawClusters(&culler.?, first_index, index_count, depth_vertices);
                     }
                 }
 
@@ -371,3 +658,128 @@ pub const MeshRenderer = struct {
         }
     }
 };
+
+test "vertex inputs (16-bit positions)" {
+    // Interleaved: 16-bit position (+ padding), normal
+    const test_data = [_]u32{
+        0xaaeecdbb,
+        0,
+
+        1 | (1 << 3) | (1 << 8),
+
+        1,
+        2,
+
+        @bitCast(u32, @as(f32, -1.0)),
+        @bitCast(u32, @as(f32, 0.0)),
+        @bitCast(u32, @as(f32, 1.0)),
+        @bitCast(u32, @as(f32, 2.0)),
+
+        0x0000ffff,
+        0x00000000,
+        0x1ff00000,
+        0x00008000,
+        0x00000000,
+        0x1ff00000,
+
+        0,
+
+        0,
+    };
+
+    var buf: [1024]u8 = undefined;
+    const a = &std.heap.FixedBufferAllocator.init(&buf).allocator;
+
+    var model = try ModelData.init(std.mem.sliceAsBytes(test_data[0..]), a);
+    defer model.free(a);
+
+    // Not used without OpenGL
+    var buffer: Buffer = undefined;
+
+    var inputs: [2]VertexMeta.VertexInput = undefined;
+    std.testing.expect(MeshRenderer.vertexInputs(&model, &buffer, inputs[0..]) == null);
+
+    for (inputs) |inp| {
+        try VertexMeta.checkInput(inp);
+    }
+    std.testing.expect(inputs[0].componentCount == 4 and inputs[0].stride == 12);
+    std.testing.expect(inputs[1].offset == 8);
+}
+
+test "depth vertex inputs (16-bit positions)" {
+    // Not interleaved: 16-bit positions (+ padding), bone indices, bone weights. 2 depth vertices
+    const test_data = [_]u32{
+        0xaaeecdbb,
+        3,
+
+        1 | (1 << 4) | (1 << 5) | (1 << 8) | ModelData.DEPTH_VERTICES_FLAG,
+
+        0,
+        3,
+
+        @bitCast(u32, @as(f32, -1.0)),
+        @bitCast(u32, @as(f32, 0.0)),
+        @bitCast(u32, @as(f32, 1.0)),
+        @bitCast(u32, @as(f32, 2.0)),
+
+        0x0000ffff,
+        0x00000000,
+        0x0000ffff,
+        0x00000000,
+        0x00008000,
+        0x00000000,
+
+        0,
+        0,
+        0,
+
+        0x000000ff,
+        0x000000ff,
+        0x000000ff,
+
+        0x00010000,
+        0x00000002,
+
+        0,
+
+        0,
+
+        2,
+
+        0x0000ffff,
+        0x00000000,
+        0,
+        0x000000ff,
+        0x00008000,
+        0x00000000,
+        0,
+        0x000000ff,
+
+        0x00000000,
+        0x00000001,
+    };
+
+    var buf: [1024]u8 = undefined;
+    const a = &std.heap.FixedBufferAllocator.init(&buf).allocator;
+
+    var model = try ModelData.init(std.mem.sliceAsBytes(test_data[0..]), a);
+    defer model.free(a);
+
+    // Not used without OpenGL
+    var buffer: Buffer = undefined;
+    var depth_buffer: Buffer = undefined;
+
+    var inputs: [3]VertexMeta.VertexInput = undefined;
+    const bone_indices_input = MeshRenderer.vertexInputs(&model, &buffer, inputs[0..]);
+    std.testing.expect(bone_indices_input.? == 1);
+
+    var depth_inputs: [3]VertexMeta.VertexInput = undefined;
+    std.testing.expect(MeshRenderer.depthVertexInputs(&model, inputs[0..], bone_indices_input, &depth_buffer, &depth_inputs) == 3);
+
+    for (depth_inputs) |inp| {
+        try VertexMeta.checkInput(inp);
+        std.testing.expect(inp.stride == 16 and inp.source == &depth_buffer);
+    }
+    std.testing.expect(depth_inputs[0].componentCount == 4);
+    std.testing.expect(depth_inputs[1].offset == 8 and depth_inputs[2].offset == 12);
+}
@@ -4,6 +4,8 @@ pub const Mesh = @import("Mesh.zig").Mesh;
 pub const MeshRenderer = @import("MeshRenderer.zig").MeshRenderer;
 pub const Light = @import("Light.zig").Light;
 pub const Texture2D = @import("Texture2D.zig").Texture2D;
+const bounding_volumes = @import("BVH.zig");
+pub const BVH = bounding_volumes.BVH;
 const PostProcess = @import("PostProcess.zig");
 const Matrix = @import("../Mathematics/Mathematics.zig").Matrix;
 const Vector = @import("../Mathematics/Mathematics.zig").Vector;
@@ -54,6 +56,9 @@ pub const SettingsStruct = struct {
     ambient: [3]f32 = [3]f32{ 0.1, 0.1, 0.1 },
     clear_colour: [3]f32 = [3]f32{ 0.5, 0.5, 0.5 },
     fog_colour: [4]f32 = [4]f32{ 0.5, 0.5, 0.5, 1.0 },
+
+    // Screen sizes are multiplied by this when choosing levels of detail. Bigger values keep the detailed levels for longer
+    lod_bias: f32 = 1.0,
 };
 
 var settings: ?SettingsStruct = null;
@@ -113,6 +118,10 @@ pub const Object = struct {
 
     light: ?Light = null,
 
+    // Bounding boxes of objects below this object (see BVH.zig). Objects outside of the view are not drawn.
+    // Set by the scene loader. Freed when this object is deleted with free_resources = true
+    bvh: ?BVH = null,
+
     // -- INTERNAL VARIABLES (READ-ONLY)
 
     transform: Matrix(f32, 4) = Matrix(f32, 4).identity(),
@@ -121,6 +130,12 @@ pub const Object = struct {
 
     true_transform: ?Matrix(f32, 4) = null,
 
+    // True if the object is in a BVH and has not moved since then
+    in_bvh: bool = false,
+
+    // Last render pass in which the object was found to be inside the view frustum (see BVH.markVisible)
+    visible_pass: u32 = 0,
+
     pub fn init(name: []const u8) Object {
         var obj = Object{};
         obj.name_length = std.math.min(@intCast(u32, name.len), 16);
@@ -131,6 +146,24 @@ pub const Object = struct {
     pub fn setTransform(self: *Object, new_transform: Matrix(f32, 4)) void {
         self.transform = new_transform;
         self.nullifyTrueTransform();
+        self.removeFromBVH();
+    }
+
+    // The bounding box of the object in the BVH is no longer valid. Also affects children.
+    fn removeFromBVH(self: *Object) void {
+        self.in_bvh = false;
+
+        const first = self.first_child;
+        var current = self.first_child;
+
+        while (current != null) {
+            current.?.removeFromBVH();
+
+            current = current.?.next;
+            if (current == first) {
+                break;
+            }
+        }
     }
 
     fn nullifyTrueTransform(self: *Object) void {
@@ -154,6 +187,11 @@ pub const Object = struct {
         }
         self.mesh_renderer = null;
 
+        if (free_resources and self.bvh != null) {
+            self.bvh.?.free();
+            self.bvh = null;
+        }
+
         // Delete the children
 
         if (self.first_child != null) {
@@ -299,7 +337,7 @@ pub const Object = struct {
 
         if (depth_only) {
             // For shadow maps
-            try self.mesh_renderer.?.*.drawDepthOnly(allocator, &mvp_matrix, &self.true_transform.?);
+            try self.mesh_renderer.?.*.drawDepthOnly(allocator, &mvp_matrix, &self.true_transform.?, &model_view_matrix);
         } else {
             var draw_data = MeshRenderer.DrawData{
                 .mvp_matrix = &mvp_matrix,
@@ -396,19 +434,74 @@ fn objectsPrePass(o: *Object, allocator: *Allocator, root_object: *Object) void
     }
 }
 
+const DrawListEntry = struct {
+    object: *Object,
+
+    // Distance from the camera along the view direction
+    depth: f32,
+};
+
+// Objects to draw in the current render pass
+var draw_list: ?ArrayList(DrawListEntry) = null;
+
+// Incremented for each call to renderObjects. Objects in BVHs are visible if their visible_pass is this value
+var render_pass: u32 = 0;
+
+// Adds the objects that have mesh renderers and are not outside of the view frustum to draw_list
+fn gatherObjects(o: *Object, planes: *const bounding_volumes.FrustumPlanes, view_matrix: *const Matrix(f32, 4)) !void {
+    if (o.bvh != null) {
+        o.bvh.?.markVisible(planes, render_pass);
+    }
+
+    // Bounding boxes are for the rest pose
+    if (o.mesh_renderer != null and (!o.in_bvh or o.visible_pass == render_pass or o.mesh_renderer.?.animation_object != null)) {
+        o.calculateTransform();
+        const p = o.true_transform.?.position3D();
+        const v = view_matrix.data;
+
+        try draw_list.?.append(DrawListEntry{
+            .object = o,
+            .depth = -(p.x() * v[0][2] + p.y() * v[1][2] + p.z() * v[2][2] + v[3][2]),
+        });
+    }
+
+    // depth-first traversal
+    if (o.first_child != null) {
+        try gatherObjects(o.first_child.?, planes, view_matrix);
+    }
+    if (o.parent != null and o.next != null and o.next.? != o.parent.?.*.first_child) {
+        try gatherObjects(o.next.?, planes, view_matrix);
+    }
+}
+
 // INTERNAL FUNCTION - DO NOT CALL
 // obj = root
+// Objects are culled with the BVHs in the tree. In the colour pass they are drawn front-to-back to reduce overdraw.
 pub fn renderObjects(o: *Object, allocator: *Allocator, view_matrix: *const Matrix(f32, 4), projection_matrix: *const Matrix(f32, 4), depth_only: bool) void {
-    o.renderObject(allocator, view_matrix, projection_matrix, depth_only) catch {
+    render_pass +%= 1;
+
+    const view_projection_matrix = view_matrix.mul(projection_matrix.*);
+    const planes = bounding_volumes.getFrustumPlanes(&view_projection_matrix);
+
+    draw_list.?.resize(0) catch unreachable;
+    gatherObjects(o, &planes, view_matrix) catch {
         assert(false);
     };
 
-    // depth-first traversal
-    if (o.first_child != null) {
-        renderObjects(o.first_child.?, allocator, view_matrix, projection_matrix, depth_only);
+    if (!depth_only) {
+        const sortFunction = struct {
+            fn f(a: DrawListEntry, b: DrawListEntry) bool {
+                return a.depth < b.depth;
+            }
+        };
+
+        std.sort.sort(DrawListEntry, draw_list.?.items, sortFunction.f);
     }
-    if (o.parent != null and o.next != null and o.next.? != o.parent.?.*.first_child) {
-        renderObjects(o.next.?, allocator, view_matrix, projection_matrix, depth_only);
+
+    for (draw_list.?.items) |e| {
+        e.object.renderObject(allocator, view_matrix, projection_matrix, depth_only) catch {
+            assert(false);
+        };
     }
 }
 
@@ -444,6 +537,7 @@ pub fn init(time: u64, allocator: *Allocator) !void {
     try default_normal_map.?.upload(1, 1, ImageType.RGBA, &[4]u8{ 0x80, 0x80, 0xff, 0xff });
 
     lights = ArrayList(*Object).init(allocator);
+    draw_list = ArrayList(DrawListEntry).init(allocator);
 
     uniform_buffer = try Buffer.init();
     errdefer uniform_buffer.?.free();
@@ -453,6 +547,7 @@ pub fn init(time: u64, allocator: *Allocator) !void {
 
 pub fn deinit(allocator: *Allocator) void {
     lights.?.deinit();
+    draw_list.?.deinit();
     allocator.destroy(uniform_data);
 }
 
@@ -527,6 +622,8 @@ pub fn setImageCorrection(brightness_: f32, contrast_: f32) void {
 
 test "All tests" {
     _ = @import("Mesh.zig");
+    _ = @import("MeshRenderer.zig");
     _ = @import("Shader.zig");
     _ = @import("PostProcess.zig");
+    _ = @import("BVH.zig");
 }
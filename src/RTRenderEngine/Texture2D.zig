@@ -17,7 +17,9 @@ pub const Texture2D = struct {
     }
 
     pub fn loadFromAsset(asset: *Asset) !Texture2D {
-        if (asset.asset_type != Asset.AssetType.Texture and asset.asset_type != Asset.AssetType.RGB10A2Texture) {
+        if (asset.asset_type != Asset.AssetType.Texture and asset.asset_type != Asset.AssetType.RGB10A2Texture and
+            asset.asset_type != Asset.AssetType.BlockCompressedTexture)
+        {
             return error.InvalidAssetType;
         }
         if (asset.state != Asset.AssetState.Ready) {
@@ -27,11 +29,16 @@ pub const Texture2D = struct {
         asset.ref_count.inc();
         errdefer asset.ref_count.dec();
 
-        var t = try Tex2D.init(false, wgi.MinFilter.Linear);
+        // Precomputed mip-maps are uploaded and used (see Tools/convert-textures.py)
+        const min_filter = if (asset.texture_mip_levels > 1) wgi.MinFilter.LinearMipMapLinear else wgi.MinFilter.Linear;
+
+        var t = try Tex2D.init(false, min_filter);
         errdefer t.free();
 
         if (asset.asset_type == Asset.AssetType.RGB10A2Texture) {
-            try t.upload(asset.texture_width.?, asset.texture_height.?, asset.texture_type.?, asset.rgb10a2_data.?);
+            try t.uploadMipLevels(asset.texture_width.?, asset.texture_height.?, asset.texture_type.?, asset.rgb10a2_data.?, asset.texture_mip_levels);
+        } else if (asset.asset_type == Asset.AssetType.BlockCompressedTexture) {
+            try t.uploadMipLevels(asset.texture_width.?, asset.texture_height.?, asset.texture_type.?, asset.block_compressed_data.?, asset.texture_mip_levels);
         } else {
             try t.upload(asset.texture_width.?, asset.texture_height.?, asset.texture_type.?, asset.data.?);
         }
@@ -9,6 +9,48 @@ const wgi = @import("../WindowGraphicsInput/WindowGraphicsInput.zig");
 const image = wgi.image;
 const Texture2D = render.Texture2D;
 
+// Version 1 files store all 32 materials of every mesh renderer
+// Version 2 files have a table of materials and mesh renderers only store the materials that they use
+const MAGIC_V1: u32 = 0x1a98fd34;
+const MAGIC_V2: u32 = 0x1a98fd35;
+
+// Size of a material in u32s
+const MATERIAL_SIZE = 6;
+
+// Returns the version of the scene file format
+fn getVersion(file_data: []align(4) const u8) !u32 {
+    if (file_data.len < 9 * 4) {
+        return error.FileTooSmall;
+    }
+
+    const magic = std.mem.bytesAsSlice(u32, file_data)[0];
+    if (magic == MAGIC_V1) {
+        return 1;
+    } else if (magic == MAGIC_V2) {
+        return 2;
+    }
+    return error.InvalidMagic;
+}
+
+// data_u32 and data_f32 start at the material (texture index, normal map index, specular size, specular intensity,
+// specular colourisation, flat shading)
+fn loadMaterial(material: *render.MeshRenderer.Material, data_u32: []const u32, data_f32: []const f32, textures: []?*Texture2D) void {
+    const tex = data_u32[0];
+    const norm = data_u32[1];
+
+    if (tex < textures.len and textures[tex] != null) {
+        material.setTexture(textures[tex].?);
+    }
+    if (norm < textures.len and textures[norm] != null) {
+        material.setNormalMap(textures[norm].?);
+    }
+
+    material.specular_size = data_f32[2];
+    material.specular_intensity = data_f32[3];
+    material.specular_colourisation = data_f32[4];
+    material.flat_shading = data_u32[5] != 0;
+}
+
 pub fn getAmbient(file_data: []align(4) const u8, ambient: *[3]f32) void {
     const scene_file_f32 = std.mem.bytesAsSlice(f32, file_data);
     ambient.*[0] = scene_file_f32[1];
@@ -25,11 +67,8 @@ pub fn getClearColour(file_data: []align(4) const u8, c: *[3]f32) void {
 
 pub fn getAssets(file_data: []align(4) const u8, assets_list: *std.ArrayList(Asset)) !void {
     const scene_file_u32 = std.mem.bytesAsSlice(u32, file_data);
-    const scene_file_f32 = std.mem.bytesAsSlice(f32, file_data);
 
-    if (scene_file_u32[0] != 0x1a98fd34) {
-        return error.InvalidMagic;
-    }
+    _ = try getVersion(file_data);
 
     const num_assets = scene_file_u32[8];
     if (num_assets > 10000) {
@@ -60,6 +99,52 @@ pub fn getAssets(file_data: []align(4) const u8, assets_list: *std.ArrayList(Ass
     }
 }
 
+// Bounding volume hierarchy at the end of the file. See scene file format.md
+fn loadBVH(data_u32: []const u32, data_f32: []const f32, objects: []*render.Object, allocator: *std.mem.Allocator) !render.BVH {
+    if (data_u32.len < 2) {
+        return error.FileTooSmall;
+    }
+
+    const num_entries = data_u32[0];
+    var offset: u32 = 1;
+
+    const entry_size = 7;
+    if (num_entries > (data_u32.len - offset - 1) / entry_size) {
+        return error.FileTooSmall;
+    }
+
+    var entries = try allocator.alloc(render.BVH.Entry, num_entries);
+    errdefer allocator.free(entries);
+
+    for (entries) |*e| {
+        const object_index = data_u32[offset];
+        if (object_index >= objects.len) {
+            return error.InvalidBVH;
+        }
+
+        e.* = render.BVH.Entry{
+            .object = objects[object_index],
+            .box_min = [3]f32{ data_f32[offset + 1], data_f32[offset + 2], data_f32[offset + 3] },
+            .box_max = [3]f32{ data_f32[offset + 4], data_f32[offset + 5], data_f32[offset + 6] },
+        };
+        offset += entry_size;
+    }
+
+    const num_nodes = data_u32[offset];
+    offset += 1;
+
+    const node_size = @sizeOf(render.BVH.Node) / 4;
+    if (num_nodes > (data_u32.len - offset) / node_size) {
+        return error.FileTooSmall;
+    }
+
+    var nodes = try allocator.alloc(render.BVH.Node, num_nodes);
+    errdefer allocator.free(nodes);
+    std.mem.copy(render.BVH.Node, nodes, std.mem.bytesAsSlice(render.BVH.Node, std.mem.sliceAsBytes(data_u32[offset..(offset + num_nodes * node_size)])));
+
+    return render.BVH.init(nodes, entries, allocator);
+}
+
 // Returns root object
 // Assets must be in the ready state
 // Assets slie must point to the assets loaded by getAssets or the wrong assets will be used
@@ -71,9 +156,7 @@ pub fn loadSceneFromFile(file_data: []align(4) const u8, assets_list: []Asset, a
     const scene_file_u32 = std.mem.bytesAsSlice(u32, file_data);
     const scene_file_f32 = std.mem.bytesAsSlice(f32, file_data);
 
-    if (scene_file_u32[0] != 0x1a98fd34) {
-        return error.InvalidMagic;
-    }
+    const version = try getVersion(file_data);
 
     var offset: u32 = 9 + scene_file_u32[7];
 
@@ -139,7 +222,8 @@ pub fn loadSceneFromFile(file_data: []align(4) const u8, assets_list: []Asset, a
 
         if (@intCast(usize, asset_index) < assets_list.len and
             (asset.asset_type == Asset.AssetType.Texture or
-            asset.asset_type == Asset.AssetType.RGB10A2Texture))
+            asset.asset_type == Asset.AssetType.RGB10A2Texture or
+            asset.asset_type == Asset.AssetType.BlockCompressedTexture))
         {
             var texture = try allocator.create(Texture2D);
             errdefer allocator.destroy(texture);
@@ -147,10 +231,9 @@ pub fn loadSceneFromFile(file_data: []align(4) const u8, assets_list: []Asset, a
             texture.* = try Texture2D.loadFromAsset(asset);
             errdefer texture.*.free();
 
-            if (asset.asset_type == Asset.AssetType.RGB10A2Texture) {
-                try texture.texture.upload(asset.texture_width.?, asset.texture_height.?, asset.texture_type.?, asset.rgb10a2_data.?);
-            } else {
-                try texture.texture.upload(asset.texture_width.?, asset.texture_height.?, asset.texture_type.?, asset.data.?);
+            // Filtering with mip-maps is only used if the texture has precomputed mip-maps
+            if (asset.texture_mip_levels > 1 or min_filter == image.MinFilter.Nearest or min_filter == image.MinFilter.Linear) {
+                try texture.texture.setFiltering(smooth_when_magnified, min_filter);
             }
 
             textures.items[i] = texture;
@@ -159,6 +242,23 @@ pub fn loadSceneFromFile(file_data: []align(4) const u8, assets_list: []Asset, a
         }
     }
 
+    // Materials (version 2)
+
+    var num_materials: u32 = 0;
+    var materials_offset: u32 = 0;
+
+    if (version >= 2) {
+        num_materials = scene_file_u32[offset];
+        offset += 1;
+
+        if (num_materials > (scene_file_u32.len - offset) / MATERIAL_SIZE) {
+            return error.FileTooSmall;
+        }
+
+        materials_offset = offset;
+        offset += num_materials * MATERIAL_SIZE;
+    }
+
     // Game objects
 
     const num_objects = scene_file_u32[offset];
@@ -203,28 +303,58 @@ pub fn loadSceneFromFile(file_data: []align(4) const u8, assets_list: []Asset, a
                 errdefer allocator.destroy(mesh_renderer);
                 mesh_renderer.* = try render.MeshRenderer.init(meshes.items[mesh_index].?, allocator);
                 o.setMeshRenderer(mesh_renderer);
+            }
 
-                // Materials
-
-                var j: u32 = 0;
-                while (j < 32) : (j += 1) {
-                    const tex = scene_file_u32[offset + 0];
-                    const norm = scene_file_u32[offset + 1];
-                    offset += 2;
+            // Materials. Skipped if the mesh could not be loaded
 
-                    if (tex < textures.items.len and textures.items[tex] != null) {
-                        o.mesh_renderer.?.materials[j].setTexture(textures.items[tex].?);
+            if (version == 1) {
+                if (o.mesh_renderer != null) {
+                    var j: u32 = 0;
+                    while (j < 32) : (j += 1) {
+                        const m = offset + j * MATERIAL_SIZE;
+                        loadMaterial(&o.mesh_renderer.?.materials[j], scene_file_u32[m..], scene_file_f32[m..], textures.items);
                     }
-                    if (norm < textures.items.len and textures.items[norm] != null) {
-                        o.mesh_renderer.?.materials[j].setNormalMap(textures.items[norm].?);
+                }
+                offset += 32 * MATERIAL_SIZE;
+            } else {
+                // Material used for all slots, then (slot, material) pairs
+                const default_material = scene_file_u32[offset];
+                const num_overrides = scene_file_u32[offset + 1];
+                offset += 2;
+
+                if (num_overrides > (scene_file_u32.len - offset) / 2) {
+                    return error.FileTooSmall;
+                }
+
+                if (o.mesh_renderer != null) {
+                    if (default_material != 0xffffffff) {
+                        if (default_material >= num_materials) {
+                            return error.InvalidMaterialIndex;
+                        }
+
+                        const m = materials_offset + default_material * MATERIAL_SIZE;
+                        for (o.mesh_renderer.?.materials) |*material| {
+                            loadMaterial(material, scene_file_u32[m..], scene_file_f32[m..], textures.items);
+                        }
                     }
 
-                    o.mesh_renderer.?.materials[j].specular_size = scene_file_f32[offset + 0];
-                    o.mesh_renderer.?.materials[j].specular_intensity = scene_file_f32[offset + 1];
-                    o.mesh_renderer.?.materials[j].specular_colourisation = scene_file_f32[offset + 2];
-                    o.mesh_renderer.?.materials[j].flat_shading = scene_file_u32[offset + 3] != 0;
-                    offset += 4;
+                    var j: u32 = 0;
+                    while (j < num_overrides) : (j += 1) {
+                        const slot = scene_file_u32[offset + j * 2];
+                        const material_index = scene_file_u32[offset + j * 2 + 1];
+
+                        if (slot >= 32) {
+                            return error.InvalidMaterialSlot;
+                        }
+                        if (material_index >= num_materials) {
+                            return error.InvalidMaterialIndex;
+                        }
+
+                        const m = materials_offset + material_index * MATERIAL_SIZE;
+                        loadMaterial(&o.mesh_renderer.?.materials[slot], scene_file_u32[m..], scene_file_f32[m..], textures.items);
+                    }
                 }
+                offset += num_overrides * 2;
             }
         }
 
@@ -278,5 +408,11 @@ pub fn loadSceneFromFile(file_data: []align(4) const u8, assets_list: []Asset, a
         }
     }
 
+    // Bounding volume hierarchy (files from older exporters end after the objects)
+
+    if (offset < scene_file_u32.len) {
+        root_object.bvh = try loadBVH(scene_file_u32[offset..], scene_file_f32[offset..], objects_list.items, allocator);
+    }
+
     return root_object;
 }
@@ -0,0 +1,243 @@
+// Compares planar (grouped by attribute) and interleaved (grouped by vertex) model files.
+// Loads the assets of a scene, converts every model to the interleaved layout in memory
+// and measures the time taken to decompress and parse the models, upload them to the GPU and render the scene.
+// Both layouts are compressed in memory the same way as compress-file does, as the layout affects the compression ratio.
+//
+// Usage: vertex-layout-benchmark [scene file in DemoAssets] [frames]
+// Defaults to Farm.scene and 1000 frames. Run from the repository root.
+
+const std = @import("std");
+const warn = std.debug.warn;
+const wgi = @import("WindowGraphicsInput/WindowGraphicsInput.zig");
+const window = wgi.window;
+const c = wgi.c;
+const render = @import("RTRenderEngine/RTRenderEngine.zig");
+const ModelData = @import("ModelFiles/ModelFiles.zig").ModelData;
+const c_allocator = std.heap.c_allocator;
+const maths = @import("Mathematics/Mathematics.zig");
+const Matrix = maths.Matrix;
+const Vector = maths.Vector;
+const Files = @import("Files.zig");
+const loadFile = Files.loadFile;
+const compress = @import("Compress/Compress.zig");
+const assets = @import("Assets/Assets.zig");
+const Asset = assets.Asset;
+const scenes = @import("Scene/Scene.zig");
+
+const load_iterations = 100;
+const warmup_frames = 60;
+
+const LayoutResults = struct {
+    name: []const u8,
+    compressed_size: usize = 0, // all models (bytes)
+    load_time: u64 = 0, // decompression + ModelData.init for all models, averaged (µs)
+    upload_time: u64 = 0, // scene creation: vertex/index buffer uploads + vertex array setup (µs)
+    frame_time_average: u64 = 0, // µs
+    frame_time_min: u64 = 0, // µs
+    frame_time_max: u64 = 0, // µs
+
+    fn print(self: LayoutResults) void {
+        warn("{}:\n", .{self.name});
+        warn("    Compressed size: {} bytes\n", .{self.compressed_size});
+        warn("    Load (decompress, parse): {} us\n", .{self.load_time});
+        warn("    Upload (scene creation): {} us\n", .{self.upload_time});
+        warn("    Frame time: avg {} us, min {} us, max {} us\n", .{ self.frame_time_average, self.frame_time_min, self.frame_time_max });
+    }
+};
+
+// Loads all assets of the scene on this thread
+fn loadAssets(assets_list: []Asset) !void {
+    for (assets_list) |*a| {
+        try a.load(c_allocator);
+        try a.decompress();
+    }
+}
+
+// Replaces the (planar) model data of the assets with interleaved model data
+fn interleaveModels(assets_list: []Asset) !void {
+    for (assets_list) |*a| {
+        if (a.asset_type != Asset.AssetType.Model or a.model.?.interleaved) {
+            continue;
+        }
+
+        const interleaved_data = try a.model.?.interleave(c_allocator);
+        errdefer c_allocator.free(interleaved_data);
+
+        a.model.?.free(c_allocator);
+        c_allocator.free(a.data.?);
+        a.data = interleaved_data;
+        a.model = try ModelData.init(a.data.?, c_allocator);
+    }
+}
+
+fn timeLoading(assets_list: []Asset, results: *LayoutResults) !void {
+    var total: u64 = 0;
+
+    for (assets_list) |*a| {
+        if (a.asset_type != Asset.AssetType.Model) {
+            continue;
+        }
+
+        const compressed_data = try compress.compress(a.data.?, c_allocator);
+        defer c_allocator.free(compressed_data);
+
+        results.compressed_size += compressed_data.len;
+
+        var timer = try std.time.Timer.start();
+
+        var i: u32 = 0;
+        while (i < load_iterations) : (i += 1) {
+            const data = try compress.decompress(compressed_data, c_allocator);
+            defer c_allocator.free(data);
+
+            var m = try ModelData.init(data, c_allocator);
+            m.free(c_allocator);
+        }
+
+        total += timer.read();
+    }
+
+    results.load_time = total / load_iterations / 1000;
+}
+
+fn loadScene(scene_file: []align(4) const u8, assets_list: []Asset, results: *LayoutResults) !*render.Object {
+    var timer = try std.time.Timer.start();
+
+    const scene = try scenes.loadSceneFromFile(scene_file, assets_list, c_allocator);
+    c.glFinish();
+
+    results.upload_time = timer.read() / 1000;
+
+    for (assets_list) |*a| {
+        a.freeData();
+    }
+
+    return scene;
+}
+
+fn timeFrames(root_object: *render.Object, scene: *render.Object, frames: u32, results: *LayoutResults) !void {
+    try root_object.addChild(scene);
+    defer scene.delete(false);
+
+    var total: u64 = 0;
+    results.frame_time_min = std.math.maxInt(u64);
+    results.frame_time_max = 0;
+
+    var i: u32 = 0;
+    while (i < warmup_frames + frames) : (i += 1) {
+        if (window.windowShouldClose()) {
+            return error.WindowClosed;
+        }
+
+        var timer = try std.time.Timer.start();
+
+        try render.render(root_object, wgi.getMicroTime(), c_allocator);
+        window.swapBuffers();
+        c.glFinish();
+
+        const t = timer.read() / 1000;
+
+        window.pollEvents();
+
+        if (i >= warmup_frames) {
+            total += t;
+            results.frame_time_min = std.math.min(results.frame_time_min, t);
+            results.frame_time_max = std.math.max(results.frame_time_max, t);
+        }
+    }
+
+    results.frame_time_average = total / frames;
+}
+
+pub fn main() !void {
+    const args = try std.process.argsAlloc(c_allocator);
+    defer std.process.argsFree(c_allocator, args);
+
+    if (args.len > 3) {
+        warn("Usage: vertex-layout-benchmark [scene file] [frames]\n", .{});
+        return error.InvalidParameters;
+    }
+
+    const scene_file_name = if (args.len >= 2) args[1] else "Farm.scene";
+    const frames = if (args.len >= 3) try std.fmt.parseInt(u32, args[2], 10) else 1000;
+
+    if (frames == 0) {
+        return error.InvalidParameters;
+    }
+
+    assets.setAssetsDirectory("DemoAssets" ++ Files.path_seperator);
+
+    var scene_path: [256]u8 = undefined;
+    const scene_file = try loadFile(try std.fmt.bufPrint(scene_path[0..], "DemoAssets{}{}", .{ Files.path_seperator, scene_file_name }), c_allocator);
+    defer c_allocator.free(scene_file);
+
+    // Separate asset objects for each layout so both scenes can exist at the same time
+
+    var planar_assets = std.ArrayList(Asset).init(c_allocator);
+    defer planar_assets.deinit();
+    var interleaved_assets = std.ArrayList(Asset).init(c_allocator);
+    defer interleaved_assets.deinit();
+
+    try scenes.getAssets(scene_file, &planar_assets);
+    try scenes.getAssets(scene_file, &interleaved_assets);
+
+    defer {
+        for (planar_assets.items) |*a| {
+            a.*.free(true);
+        }
+        for (interleaved_assets.items) |*a| {
+            a.*.free(true);
+        }
+    }
+
+    var planar = LayoutResults{ .name = "Planar" };
+    var interleaved = LayoutResults{ .name = "Interleaved" };
+
+    try loadAssets(planar_assets.items);
+    try loadAssets(interleaved_assets.items);
+
+    // The demo assets are planar. Models that are already interleaved are left as they are.
+    try interleaveModels(interleaved_assets.items);
+
+    try timeLoading(planar_assets.items, &planar);
+    try timeLoading(interleaved_assets.items, &interleaved);
+
+    try window.createWindow(false, 1024, 768, "Vertex Layout Benchmark", true, 0);
+    defer window.closeWindow();
+
+    // Measure render time, not the monitor refresh rate
+    c.glfwSwapInterval(0);
+
+    try render.init(wgi.getMicroTime(), c_allocator);
+    defer render.deinit(c_allocator);
+
+    const settings = render.getSettings();
+    scenes.getAmbient(scene_file, &settings.*.ambient);
+    scenes.getClearColour(scene_file, &settings.*.clear_colour);
+    std.mem.copy(f32, settings.*.fog_colour[0..3], &settings.*.clear_colour);
+    settings.*.fog_colour[3] = 1;
+
+    var root_object: render.Object = render.Object.init("root");
+    defer root_object.delete(true);
+
+    var camera: render.Object = render.Object.init("camera");
+    try root_object.addChild(&camera);
+    render.setActiveCamera(&camera);
+    camera.setTransform(Matrix(f32, 4).translate(Vector(f32, 3).init([3]f32{ 0.0, 1.75, 10.0 })));
+
+    const planar_scene = try loadScene(scene_file, planar_assets.items, &planar);
+    defer planar_scene.delete(true);
+    const interleaved_scene = try loadScene(scene_file, interleaved_assets.items, &interleaved);
+    defer interleaved_scene.delete(true);
+
+    // Run each layout twice (alternating) and keep the second run
+    // so that driver and GPU clock warm up does not favour either layout.
+    try timeFrames(&root_object, planar_scene, frames, &planar);
+    try timeFrames(&root_object, interleaved_scene, frames, &interleaved);
+    try timeFrames(&root_object, planar_scene, frames, &planar);
+    try timeFrames(&root_object, interleaved_scene, frames, &interleaved);
+
+    warn("{} ({} frames)\n", .{ scene_file_name, frames });
+    planar.print();
+    interleaved.print();
+}
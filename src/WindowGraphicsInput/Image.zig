@@ -7,6 +7,10 @@ const files = @import("../Files.zig");
 const expect = std.testing.expect;
 const ReferenceCounter = @import("../RefCount.zig").ReferenceCounter;
 
+// From EXT_texture_compression_s3tc. Not in the core profile headers but supported by all desktop GPUs
+const GL_COMPRESSED_RGB_S3TC_DXT1_EXT = 0x83F0;
+const GL_COMPRESSED_RGBA_S3TC_DXT5_EXT = 0x83F3;
+
 // Base internal formats
 pub const image_type_base_internal_formats = [_]u32{
     c.GL_RED,
@@ -27,6 +31,9 @@ pub const image_type_base_internal_formats = [_]u32{
     c.GL_RGB,
     c.GL_RGBA,
     c.GL_RGB,
+    c.GL_RGB,
+    c.GL_RGBA,
+    c.GL_RG,
 };
 
 pub const image_type_sized_internal_formats = [_]u32{
@@ -48,6 +55,9 @@ pub const image_type_sized_internal_formats = [_]u32{
     c.GL_RGB16F,
     c.GL_RGBA16F,
     c.GL_R11F_G11F_B10F,
+    GL_COMPRESSED_RGB_S3TC_DXT1_EXT,
+    GL_COMPRESSED_RGBA_S3TC_DXT5_EXT,
+    c.GL_COMPRESSED_RG_RGTC2,
 };
 
 pub const ImageType = enum {
@@ -69,8 +79,17 @@ pub const ImageType = enum {
     RGB16F,
     RGBA16F,
     RG11FB10F,
+
+    // Block compressed. 4x4 pixel blocks of 8 (BC1) or 16 bytes. See docs/block compressed texture format.md
+    BC1, // RGB (DXT1)
+    BC3, // RGBA (DXT5)
+    BC5, // RG (RGTC2), for normal maps
 };
 
+pub fn isBlockCompressed(imgType: ImageType) bool {
+    return imgType == ImageType.BC1 or imgType == ImageType.BC3 or imgType == ImageType.BC5;
+}
+
 const min_filter_gl_values = [_]i32{
     c.GL_NEAREST,
     c.GL_LINEAR,
@@ -112,12 +131,47 @@ pub fn imageDataSize(w: usize, h: usize, imgType: ImageType) usize {
     } else if (imgType == ImageType.R) {
         assert(w % 4 == 0); // Ensure rows are a multiple of 4 bytes
         expectedDataSize = w * h;
+    } else if (imgType == ImageType.BC1) {
+        expectedDataSize = ((w + 3) / 4) * ((h + 3) / 4) * 8;
+    } else if (imgType == ImageType.BC3 or imgType == ImageType.BC5) {
+        expectedDataSize = ((w + 3) / 4) * ((h + 3) / 4) * 16;
     } else {
         assert(false);
     }
     return expectedDataSize;
 }
 
+// Size of mip-map level 'level' of a w*h image (level 0 is the full image)
+pub fn mipLevelSize(w: u32, h: u32, level: u32) [2]u32 {
+    const shift = @intCast(u5, std.math.min(level, 31));
+    return [2]u32{ std.math.max(w >> shift, 1), std.math.max(h >> shift, 1) };
+}
+
+// Number of levels in a full mip-map chain (down to 1x1)
+pub fn mipLevelCount(w: u32, h: u32) u32 {
+    var levels: u32 = 1;
+    var size = std.math.max(w, h);
+    while (size > 1) : (levels += 1) {
+        size >>= 1;
+    }
+    return levels;
+}
+
+// Number of mip-map levels in data_size bytes of image data (levels stored one after another, biggest first)
+pub fn mipLevelsInData(w: u32, h: u32, imgType: ImageType, data_size: usize) !u32 {
+    var size: usize = 0;
+    var levels: u32 = 0;
+    while (size < data_size and levels < mipLevelCount(w, h)) : (levels += 1) {
+        const level_size = mipLevelSize(w, h, levels);
+        size += imageDataSize(level_size[0], level_size[1], imgType);
+    }
+
+    if (size != data_size or levels == 0) {
+        return error.InvalidDataSize;
+    }
+    return levels;
+}
+
 pub fn setTextureFiltering(textureId: c_uint, gl_type: c_uint, smooth_when_magnified: bool, min_filter: MinFilter) void {
     c.glBindTexture(gl_type, textureId);
 
@@ -224,6 +278,14 @@ pub const Texture2D = struct {
 
     // If data is null then texture data will be uninitialised
     pub fn upload(self: *Texture2D, w: u32, h: u32, imgType: ImageType, data: ?[]const u8) !void {
+        if (isBlockCompressed(imgType)) {
+            if (data == null) {
+                assert(false);
+                return error.InvalidParameter;
+            }
+            return self.uploadMipLevels(w, h, imgType, data.?, 1);
+        }
+
         if (w == 0 or h == 0 or w > window.maximumTextureSize() or h > window.maximumTextureSize()) {
             assert(false);
             return error.InvalidParameter;
@@ -261,7 +323,59 @@ pub const Texture2D = struct {
         }
     }
 
+    // Uploads precomputed mip-map levels instead of generating them. data has 'levels' levels one after another,
+    // biggest first (see mipLevelsInData). The levels after the last one are not used.
+    pub fn uploadMipLevels(self: *Texture2D, w: u32, h: u32, imgType: ImageType, data: []const u8, levels: u32) !void {
+        if (w == 0 or h == 0 or w > window.maximumTextureSize() or h > window.maximumTextureSize() or levels == 0 or levels > 32) {
+            assert(false);
+            return error.InvalidParameter;
+        }
+
+        if ((try mipLevelsInData(w, h, imgType, data.len)) != levels) {
+            assert(false);
+            return error.InvalidParameter;
+        }
+
+        self.width = w;
+        self.height = h;
+        self.imageType = imgType;
+
+        const internalFormat: u32 = image_type_sized_internal_formats[@enumToInt(imgType)];
+
+        var data_format: c_uint = c.GL_UNSIGNED_BYTE;
+        if (imgType == ImageType.RGB10A2) {
+            data_format = c.GL_UNSIGNED_INT_10_10_10_2;
+        }
+
+        try self.bind();
+
+        var offset: usize = 0;
+        var level: u32 = 0;
+        while (level < levels) : (level += 1) {
+            const size = mipLevelSize(w, h, level);
+            const level_data_size = imageDataSize(size[0], size[1], imgType);
+            const ptr: [*c]const u8 = data[offset..].ptr;
+
+            if (isBlockCompressed(imgType)) {
+                c.glCompressedTexImage2D(c.GL_TEXTURE_2D, @intCast(c_int, level), internalFormat, @intCast(c_int, size[0]), @intCast(c_int, size[1]), 0, @intCast(c_int, level_data_size), ptr);
+            } else {
+                c.glTexImage2D(c.GL_TEXTURE_2D, @intCast(c_int, level), @intCast(c_int, internalFormat), @intCast(c_int, size[0]), @intCast(c_int, size[1]), 0, image_type_base_internal_formats[@enumToInt(imgType)], data_format, ptr);
+            }
+
+            offset += level_data_size;
+        }
+
+        if (self.min_filter != MinFilter.Nearest and self.min_filter != MinFilter.Linear) {
+            c.glTexParameteri(c.GL_TEXTURE_2D, c.GL_TEXTURE_BASE_LEVEL, 0);
+            c.glTexParameteri(c.GL_TEXTURE_2D, c.GL_TEXTURE_MAX_LEVEL, @intCast(c_int, levels - 1));
+        }
+    }
+
     pub fn download(self: Texture2D, outputBuffer: []u8) !void {
+        if (isBlockCompressed(self.imageType)) {
+            return error.ImageFormatNotSupported;
+        }
+
         const expectedDataSize = imageDataSize(self.width, self.height, self.imageType);
 
         if (outputBuffer.len != expectedDataSize) {
@@ -352,7 +466,9 @@ pub const Texture2D = struct {
             return error.InvalidDimensions;
         }
 
-        try tex.upload(w, h, ImageType.RGB10A2, file_data[16..(w * h * 4 + 16)]);
+        // The file may have mip-map levels after the image
+        const levels = try mipLevelsInData(w, h, ImageType.RGB10A2, file_data.len - 16);
+        try tex.uploadMipLevels(w, h, ImageType.RGB10A2, file_data[16..], levels);
 
         return tex;
     }
@@ -408,6 +524,22 @@ pub fn freeDecodedImage(data: []align(4) u8) void {
     c.stbi_image_free(d2);
 }
 
+test "mip-map levels" {
+    expect(mipLevelCount(1, 1) == 1);
+    expect(mipLevelCount(1024, 256) == 11);
+    expect(mipLevelSize(5, 3, 1)[0] == 2 and mipLevelSize(5, 3, 1)[1] == 1);
+    expect(mipLevelSize(5, 3, 2)[0] == 1 and mipLevelSize(5, 3, 2)[1] == 1);
+
+    expect((try mipLevelsInData(4, 2, ImageType.RGBA, 4 * 2 * 4)) == 1);
+    expect((try mipLevelsInData(4, 2, ImageType.RGBA, (8 + 2 + 1) * 4)) == 3);
+    std.testing.expectError(error.InvalidDataSize, mipLevelsInData(4, 2, ImageType.RGBA, (8 + 2 + 1 + 1) * 4));
+    std.testing.expectError(error.InvalidDataSize, mipLevelsInData(4, 2, ImageType.RGBA, 9 * 4));
+
+    // 2x2 blocks, then 1 block for each level after that
+    expect((try mipLevelsInData(8, 8, ImageType.BC1, (4 + 1 + 1 + 1) * 8)) == 4);
+    expect((try mipLevelsInData(8, 8, ImageType.BC5, 4 * 16)) == 1);
+}
+
 test "2d texture" {
     try window.createWindow(false, 200, 200, "test", true, 0);
 
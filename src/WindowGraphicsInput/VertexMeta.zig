@@ -83,6 +83,24 @@ pub const VertexMeta = struct {
         return error.InvalidParameter;
     }
 
+    // Returns an error if OpenGL cannot use the input. Does not need an OpenGL context
+    pub fn checkInput(inp: VertexInput) !void {
+        if (inp.dataType != VertexInput.DataType.CompactInts and (inp.componentCount == 0 or inp.componentCount > 4)) {
+            return error.InvalidParameter;
+        }
+
+        if (inp.dataType == VertexInput.DataType.Float) {
+            if (inp.dataElementSize != 4 and inp.dataElementSize != 2) {
+                return error.InvalidParameter;
+            }
+        } else if (inp.dataType != VertexInput.DataType.CompactInts) {
+            // Attributes must be aligned to 4 bytes
+            if (inp.componentCount * @as(u32, inp.dataElementSize) % 4 != 0) {
+                return error.InvalidParameter;
+            }
+        }
+    }
+
     pub fn init(inputs: []const VertexInput, indices_source: ?*buf.Buffer) !VertexMeta {
         assert(inputs.len <= window.maximumNumVertexAttributes());
         if (inputs.len > window.maximumNumVertexAttributes()) {
@@ -108,19 +126,14 @@ pub const VertexMeta = struct {
 
         var i: u32 = 0;
         for (inputs) |inp| {
-            if (inp.dataType != VertexInput.DataType.CompactInts and (inp.componentCount == 0 or inp.componentCount > 4)) {
+            checkInput(inp) catch |e| {
                 assert(false);
-                return error.InvalidParameter;
-            }
+                return e;
+            };
 
             try inp.source.bind(buf.Buffer.BufferType.VertexData);
 
             if (inp.dataType == VertexInput.DataType.Float) {
-                if (inp.dataElementSize != 4 and inp.dataElementSize != 2) {
-                    assert(false);
-                    return error.InvalidParameter;
-                }
-
                 var dataType: u32 = 0;
                 if (inp.dataElementSize == 4) {
                     dataType = c.GL_FLOAT;
@@ -139,11 +152,6 @@ pub const VertexMeta = struct {
                 }
                 c.glVertexAttribPointer(i, 4, dataType, @boolToInt(inp.normalised), @intCast(c_int, inp.stride), @intToPtr(?*const c_void, inp.offset));
             } else {
-                if (inp.componentCount * inp.dataElementSize % 4 != 0) {
-                    assert(false);
-                    return error.InvalidParameter;
-                }
-
                 if (inp.dataType == VertexInput.DataType.IntegerToFloat) {
                     var dataType: u32 = try getGLDataType(inp.dataElementSize, inp.signed);
                     assert(dataType != 0);
@@ -211,6 +219,21 @@ pub const VertexMeta = struct {
         }
     }
 
+    // base_vertex is added to the indices
+    pub fn drawWithIndicesAndBaseVertex(self: *VertexMeta, mode: PrimitiveType, large_indices: bool, first: u32, count: u32, base_vertex: u32) !void {
+        if (count == 0) {
+            assert(false);
+            return error.InvalidParameter;
+        }
+        try self.bind();
+
+        if (large_indices) {
+            c.glDrawElementsBaseVertex(primitive_type_gl[@enumToInt(mode)], @intCast(c_int, count), c.GL_UNSIGNED_INT, @intToPtr(?*const c_void, first * 4), @intCast(c_int, base_vertex));
+        } else {
+            c.glDrawElementsBaseVertex(primitive_type_gl[@enumToInt(mode)], @intCast(c_int, count), c.GL_UNSIGNED_SHORT, @intToPtr(?*const c_void, first * 2), @intCast(c_int, base_vertex));
+        }
+    }
+
     pub fn free(self: *VertexMeta) void {
         if (self.id == 0) {
             assert(false);